@@ -1,14 +1,10 @@
+from .utils import boot_profile           # first: its clock starts the boot report
 from flask import Flask, send_from_directory, jsonify
 from flask_cors import CORS
 import os
 import threading
+from concurrent.futures import ThreadPoolExecutor
 import time
-import requests
-
-# Global flags for scheduler
-_scheduler_started = False
-_scheduler_enabled = True  # Default: scheduler is enabled
-_scheduler_enabled = True  # Control flag to pause/resume scheduler
 
 def create_app():
     app = Flask(__name__)
@@ -41,84 +37,74 @@ def create_app():
     os.makedirs(app.config['PDF_FOLDER'], exist_ok=True)
     
     # Initialize database
-    from app.models.database import db
-    db.init_app(app)
-    
-    # Import ALL models before create_all so tables get created
-    from app.models.qms_models import QMSDocument, QMSPartnerAudit, QMSActionPlan, QMSAuditLog, QMSDocumentVersion
+    with boot_profile.step('models'):
+        from app.models.database import db
+        db.init_app(app)
+
+        # Import ALL models before create_all so tables get created
+        # (route modules are imported lazily, so their models cannot be relied on)
+        from app.models.qms_models import QMSDocument, QMSPartnerAudit, QMSActionPlan, QMSAuditLog, QMSDocumentVersion
+        from app.models.qms_models import QMSSearchChunk, QMSSearchPosting, QMSSearchDocState, QMSSearchIndexMeta
+        from app.models import master_data, peel_test_data, calibration_data, coc_tracking
     
     # Create tables
-    with app.app_context():
+    with boot_profile.step('db.create_all'), app.app_context():
         db.create_all()
+
+    # Raw-SQL tables, added columns and upgrades: run once here, so handlers run no DDL
+    with boot_profile.step('schema_registry'):
+        from app.models import schema_registry
+        schema_registry.ensure_all(app)
     
     # Ensure QMS upload directory exists
     qms_upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'qms_documents')
     os.makedirs(qms_upload_dir, exist_ok=True)
     
-    # Register blueprints
-    from app.routes.ipqc_routes import ipqc_bp
-    from app.routes.production_routes import production_bp
-    from app.routes.company_routes import company_bp
-    from app.routes.peel_test_routes import peel_test_bp
-    from app.routes.master_routes import master_bp
-    from app.routes.coc_routes import coc_bp
-    from app.routes.production_validation_routes import production_validation_bp
-    from app.routes.auth_routes import auth_bp
-    from app.routes.order_routes import orders_bp
-    from app.routes.pdi_routes import pdi_bp
-    from app.routes.coc_new_routes import coc_new_bp
-    from app.routes.ftr_routes import ftr_bp
-    from app.routes.ftr_management_routes import ftr_management_bp
-    from app.routes.ftr_upload_routes import ftr_upload_bp
-    from app.routes.rfid_upload_routes import rfid_upload_bp
-    from app.routes.ai_assistant_routes import ai_assistant_bp
-    from app.routes.coc_management_routes import coc_mgmt_bp
-    from app.routes.witness_report_routes import witness_report_bp
-    from app.routes.calibration_routes import calibration_bp
-    from app.routes.qms_routes import qms_bp
-    from app.routes.telegram_routes import telegram_bp
-    from app.routes.pdi_doc_routes import pdi_doc_bp as pdi_doc_v5_bp
-    
-    _pdi_doc_full_available = False
-    pdi_doc_full_bp = None
+    # Register blueprints. Most route modules are imported on their first
+    # request (utils/lazy_blueprints); the first boot after a change to a
+    # module imports it here and records its routes for the next boot.
+    from app.utils import lazy_blueprints
+
+    blueprints = [
+        # (module, blueprint, url_prefix, lazy)
+        ('ipqc_routes', 'ipqc_bp', '/api/ipqc', True),
+        ('production_routes', 'production_bp', None, True),
+        ('company_routes', 'company_bp', None, True),
+        ('peel_test_routes', 'peel_test_bp', '/api/peel-test', True),
+        ('master_routes', 'master_bp', None, True),
+        ('coc_routes', 'coc_bp', '/api/coc', True),
+        ('production_validation_routes', 'production_validation_bp', '/api', True),
+        ('auth_routes', 'auth_bp', '/api/auth', True),
+        ('order_routes', 'orders_bp', None, True),
+        ('pdi_routes', 'pdi_bp', None, True),
+        ('coc_new_routes', 'coc_new_bp', None, True),
+        ('ftr_routes', 'ftr_bp', None, False),          # registers scheduler jobs at import
+        ('ftr_management_routes', 'ftr_management_bp', '/api', True),
+        ('ftr_upload_routes', 'ftr_upload_bp', None, True),
+        ('rfid_upload_routes', 'rfid_upload_bp', None, True),
+        ('ai_assistant_routes', 'ai_assistant_bp', '/api', True),
+        ('coc_management_routes', 'coc_mgmt_bp', None, True),
+        ('witness_report_routes', 'witness_report_bp', '/api', True),
+        ('calibration_routes', 'calibration_bp', None, True),
+        ('qms_routes', 'qms_bp', None, True),
+        ('telegram_routes', 'telegram_bp', None, True),
+    ]
+    for module, bp_name, url_prefix, lazy in blueprints:
+        with boot_profile.step(f'routes.{module}'):
+            lazy_blueprints.register(app, f'app.routes.{module}', bp_name, url_prefix=url_prefix, lazy=lazy)
+
     try:
-        from app.routes.pdi_documentation_routes import pdi_doc_bp as pdi_doc_full_bp
-        _pdi_doc_full_available = True
-        print("[STARTUP] ✅ PDI Documentation routes imported successfully")
+        # Full PDI docs - routes already have /pdi-docs/ prefix, register at /api
+        with boot_profile.step('routes.pdi_documentation_routes'):
+            lazy_blueprints.register(app, 'app.routes.pdi_documentation_routes', 'pdi_doc_bp', url_prefix='/api', lazy=False)
+        print("[STARTUP] [OK] PDI Documentation (full) registered at /api/pdi-docs/*")
     except Exception as e:
         print(f"[STARTUP] [ERROR] PDI Documentation routes FAILED to import: {e}")
         import traceback
         traceback.print_exc()
-    
-    app.register_blueprint(ipqc_bp, url_prefix='/api/ipqc')
-    app.register_blueprint(production_bp)
-    app.register_blueprint(company_bp)
-    app.register_blueprint(peel_test_bp, url_prefix='/api/peel-test')
-    app.register_blueprint(master_bp)
-    app.register_blueprint(coc_bp, url_prefix='/api/coc')
-    app.register_blueprint(production_validation_bp, url_prefix='/api')
-    app.register_blueprint(auth_bp, url_prefix='/api/auth')
-    app.register_blueprint(orders_bp)
-    app.register_blueprint(pdi_bp)
-    app.register_blueprint(coc_new_bp)
-    app.register_blueprint(ftr_bp)
-    app.register_blueprint(ftr_management_bp, url_prefix='/api')
-    app.register_blueprint(ftr_upload_bp)
-    app.register_blueprint(rfid_upload_bp)
-    app.register_blueprint(ai_assistant_bp, url_prefix='/api')
-    app.register_blueprint(coc_mgmt_bp)
-    app.register_blueprint(witness_report_bp, url_prefix='/api')
-    app.register_blueprint(calibration_bp)
-    app.register_blueprint(qms_bp)
-    app.register_blueprint(telegram_bp)
-    if _pdi_doc_full_available:
-        # Full PDI docs - routes already have /pdi-docs/ prefix, register at /api
-        app.register_blueprint(pdi_doc_full_bp, url_prefix='/api')
-        print("[STARTUP] [OK] PDI Documentation (full) registered at /api/pdi-docs/*")
-    else:
         # Fallback v5 - routes don't have prefix, register at /api/pdi-docs
         # v5's /generate endpoint does dynamic import of full generator
-        app.register_blueprint(pdi_doc_v5_bp, url_prefix='/api/pdi-docs')
+        lazy_blueprints.register(app, 'app.routes.pdi_doc_routes', 'pdi_doc_bp', url_prefix='/api/pdi-docs', lazy=False)
         print("[STARTUP] ⚠️ PDI docs v5 fallback at /api/pdi-docs/* (generate uses dynamic import)")
 
     # Serve uploaded files (IPQC PDFs, FTR documents, BOM images)
@@ -145,72 +131,52 @@ def create_app():
         return send_from_directory(static_folder, 'index.html')
     
     # ============================================
-    # AUTO PACKING VALIDATION SCHEDULER
-    # Runs every 10 minutes to check for issues
+    # AUTO PACKING VALIDATION (scheduler job, every 10 minutes)
     # DISABLED BY DEFAULT — heavy MRP API calls + WhatsApp
     # alerts that overload Waitress thread pool. Enable via
     # env var ENABLE_PACKING_SCHEDULER=true if needed.
+    # Cycles are incremental (only new/changed rows and their
+    # pallets are looked up, alerts only for new issues), see
+    # services/packing_validation.
     # ============================================
+    from app.services import scheduler
+
+    # List of companies to check
+    COMPANIES_TO_CHECK = ['Rays Power', 'Larsen & Toubro', 'Sterlin and Wilson']
+    CHECK_INTERVAL = 600  # 10 minutes in seconds
+
     def run_packing_validation():
-        """Background task to validate packing every 10 minutes"""
-        global _scheduler_started
-        
-        if _scheduler_started:
-            return
-        _scheduler_started = True
-        
-        # List of companies to check
-        COMPANIES_TO_CHECK = ['Rays Power', 'Larsen & Toubro', 'Sterlin and Wilson']
-        CHECK_INTERVAL = 600  # 10 minutes in seconds
-        
-        def validation_loop():
-            global _scheduler_enabled
-            print("\n🔄 PACKING VALIDATION SCHEDULER STARTED")
-            print(f"   Checking every {CHECK_INTERVAL // 60} minutes")
-            print(f"   Companies: {', '.join(COMPANIES_TO_CHECK)}")
-            
-            # Wait for server to fully start
-            time.sleep(30)
-            
-            while True:
+        """Validate packing for every company (scheduler job; pause/resume via /ai/scheduler-control)"""
+        print(f"\n⏰ [{time.strftime('%Y-%m-%d %H:%M:%S')}] Running scheduled packing validation...")
+
+        # Refresh all companies' MRP fact tables concurrently, then
+        # validate the companies in parallel (each in its own app context)
+        from app.services import mrp_facts
+        mrp_facts.get_many(COMPANIES_TO_CHECK)
+
+        def check_company(company):
+            with app.app_context():
+                from app.routes.ai_assistant_routes import validate_packing_internal
+                return validate_packing_internal(company, send_alerts=True)
+
+        with ThreadPoolExecutor(max_workers=len(COMPANIES_TO_CHECK)) as executor:
+            futures = {company: executor.submit(check_company, company) for company in COMPANIES_TO_CHECK}
+            for company, future in futures.items():
                 try:
-                    # Check if scheduler is enabled
-                    if not _scheduler_enabled:
-                        print(f"\n⏸️ [{time.strftime('%Y-%m-%d %H:%M:%S')}] Scheduler paused, skipping validation...")
-                        time.sleep(CHECK_INTERVAL)
-                        continue
-                    
-                    print(f"\n⏰ [{time.strftime('%Y-%m-%d %H:%M:%S')}] Running scheduled packing validation...")
-                    
-                    for company in COMPANIES_TO_CHECK:
-                        try:
-                            # Call the validation API internally
-                            with app.app_context():
-                                from app.routes.ai_assistant_routes import validate_packing_internal
-                                result = validate_packing_internal(company, send_alerts=True)
-                                
-                                if result.get('total_issues', 0) > 0:
-                                    print(f"   ⚠️ {company}: {result['total_issues']} issues found - Alerts sent!")
-                                else:
-                                    print(f"   ✅ {company}: No issues")
-                        except Exception as e:
-                            print(f"   ❌ Error checking {company}: {str(e)}")
-                    
-                    print(f"   Next check in {CHECK_INTERVAL // 60} minutes...")
-                    
+                    result = future.result()
+                    if result.get('total_issues', 0) > 0:
+                        print(f"   ⚠️ {company}: {result['total_issues']} issues found - Alerts sent!")
+                    else:
+                        print(f"   ✅ {company}: No issues")
                 except Exception as e:
-                    print(f"❌ Scheduler error: {str(e)}")
-                
-                time.sleep(CHECK_INTERVAL)
-        
-        # Start background thread
-        scheduler_thread = threading.Thread(target=validation_loop, daemon=True)
-        scheduler_thread.start()
-    
-    # Start scheduler ONLY if explicitly enabled (default: OFF)
+                    print(f"   ❌ Error checking {company}: {str(e)}")
+
+    # Register the job ONLY if explicitly enabled (default: OFF)
     if os.environ.get('ENABLE_PACKING_SCHEDULER', 'false').lower() == 'true':
-        print("⚙️  ENABLE_PACKING_SCHEDULER=true — starting packing validation scheduler")
-        run_packing_validation()
+        print(f"⚙️  ENABLE_PACKING_SCHEDULER=true — packing validation every {CHECK_INTERVAL // 60} minutes")
+        print(f"   Companies: {', '.join(COMPANIES_TO_CHECK)}")
+        scheduler.add_job('packing-validation', run_packing_validation,
+                          every=CHECK_INTERVAL, jitter=30, start_delay=30)
     else:
         print("⏸️  Packing validation scheduler DISABLED (set ENABLE_PACKING_SCHEDULER=true to enable)")
 
@@ -218,16 +184,38 @@ def create_app():
     if os.environ.get('ENABLE_TELEGRAM_BOT', 'false').lower() == 'true':
         print("⚙️  ENABLE_TELEGRAM_BOT=true — starting Telegram bot")
         from app.routes.telegram_routes import start_telegram_scheduler
-        start_telegram_scheduler(app)
+        start_telegram_scheduler()
     else:
         print("⏸️  Telegram bot DISABLED (set ENABLE_TELEGRAM_BOT=true to enable)")
 
     # Warm up the shared MySQL connection pool so first requests are fast
-    try:
-        from app.utils.db_pool import warm_pool
-        warm_pool()
-    except Exception as e:
-        print(f"[startup] db_pool warm skipped: {e}")
+    # (in the background: the server can take requests meanwhile)
+    def _warm_db_pool():
+        try:
+            from app.utils.db_pool import warm_pool
+            warm_pool()
+        except Exception as e:
+            print(f"[startup] db_pool warm skipped: {e}")
+
+    threading.Thread(target=_warm_db_pool, name='db-pool-warm', daemon=True).start()
+
+    # Outbound WhatsApp/Telegram queue — alerts and reports are sent by one worker thread
+    from app.services import notification_queue
+    notification_queue.start(app)
+
+    # AI assistant data snapshot — built in the background, rebuilt on FTR/PDI/MRP changes
+    # (only where chat requests are served, not in worker.py)
+    if scheduler.MODE != 'worker':
+        from app.services import ai_snapshot
+        ai_snapshot.start(app)
+
+    # Background jobs (packing validation, Telegram reports, party cache
+    # warmers) start once the server has served its first request. With
+    # SCHEDULER_MODE=web they run in the separate worker.py process instead.
+    if scheduler.MODE != 'worker':      # worker.py starts it via run_worker()
+        scheduler.start(app)
+
+    boot_profile.report(app)
 
     # NOTE: Cache warmer removed — bulk packing API (get_barcode_tracking.php
     # with party_name) is fast enough on demand (~4 sec per party, then 30-min
@@ -38,7 +38,17 @@ class QMSDocument(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    def to_dict(self):
+    __table_args__ = (
+        # Keyset pagination of the document list, and its filters
+        db.Index('ix_qms_documents_updated_id', 'updated_at', 'id'),
+        db.Index('ix_qms_documents_category_status', 'category', 'status'),
+    )
+    
+    def to_dict(self, text_length=None):
+        # text_length can be passed in (computed in SQL) so list views don't
+        # have to load extracted_text
+        if text_length is None:
+            text_length = len(self.extracted_text) if self.extracted_text else 0
         return {
             'id': self.id,
             'doc_number': self.doc_number,
@@ -64,8 +74,8 @@ class QMSDocument(db.Model):
             'revision_history': self.revision_history,
             'is_controlled': self.is_controlled,
             'access_level': self.access_level,
-            'has_extracted_text': bool(self.extracted_text),
-            'text_length': len(self.extracted_text) if self.extracted_text else 0,
+            'has_extracted_text': bool(text_length),
+            'text_length': text_length,
             'text_extracted_at': self.text_extracted_at.isoformat() if self.text_extracted_at else None,
             'checked_out_by': self.checked_out_by,
             'checked_out_at': self.checked_out_at.isoformat() if self.checked_out_at else None,
@@ -217,3 +227,55 @@ class QMSAuditLog(db.Model):
             'details': self.details,
             'timestamp': self.timestamp.isoformat() if self.timestamp else None
         }
+
+
+# ═══════════════════════════════════════════════
+# Search index (maintained by app.services.qms_search_index)
+# No FK constraints: document rows may be deleted before their
+# index rows are cleaned up.
+# ═══════════════════════════════════════════════
+class QMSSearchChunk(db.Model):
+    """One searchable chunk of a document's text"""
+    __tablename__ = 'qms_search_chunks'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, nullable=False, index=True)
+    chunk_index = db.Column(db.Integer, nullable=False)
+    text = db.Column(db.Text)
+    token_count = db.Column(db.Integer, default=0)
+
+
+class QMSSearchPosting(db.Model):
+    """Term -> chunk posting with in-chunk frequency (chunk length copied in)"""
+    __tablename__ = 'qms_search_postings'
+    __table_args__ = (
+        db.Index('ix_qms_search_postings_lookup', 'term', 'chunk_id', 'document_id', 'tf', 'chunk_len'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    term = db.Column(db.String(64), nullable=False)
+    chunk_id = db.Column(db.Integer, nullable=False, index=True)
+    document_id = db.Column(db.Integer, nullable=False, index=True)
+    tf = db.Column(db.Integer, nullable=False)         # occurrences of term in chunk
+    chunk_len = db.Column(db.Integer, nullable=False)  # tokens in chunk
+
+
+class QMSSearchDocState(db.Model):
+    """Which version of each document the index reflects"""
+    __tablename__ = 'qms_search_doc_state'
+    
+    document_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    source_updated_at = db.Column(db.DateTime)
+    text_hash = db.Column(db.String(40))   # sha1 of the indexed text
+    has_text = db.Column(db.Boolean, default=False)
+    chunk_count = db.Column(db.Integer, default=0)
+    indexed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class QMSSearchIndexMeta(db.Model):
+    """Single row: index generation, bumped whenever postings change"""
+    __tablename__ = 'qms_search_index_meta'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
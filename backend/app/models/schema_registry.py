@@ -0,0 +1,342 @@
+"""
+Schema checks run once per process at start-up instead of on every request.
+
+Tables that have no SQLAlchemy model (db.create_all() does not know
+them) used to be created by the handlers themselves: CREATE TABLE IF NOT
+EXISTS, ALTER TABLE and information_schema checks ran on each call and
+took metadata locks. They are declared here instead, together with the
+columns and one-off upgrades (indexes, backfills) that model tables
+gained after they were first created; db.create_all() never alters an
+existing table.
+
+create_app() calls ensure_all(app) at start-up: one information_schema
+query finds what exists, only missing tables / columns get DDL, and each
+upgrade runs once. Handlers call ensure(name) for the raw-SQL tables, a
+set lookup once the table is verified; if the start-up check failed
+(database down), the next ensure() retries it, at most every
+SCHEMA_RETRY_SEC, and the handler's own query reports the error.
+
+Usage:
+    from app.models import schema_registry
+    schema_registry.table('actual_pdi_barcodes', "CREATE TABLE IF NOT EXISTS ...",
+                          columns={'filename': 'VARCHAR(255) DEFAULT NULL'})  # added if missing
+    schema_registry.columns('qms_search_doc_state', {'text_hash': 'VARCHAR(40) NULL'})  # model table
+    schema_registry.upgrade('qms_documents.list', fn)   # fn() runs once, in an app context
+    schema_registry.ensure_all(app)               # create_app()
+    schema_registry.ensure('actual_pdi_barcodes')  # in a handler; no DDL once verified
+    schema_registry.status()
+
+Tunables via environment:
+    SCHEMA_RETRY_SEC  retry a failed table check at most this often  (default 30)
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+_RETRY_SEC = int(os.environ.get('SCHEMA_RETRY_SEC', '30'))
+
+_tables = {}            # name -> (create_sql or None for model tables, {column: definition})
+_upgrades = {}          # name -> callable, run by ensure_all(app)
+_verified = set()
+_failed = {}            # name -> (time, error)
+_lock = threading.Lock()
+
+
+def table(name, create_sql, columns=None):
+    """Declare a table: its CREATE statement and columns to add to older copies of it."""
+    _tables[name] = (create_sql, dict(columns or {}))
+
+
+def columns(name, columns):
+    """Columns to add to a model table (created by db.create_all()) that predates them."""
+    _tables[name] = (None, dict(columns))
+
+
+def upgrade(name, fn):
+    """A one-off schema / data step; ensure_all(app) runs fn() inside an app context."""
+    _upgrades[name] = fn
+
+
+def _existing_columns(cursor, names):
+    placeholders = ', '.join(['%s'] * len(names))
+    cursor.execute(f"""
+        SELECT table_name AS t, column_name AS c
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name IN ({placeholders})
+    """, tuple(names))
+    existing = {}
+    for row in cursor.fetchall() or []:
+        existing.setdefault(row['t'], set()).add(row['c'])
+    return existing
+
+
+def _check(names):
+    from app.utils.db_pool import get_db_connection
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            existing = _existing_columns(cursor, names)
+            for name in names:
+                create_sql, columns = _tables[name]
+                try:
+                    if name not in existing:
+                        if create_sql is None:
+                            raise RuntimeError('table missing (db.create_all() should have created it)')
+                        cursor.execute(create_sql)
+                        print(f"[schema] created {name}")
+                    else:
+                        for column, definition in columns.items():
+                            if column not in existing[name]:
+                                cursor.execute(f"ALTER TABLE {name} ADD COLUMN {column} {definition}")
+                                print(f"[schema] {name}: added column {column}")
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    _failed[name] = (time.time(), str(e))
+                    print(f"[schema] {name}: {e}")
+                    continue
+                _verified.add(name)
+                _failed.pop(name, None)
+    finally:
+        conn.close()
+
+
+def ensure_all(app=None):
+    """
+    Verify every declared table and create what is missing, then (given
+    the app) run the upgrades not run yet. Errors are logged, not raised.
+    """
+    with _lock:
+        names = [name for name in _tables if name not in _verified]
+        if names:
+            try:
+                _check(names)
+            except Exception as e:
+                now = time.time()
+                for name in names:
+                    _failed[name] = (now, str(e))
+                print(f"[schema] check failed: {e}")
+        if app is None:
+            return
+        for name, fn in _upgrades.items():
+            if name in _verified:
+                continue
+            try:
+                with app.app_context():
+                    fn()
+            except Exception as e:
+                _failed[name] = (time.time(), str(e))
+                print(f"[schema] {name}: {e}")
+                continue
+            _verified.add(name)
+            _failed.pop(name, None)
+
+
+def ensure(name):
+    """True once name is verified. Checks it now only if it was not (retry throttled)."""
+    if name in _verified:
+        return True
+    with _lock:
+        if name in _verified:
+            return True
+        failed = _failed.get(name)
+        if failed and time.time() - failed[0] < _RETRY_SEC:
+            return False
+        try:
+            _check([name])
+        except Exception as e:
+            _failed[name] = (time.time(), str(e))
+            print(f"[schema] {name}: check failed: {e}")
+    return name in _verified
+
+
+def status():
+    return {
+        'verified': sorted(_verified),
+        'failed': {name: error for name, (_, error) in _failed.items()},
+        'pending': sorted((set(_tables) | set(_upgrades)) - _verified - set(_failed)),
+    }
+
+
+# ─── tables ───────────────────────────────────
+
+table('pdi_serial_numbers', """
+    CREATE TABLE IF NOT EXISTS pdi_serial_numbers (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        pdi_number VARCHAR(50) NOT NULL,
+        serial_number VARCHAR(100) NOT NULL,
+        company_id INT,
+        production_record_id INT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_pdi (pdi_number),
+        INDEX idx_serial (serial_number),
+        INDEX idx_company (company_id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+""")
+
+table('ftr_master_serials', """
+    CREATE TABLE IF NOT EXISTS ftr_master_serials (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        company_id INT NOT NULL,
+        serial_number VARCHAR(100) NOT NULL,
+        pmax DECIMAL(10,3) DEFAULT NULL,
+        binning VARCHAR(20) DEFAULT NULL,
+        class_status VARCHAR(20) DEFAULT 'OK',
+        status ENUM('available', 'assigned', 'used') DEFAULT 'available',
+        pdi_number VARCHAR(50) DEFAULT NULL,
+        upload_date DATETIME NOT NULL,
+        assigned_date DATETIME DEFAULT NULL,
+        file_name VARCHAR(255) DEFAULT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE KEY unique_serial (company_id, serial_number),
+        INDEX idx_company_status (company_id, status),
+        INDEX idx_pdi (pdi_number),
+        INDEX idx_binning (binning),
+        INDEX idx_class (class_status)
+    )
+""", columns={
+    'pmax': 'DECIMAL(10,3) DEFAULT NULL',
+    'binning': 'VARCHAR(20) DEFAULT NULL',
+    'class_status': "VARCHAR(20) DEFAULT 'OK'",
+})
+
+table('ftr_packed_modules', """
+    CREATE TABLE IF NOT EXISTS ftr_packed_modules (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        company_id INT NOT NULL,
+        serial_number VARCHAR(100) NOT NULL,
+        packed_date DATETIME NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE KEY unique_packed (company_id, serial_number),
+        INDEX idx_company (company_id)
+    )
+""")
+
+# Actual PDI barcodes: independent of the PDI card, one row per pdi_id
+table('actual_pdi_barcodes', """
+    CREATE TABLE IF NOT EXISTS actual_pdi_barcodes (
+        pdi_id          VARCHAR(64) PRIMARY KEY,
+        party_name      VARCHAR(255) DEFAULT NULL,
+        filename        VARCHAR(255) DEFAULT NULL,
+        barcode_count   INT DEFAULT 0,
+        barcodes_json   LONGTEXT,
+        uploaded_at     DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at      DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+""")
+
+# Actual PDI batches: PDI 1 ... PDI N per party, for compare reports
+table('actual_pdi_batches', """
+    CREATE TABLE IF NOT EXISTS actual_pdi_batches (
+        id              INT AUTO_INCREMENT PRIMARY KEY,
+        party_id        VARCHAR(64) NOT NULL,
+        party_name      VARCHAR(255) DEFAULT NULL,
+        batch_no        INT NOT NULL,
+        batch_name      VARCHAR(255) DEFAULT NULL,
+        filename        VARCHAR(255) DEFAULT NULL,
+        barcode_count   INT DEFAULT 0,
+        barcodes_json   LONGTEXT,
+        created_at      DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at      DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        UNIQUE KEY uniq_party_batch (party_id, batch_no)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+""")
+
+table('party_reallocation_workspace', """
+    CREATE TABLE IF NOT EXISTS party_reallocation_workspace (
+        id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+        party_id VARCHAR(64) NOT NULL,
+        party_name VARCHAR(255) NOT NULL,
+        pdi_serials LONGTEXT NULL,
+        running_order_serials LONGTEXT NULL,
+        barcode_serials LONGTEXT NULL,
+        rejection_serials LONGTEXT NULL,
+        smt_module_serials LONGTEXT NULL,
+        pdi_number VARCHAR(120) NULL,
+        running_order_number VARCHAR(120) NULL,
+        rfid_data_json LONGTEXT NULL,
+        rfid_row_count INT NOT NULL DEFAULT 0,
+        rfid_uploaded_at DATETIME NULL,
+        pdi_count INT NOT NULL DEFAULT 0,
+        running_order_count INT NOT NULL DEFAULT 0,
+        barcode_count INT NOT NULL DEFAULT 0,
+        rejection_count INT NOT NULL DEFAULT 0,
+        smt_module_count INT NOT NULL DEFAULT 0,
+        created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (id),
+        UNIQUE KEY uq_party_reallocation_workspace_party_id (party_id),
+        KEY idx_party_reallocation_workspace_updated_at (updated_at)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+""", columns={
+    'pdi_number': 'VARCHAR(120) NULL',
+    'running_order_number': 'VARCHAR(120) NULL',
+    'rfid_data_json': 'LONGTEXT NULL',
+    'rfid_row_count': 'INT NOT NULL DEFAULT 0',
+    'rfid_uploaded_at': 'DATETIME NULL',
+})
+
+table('party_reallocation_workspace_pdi', """
+    CREATE TABLE IF NOT EXISTS party_reallocation_workspace_pdi (
+        id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+        party_id VARCHAR(64) NOT NULL,
+        party_name VARCHAR(255) NOT NULL,
+        pdi_key VARCHAR(120) NOT NULL,
+        pdi_number VARCHAR(120) NULL,
+        running_order_number VARCHAR(120) NULL,
+        pdi_serials LONGTEXT NULL,
+        running_order_serials LONGTEXT NULL,
+        barcode_serials LONGTEXT NULL,
+        rejection_serials LONGTEXT NULL,
+        smt_module_serials LONGTEXT NULL,
+        rfid_data_json LONGTEXT NULL,
+        rfid_row_count INT NOT NULL DEFAULT 0,
+        rfid_uploaded_at DATETIME NULL,
+        pdi_count INT NOT NULL DEFAULT 0,
+        running_order_count INT NOT NULL DEFAULT 0,
+        barcode_count INT NOT NULL DEFAULT 0,
+        rejection_count INT NOT NULL DEFAULT 0,
+        smt_module_count INT NOT NULL DEFAULT 0,
+        created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (id),
+        UNIQUE KEY uq_party_reallocation_workspace_pdi (party_id, pdi_key),
+        KEY idx_party_reallocation_workspace_pdi_updated_at (updated_at)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+""")
+
+
+# ─── model tables ─────────────────────────────
+
+columns('qms_search_doc_state', {'text_hash': 'VARCHAR(40) NULL'})
+
+
+def _qms_document_list():
+    """Indexes the keyset-paginated QMS document list relies on, and an updated_at on every row"""
+    from datetime import datetime
+    from app.models.database import db
+    from app.models.qms_models import QMSDocument
+    for index in QMSDocument.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+    QMSDocument.query.filter(QMSDocument.updated_at.is_(None)).update(
+        {QMSDocument.updated_at: db.func.coalesce(QMSDocument.created_at, datetime.utcnow())},
+        synchronize_session=False)
+    db.session.commit()
+
+
+upgrade('qms_documents.list', _qms_document_list)
+
+
+def _whatsapp_alert_log_indexes():
+    """(alert_type, serial_number) index the notification queue's dedupe lookup relies on"""
+    from app.models.database import db
+    from app.models.whatsapp_alert_log import WhatsAppAlertLog
+    for index in WhatsAppAlertLog.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+
+
+upgrade('whatsapp_alert_log.indexes', _whatsapp_alert_log_indexes)
@@ -8,5 +8,10 @@ class WhatsAppAlertLog(db.Model):
     alert_type = db.Column(db.String(50), nullable=False, index=True)  # e.g. 'rejection', 'mix_binning', etc
     sent_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Dedupe lookups: WHERE alert_type = ? AND serial_number IN (...)
+        db.Index('ix_whatsapp_alert_log_type_serial', 'alert_type', 'serial_number'),
+    )
+
     def __repr__(self):
         return f'<WhatsAppAlertLog {self.serial_number} {self.alert_type}>'
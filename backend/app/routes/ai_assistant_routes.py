@@ -1,17 +1,27 @@
 from flask import Blueprint, request, jsonify, send_file
 from app.models.database import db
-from app.models.whatsapp_alert_log import WhatsAppAlertLog
-from sqlalchemy import text
+from app.utils.keyword_automaton import KeywordAutomaton
+from app.services import mrp_facts
+from app.services import packing_validation
+from app.services import notification_queue
+from app.utils.http_client import http
+from sqlalchemy import text, bindparam
+import numpy as np
+import pandas as pd
 import requests
 import os
 import json
 import io
 import re
 from datetime import datetime, timedelta
+from functools import lru_cache
 
 try:
     import openpyxl
     from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+    from app.utils.excel_export import (
+        new_workbook, write_sheet, styled, workbook_bytes, THIN_BORDER,
+    )
     EXCEL_AVAILABLE = True
 except ImportError:
     EXCEL_AVAILABLE = False
@@ -123,6 +133,8 @@ def get_all_mrp_data(company):
     1. STERLING AND WILSON RENEWABLE ENERGY LIMITED
     2. S&W
     Both are different parties in MRP but we treat them as one.
+    The result also lists which parties were fetched ('parties') and which
+    failed ('failed_parties'); success means at least one returned rows.
     """
     mrp_party_name = get_mrp_party_name(company)
     
@@ -132,6 +144,8 @@ def get_all_mrp_data(company):
     is_lt = 'larsen' in mrp_party_name.lower() or 'l&t' in company.lower()
     
     all_data = []
+    parties = []
+    failed_parties = []
     
     # Party names to fetch from — include all sub-parties for each main party
     party_names_to_fetch = [mrp_party_name]
@@ -178,7 +192,7 @@ def get_all_mrp_data(company):
                 print(f"MRP API TIMEOUT for {party_name} (30s)")
             except Exception as e:
                 print(f"MRP API Error for {party_name}: {str(e)}")
-            return []
+            return None
         
         # Fetch all parties in parallel — capped to avoid thread storm
         # under concurrent user load. 6 in flight is plenty for ~10 parties.
@@ -186,13 +200,19 @@ def get_all_mrp_data(company):
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
             futures = {executor.submit(fetch_party, p): p for p in party_names_to_fetch}
             for future in as_completed(futures):
-                all_data.extend(future.result())
+                party_data = future.result()
+                if party_data is None:
+                    failed_parties.append(futures[future])
+                else:
+                    parties.append(futures[future])
+                    all_data.extend(party_data)
         
         if all_data:
-            return {'success': True, 'data': all_data}
-        return {'success': False, 'data': []}
+            return {'success': True, 'data': all_data, 'parties': parties, 'failed_parties': failed_parties}
+        return {'success': False, 'data': [], 'parties': parties, 'failed_parties': failed_parties}
     except Exception as e:
-        return {'success': False, 'error': str(e), 'data': []}
+        return {'success': False, 'error': str(e), 'data': [], 'parties': [],
+                'failed_parties': party_names_to_fetch}
 
 
 
@@ -214,6 +234,14 @@ def extract_ro_from_ro(running_order):
         return match.group(1).upper()
     return None
 
+def _fact_key(value):
+    """R-O / binning filter as an mrp_facts.select() key: upper-cased, '' = no filter"""
+    if not value:
+        return None
+    if isinstance(value, (list, tuple)):
+        return [v.upper() for v in value]
+    return value.upper()
+
 # Company Name Mapping (Database name -> MRP API name)
 # EXACT names from production server
 COMPANY_NAME_MAPPING = {
@@ -1008,44 +1036,26 @@ def check_extra_in_mrp(company):
 
 def query_by_julian_date(company, julian_date, running_order=None, binning=None, status=None):
     """Query modules by Julian date with optional filters"""
-    mrp_result = get_all_mrp_data(company)
-    if not mrp_result.get('success'):
+    facts = mrp_facts.get(company)
+    if facts is None:
         return {'has_answer': False, 'error': 'MRP API failed'}
-    
-    filtered = []
-    for b in mrp_result.get('data', []):
-        barcode = b.get('barcode', '')
-        bc_julian = get_julian_from_barcode(barcode)
-        
-        if bc_julian != julian_date:
-            continue
-        
-        ro = b.get('running_order', '') or ''
-        bc_ro = extract_ro_from_ro(ro)
-        bc_binning = extract_binning_from_ro(ro)
-        is_dispatched = bool(b.get('dispatch_party'))
-        
-        # Apply filters
-        if running_order and bc_ro != running_order.upper():
-            continue
-        if binning and bc_binning != binning.upper():
-            continue
-        if status == 'dispatched' and not is_dispatched:
-            continue
-        if status == 'pending' and is_dispatched:
-            continue
-        
-        filtered.append({
-            'barcode': barcode,
-            'running_order': bc_ro,
-            'binning': bc_binning,
-            'pallet': b.get('pallet_no', ''),
-            'dispatched': is_dispatched
-        })
-    
+
+    pos = facts.select(julian=julian_date, ro=_fact_key(running_order), binning=_fact_key(binning))
+    if status == 'dispatched':
+        pos = pos[facts.dispatched[pos]]
+    elif status == 'pending':
+        pos = pos[~facts.dispatched[pos]]
+
+    filtered = [
+        {'barcode': bc, 'running_order': ro, 'binning': bn, 'pallet': pallet, 'dispatched': d}
+        for bc, ro, bn, pallet, d in zip(
+            facts.barcode[pos].tolist(), facts.ro[pos].tolist(), facts.binning[pos].tolist(),
+            facts.pallet[pos].tolist(), facts.dispatched[pos].tolist())
+    ]
+
     # Count stats
     total = len(filtered)
-    dispatched = len([f for f in filtered if f['dispatched']])
+    dispatched = int(facts.dispatched[pos].sum())
     pending = total - dispatched
     
     # Build answer
@@ -1065,14 +1075,9 @@ def query_by_julian_date(company, julian_date, running_order=None, binning=None,
     answer_parts.append(f"⏳ **Remaining:** {pending:,}")
     
     # Breakdown by R-O
-    ro_counts = {}
-    bin_counts = {}
-    for f in filtered:
-        if f['running_order']:
-            ro_counts[f['running_order']] = ro_counts.get(f['running_order'], 0) + 1
-        if f['binning']:
-            bin_counts[f['binning']] = bin_counts.get(f['binning'], 0) + 1
-    
+    ro_counts = facts.counts('ro', pos)
+    bin_counts = facts.counts('binning', pos)
+
     if ro_counts:
         answer_parts.append(f"\n\n**🏭 Running Order Breakdown:**")
         for ro, count in sorted(ro_counts.items()):
@@ -1087,21 +1092,15 @@ def query_by_julian_date(company, julian_date, running_order=None, binning=None,
 
 def get_julian_dates_list(company):
     """Get all Julian dates available for a company"""
-    mrp_result = get_all_mrp_data(company)
-    if not mrp_result.get('success'):
+    facts = mrp_facts.get(company)
+    if facts is None:
         return {'has_answer': False, 'error': 'MRP API failed'}
-    
-    julian_stats = {}
-    for b in mrp_result.get('data', []):
-        barcode = b.get('barcode', '')
-        julian = get_julian_from_barcode(barcode)
-        if julian:
-            if julian not in julian_stats:
-                julian_stats[julian] = {'total': 0, 'dispatched': 0}
-            julian_stats[julian]['total'] += 1
-            if b.get('dispatch_party'):
-                julian_stats[julian]['dispatched'] += 1
-    
+
+    julian_stats = {
+        julian: {'total': len(pos), 'dispatched': int(facts.dispatched[pos].sum())}
+        for julian, pos in facts.index('julian').items()
+    }
+
     answer_parts = [f"**📅 {company} - All Julian Dates**\n"]
     answer_parts.append(f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
     answer_parts.append(f"📊 **Total Julian Dates:** {len(julian_stats)}\n")
@@ -1117,20 +1116,14 @@ def get_julian_dates_list(company):
 
 def get_oldest_pending_julian(company):
     """Get oldest Julian date with pending modules"""
-    mrp_result = get_all_mrp_data(company)
-    if not mrp_result.get('success'):
+    facts = mrp_facts.get(company)
+    if facts is None:
         return {'has_answer': False, 'error': 'MRP API failed'}
-    
-    julian_pending = {}
-    for b in mrp_result.get('data', []):
-        if b.get('dispatch_party'):
-            continue  # Skip dispatched
-        
-        barcode = b.get('barcode', '')
-        julian = get_julian_from_barcode(barcode)
-        if julian:
-            julian_pending[julian] = julian_pending.get(julian, 0) + 1
-    
+
+    pending = ~facts.dispatched
+    julian_pending = {julian: int(pending[pos].sum()) for julian, pos in facts.index('julian').items()}
+    julian_pending = {julian: count for julian, count in julian_pending.items() if count}
+
     if not julian_pending:
         return {'has_answer': True, 'answer': f"✅ **{company}** - No pending modules!"}
     
@@ -1157,6 +1150,53 @@ def get_oldest_pending_julian(company):
 # BARCODE SPECIFIC FUNCTIONS  
 # ============================================
 
+# Companies searched for a single barcode, in order: (company, MRP party)
+BARCODE_SEARCH_COMPANIES = (
+    ('Rays Power', 'RAYS POWER INFRA PRIVATE LIMITED'),
+    ('Larsen & Toubro', 'LARSEN & TOUBRO LIMITED, CONSTRUCTION'),
+    ('Sterlin and Wilson', 'STERLING AND WILSON RENEWABLE ENERGY LIMITED'),
+    ('KPI Green Energy', 'KPI GREEN ENERGY LIMITED')
+)
+
+def track_single_barcode(barcode):
+    """
+    Look up one barcode with MRP's single-barcode tracking call.
+    Returns a row shaped like the party dump rows (plus company/mrp_party), or None.
+    """
+    try:
+        response = http.post(BARCODE_TRACKING_API, data={'barcode': barcode}, timeout=8)
+        if response.status_code != 200:
+            return None
+        data = response.json()
+        if not data.get('success') or not data.get('data'):
+            return None
+        packing = data['data'].get('packing') or {}
+        dispatch = data['data'].get('dispatch') or {}
+        if not packing.get('packing_date') and not dispatch.get('dispatch_date'):
+            return None
+        
+        party = packing.get('party_name') or dispatch.get('party_name') or ''
+        company, mrp_party = party or 'Unknown', party
+        for name, search_party in BARCODE_SEARCH_COMPANIES:
+            base_party = party.split(' - ')[0].strip()        # 'S&W - NTPC' -> 'S&W'
+            if get_mrp_party_name(base_party) == search_party or name.split()[0].lower() in party.lower():
+                company, mrp_party = name, search_party
+                break
+        
+        return {
+            'barcode': barcode,
+            'running_order': packing.get('running_order') or packing.get('ro_no') or packing.get('box_no', ''),
+            'pallet_no': packing.get('pallet_no', ''),
+            'date': packing.get('packing_date', ''),
+            'status': 'dispatched' if dispatch.get('dispatch_date') else 'packed',
+            'dispatch_party': (dispatch.get('party_name') or 'Unknown') if dispatch.get('dispatch_date') else None,
+            'company': company,
+            'mrp_party': mrp_party
+        }
+    except Exception as e:
+        print(f"Single barcode lookup error for {barcode}: {str(e)}")
+        return None
+
 def get_barcode_full_status(barcode):
     """Get complete status of a single barcode"""
     # Clean barcode - remove spaces and convert to uppercase
@@ -1166,38 +1206,18 @@ def get_barcode_full_status(barcode):
     if not parsed:
         return {'has_answer': True, 'answer': f"❌ Invalid barcode format: {barcode}\n\nBarcode should be 18 characters starting with 'GS', e.g., GS04875KG3022500075"}
     
-    # Find in all companies' MRP
+    # Find in the cached MRP fact tables; ask MRP about this one barcode if absent
     found_in_mrp = None
-    search_companies = [
-        ('Rays Power', 'RAYS POWER INFRA PRIVATE LIMITED'),
-        ('Larsen & Toubro', 'LARSEN & TOUBRO LIMITED, CONSTRUCTION'),
-        ('Sterlin and Wilson', 'STERLING AND WILSON RENEWABLE ENERGY LIMITED'),
-        ('KPI Green Energy', 'KPI GREEN ENERGY LIMITED')
-    ]
-    
-    for company_name, mrp_party in search_companies:
-        try:
-            response = requests.post(
-                BARCODE_TRACKING_API,
-                json={'party_name': mrp_party},
-                timeout=30
-            )
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('status') == 'success':
-                    for b in data.get('data', []):
-                        if b.get('barcode', '').upper() == barcode:
-                            found_in_mrp = {
-                                **b, 
-                                'company': company_name,
-                                'mrp_party': mrp_party
-                            }
-                            break
-            if found_in_mrp:
-                break
-        except Exception as e:
-            print(f"Error searching {company_name}: {str(e)}")
-            continue
+    hit = mrp_facts.find_barcode(barcode, [company for company, _ in BARCODE_SEARCH_COMPANIES])
+    if hit:
+        company_name, row = hit
+        found_in_mrp = {
+            **row,
+            'company': company_name,
+            'mrp_party': dict(BARCODE_SEARCH_COMPANIES)[company_name]
+        }
+    else:
+        found_in_mrp = track_single_barcode(barcode)
     
     # Check in local database
     db_row = None
@@ -1289,22 +1309,21 @@ def get_barcode_full_status(barcode):
 
 def get_pallet_full_details(company, pallet_no):
     """Get complete details of a pallet"""
-    mrp_result = get_all_mrp_data(company)
-    if not mrp_result.get('success'):
+    facts = mrp_facts.get(company)
+    if facts is None:
         return {'has_answer': False, 'error': 'MRP API failed'}
-    
+
     pallet_barcodes = []
-    for b in mrp_result.get('data', []):
-        if str(b.get('pallet_no', '')) == str(pallet_no):
-            parsed = parse_barcode(b.get('barcode', ''))
-            pallet_barcodes.append({
-                'barcode': b.get('barcode', ''),
-                'running_order': extract_ro_from_ro(b.get('running_order', '')),
-                'binning': extract_binning_from_ro(b.get('running_order', '')),
-                'julian': parsed['julian_date'] if parsed else None,
-                'dispatched': bool(b.get('dispatch_party')),
-                'date': b.get('date', '')
-            })
+    for i in facts.select(pallet=str(pallet_no)).tolist():
+        parsed = parse_barcode(facts.barcode[i])
+        pallet_barcodes.append({
+            'barcode': facts.barcode[i],
+            'running_order': facts.ro[i],
+            'binning': facts.binning[i],
+            'julian': parsed['julian_date'] if parsed else None,
+            'dispatched': bool(facts.dispatched[i]),
+            'date': facts.date[i]
+        })
     
     if not pallet_barcodes:
         return {'has_answer': True, 'answer': f"❌ Pallet {pallet_no} not found for {company}"}
@@ -1370,48 +1389,29 @@ def get_total_pallets(company, running_order=None, binning=None, pdi_number=None
         except Exception as e:
             print(f"Error getting PDI serials: {e}")
     
-    mrp_result = get_all_mrp_data(company)
-    if not mrp_result.get('success'):
+    facts = mrp_facts.get(company)
+    if facts is None:
         return {'has_answer': False, 'error': 'MRP API failed'}
-    
-    pallets = {}
-    total_modules = 0
-    dispatched_modules = 0
-    
-    for b in mrp_result.get('data', []):
-        barcode = b.get('barcode', '')
-        pallet_no = b.get('pallet_no', '')
-        if not pallet_no:
-            continue
-        
-        # If PDI filter, check if barcode is in PDI serials
-        if pdi_number and pdi_serials and barcode not in pdi_serials:
-            continue
-        
-        ro = extract_ro_from_ro(b.get('running_order', ''))
-        bin_val = extract_binning_from_ro(b.get('running_order', ''))
-        
-        if running_order and ro != running_order.upper():
-            continue
-        if binning and bin_val != binning.upper():
-            continue
-        
-        total_modules += 1
-        is_dispatched = bool(b.get('dispatch_party'))
-        if is_dispatched:
-            dispatched_modules += 1
-        
-        if pallet_no not in pallets:
-            pallets[pallet_no] = {'count': 0, 'dispatched': False, 'dispatched_count': 0}
-        pallets[pallet_no]['count'] += 1
-        if is_dispatched:
-            pallets[pallet_no]['dispatched_count'] += 1
-            # Mark pallet as dispatched if ALL modules dispatched
-            if pallets[pallet_no]['dispatched_count'] == pallets[pallet_no]['count']:
-                pallets[pallet_no]['dispatched'] = True
-    
-    total = len(pallets)
-    dispatched = len([p for p in pallets.values() if p['dispatched']])
+
+    pos = facts.select(ro=_fact_key(running_order), binning=_fact_key(binning))
+    pos = pos[facts.has_pallet[pos]]
+
+    # If PDI filter, keep only barcodes in the PDI serials
+    if pdi_number and pdi_serials:
+        in_pdi = np.fromiter((bc in pdi_serials for bc in facts.barcode[pos].tolist()), dtype=bool, count=len(pos))
+        pos = pos[in_pdi]
+
+    is_dispatched = facts.dispatched[pos]
+    total_modules = len(pos)
+    dispatched_modules = int(is_dispatched.sum())
+
+    # A pallet is dispatched once ALL its modules are dispatched
+    pallet_codes, _ = pd.factorize(facts.pallet[pos], sort=False)
+    modules_per_pallet = np.bincount(pallet_codes)
+    dispatched_per_pallet = np.bincount(pallet_codes, weights=is_dispatched, minlength=len(modules_per_pallet))
+
+    total = len(modules_per_pallet)
+    dispatched = int((dispatched_per_pallet == modules_per_pallet).sum())
     pending = total - dispatched
     remaining_modules = total_modules - dispatched_modules
     
@@ -1446,38 +1446,21 @@ def get_total_pallets(company, running_order=None, binning=None, pdi_number=None
 
 def get_running_order_status(company, running_order):
     """Get complete status of a running order"""
-    mrp_result = get_all_mrp_data(company)
-    if not mrp_result.get('success'):
+    facts = mrp_facts.get(company)
+    if facts is None:
         return {'has_answer': False, 'error': 'MRP API failed'}
-    
-    ro_data = {'total': 0, 'dispatched': 0, 'packed': 0, 'binnings': {}, 'julians': {}, 'pallets': set()}
-    
-    for b in mrp_result.get('data', []):
-        ro = extract_ro_from_ro(b.get('running_order', ''))
-        if ro != running_order.upper():
-            continue
-        
-        ro_data['total'] += 1
-        if b.get('dispatch_party'):
-            ro_data['dispatched'] += 1
-        else:
-            ro_data['packed'] += 1
-        
-        # Binning breakdown
-        binning = extract_binning_from_ro(b.get('running_order', ''))
-        if binning:
-            ro_data['binnings'][binning] = ro_data['binnings'].get(binning, 0) + 1
-        
-        # Julian breakdown
-        julian = get_julian_from_barcode(b.get('barcode', ''))
-        if julian:
-            ro_data['julians'][julian] = ro_data['julians'].get(julian, 0) + 1
-        
-        # Pallet count
-        pallet = b.get('pallet_no', '')
-        if pallet:
-            ro_data['pallets'].add(pallet)
-    
+
+    pos = facts.select(ro=_fact_key(running_order))
+    dispatched = int(facts.dispatched[pos].sum())
+    ro_data = {
+        'total': len(pos),
+        'dispatched': dispatched,
+        'packed': len(pos) - dispatched,
+        'binnings': facts.counts('binning', pos),
+        'julians': facts.counts('julian', pos),
+        'pallets': set(facts.pallet[pos[facts.has_pallet[pos]]].tolist()),
+    }
+
     if ro_data['total'] == 0:
         return {'has_answer': True, 'answer': f"❌ {running_order} not found for {company}"}
     
@@ -1513,22 +1496,15 @@ def get_running_order_status(company, running_order):
 
 def compare_running_orders(company):
     """Compare all running orders for a company"""
-    mrp_result = get_all_mrp_data(company)
-    if not mrp_result.get('success'):
+    facts = mrp_facts.get(company)
+    if facts is None:
         return {'has_answer': False, 'error': 'MRP API failed'}
-    
-    ros = {}
-    for b in mrp_result.get('data', []):
-        ro = extract_ro_from_ro(b.get('running_order', ''))
-        if not ro:
-            continue
-        
-        if ro not in ros:
-            ros[ro] = {'total': 0, 'dispatched': 0}
-        ros[ro]['total'] += 1
-        if b.get('dispatch_party'):
-            ros[ro]['dispatched'] += 1
-    
+
+    ros = {
+        ro: {'total': len(pos), 'dispatched': int(facts.dispatched[pos].sum())}
+        for ro, pos in facts.index('ro').items()
+    }
+
     answer_parts = [f"**🏭 {company} - Running Order Comparison**\n"]
     answer_parts.append(f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
     
@@ -1551,29 +1527,18 @@ def compare_running_orders(company):
 
 def get_binning_status(company, binning):
     """Get complete status of a binning type"""
-    mrp_result = get_all_mrp_data(company)
-    if not mrp_result.get('success'):
+    facts = mrp_facts.get(company)
+    if facts is None:
         return {'has_answer': False, 'error': 'MRP API failed'}
-    
-    bin_data = {'total': 0, 'dispatched': 0, 'ros': {}, 'julians': {}}
-    
-    for b in mrp_result.get('data', []):
-        bc_binning = extract_binning_from_ro(b.get('running_order', ''))
-        if bc_binning != binning.upper():
-            continue
-        
-        bin_data['total'] += 1
-        if b.get('dispatch_party'):
-            bin_data['dispatched'] += 1
-        
-        ro = extract_ro_from_ro(b.get('running_order', ''))
-        if ro:
-            bin_data['ros'][ro] = bin_data['ros'].get(ro, 0) + 1
-        
-        julian = get_julian_from_barcode(b.get('barcode', ''))
-        if julian:
-            bin_data['julians'][julian] = bin_data['julians'].get(julian, 0) + 1
-    
+
+    pos = facts.select(binning=_fact_key(binning))
+    bin_data = {
+        'total': len(pos),
+        'dispatched': int(facts.dispatched[pos].sum()),
+        'ros': facts.counts('ro', pos),
+        'julians': facts.counts('julian', pos),
+    }
+
     if bin_data['total'] == 0:
         return {'has_answer': True, 'answer': f"❌ {binning} not found for {company}"}
     
@@ -1596,22 +1561,15 @@ def get_binning_status(company, binning):
 
 def compare_binnings(company):
     """Compare all binning types for a company"""
-    mrp_result = get_all_mrp_data(company)
-    if not mrp_result.get('success'):
+    facts = mrp_facts.get(company)
+    if facts is None:
         return {'has_answer': False, 'error': 'MRP API failed'}
-    
-    bins = {}
-    for b in mrp_result.get('data', []):
-        binning = extract_binning_from_ro(b.get('running_order', ''))
-        if not binning:
-            continue
-        
-        if binning not in bins:
-            bins[binning] = {'total': 0, 'dispatched': 0}
-        bins[binning]['total'] += 1
-        if b.get('dispatch_party'):
-            bins[binning]['dispatched'] += 1
-    
+
+    bins = {
+        binning: {'total': len(pos), 'dispatched': int(facts.dispatched[pos].sum())}
+        for binning, pos in facts.index('binning').items()
+    }
+
     answer_parts = [f"**🏷️ {company} - Binning Comparison**\n"]
     answer_parts.append(f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
     
@@ -1634,19 +1592,14 @@ def compare_companies():
     companies = ['Rays Power', 'Larsen & Toubro', 'Sterlin and Wilson']
     comparison = {}
     
-    for company in companies:
-        mrp_result = get_all_mrp_data(company)
-        if mrp_result.get('success'):
-            data = mrp_result.get('data', [])
-            dispatched = len([b for b in data if b.get('dispatch_party')])
-            packed = len([b for b in data if not b.get('dispatch_party')])
-            pallets = len(set(b.get('pallet_no', '') for b in data if b.get('pallet_no')))
-            
+    for company, facts in mrp_facts.get_many(companies).items():
+        if facts is not None:
+            dispatched = int(facts.dispatched.sum())
             comparison[company] = {
-                'total': len(data),
+                'total': len(facts),
                 'dispatched': dispatched,
-                'packed': packed,
-                'pallets': pallets
+                'packed': len(facts) - dispatched,
+                'pallets': len(set(facts.pallet[facts.has_pallet].tolist()))
             }
     
     answer_parts = [f"**🏢 Company Comparison**\n"]
@@ -1665,44 +1618,21 @@ def compare_companies():
 
 def get_company_full_status(company):
     """Get complete status of a company"""
-    mrp_result = get_all_mrp_data(company)
-    if not mrp_result.get('success'):
+    facts = mrp_facts.get(company)
+    if facts is None:
         return {'has_answer': False, 'error': 'MRP API failed'}
-    
-    data = mrp_result.get('data', [])
-    
+
+    dispatched = int(facts.dispatched.sum())
     stats = {
-        'total': len(data),
-        'dispatched': 0,
-        'packed': 0,
-        'ros': {},
-        'binnings': {},
-        'pallets': set(),
-        'julians': {}
+        'total': len(facts),
+        'dispatched': dispatched,
+        'packed': len(facts) - dispatched,
+        'ros': {ro: len(pos) for ro, pos in facts.index('ro').items()},
+        'binnings': {b: len(pos) for b, pos in facts.index('binning').items()},
+        'pallets': set(facts.pallet[facts.has_pallet].tolist()),
+        'julians': {j: len(pos) for j, pos in facts.index('julian').items()}
     }
-    
-    for b in data:
-        if b.get('dispatch_party'):
-            stats['dispatched'] += 1
-        else:
-            stats['packed'] += 1
-        
-        ro = extract_ro_from_ro(b.get('running_order', ''))
-        if ro:
-            stats['ros'][ro] = stats['ros'].get(ro, 0) + 1
-        
-        binning = extract_binning_from_ro(b.get('running_order', ''))
-        if binning:
-            stats['binnings'][binning] = stats['binnings'].get(binning, 0) + 1
-        
-        pallet = b.get('pallet_no', '')
-        if pallet:
-            stats['pallets'].add(pallet)
-        
-        julian = get_julian_from_barcode(b.get('barcode', ''))
-        if julian:
-            stats['julians'][julian] = stats['julians'].get(julian, 0) + 1
-    
+
     answer_parts = [f"**🏢 {company} - Full Status**\n"]
     answer_parts.append(f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
     answer_parts.append(f"📊 **Total Modules:** {stats['total']:,}")
@@ -1735,10 +1665,10 @@ def get_company_full_status(company):
 
 def full_pallet_audit(company):
     """Complete pallet integrity verification"""
-    mrp_result = get_all_mrp_data(company)
-    if not mrp_result.get('success'):
+    facts = mrp_facts.get(company)
+    if facts is None:
         return {'has_answer': False, 'error': 'MRP API failed'}
-    
+
     # Get rejected barcodes from DB
     company_result = db.session.execute(text(
         "SELECT id FROM companies WHERE company_name LIKE :name"
@@ -1753,46 +1683,27 @@ def full_pallet_audit(company):
         """), {'cid': company_row[0]})
         rejected_serials = set(row[0] for row in rejected_result.fetchall())
     
-    # Analyze pallets
+    # Analyze pallets (pallet index: row positions per pallet, in MRP order)
     pallets = {}
-    barcode_pallets = {}  # Track which pallets each barcode appears in
-    
-    for b in mrp_result.get('data', []):
-        pallet_no = b.get('pallet_no', '')
-        if not pallet_no:
-            continue
-        
-        barcode = b.get('barcode', '')
-        ro = b.get('running_order', '') or ''
-        
-        if pallet_no not in pallets:
-            pallets[pallet_no] = {
-                'barcodes': [],
-                'binnings': set(),
-                'ros': set(),
-                'julians': set(),
-                'has_rejected': False,
-                'issues': []
-            }
-        
-        # Track barcode's pallet
-        if barcode not in barcode_pallets:
-            barcode_pallets[barcode] = []
-        barcode_pallets[barcode].append(pallet_no)
-        
-        binning = extract_binning_from_ro(ro)
-        running_order = extract_ro_from_ro(ro)
-        julian = get_julian_from_barcode(barcode)
-        
-        pallets[pallet_no]['barcodes'].append(barcode)
-        if binning:
-            pallets[pallet_no]['binnings'].add(binning)
-        if running_order:
-            pallets[pallet_no]['ros'].add(running_order)
-        if julian:
-            pallets[pallet_no]['julians'].add(julian)
-        if barcode in rejected_serials:
-            pallets[pallet_no]['has_rejected'] = True
+    for pos in facts.index('pallet').values():
+        barcodes = facts.barcode[pos].tolist()
+        pallets[facts.pallet[pos[0]]] = {
+            'barcodes': barcodes,
+            'binnings': set(facts.binning[pos].tolist()) - {None},
+            'ros': set(facts.ro[pos].tolist()) - {None},
+            'julians': set(facts.julian[pos].tolist()) - {0},
+            'has_rejected': not rejected_serials.isdisjoint(barcodes),
+            'issues': []
+        }
+
+    # Barcodes packed on more than one pallet row -> the pallets they appear in
+    rows = np.flatnonzero(facts.has_pallet)
+    codes, _ = pd.factorize(facts.barcode[rows], sort=False, use_na_sentinel=False)
+    repeated = np.flatnonzero(np.bincount(codes) > 1) if len(codes) else codes
+    rows = rows[np.isin(codes, repeated)]
+    cross_pallet_duplicates = {}
+    for bc, pallet in zip(facts.barcode[rows].tolist(), facts.pallet[rows].tolist()):
+        cross_pallet_duplicates.setdefault(bc, []).append(pallet)
     
     # Check for issues
     issues_summary = {
@@ -1803,9 +1714,6 @@ def full_pallet_audit(company):
         'duplicate_barcode': []
     }
     
-    # Cross-pallet duplicates
-    cross_pallet_duplicates = {bc: pals for bc, pals in barcode_pallets.items() if len(pals) > 1}
-    
     for pallet_no, data in pallets.items():
         # Mix binning
         known_bins = {b for b in data['binnings'] if b != 'Unknown'}
@@ -1896,10 +1804,12 @@ def get_packed_not_in_pdi(company=None):
         results = {}
         total_packed_not_pdi = 0
         
+        # MRP fact tables for every company, fetched concurrently
+        tables = mrp_facts.get_many(companies_to_check)
+        
         for comp in companies_to_check:
-            # Get MRP data
-            mrp_result = get_all_mrp_data(comp)
-            if not mrp_result.get('success'):
+            facts = tables[comp]
+            if facts is None:
                 continue
             
             # Get company_id
@@ -1931,7 +1841,7 @@ def get_packed_not_in_pdi(company=None):
             packed_not_pdi = []
             pallet_breakdown = {}
             
-            for b in mrp_result.get('data', []):
+            for b in facts.rows:
                 barcode = b.get('barcode', '')
                 pallet_no = b.get('pallet_no', '')
                 status = b.get('status', '')
@@ -2387,15 +2297,170 @@ def compare_pdi_with_mrp_filtered(company, pdi_number, running_orders=None):
         traceback.print_exc()
         return {'has_answer': False, 'error': str(e)}
 
+# ============================================
+# CHAT INTENT ROUTER
+# One keyword pass + precompiled entity regexes per message, shared by
+# parse_user_query() and detect_excel_command()
+# ============================================
+
+# Entity patterns (parse_user_query)
+_PDI_RE = re.compile(r'pdi[- ]?(\d+)')
+_RO_RE = re.compile(r'r[- ]?(\d+)')
+_BINNING_RE = re.compile(r'(?<!pd)\bi[- ]?(\d+)\b')        # not PDI-1 as binning I1
+_BINNING_ALPHA_RE = re.compile(r'\b(mb|mc|md|mf|mg)\s')     # not 'me' (Hindi for 'in')
+_PALLET_RE = re.compile(r'pallet[- ]?(\d+)|pallet\s*no\.?\s*(\d+)')
+_JULIAN_RE = re.compile(r'julian[- ]?(\d{3})|(\d{3})\s*julian')
+_JULIAN_RANGE_RE = re.compile(r'(\d{3})\s*(?:se|to|-)\s*(\d{3})')
+_BARCODE_RE = re.compile(r'(GS\s*\d{5}\s*[A-Z]{2}\s*\d{3}\s*\d{2}\s*\d{5})', re.IGNORECASE)
+_BARCODE_LOOSE_RE = re.compile(r'(GS[A-Z0-9]{16,18})', re.IGNORECASE)
+_COUNT_RE = re.compile(r'(\d+)\s*(barcode|serial|module|piece)')
+
+# Entity patterns (detect_excel_command - stricter R-/I-/PDI- forms)
+_EXCEL_RO_RE = re.compile(r'r-?(\d+)')
+_EXCEL_BINNING_RE = re.compile(r'(?<!pd)i-?(\d+)')
+_EXCEL_BINNING_ALPHA_RE = re.compile(r'\b(mb|mc|md|mf|mg)\b')
+_EXCEL_JULIAN_RE = re.compile(r'\bjulian\s*(\d{3})\b|\b(\d{3})\s*julian\b')
+_EXCEL_PDI_RE = re.compile(r'pdi-?(\d+)')
+_EXCEL_COUNT_AFTER_RE = re.compile(r'(barcode|module|serial)\s*(\d+)')
+
+# Intent keywords (plain substring matches, as before)
+DISPATCH_WORDS = ('dispatch', 'dispatched', 'bheja', 'bhej', 'sent', 'ship', 'nikla', 'nikal', 'gaya', 'gaye', 'deliver')
+PACKED_WORDS = ('pack', 'packed', 'packing', 'ban', 'bana', 'ready')
+REMAINING_WORDS = ('remaining', 'bacha', 'baki', 'pending', 'left', 'kitna', 'kitne', 'baaki', 'rest')
+PALLET_COUNT_WORDS = ('kitne', 'kitna', 'count', 'total', 'remaining', 'baaki', 'baki', 'pending', 'hai')
+NEGATION_WORDS = ('na', 'not', 'nahi', 'without', 'bina', 'jo nahi')
+EXCEL_WORDS = ('excel', 'export', 'download', 'list', 'de do', 'do', 'chahiye', 'nikalo', 'bhejo', 'file', 'sheet')
+QUALITY_CHECK_WORDS = {
+    'duplicate': ('duplicate', 'dohra', 'repeat', 'same barcode'),
+    'mismatch': ('mismatch', 'binning mismatch', 'different binning', 'galat binning'),
+    'rejected': ('rejected', 'reject', 'rejected packed', 'rejection'),
+    'missing': ('missing', 'mrp mein nahi', 'not in mrp', 'gayab'),
+    'extra': ('extra', 'db mein nahi', 'not in db', 'extra mrp'),
+    'mix_packing': ('mix', 'mix packing', 'mixed', 'mix pallet'),
+    'pallet_audit': ('audit', 'pallet audit', 'full audit', 'integrity'),
+}
+_RULE_WORDS = (
+    'duplicate', 'dohra', 'mismatch', 'db', 'mrp', 'binning', 'check', 'reject', 'pack', 'packed',
+    'missing', 'nahi', 'extra', 'zyada', 'mix', 'packing', 'pallet', 'julian', 'list', 'sab', 'all',
+    'kon', 'purana', 'oldest', 'old', 'status', 'progress', 'complete', 'vs', 'comparison', 'compare',
+    'r-1', 'r-2', 'i1', 'i2', 'company', 'rays', 'l&t', 'kitna', 'total', 'full', 'audit', 'verify',
+    'sare pallet', 'pdi', 'rejaction', 'rejection', 'dispatch', 'sent', 'bheja', 'pending', 'baaki',
+    'remaining', 'barcode', 'serial', 'module', 'piece',
+)
+
+# Company aliases: hand-written short forms plus every key of
+# COMPANY_NAME_MAPPING / PARTY_IDS, grouped under the first (DB) name
+_COMPANY_SHORT_ALIASES = {
+    'Larsen & Toubro': ('l&t', 'larsen', 'toubro', 'lnt', 'l & t'),
+    'Rays Power': ('rays', 'rp'),
+    'Sterlin and Wilson': ('sterlin', 'wilson', 'sw', 's&w', 'sterling'),
+}
+
+
+def _company_aliases():
+    aliases = {}
+    for mapping in (COMPANY_NAME_MAPPING, PARTY_IDS):
+        canonical = {}
+        for key, value in mapping.items():
+            name = canonical.setdefault(value, key)
+            aliases.setdefault(key.lower(), name)
+    for name, words in _COMPANY_SHORT_ALIASES.items():
+        for word in words:
+            aliases.setdefault(word, name)
+    return aliases
+
+
+_COMPANY_ALIASES = _company_aliases()
+# Short alphanumeric aliases ('rp', 'sw', 'kpi') only count as whole words,
+# so "mrp", "answer" or "sharp" don't pick a company
+_WHOLE_WORD_ALIASES = frozenset(a for a in _COMPANY_ALIASES if a.isalnum() and len(a) < 4)
+_WHOLE_WORD_ALIAS_RE = re.compile(r'\b(' + '|'.join(sorted(_WHOLE_WORD_ALIASES)) + r')\b')
+# Every keyword the rules below test must be registered here
+_CHAT_KEYWORDS = KeywordAutomaton(
+    set(DISPATCH_WORDS) | set(PACKED_WORDS) | set(REMAINING_WORDS) | set(PALLET_COUNT_WORDS)
+    | set(NEGATION_WORDS) | set(EXCEL_WORDS) | set(_RULE_WORDS) | set(_COMPANY_ALIASES)
+    | {w for words in QUALITY_CHECK_WORDS.values() for w in words}
+)
+
+
+class ChatMessage:
+    """Keywords and companies found in one chat message (one automaton pass)."""
+
+    __slots__ = ('text', 'lower', 'words', 'companies')
+
+    def __init__(self, text):
+        self.text = text
+        self.lower = text.lower()
+        self.words = frozenset(_CHAT_KEYWORDS.find(self.lower))
+        aliases = {w for w in self.words if w in _COMPANY_ALIASES}
+        if not aliases.isdisjoint(_WHOLE_WORD_ALIASES):
+            aliases -= _WHOLE_WORD_ALIASES
+            aliases.update(_WHOLE_WORD_ALIAS_RE.findall(self.lower))
+        self.companies = frozenset(_COMPANY_ALIASES[a] for a in aliases)
+
+    def has(self, *words):
+        """True if any of the keywords occurs in the message"""
+        return not self.words.isdisjoint(words)
+
+    def company(self, priority):
+        """First company of `priority` mentioned in the message"""
+        for name in priority:
+            if name in self.companies:
+                return name
+        return None
+
+
+@lru_cache(maxsize=256)
+def analyze_chat_message(message):
+    return ChatMessage(message)
+
+
+_PARSE_COMPANY_PRIORITY = ('Larsen & Toubro', 'Rays Power', 'Sterlin and Wilson', 'KPI Green Energy')
+_EXCEL_COMPANY_PRIORITY = ('Rays Power', 'Larsen & Toubro', 'Sterlin and Wilson', 'KPI Green Energy')
+
+# Intent flags derived from keywords and already-extracted entities, in
+# order (later rules may read earlier flags)
+_INTENT_RULES = (
+    ('wants_dispatch_count', lambda m, r: m.has(*DISPATCH_WORDS)),
+    ('wants_packed_count', lambda m, r: m.has(*PACKED_WORDS)),
+    ('wants_remaining', lambda m, r: m.has(*REMAINING_WORDS)),
+    ('wants_duplicate_check', lambda m, r: m.has('duplicate', 'dohra')),
+    ('wants_binning_mismatch', lambda m, r: m.has('mismatch') or (m.has('db') and m.has('mrp'))
+                                            or (m.has('binning') and m.has('check'))),
+    ('wants_rejected_check', lambda m, r: m.has('reject') and m.has('pack', 'check')),
+    ('wants_missing_in_mrp', lambda m, r: m.has('missing', 'nahi') and m.has('mrp')),
+    ('wants_extra_in_mrp', lambda m, r: m.has('extra', 'zyada') and m.has('mrp')),
+    ('wants_mix_packing_check', lambda m, r: m.has('mix') and m.has('packing', 'pallet')),
+    ('wants_julian_list', lambda m, r: m.has('julian') and m.has('list', 'sab', 'all', 'kon')),
+    ('wants_oldest_pending', lambda m, r: m.has('julian') and m.has('purana', 'oldest', 'old')),
+    ('wants_ro_status', lambda m, r: bool(r['running_order']) and m.has('status', 'progress', 'complete')),
+    ('wants_ro_comparison', lambda m, r: m.has('vs', 'comparison', 'compare')
+                                         and (bool(r['running_order']) or m.has('r-1', 'r-2'))),
+    ('wants_binning_comparison', lambda m, r: m.has('vs', 'comparison', 'compare')
+                                              and (bool(r['binning']) or m.has('i1', 'i2'))),
+    ('wants_company_comparison', lambda m, r: m.has('vs', 'comparison', 'compare')
+                                              and (m.has('company') or (m.has('rays') and m.has('l&t')))),
+    ('wants_binning_status', lambda m, r: bool(r['binning']) and not r['wants_binning_comparison']
+                                          and m.has('status', 'kitna', 'total')),
+    ('wants_company_status', lambda m, r: m.has('full', 'complete', 'status') and bool(r['company'])
+                                          and not (r['running_order'] or r['binning'] or r['pdi_number'])),
+    ('wants_pallet_audit', lambda m, r: m.has('audit', 'verify', 'sare pallet')),
+    ('wants_pallet_count', lambda m, r: m.has('pallet') and m.has(*PALLET_COUNT_WORDS)),
+    # Never False: parse_user_query() only ever set this flag to True (None otherwise)
+    ('wants_packed_not_pdi', lambda m, r: (m.has('packed', 'pack') and m.has('pdi', 'rejaction', 'rejection')
+                                           and m.has(*NEGATION_WORDS)) or None),
+)
+
 def parse_user_query(message):
     """
     Parse user query to understand EXACTLY what they're asking
     Returns: dict with extracted parameters
     """
-    message_lower = message.lower()
+    msg = analyze_chat_message(message)
+    message_lower = msg.lower
     
     result = {
-        'company': None,
+        'company': msg.company(_PARSE_COMPANY_PRIORITY),
         'pdi_number': None,
         'running_order': None,
         'multiple_running_orders': False,
@@ -2405,50 +2470,19 @@ def parse_user_query(message):
         'julian_range': None,
         'specific_barcode': None,
         'count_needed': 0,
-        # Intent flags
-        'wants_dispatch_count': False,
-        'wants_packed_count': False,
-        'wants_remaining': False,
         'wants_pallet_details': False,
         'wants_barcode_list': False,
-        'wants_mix_packing_check': False,
-        'wants_duplicate_check': False,
-        'wants_binning_mismatch': False,
-        'wants_rejected_check': False,
-        'wants_missing_in_mrp': False,
-        'wants_extra_in_mrp': False,
         'wants_julian_query': False,
-        'wants_julian_list': False,
-        'wants_oldest_pending': False,
-        'wants_barcode_status': False,
-        'wants_ro_status': False,
-        'wants_ro_comparison': False,
-        'wants_binning_status': False,
-        'wants_binning_comparison': False,
-        'wants_company_comparison': False,
-        'wants_company_status': False,
-        'wants_pallet_audit': False,
-        'wants_pallet_count': False
-    }
-    
-    # Company detection (more patterns)
-    company_patterns = {
-        'Larsen & Toubro': r'l&t|larsen|toubro|lnt|l \& t',
-        'Rays Power': r'rays|rp|rays\s*power',
-        'Sterlin and Wilson': r'sterlin|wilson|sw|s&w|s\&w|sterling'
+        'wants_barcode_status': False
     }
-    for company, pattern in company_patterns.items():
-        if re.search(pattern, message_lower):
-            result['company'] = company
-            break
     
     # PDI number detection
-    pdi_match = re.search(r'pdi[- ]?(\d+)', message_lower)
+    pdi_match = _PDI_RE.search(message_lower) if msg.has('pdi') else None
     if pdi_match:
         result['pdi_number'] = f"PDI-{pdi_match.group(1)}"
     
     # Running Order detection - support multiple (R1 aur R2)
-    ro_matches = re.findall(r'r[- ]?(\d+)', message_lower)
+    ro_matches = _RO_RE.findall(message_lower)
     if ro_matches:
         if len(ro_matches) == 1:
             result['running_order'] = f"R-{ro_matches[0]}"
@@ -2457,122 +2491,49 @@ def parse_user_query(message):
             result['running_order'] = [f"R-{ro}" for ro in ro_matches]
             result['multiple_running_orders'] = True
     
-    # Binning detection (I1, I2, I3 or MB, MC, MD, MF, MG - NOT 'me' as it's Hindi word)
-    # Use negative lookbehind to NOT match PDI-1 as binning I1
-    bin_match = re.search(r'(?<!pd)\bi[- ]?(\d+)\b', message_lower)
+    # Binning detection (I1, I2, I3 or MB, MC, MD, MF, MG)
+    bin_match = _BINNING_RE.search(message_lower)
     if bin_match:
         result['binning'] = f"I{bin_match.group(1)}"
     else:
-        # Alpha binnings like MB, MC, MD (excluding 'me' - Hindi word for 'in')
-        bin_alpha = re.search(r'\b(mb|mc|md|mf|mg)\s', message_lower)
+        bin_alpha = _BINNING_ALPHA_RE.search(message_lower)
         if bin_alpha:
             result['binning'] = bin_alpha.group(1).upper()
     
     # Pallet detection
-    pallet_match = re.search(r'pallet[- ]?(\d+)|pallet\s*no\.?\s*(\d+)', message_lower)
+    pallet_match = _PALLET_RE.search(message_lower) if msg.has('pallet') else None
     if pallet_match:
         result['pallet_no'] = pallet_match.group(1) or pallet_match.group(2)
         result['wants_pallet_details'] = True
     
     # Julian date detection
-    julian_match = re.search(r'julian[- ]?(\d{3})|(\d{3})\s*julian', message_lower)
+    julian_match = _JULIAN_RE.search(message_lower) if msg.has('julian') else None
     if julian_match:
         result['julian_date'] = int(julian_match.group(1) or julian_match.group(2))
         result['wants_julian_query'] = True
     
     # Julian range detection (300 se 310)
-    julian_range_match = re.search(r'(\d{3})\s*(?:se|to|-)\s*(\d{3})', message_lower)
+    julian_range_match = _JULIAN_RANGE_RE.search(message_lower)
     if julian_range_match:
         result['julian_range'] = (int(julian_range_match.group(1)), int(julian_range_match.group(2)))
         result['wants_julian_query'] = True
     
     # Specific barcode check (GS format - more flexible matching)
     # Matches: GS04875KG3022544039, gs04875kg3022544039, GS 04875 KG 302 25 44039
-    barcode_match = re.search(r'(GS\s*\d{5}\s*[A-Z]{2}\s*\d{3}\s*\d{2}\s*\d{5})', message.replace(' ', ''), re.IGNORECASE)
-    if not barcode_match:
-        # Try simpler pattern - just GS followed by 16+ alphanumeric
-        barcode_match = re.search(r'(GS[A-Z0-9]{16,18})', message.replace(' ', ''), re.IGNORECASE)
+    compact = message.replace(' ', '')
+    barcode_match = _BARCODE_RE.search(compact) or _BARCODE_LOOSE_RE.search(compact)
     if barcode_match:
         result['specific_barcode'] = barcode_match.group(1).upper().replace(' ', '')
         result['wants_barcode_status'] = True
     
     # Count needed
-    count_match = re.search(r'(\d+)\s*(barcode|serial|module|piece)', message_lower)
+    count_match = _COUNT_RE.search(message_lower) if msg.has('barcode', 'serial', 'module', 'piece') else None
     if count_match:
         result['count_needed'] = int(count_match.group(1))
     
-    # Intent detection - Keywords
-    dispatch_words = ['dispatch', 'dispatched', 'bheja', 'bhej', 'sent', 'ship', 'nikla', 'nikal', 'gaya', 'gaye', 'deliver']
-    packed_words = ['pack', 'packed', 'packing', 'ban', 'bana', 'ready']
-    remaining_words = ['remaining', 'bacha', 'baki', 'pending', 'left', 'kitna', 'kitne', 'baaki', 'rest']
-    
-    result['wants_dispatch_count'] = any(w in message_lower for w in dispatch_words)
-    result['wants_packed_count'] = any(w in message_lower for w in packed_words)
-    result['wants_remaining'] = any(w in message_lower for w in remaining_words)
-    
-    # Quality check intents
-    if 'duplicate' in message_lower or 'dohra' in message_lower:
-        result['wants_duplicate_check'] = True
-    
-    if 'mismatch' in message_lower or ('db' in message_lower and 'mrp' in message_lower) or 'binning' in message_lower and 'check' in message_lower:
-        result['wants_binning_mismatch'] = True
-    
-    if 'reject' in message_lower and ('pack' in message_lower or 'check' in message_lower):
-        result['wants_rejected_check'] = True
-    
-    if ('missing' in message_lower or 'nahi' in message_lower) and 'mrp' in message_lower:
-        result['wants_missing_in_mrp'] = True
-    
-    if ('extra' in message_lower or 'zyada' in message_lower) and 'mrp' in message_lower:
-        result['wants_extra_in_mrp'] = True
-    
-    # Mix packing check
-    if 'mix' in message_lower and ('packing' in message_lower or 'pallet' in message_lower):
-        result['wants_mix_packing_check'] = True
-    
-    # Julian queries
-    if 'julian' in message_lower:
-        if 'list' in message_lower or 'sab' in message_lower or 'all' in message_lower or 'kon' in message_lower:
-            result['wants_julian_list'] = True
-        if 'purana' in message_lower or 'oldest' in message_lower or 'old' in message_lower:
-            result['wants_oldest_pending'] = True
-    
-    # Running Order queries
-    if result['running_order']:
-        if 'status' in message_lower or 'progress' in message_lower or 'complete' in message_lower:
-            result['wants_ro_status'] = True
-    
-    if 'vs' in message_lower or 'comparison' in message_lower or 'compare' in message_lower:
-        if result['running_order'] or 'r-1' in message_lower or 'r-2' in message_lower:
-            result['wants_ro_comparison'] = True
-        if result['binning'] or 'i1' in message_lower or 'i2' in message_lower:
-            result['wants_binning_comparison'] = True
-        if 'company' in message_lower or ('rays' in message_lower and 'l&t' in message_lower):
-            result['wants_company_comparison'] = True
-    
-    # Binning queries
-    if result['binning'] and not result['wants_binning_comparison']:
-        if 'status' in message_lower or 'kitna' in message_lower or 'total' in message_lower:
-            result['wants_binning_status'] = True
-    
-    # Company queries
-    if ('full' in message_lower or 'complete' in message_lower or 'status' in message_lower) and result['company']:
-        if not result['running_order'] and not result['binning'] and not result['pdi_number']:
-            result['wants_company_status'] = True
-    
-    # Pallet queries
-    if 'audit' in message_lower or 'verify' in message_lower or 'sare pallet' in message_lower:
-        result['wants_pallet_audit'] = True
-    
-    # Pallet count - detect "pallet kitne", "kitne pallet", "pallet + remaining/baaki"
-    if 'pallet' in message_lower:
-        if any(w in message_lower for w in ['kitne', 'kitna', 'count', 'total', 'remaining', 'baaki', 'baki', 'pending', 'hai']):
-            result['wants_pallet_count'] = True
-    
-    # Packed but not in PDI (orphan packed modules)
-    if ('packed' in message_lower or 'pack' in message_lower) and ('pdi' in message_lower or 'rejaction' in message_lower or 'rejection' in message_lower):
-        if any(w in message_lower for w in ['na', 'not', 'nahi', 'without', 'bina', 'jo nahi']):
-            result['wants_packed_not_pdi'] = True
+    # Intent flags
+    for flag, rule in _INTENT_RULES:
+        result[flag] = rule(msg, result)
     
     return result
 
@@ -2581,91 +2542,81 @@ def get_specific_mrp_data(company, filters=None):
     Get MRP data with specific filters
     filters: {'running_order': 'R-3', 'binning': 'I2', 'pallet_no': '123', 'status': 'dispatched'}
     """
-    import re
     filters = filters or {}
     
-    mrp_party_name = get_mrp_party_name(company)
+    facts = mrp_facts.get(company)
+    if facts is None:
+        return {'success': False, 'error': 'MRP API failed'}
     
     try:
-        response = requests.post(
-            BARCODE_TRACKING_API,
-            json={'party_name': mrp_party_name},
-            timeout=30
+        # Main MRP party only (the fact table also holds the sub-parties)
+        pallet = filters.get('pallet_no')
+        pos = facts.select(
+            sub_party=get_mrp_party_name(company),
+            binning=_fact_key(filters.get('binning')),
+            pallet=str(pallet) if pallet else None,
         )
         
-        if response.status_code != 200:
-            return {'success': False, 'error': 'MRP API failed'}
-        
-        data = response.json()
-        if data.get('status') != 'success':
-            return {'success': False, 'error': 'No data from MRP'}
-        
-        all_barcodes = data.get('data', [])
-        
-        # Apply filters
-        filtered = all_barcodes
-        
-        # Filter by running order
+        # Filter by running order (substring of the raw running_order)
         if filters.get('running_order'):
             ro_filter = filters['running_order'].upper()
-            filtered = [b for b in filtered if ro_filter in (b.get('running_order', '') or '').upper()]
-        
-        # Filter by binning
-        if filters.get('binning'):
-            bin_filter = filters['binning'].upper()
-            new_filtered = []
-            for b in filtered:
-                ro = b.get('running_order', '') or ''
-                bin_match = re.search(r'i-?(\d+)', ro, re.IGNORECASE)
-                if bin_match:
-                    barcode_bin = f"I{bin_match.group(1)}"
-                    if barcode_bin.upper() == bin_filter:
-                        new_filtered.append(b)
-            filtered = new_filtered
-        
-        # Filter by pallet
-        if filters.get('pallet_no'):
-            pallet = str(filters['pallet_no'])
-            filtered = [b for b in filtered if str(b.get('pallet_no', '')) == pallet]
+            matching = facts.match('running_order', lambda ro: ro_filter in ro.upper())
+            pos = np.intersect1d(pos, matching, assume_unique=True)
         
         # Count by status
-        dispatched = [b for b in filtered if b.get('dispatch_party') or b.get('status') == 'dispatched']
-        packed = [b for b in filtered if b.get('status') == 'packed' and not b.get('dispatch_party')]
-        pending = [b for b in filtered if b.get('status') != 'packed' and not b.get('dispatch_party')]
-        
-        # Running order breakdown
-        ro_breakdown = {}
-        bin_breakdown = {}
-        for b in filtered:
-            ro = b.get('running_order', '') or ''
-            ro_match = re.search(r'(R-\d+)', ro, re.IGNORECASE)
-            if ro_match:
-                ro_key = ro_match.group(1).upper()
-                ro_breakdown[ro_key] = ro_breakdown.get(ro_key, 0) + 1
-            
-            bin_match = re.search(r'i-?(\d+)', ro, re.IGNORECASE)
-            if bin_match:
-                bin_key = f"I{bin_match.group(1)}"
-                bin_breakdown[bin_key] = bin_breakdown.get(bin_key, 0) + 1
+        has_party = facts.dispatched[pos]
+        status = facts.status[pos]
+        dispatched = pos[has_party | (status == 'dispatched')]
+        packed = pos[(status == 'packed') & ~has_party]
+        pending = pos[(status != 'packed') & ~has_party]
         
         return {
             'success': True,
-            'total': len(filtered),
+            'total': len(pos),
             'dispatched_count': len(dispatched),
             'packed_count': len(packed),
             'pending_count': len(pending),
-            'remaining': len(filtered) - len(dispatched),  # Total minus dispatched
-            'dispatched_list': dispatched[:50],  # Sample
-            'packed_list': packed[:50],
-            'pending_list': pending[:50],
-            'all_filtered': filtered,
-            'ro_breakdown': ro_breakdown,
-            'bin_breakdown': bin_breakdown
+            'remaining': len(pos) - len(dispatched),  # Total minus dispatched
+            'dispatched_list': facts.rows_at(dispatched[:50]),  # Sample
+            'packed_list': facts.rows_at(packed[:50]),
+            'pending_list': facts.rows_at(pending[:50]),
+            'all_filtered': facts.rows_at(pos),
+            'ro_breakdown': facts.counts('ro', pos),
+            'bin_breakdown': facts.counts('binning', pos)
         }
         
     except Exception as e:
         return {'success': False, 'error': str(e)}
 
+# Company-scoped intents for answer_specific_query(), in priority order:
+# (intent flag, entity that must also be present, handler)
+_COMPANY_INTENT_HANDLERS = (
+    # Quality checks
+    ('wants_duplicate_check', None, lambda p, c: check_duplicate_barcodes(c)),
+    ('wants_binning_mismatch', None, lambda p, c: check_binning_mismatch(c)),
+    ('wants_rejected_check', None, lambda p, c: check_rejected_packed(c)),
+    ('wants_missing_in_mrp', None, lambda p, c: check_missing_in_mrp(c)),
+    ('wants_extra_in_mrp', None, lambda p, c: check_extra_in_mrp(c)),
+    ('wants_mix_packing_check', None, lambda p, c: check_mix_packing(c)),
+    ('wants_pallet_audit', None, lambda p, c: full_pallet_audit(c)),
+    ('wants_packed_not_pdi', None, lambda p, c: get_packed_not_in_pdi(c)),
+    # Julian dates
+    ('wants_julian_list', None, lambda p, c: get_julian_dates_list(c)),
+    ('wants_oldest_pending', None, lambda p, c: get_oldest_pending_julian(c)),
+    ('wants_julian_query', 'julian_date',
+     lambda p, c: query_by_julian_date(c, p['julian_date'], p.get('running_order'), p.get('binning'))),
+    # Pallets
+    ('wants_pallet_details', 'pallet_no', lambda p, c: get_pallet_full_details(c, p['pallet_no'])),
+    ('wants_pallet_count', None,
+     lambda p, c: get_total_pallets(c, p.get('running_order'), p.get('binning'), p.get('pdi_number'))),
+    # Running orders, binnings, company
+    ('wants_ro_comparison', None, lambda p, c: compare_running_orders(c)),
+    ('wants_ro_status', 'running_order', lambda p, c: get_running_order_status(c, p['running_order'])),
+    ('wants_binning_comparison', None, lambda p, c: compare_binnings(c)),
+    ('wants_binning_status', 'binning', lambda p, c: get_binning_status(c, p['binning'])),
+    ('wants_company_status', None, lambda p, c: get_company_full_status(c)),
+)
+
 def answer_specific_query(parsed_query):
     """
     Generate a SPECIFIC answer based on parsed query
@@ -2676,7 +2627,6 @@ def answer_specific_query(parsed_query):
     ro = parsed_query.get('running_order')
     binning = parsed_query.get('binning')
     pallet = parsed_query.get('pallet_no')
-    julian = parsed_query.get('julian_date')
     barcode = parsed_query.get('specific_barcode')
     
     # ===== BARCODE STATUS (no company needed) =====
@@ -2691,66 +2641,10 @@ def answer_specific_query(parsed_query):
     if not company:
         return {'has_answer': False}
     
-    # ===== QUALITY CHECK QUERIES =====
-    if parsed_query.get('wants_duplicate_check'):
-        return check_duplicate_barcodes(company)
-    
-    if parsed_query.get('wants_binning_mismatch'):
-        return check_binning_mismatch(company)
-    
-    if parsed_query.get('wants_rejected_check'):
-        return check_rejected_packed(company)
-    
-    if parsed_query.get('wants_missing_in_mrp'):
-        return check_missing_in_mrp(company)
-    
-    if parsed_query.get('wants_extra_in_mrp'):
-        return check_extra_in_mrp(company)
-    
-    if parsed_query.get('wants_mix_packing_check'):
-        return check_mix_packing(company)
-    
-    if parsed_query.get('wants_pallet_audit'):
-        return full_pallet_audit(company)
-    
-    # ===== PACKED NOT IN PDI =====
-    if parsed_query.get('wants_packed_not_pdi'):
-        return get_packed_not_in_pdi(company)
-    
-    # ===== JULIAN DATE QUERIES =====
-    if parsed_query.get('wants_julian_list'):
-        return get_julian_dates_list(company)
-    
-    if parsed_query.get('wants_oldest_pending'):
-        return get_oldest_pending_julian(company)
-    
-    if julian and parsed_query.get('wants_julian_query'):
-        return query_by_julian_date(company, julian, ro, binning)
-    
-    # ===== PALLET QUERIES =====
-    if pallet and parsed_query.get('wants_pallet_details'):
-        return get_pallet_full_details(company, pallet)
-    
-    if parsed_query.get('wants_pallet_count'):
-        return get_total_pallets(company, ro, binning, pdi)
-    
-    # ===== RUNNING ORDER QUERIES =====
-    if parsed_query.get('wants_ro_comparison'):
-        return compare_running_orders(company)
-    
-    if ro and parsed_query.get('wants_ro_status'):
-        return get_running_order_status(company, ro)
-    
-    # ===== BINNING QUERIES =====
-    if parsed_query.get('wants_binning_comparison'):
-        return compare_binnings(company)
-    
-    if binning and parsed_query.get('wants_binning_status'):
-        return get_binning_status(company, binning)
-    
-    # ===== COMPANY STATUS =====
-    if parsed_query.get('wants_company_status'):
-        return get_company_full_status(company)
+    # ===== INTENT HANDLERS (first match wins) =====
+    for flag, entity, handler in _COMPANY_INTENT_HANDLERS:
+        if parsed_query.get(flag) and (entity is None or parsed_query.get(entity)):
+            return handler(parsed_query, company)
     
     # ===== PDI vs MRP COMPARISON =====
     if pdi:
@@ -2780,27 +2674,17 @@ def answer_specific_query(parsed_query):
         ro_list = [r.upper() for r in ro_list]
         
         # Get specific data with both filters
-        mrp_result = get_all_mrp_data(company)
-        if not mrp_result.get('success'):
+        facts = mrp_facts.get(company)
+        if facts is None:
             return {'has_answer': False}
         
-        filtered = []
-        for b in mrp_result.get('data', []):
-            bc_ro = extract_ro_from_ro(b.get('running_order', ''))
-            bc_bin = extract_binning_from_ro(b.get('running_order', ''))
-            
-            if bc_ro in ro_list and bc_bin == binning.upper():
-                filtered.append({
-                    'barcode': b.get('barcode', ''),
-                    'dispatched': bool(b.get('dispatch_party'))
-                })
-        
-        dispatched = len([f for f in filtered if f['dispatched']])
-        remaining = len(filtered) - dispatched
+        pos = facts.select(ro=ro_list, binning=binning.upper())
+        dispatched = int(facts.dispatched[pos].sum())
+        remaining = len(pos) - dispatched
         
         answer_parts = [f"**🏭 {company} - {ro} | {binning}**\n"]
         answer_parts.append(f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
-        answer_parts.append(f"📊 **Total:** {len(filtered):,}")
+        answer_parts.append(f"📊 **Total:** {len(pos):,}")
         answer_parts.append(f"🚚 **Dispatched:** {dispatched:,}")
         answer_parts.append(f"⏳ **Remaining:** {remaining:,}")
         
@@ -3265,8 +3149,8 @@ TERMINOLOGY:
     
     return system_prompt
 
-def query_groq(user_message, ftr_data):
-    """Query Groq API with FTR context"""
+def query_groq(user_message, ftr_data, system_prompt=None):
+    """Query Groq API with FTR context (system_prompt: prebuilt prompt for ftr_data)"""
     
     if not GROQ_API_KEY:
         return {
@@ -3274,7 +3158,8 @@ def query_groq(user_message, ftr_data):
             'error': 'Groq API key not configured. Please set GROQ_API_KEY environment variable.'
         }
     
-    system_prompt = create_system_prompt(ftr_data)
+    if system_prompt is None:
+        system_prompt = create_system_prompt(ftr_data)
     
     try:
         response = requests.post(
@@ -3324,97 +3209,70 @@ def detect_excel_command(message):
     Detect if user wants Excel export from chat message
     Returns: {'type': 'excel_command', 'action': '...', 'params': {...}} or None
     """
-    import re
-    message_lower = message.lower()
+    msg = analyze_chat_message(message)
+    message_lower = msg.lower
+    
+    # PDI detection
+    # IMPORTANT: If PDI number is detected, DON'T treat as Excel command
+    # PDI queries should go to answer_specific_query for proper PDI comparison
+    pdi_match = _EXCEL_PDI_RE.search(message_lower) if msg.has('pdi') else None
+    if pdi_match:
+        return None
     
     # Patterns for Excel commands
-    excel_keywords = ['excel', 'export', 'download', 'list', 'de do', 'do', 'chahiye', 'nikalo', 'bhejo', 'file', 'sheet']
-    has_excel_intent = any(kw in message_lower for kw in excel_keywords)
+    has_excel_intent = msg.has(*EXCEL_WORDS)
     
     # Quality check keywords
-    quality_check_types = {
-        'duplicate': ['duplicate', 'dohra', 'repeat', 'same barcode'],
-        'mismatch': ['mismatch', 'binning mismatch', 'different binning', 'galat binning'],
-        'rejected': ['rejected', 'reject', 'rejected packed', 'rejection'],
-        'missing': ['missing', 'mrp mein nahi', 'not in mrp', 'gayab'],
-        'extra': ['extra', 'db mein nahi', 'not in db', 'extra mrp'],
-        'mix_packing': ['mix', 'mix packing', 'mixed', 'mix pallet'],
-        'pallet_audit': ['audit', 'pallet audit', 'full audit', 'integrity']
-    }
-    
     detected_quality_check = None
-    for check_type, keywords in quality_check_types.items():
-        if any(kw in message_lower for kw in keywords):
+    for check_type, keywords in QUALITY_CHECK_WORDS.items():
+        if msg.has(*keywords):
             detected_quality_check = check_type
             break
     
-    # Company detection
-    company_patterns = {
-        'Rays Power': r'rays|rp|rays power',
-        'Larsen & Toubro': r'l&t|larsen|toubro|lnt',
-        'Sterlin and Wilson': r'sterlin|wilson|sw|s&w|s\&w|sterling'
-    }
-    detected_company = None
-    for company, pattern in company_patterns.items():
-        if re.search(pattern, message_lower):
-            detected_company = company
-            break
-    
     # Running Order detection (R-1, R-2, R-3, etc.)
-    ro_match = re.search(r'r-?(\d+)', message_lower)
+    ro_match = _EXCEL_RO_RE.search(message_lower)
     running_order = f"R-{ro_match.group(1)}" if ro_match else None
     
     # Binning detection (I-1, I-2, I-3, i1, i2, i3, MB, MC, MD)
-    # Use negative lookbehind to NOT match PDI-1 as binning I1
-    bin_match = re.search(r'(?<!pd)i-?(\d+)', message_lower)
+    bin_match = _EXCEL_BINNING_RE.search(message_lower)
     binning = f"I{bin_match.group(1)}" if bin_match else None
     if not binning:
-        # Note: 'me' removed as it conflicts with Hindi word 'me/mein' (meaning 'in')
-        bin_alpha = re.search(r'\b(mb|mc|md|mf|mg)\b', message_lower, re.IGNORECASE)
+        bin_alpha = _EXCEL_BINNING_ALPHA_RE.search(message_lower)
         if bin_alpha:
             binning = bin_alpha.group(1).upper()
     
+    # If any specific filter detected with excel intent
+    if not (has_excel_intent or running_order or binning or detected_quality_check):
+        return None
+    
     # Julian date detection (3 digit number like 302, 365)
-    julian_match = re.search(r'\bjulian\s*(\d{3})\b|\b(\d{3})\s*julian\b', message_lower)
+    julian_match = _EXCEL_JULIAN_RE.search(message_lower) if msg.has('julian') else None
     julian_date = julian_match.group(1) or julian_match.group(2) if julian_match else None
     
-    # PDI detection
-    pdi_match = re.search(r'pdi-?(\d+)', message_lower)
-    pdi_number = f"PDI-{pdi_match.group(1)}" if pdi_match else None
-    
     # Count detection (for "18 barcode chahiye")
-    count_match = re.search(r'(\d+)\s*(barcode|module|serial|piece)', message_lower)
-    if not count_match:
-        count_match = re.search(r'(barcode|module|serial)\s*(\d+)', message_lower)
-    requested_count = int(count_match.group(1) if count_match and count_match.group(1).isdigit() else (count_match.group(2) if count_match else 0))
-    
-    # Status detection
-    packed = 'packed' in message_lower or 'pack' in message_lower
-    dispatched = 'dispatch' in message_lower or 'sent' in message_lower or 'bheja' in message_lower
-    pending = 'pending' in message_lower or 'baaki' in message_lower or 'remaining' in message_lower
-    
-    # IMPORTANT: If PDI number is detected, DON'T treat as Excel command
-    # PDI queries should go to answer_specific_query for proper PDI comparison
-    if pdi_number:
-        return None
-    
-    # If any specific filter detected with excel intent
-    if has_excel_intent or running_order or binning or detected_quality_check:
-        return {
-            'type': 'excel_command',
-            'company': detected_company,
-            'running_order': running_order,
-            'binning': binning,
-            'julian_date': julian_date,
-            'pdi_number': pdi_number,
-            'count': requested_count,
-            'packed': packed,
-            'dispatched': dispatched,
-            'pending': pending,
-            'quality_check': detected_quality_check
-        }
+    requested_count = 0
+    if msg.has('barcode', 'serial', 'module', 'piece'):
+        count_match = _COUNT_RE.search(message_lower)
+        if count_match:
+            requested_count = int(count_match.group(1))
+        else:
+            count_match = _EXCEL_COUNT_AFTER_RE.search(message_lower)
+            if count_match:
+                requested_count = int(count_match.group(2))
     
-    return None
+    return {
+        'type': 'excel_command',
+        'company': msg.company(_EXCEL_COMPANY_PRIORITY),
+        'running_order': running_order,
+        'binning': binning,
+        'julian_date': julian_date,
+        'pdi_number': None,
+        'count': requested_count,
+        'packed': msg.has('packed', 'pack'),
+        'dispatched': msg.has('dispatch', 'sent', 'bheja'),
+        'pending': msg.has('pending', 'baaki', 'remaining'),
+        'quality_check': detected_quality_check
+    }
 
 def generate_smart_excel(params):
     """Generate Excel based on smart command parameters - supports quality checks too"""
@@ -3434,19 +3292,12 @@ def generate_smart_excel(params):
     if not EXCEL_AVAILABLE:
         return None, "Excel not available"
     
-    wb = openpyxl.Workbook()
-    ws = wb.active
+    wb = new_workbook()
     
     # Styles
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
     red_fill = PatternFill(start_color="FF6B6B", end_color="FF6B6B", fill_type="solid")
     yellow_fill = PatternFill(start_color="FFE066", end_color="FFE066", fill_type="solid")
     green_fill = PatternFill(start_color="69DB7C", end_color="69DB7C", fill_type="solid")
-    thin_border = Border(
-        left=Side(style='thin'), right=Side(style='thin'),
-        top=Side(style='thin'), bottom=Side(style='thin')
-    )
     
     # ===== QUALITY CHECK EXCEL =====
     if quality_check:
@@ -3454,37 +3305,37 @@ def generate_smart_excel(params):
         
         if quality_check == 'duplicate':
             result = check_duplicate_barcodes(company)
-            ws.title = f"{company[:20]}_Duplicates"
+            title = f"{company[:20]}_Duplicates"
             headers = ["S.No", "Barcode", "Count", "R-O Values", "Issue"]
             
         elif quality_check == 'mismatch':
             result = check_binning_mismatch(company)
-            ws.title = f"{company[:20]}_Mismatch"
+            title = f"{company[:20]}_Mismatch"
             headers = ["S.No", "Barcode", "DB Binning", "MRP Binning", "Issue"]
             
         elif quality_check == 'rejected':
             result = check_rejected_packed(company)
-            ws.title = f"{company[:20]}_Rejected"
+            title = f"{company[:20]}_Rejected"
             headers = ["S.No", "Barcode", "Rejection Reason", "Status in MRP", "Issue"]
             
         elif quality_check == 'missing':
             result = check_missing_in_mrp(company)
-            ws.title = f"{company[:20]}_Missing"
+            title = f"{company[:20]}_Missing"
             headers = ["S.No", "Barcode", "DB Status", "Issue"]
             
         elif quality_check == 'extra':
             result = check_extra_in_mrp(company)
-            ws.title = f"{company[:20]}_Extra"
+            title = f"{company[:20]}_Extra"
             headers = ["S.No", "Barcode", "Pallet", "Running Order"]
             
         elif quality_check == 'mix_packing':
             result = check_mix_packing(company)
-            ws.title = f"{company[:20]}_MixPacking"
+            title = f"{company[:20]}_MixPacking"
             headers = ["S.No", "Pallet No", "Barcode", "Actual Binning (Master FTR)", "Issue"]
             
         elif quality_check == 'pallet_audit':
             result = full_pallet_audit(company)
-            ws.title = f"{company[:20]}_Audit"
+            title = f"{company[:20]}_Audit"
             headers = ["S.No", "Issue Type", "Count", "Details"]
         else:
             return None, "Unknown quality check type"
@@ -3493,114 +3344,78 @@ def generate_smart_excel(params):
         if not result or not result.get('has_answer'):
             return None, f"Quality check failed for {company}"
         
-        # Write headers
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.border = thin_border
-        
-        # Extract data from result based on quality check type
-        row_idx = 2
-        
+        # Rows per quality check type; the last column carries the issue fill
+        issue_fill = None
         if quality_check == 'duplicate':
-            duplicates = result.get('duplicates', {})
-            for idx, (bc, locations) in enumerate(duplicates.items(), 1):
-                pallets = ", ".join([f"Pallet {l['pallet']} ({l['status']})" for l in locations])
-                ws.cell(row=row_idx, column=1, value=idx).border = thin_border
-                ws.cell(row=row_idx, column=2, value=bc).border = thin_border
-                ws.cell(row=row_idx, column=3, value=len(locations)).border = thin_border
-                ws.cell(row=row_idx, column=4, value=pallets).border = thin_border
-                ws.cell(row=row_idx, column=5, value="DUPLICATE").border = thin_border
-                ws.cell(row=row_idx, column=5).fill = red_fill
-                row_idx += 1
-                
+            issue_fill = red_fill
+            rows = (
+                [idx, bc, len(locations),
+                 ", ".join([f"Pallet {l['pallet']} ({l['status']})" for l in locations]),
+                 "DUPLICATE"]
+                for idx, (bc, locations) in enumerate(result.get('duplicates', {}).items(), 1)
+            )
         elif quality_check == 'mismatch':
-            mismatches = result.get('mismatches', [])
-            for idx, m in enumerate(mismatches, 1):
-                ws.cell(row=row_idx, column=1, value=idx).border = thin_border
-                ws.cell(row=row_idx, column=2, value=m.get('barcode', '')).border = thin_border
-                ws.cell(row=row_idx, column=3, value=m.get('db_binning', '')).border = thin_border
-                ws.cell(row=row_idx, column=4, value=m.get('mrp_binning', '')).border = thin_border
-                ws.cell(row=row_idx, column=5, value="MISMATCH").border = thin_border
-                ws.cell(row=row_idx, column=5).fill = yellow_fill
-                row_idx += 1
-                
+            issue_fill = yellow_fill
+            rows = (
+                [idx, m.get('barcode', ''), m.get('db_binning', ''), m.get('mrp_binning', ''), "MISMATCH"]
+                for idx, m in enumerate(result.get('mismatches', []), 1)
+            )
         elif quality_check == 'rejected':
-            rejected = result.get('rejected_packed', [])
-            for idx, r in enumerate(rejected, 1):
-                ws.cell(row=row_idx, column=1, value=idx).border = thin_border
-                ws.cell(row=row_idx, column=2, value=r.get('barcode', '')).border = thin_border
-                ws.cell(row=row_idx, column=3, value="REJECTED").border = thin_border
-                ws.cell(row=row_idx, column=4, value=f"Pallet {r.get('pallet', '')} - {r.get('status', '')}").border = thin_border
-                ws.cell(row=row_idx, column=5, value="CRITICAL").border = thin_border
-                ws.cell(row=row_idx, column=5).fill = red_fill
-                row_idx += 1
-                
+            issue_fill = red_fill
+            rows = (
+                [idx, r.get('barcode', ''), "REJECTED",
+                 f"Pallet {r.get('pallet', '')} - {r.get('status', '')}", "CRITICAL"]
+                for idx, r in enumerate(result.get('rejected_packed', []), 1)
+            )
         elif quality_check == 'missing':
-            missing = result.get('missing', [])
-            for idx, m in enumerate(missing, 1):
-                ws.cell(row=row_idx, column=1, value=idx).border = thin_border
-                ws.cell(row=row_idx, column=2, value=m.get('barcode', '')).border = thin_border
-                ws.cell(row=row_idx, column=3, value=f"PDI: {m.get('pdi', '')}").border = thin_border
-                ws.cell(row=row_idx, column=4, value="NOT IN MRP").border = thin_border
-                ws.cell(row=row_idx, column=4).fill = yellow_fill
-                row_idx += 1
-                
+            issue_fill = yellow_fill
+            rows = (
+                [idx, m.get('barcode', ''), f"PDI: {m.get('pdi', '')}", "NOT IN MRP"]
+                for idx, m in enumerate(result.get('missing', []), 1)
+            )
         elif quality_check == 'extra':
-            extra = result.get('extra', [])
-            for idx, e in enumerate(extra, 1):
-                ws.cell(row=row_idx, column=1, value=idx).border = thin_border
-                ws.cell(row=row_idx, column=2, value=e.get('barcode', '')).border = thin_border
-                ws.cell(row=row_idx, column=3, value=e.get('pallet', '')).border = thin_border
-                ws.cell(row=row_idx, column=4, value=e.get('running_order', '')).border = thin_border
-                row_idx += 1
-                
+            rows = (
+                [idx, e.get('barcode', ''), e.get('pallet', ''), e.get('running_order', '')]
+                for idx, e in enumerate(result.get('extra', []), 1)
+            )
         elif quality_check == 'mix_packing':
-            mixed_pallets = result.get('mix_packed_pallets', [])
-            barcode_row_num = 1
+            issue_fill = yellow_fill
             
-            for pallet_idx, p in enumerate(mixed_pallets, 1):
-                pallet_no = p.get('pallet_no', '')
-                binnings_by_type = p.get('binnings_by_type', {})
-                
+            def mix_rows():
                 # Write each barcode as a separate row
-                for binning, barcodes in sorted(binnings_by_type.items()):
-                    for barcode in barcodes:
-                        ws.cell(row=row_idx, column=1, value=barcode_row_num).border = thin_border
-                        ws.cell(row=row_idx, column=2, value=f"Pallet {pallet_no}").border = thin_border
-                        ws.cell(row=row_idx, column=3, value=barcode).border = thin_border
-                        ws.cell(row=row_idx, column=4, value=binning).border = thin_border
-                        ws.cell(row=row_idx, column=5, value="MIX PACKING").border = thin_border
-                        ws.cell(row=row_idx, column=5).fill = yellow_fill
-                        row_idx += 1
-                        barcode_row_num += 1
+                barcode_row_num = 1
+                for p in result.get('mix_packed_pallets', []):
+                    pallet_no = p.get('pallet_no', '')
+                    for binning, barcodes in sorted(p.get('binnings_by_type', {}).items()):
+                        for barcode in barcodes:
+                            yield [barcode_row_num, f"Pallet {pallet_no}", barcode, binning, "MIX PACKING"]
+                            barcode_row_num += 1
+            rows = mix_rows()
+        else:
+            rows = iter(())
+        
+        last_col = len(headers)
+        ws, issue_count = write_sheet(
+            wb, title, headers, rows,
+            border=THIN_BORDER,
+            cell_style=(lambda col, value, row: {'fill': issue_fill} if col == last_col else None) if issue_fill else None
+        )
         
         # If no data found
-        if row_idx == 2:
-            ws.cell(row=2, column=1, value=1).border = thin_border
-            ws.cell(row=2, column=2, value="No issues found").border = thin_border
-            ws.cell(row=2, column=2).fill = green_fill
-        
-        # Summary row
-        summary_row = row_idx + 2
-        ws.cell(row=summary_row, column=1, value="QUALITY CHECK SUMMARY:").font = Font(bold=True)
-        ws.cell(row=summary_row + 1, column=1, value=f"Company: {company}")
-        ws.cell(row=summary_row + 2, column=1, value=f"Check Type: {quality_check.replace('_', ' ').title()}")
-        ws.cell(row=summary_row + 3, column=1, value=f"Total Issues: {row_idx - 2}")
-        ws.cell(row=summary_row + 4, column=1, value=f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-        
-        # Auto-width
-        for col in ws.columns:
-            max_length = max(len(str(cell.value or '')) for cell in col)
-            ws.column_dimensions[col[0].column_letter].width = min(max_length + 2, 50)
-        
-        buffer = io.BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
+        if issue_count == 0:
+            ws.append([styled(ws, 1, border=THIN_BORDER),
+                       styled(ws, "No issues found", border=THIN_BORDER, fill=green_fill)])
+        
+        # Summary rows
+        ws.append([])
+        ws.append([styled(ws, "QUALITY CHECK SUMMARY:", font=Font(bold=True))])
+        ws.append([f"Company: {company}"])
+        ws.append([f"Check Type: {quality_check.replace('_', ' ').title()}"])
+        ws.append([f"Total Issues: {issue_count}"])
+        ws.append([f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"])
         
         import base64
-        excel_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+        excel_base64 = base64.b64encode(workbook_bytes(wb)).decode('utf-8')
         
         return excel_base64, f"{quality_check.replace('_', ' ').title()} check complete for {company}"
     
@@ -3659,8 +3474,7 @@ def generate_smart_excel(params):
     if not EXCEL_AVAILABLE:
         return None, "Excel not available"
     
-    wb = openpyxl.Workbook()
-    ws = wb.active
+    wb = new_workbook()
     
     # Determine title
     title_parts = [company]
@@ -3675,59 +3489,30 @@ def generate_smart_excel(params):
     if get_dispatched:
         title_parts.append("Dispatched")
     
-    ws.title = "_".join(title_parts)[:31]  # Excel sheet name limit
-    
-    # Styles
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    thin_border = Border(
-        left=Side(style='thin'), right=Side(style='thin'),
-        top=Side(style='thin'), bottom=Side(style='thin')
-    )
+    def barcode_rows():
+        for idx, b in enumerate(filtered, 1):
+            ro = b.get('running_order', '') or ''
+            bin_match = re.search(r'i-?(\d+)', ro, re.IGNORECASE)
+            binning = f"I{bin_match.group(1)}" if bin_match else ''
+            status = 'Dispatched' if b.get('dispatch_party') else 'Packed'
+            yield [idx, b.get('barcode', ''), ro, binning, b.get('pallet_no', ''), b.get('date', ''), status]
     
     headers = ["S.No", "Barcode", "Running Order", "Binning", "Pallet No", "Date", "Status"]
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.border = thin_border
-    
-    for idx, b in enumerate(filtered, 1):
-        ro = b.get('running_order', '') or ''
-        bin_match = re.search(r'i-?(\d+)', ro, re.IGNORECASE)
-        binning = f"I{bin_match.group(1)}" if bin_match else ''
-        
-        status = 'Dispatched' if b.get('dispatch_party') else 'Packed'
-        
-        ws.cell(row=idx+1, column=1, value=idx).border = thin_border
-        ws.cell(row=idx+1, column=2, value=b.get('barcode', '')).border = thin_border
-        ws.cell(row=idx+1, column=3, value=ro).border = thin_border
-        ws.cell(row=idx+1, column=4, value=binning).border = thin_border
-        ws.cell(row=idx+1, column=5, value=b.get('pallet_no', '')).border = thin_border
-        ws.cell(row=idx+1, column=6, value=b.get('date', '')).border = thin_border
-        ws.cell(row=idx+1, column=7, value=status).border = thin_border
+    ws, _ = write_sheet(wb, "_".join(title_parts), headers, barcode_rows(),
+                        max_width=None, border=THIN_BORDER)
     
     # Summary
-    summary_row = len(filtered) + 3
-    ws.cell(row=summary_row, column=1, value="SUMMARY:").font = Font(bold=True)
-    ws.cell(row=summary_row + 1, column=1, value=f"Company: {company}")
-    ws.cell(row=summary_row + 2, column=1, value=f"Total Records: {len(filtered)}")
+    ws.append([])
+    ws.append([styled(ws, "SUMMARY:", font=Font(bold=True))])
+    ws.append([f"Company: {company}"])
+    ws.append([f"Total Records: {len(filtered)}"])
     if running_order_filter:
-        ws.cell(row=summary_row + 3, column=1, value=f"Running Order: {running_order_filter}")
+        ws.append([f"Running Order: {running_order_filter}"])
     if binning_filter:
-        ws.cell(row=summary_row + 4, column=1, value=f"Binning: {binning_filter}")
-    
-    # Auto-width
-    for col in ws.columns:
-        max_length = max(len(str(cell.value or '')) for cell in col)
-        ws.column_dimensions[col[0].column_letter].width = max_length + 2
-    
-    buffer = io.BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
+        ws.append([f"Binning: {binning_filter}"])
     
     import base64
-    excel_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+    excel_base64 = base64.b64encode(workbook_bytes(wb)).decode('utf-8')
     
     return excel_base64, f"Found {len(filtered)} barcodes"
 
@@ -3798,23 +3583,37 @@ def ai_chat():
             })
         
         # STEP 5: Fall back to Groq AI for general questions
-        # Get fresh FTR data
-        ftr_data = get_all_ftr_data()
+        # FTR data + prompt come from the background snapshot (no DB/MRP calls here)
+        from app.services import ai_snapshot
+        snapshot = ai_snapshot.current()
         
-        if not ftr_data:
+        if not snapshot:
             return jsonify({
                 'success': False,
                 'error': 'Failed to fetch FTR data from database'
             }), 500
+        ftr_data = snapshot.data
+        
+        cached = ai_snapshot.cached_answer(snapshot.generation, user_message)
+        if cached is not None:
+            return jsonify({
+                'success': True,
+                'response': cached,
+                'data_summary': ftr_data['summary'],
+                'data_generation': snapshot.generation,
+                'cached': True
+            })
         
         # Query Groq AI
-        result = query_groq(user_message, ftr_data)
+        result = query_groq(user_message, ftr_data, system_prompt=snapshot.prompt)
         
         if result['success']:
+            ai_snapshot.store_answer(snapshot.generation, user_message, result['response'])
             return jsonify({
                 'success': True,
                 'response': result['response'],
-                'data_summary': ftr_data['summary']
+                'data_summary': ftr_data['summary'],
+                'data_generation': snapshot.generation
             })
         else:
             return jsonify({
@@ -3830,11 +3629,16 @@ def ai_chat():
 
 @ai_assistant_bp.route('/ai/data', methods=['GET'])
 def get_ai_data():
-    """Get raw FTR data for display"""
+    """Get raw FTR data for display (the assistant's current snapshot)"""
     try:
-        ftr_data = get_all_ftr_data()
-        if ftr_data:
-            return jsonify({'success': True, 'data': ftr_data})
+        from app.services import ai_snapshot
+        snapshot = ai_snapshot.current()
+        if snapshot:
+            return jsonify({
+                'success': True,
+                'data': snapshot.data,
+                'snapshot': ai_snapshot.status()
+            })
         else:
             return jsonify({'success': False, 'error': 'Failed to fetch data'}), 500
     except Exception as e:
@@ -4115,8 +3919,8 @@ def get_all_tracking_data():
 def export_to_excel():
     """Export FTR data to Excel/CSV based on user request - FAST version using CSV"""
     try:
-        import csv
         import re
+        from app.utils.excel_export import send_csv
         
         data = request.json
         export_type = data.get('type', 'all')  # all, company, pending, packed, dispatched, binning, rejected
@@ -4142,27 +3946,12 @@ def export_to_excel():
                 print(f"Company ID lookup error: {e}")
         
         def make_csv_response(headers, rows, filename):
-            """Fast CSV file generation"""
-            buffer = io.StringIO()
-            writer = csv.writer(buffer)
-            writer.writerow(headers)
-            for idx, row in enumerate(rows, 1):
-                writer.writerow([idx] + list(row))
-            
-            csv_bytes = io.BytesIO(buffer.getvalue().encode('utf-8-sig'))  # BOM for Excel
-            csv_bytes.seek(0)
-            return send_file(csv_bytes, mimetype='text/csv', as_attachment=True, download_name=filename)
+            """Streamed CSV, S.No prepended to each DB row"""
+            return send_csv(headers, ([idx] + list(row) for idx, row in enumerate(rows, 1)), filename)
         
         def make_csv_response_direct(headers, data_rows, filename):
-            """Fast CSV from list of lists"""
-            buffer = io.StringIO()
-            writer = csv.writer(buffer)
-            writer.writerow(headers)
-            writer.writerows(data_rows)
-            
-            csv_bytes = io.BytesIO(buffer.getvalue().encode('utf-8-sig'))
-            csv_bytes.seek(0)
-            return send_file(csv_bytes, mimetype='text/csv', as_attachment=True, download_name=filename)
+            """Streamed CSV from list of lists"""
+            return send_csv(headers, data_rows, filename)
         
         query_params = {}
         
@@ -4579,73 +4368,33 @@ def download_check_result():
 # Alert numbers for packing validation issues
 PACKING_ALERT_NUMBERS = ['9773983859']
 
-def send_packing_alert_whatsapp(caution, party_name, module_no, pallet_no, reason):
-    """Send WhatsApp alert for packing validation issues, but only once per serial/alert_type"""
-    try:
-        results = []
-        alert_type = "rejection" if "REJECTED" in str(caution).upper() else "other"
-        # Prevent duplicate alerts for same serial/alert_type
-        if alert_type == "rejection":
-            existing = WhatsAppAlertLog.query.filter_by(serial_number=module_no, alert_type=alert_type).first()
-            if existing:
-                print(f"⏩ Skipping duplicate WhatsApp alert for {module_no} [{alert_type}]")
-                return [{'recipient': 'ALL', 'success': False, 'skipped': True, 'reason': 'Already sent'}]
-        for number in PACKING_ALERT_NUMBERS:
-            recipient = '91' + number.replace('+91', '').replace(' ', '')
-            payload = {
-                "to": recipient,
-                "type": "template",
-                "source": "external",
-                "template": {
-                    "name": "pack_dispatch",
-                    "language": {"code": "en"},
-                    "components": [
-                        {
-                            "type": "header",
-                            "parameters": [
-                                {"type": "text", "text": str(caution)}
-                            ]
-                        },
-                        {
-                            "type": "body",
-                            "parameters": [
-                                {"type": "text", "text": str(party_name)},
-                                {"type": "text", "text": str(module_no)},
-                                {"type": "text", "text": str(pallet_no)},
-                                {"type": "text", "text": str(reason)}
-                            ]
-                        }
-                    ]
-                }
-            }
-            headers = {
-                "Authorization": WHATSAPP_AUTH_TOKEN,
-                "Content-Type": "application/json"
-            }
-            response = requests.post(WHATSAPP_API_URL, json=payload, headers=headers, timeout=30)
-            if response.status_code == 200:
-                print(f"✅ Packing alert sent to {recipient}")
-                results.append({'recipient': recipient, 'success': True})
-            else:
-                print(f"❌ Packing alert failed for {recipient}")
-                results.append({'recipient': recipient, 'success': False})
-        # Log only if at least one sent
-        if alert_type == "rejection" and any(r.get('success') for r in results):
-            log = WhatsAppAlertLog(serial_number=module_no, alert_type=alert_type)
-            db.session.add(log)
-            db.session.commit()
-        return results
-    except Exception as e:
-        print(f"❌ Packing alert error: {str(e)}")
-        return []
+# Issues of each type queued per validation run (sent as one digest per type)
+PACKING_ALERTS_PER_TYPE = int(os.environ.get('PACKING_ALERTS_PER_TYPE', '25'))
 
-
-def validate_packing_internal(company, send_alerts=True):
+def send_packing_alert_whatsapp(caution, party_name, module_no, pallet_no, reason, alert_type=None, serial=None):
+    """
+    Queue a WhatsApp alert for a packing validation issue to every alert
+    number. With alert_type, the alert goes out only once per serial/alert_type
+    (serial defaults to module_no); the queue worker sends digests, see
+    services/notification_queue.
+    """
+    if alert_type is None and "REJECTED" in str(caution).upper():
+        alert_type = "rejection"
+    dedupe = (str(serial or module_no), alert_type) if alert_type else None
+    results = []
+    for number in PACKING_ALERT_NUMBERS:
+        job_id = notification_queue.whatsapp(number, caution, party_name, module_no, pallet_no, reason,
+                                             dedupe=dedupe, digest=True)
+        results.append({'recipient': number, 'queued': True, 'job_id': job_id})
+    return results
+
+
+def validate_packing_internal(company, send_alerts=True, full=False):
     """
     Internal function for packing validation (called by scheduler)
     Returns dict with issues found
     """
-    return _do_validate_packing(company, send_alerts)
+    return _do_validate_packing(company, send_alerts, full)
 
 
 @ai_assistant_bp.route('/ai/validate-packing', methods=['POST'])
@@ -4657,14 +4406,15 @@ def validate_packing():
         data = request.json
         company = data.get('company', 'Rays Power')
         send_alerts = data.get('send_alerts', True)
+        full = data.get('full', False)  # True = re-check everything, not just new/changed rows
         
-        result = _do_validate_packing(company, send_alerts)
+        result = _do_validate_packing(company, send_alerts, full)
         return jsonify(result)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-def _do_validate_packing(company, send_alerts=True):
+def _do_validate_packing(company, send_alerts=True, full=False):
     """
     Core validation logic - used by both API and scheduler
     1. Check if any REJECTED module is packed
@@ -4672,7 +4422,9 @@ def _do_validate_packing(company, send_alerts=True):
     3. Check for DUPLICATE barcodes
     4. Check for MIX BINNING in pallets
     
-    Returns dict with issues found and sends WhatsApp alerts
+    Incremental: only rows/pallets that changed since the company's last
+    run are looked up again (full=True re-checks everything).
+    Returns dict with issues found and sends WhatsApp alerts for new issues
     """
     try:
         # ⚡ CUTOFF DATE - Only for MIX BINNING check (not for rejection)
@@ -4697,32 +4449,28 @@ def _do_validate_packing(company, send_alerts=True):
         # Get MRP party name
         mrp_party_name = get_mrp_party_name(company)
         
-        # Fetch MRP data (packed modules)
-        print(f"📡 Fetching MRP data for: {mrp_party_name}")
-        response = requests.post(
-            BARCODE_TRACKING_API,
-            json={'party_name': mrp_party_name},
-            timeout=60
-        )
-        
-        if response.status_code != 200:
-            return jsonify({'success': False, 'error': 'MRP API failed'}), 500
-        
-        mrp_data = response.json()
-        all_barcodes = mrp_data.get('data', [])  # ALL data for rejection check
+        # MRP data (packed modules) for the main party, from the shared fact table
+        # (only if that party's fetch succeeded: a table built while it failed has no rows for it)
+        facts = mrp_facts.get(company)
+        if facts is not None and mrp_party_name in facts.parties:
+            all_barcodes = facts.rows_at(facts.select(sub_party=mrp_party_name))  # ALL data for rejection check
+        else:
+            print(f"📡 Fetching MRP data for: {mrp_party_name}")
+            response = requests.post(
+                BARCODE_TRACKING_API,
+                json={'party_name': mrp_party_name},
+                timeout=60
+            )
+            
+            if response.status_code != 200:
+                return {'success': False, 'error': 'MRP API failed', 'total_issues': 0}
+            
+            mrp_data = response.json()
+            all_barcodes = mrp_data.get('data', [])  # ALL data for rejection check
         print(f"📦 Total packed modules in MRP: {len(all_barcodes)}")
         
-        # Filter for binning check - only from cutoff date
-        barcodes_for_binning = []
-        for b in all_barcodes:
-            pack_date = b.get('date', '')
-            if pack_date and pack_date >= BINNING_CUTOFF_DATE:
-                barcodes_for_binning.append(b)
-        
-        print(f"📦 Modules for binning check (from {BINNING_CUTOFF_DATE}): {len(barcodes_for_binning)}")
-        
         if not all_barcodes:
-            return jsonify({
+            return {
                 'success': True,
                 'company': company,
                 'validation_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
@@ -4731,7 +4479,7 @@ def _do_validate_packing(company, send_alerts=True):
                 'message': '✅ No packing data found',
                 'is_valid': True,
                 'issues': {'rejected_packed': [], 'mix_binning': [], 'total_issues': 0}
-            })
+            }
         
         # Get company_id
         company_result = db.session.execute(text(
@@ -4740,192 +4488,69 @@ def _do_validate_packing(company, send_alerts=True):
         company_row = company_result.fetchone()
         
         if not company_row:
-            return jsonify({'success': False, 'error': f'Company {company} not found'}), 404
+            return {'success': False, 'error': f'Company {company} not found', 'total_issues': 0}
         
         company_id = company_row[0]
         
-        # Get all serials for binning lookup
-        all_serials = [b.get('barcode') for b in all_barcodes if b.get('barcode')]
-        
-        if all_serials:
-            # Fetch binning data from Master FTR
-            binning_result = db.session.execute(text("""
-                SELECT serial_number, binning, class_status 
-                FROM ftr_master_serials 
-                WHERE company_id = :cid 
-                AND serial_number IN :serials
-            """), {'cid': company_id, 'serials': tuple(all_serials)})
-            
-            binning_lookup = {row[0]: {'binning': row[1], 'class_status': row[2]} for row in binning_result.fetchall()}
-        else:
-            binning_lookup = {}
-        
+        # FTR binning/class and PDI serial lookups, for all serials (None) or
+        # only the given ones - incremental runs look up just what changed
+        PDI_SERIALS_SQL = """
+            SELECT msn.serial_number, pb.pdi_number, c.company_name, msn.rejection_reason, msn.qc_status
+            FROM module_serial_numbers msn
+            JOIN pdi_batches pb ON msn.pdi_batch_id = pb.id
+            LEFT JOIN master_orders mo ON pb.order_id = mo.id
+            LEFT JOIN companies c ON mo.company_id = c.id
+        """
+
+        def by_serials(sql, serials, **params):
+            rows = []
+            query = text(sql).bindparams(bindparam('serials', expanding=True))
+            for i in range(0, len(serials), 2000):
+                rows.extend(db.session.execute(query, dict(params, serials=serials[i:i + 2000])).fetchall())
+            return rows
+
+        def load_ftr(serials):
+            sql = "SELECT serial_number, binning, class_status FROM ftr_master_serials WHERE company_id = :cid"
+            if serials is None:
+                return db.session.execute(text(sql), {'cid': company_id}).fetchall()
+            return by_serials(sql + " AND serial_number IN :serials", serials, cid=company_id)
+
+        def load_pdi(serials):
+            if serials is None:
+                return db.session.execute(text(PDI_SERIALS_SQL)).fetchall()
+            return by_serials(PDI_SERIALS_SQL + " WHERE msn.serial_number IN :serials", serials)
+
+        def load_rejected():
+            ftr = db.session.execute(text("""
+                SELECT serial_number, binning, class_status
+                FROM ftr_master_serials
+                WHERE company_id = :cid AND UPPER(class_status) IN ('REJECTED', 'REJECT', 'REJ')
+            """), {'cid': company_id}).fetchall()
+            pdi = db.session.execute(text(
+                PDI_SERIALS_SQL + " WHERE msn.rejection_reason IS NOT NULL AND msn.rejection_reason <> ''"
+            )).fetchall()
+            return ftr, pdi
+
         # ============================================
-        # CHECK 1: REJECTED MODULES PACKED (ALL TIME)
+        # CHECKS 1-4: rejected packed (ALL TIME), wrong party, duplicates,
+        # mix binning (from cutoff) - columnar, and incremental against the
+        # company's last run; see services/packing_validation
         # ============================================
-        print(f"\n🔍 Check 1: Looking for REJECTED modules in ALL packed data...")
-        
-        for b in all_barcodes:  # Check ALL barcodes
-            barcode = b.get('barcode', '')
-            pallet_no = b.get('pallet_no', '')
-            pack_date = b.get('date', '')
-            
-            # Check in our rejection database (ModuleSerialNumber)
-            serial_record = db.session.execute(text("""
-                SELECT msn.serial_number, msn.rejection_reason, msn.qc_status, pb.pdi_number
-                FROM module_serial_numbers msn
-                JOIN pdi_batches pb ON msn.pdi_batch_id = pb.id
-                WHERE msn.serial_number = :barcode
-                AND (msn.rejection_reason IS NOT NULL AND msn.rejection_reason != '')
-            """), {'barcode': barcode}).fetchone()
-            
-            if serial_record:
-                print(f"   ❌ REJECTED module found in pack: {barcode} (packed on {pack_date})")
-                issues['rejected_packed'].append({
-                    'barcode': barcode,
-                    'pallet_no': pallet_no,
-                    'pack_date': pack_date,
-                    'rejection_reason': serial_record[1],
-                    'qc_status': serial_record[2],
-                    'pdi_number': serial_record[3]
-                })
-            
-            # Also check class_status from FTR (might have rejected status)
-            ftr_data = binning_lookup.get(barcode, {})
-            if ftr_data.get('class_status', '').upper() in ['REJECTED', 'REJECT', 'REJ']:
-                if not any(r['barcode'] == barcode for r in issues['rejected_packed']):
-                    print(f"   ❌ FTR REJECTED module found: {barcode} (packed on {pack_date})")
-                    issues['rejected_packed'].append({
-                        'barcode': barcode,
-                        'pallet_no': pallet_no,
-                        'pack_date': pack_date,
-                        'rejection_reason': f"FTR Status: {ftr_data.get('class_status')}",
-                        'qc_status': 'rejected',
-                        'pdi_number': '-'
-                    })
-        
+        with packing_validation.run_lock(company):
+            previous = packing_validation.load_state(company)
+            found, stats, state, info = packing_validation.validate_packing_incremental(
+                all_barcodes, previous, load_rejected, load_ftr, load_pdi, BINNING_CUTOFF_DATE,
+                full=full or packing_validation.needs_full(company, previous))
+            packing_validation.save_state(company, state)
+        issues.update(found)
+        fresh = packing_validation.new_issues(found, previous)
+
+        print(f"🧮 {info['mode'].title()} run: {info['changed_rows']} new/changed rows, "
+              f"{info['rechecked_pallets']} pallets re-checked")
+        print(f"📦 Modules for binning check (from {BINNING_CUTOFF_DATE}): {stats['modules_for_binning_check']}")
         print(f"   Found {len(issues['rejected_packed'])} rejected modules in packing (ALL TIME)")
-        
-        # ============================================
-        # CHECK 2: WRONG PARTY - Module PDI hua kisi aur party ke liye
-        # ============================================
-        print(f"\n🔍 Check 2: Looking for WRONG PARTY in DISPATCHED modules...")
-        
-        issues['wrong_party'] = []
-        
-        for b in all_barcodes:
-            barcode = b.get('barcode', '')
-            pallet_no = b.get('pallet_no', '')
-            pack_date = b.get('date', '')
-            dispatch_party = b.get('dispatch_party', '')
-            
-            # Only check DISPATCHED modules (dispatch_party is set)
-            if not dispatch_party:
-                continue  # Skip if not dispatched yet
-            
-            # Check if this barcode belongs to a different company/party in PDI
-            pdi_record = db.session.execute(text("""
-                SELECT msn.serial_number, pb.pdi_number, mo.order_number, c.company_name
-                FROM module_serial_numbers msn
-                JOIN pdi_batches pb ON msn.pdi_batch_id = pb.id
-                JOIN master_orders mo ON pb.order_id = mo.id
-                JOIN companies c ON mo.company_id = c.id
-                WHERE msn.serial_number = :barcode
-            """), {'barcode': barcode}).fetchone()
-            
-            if pdi_record:
-                pdi_company = pdi_record[3]  # Company name from PDI
-                # Check if PDI company matches DISPATCH party
-                if pdi_company and pdi_company.lower().split()[0] not in dispatch_party.lower():
-                    print(f"   ❌ WRONG DISPATCH: {barcode} - PDI for '{pdi_company}' but DISPATCHED to '{dispatch_party}'")
-                    issues['wrong_party'].append({
-                        'barcode': barcode,
-                        'pallet_no': pallet_no,
-                        'pack_date': pack_date,
-                        'pdi_company': pdi_company,
-                        'dispatched_to': dispatch_party,
-                        'pdi_number': pdi_record[1]
-                    })
-        
         print(f"   Found {len(issues['wrong_party'])} modules DISPATCHED to wrong party")
-        
-        # ============================================
-        # CHECK 3: DUPLICATE BARCODES (Same barcode packed multiple times for same party)
-        # ============================================
-        print(f"\n🔍 Check 3: Looking for DUPLICATE barcodes in same party...")
-        
-        issues['duplicates'] = []
-        barcode_occurrences = {}
-        
-        for b in all_barcodes:
-            barcode = b.get('barcode', '')
-            if not barcode:
-                continue
-            
-            pallet_no = b.get('pallet_no', '')
-            pack_date = b.get('date', '')
-            
-            if barcode not in barcode_occurrences:
-                barcode_occurrences[barcode] = []
-            
-            barcode_occurrences[barcode].append({
-                'pallet_no': pallet_no,
-                'pack_date': pack_date
-            })
-        
-        # Find duplicates (barcode appearing more than once)
-        for barcode, occurrences in barcode_occurrences.items():
-            if len(occurrences) > 1:
-                print(f"   ❌ DUPLICATE: {barcode} found {len(occurrences)} times")
-                issues['duplicates'].append({
-                    'barcode': barcode,
-                    'count': len(occurrences),
-                    'pallets': [o['pallet_no'] for o in occurrences],
-                    'dates': [o['pack_date'] for o in occurrences]
-                })
-        
         print(f"   Found {len(issues['duplicates'])} duplicate barcodes")
-        
-        # ============================================
-        # CHECK 4: MIX BINNING IN PALLETS (FROM CUTOFF DATE ONLY)
-        # ============================================
-        print(f"\n🔍 Check 4: Looking for MIX BINNING in pallets (from {BINNING_CUTOFF_DATE})...")
-        
-        # Group by pallet - only pallets with modules packed from BINNING_CUTOFF_DATE
-        pallets = {}
-        for b in barcodes_for_binning:  # Only check barcodes from cutoff date
-            pallet_no = b.get('pallet_no', '')
-            if not pallet_no:
-                continue
-            
-            barcode = b.get('barcode', '')
-            if not barcode:
-                continue
-            
-            # Get binning from FTR
-            ftr_data = binning_lookup.get(barcode, {'binning': 'Unknown', 'class_status': 'Unknown'})
-            binning = ftr_data['binning'] if ftr_data['binning'] else 'Unknown'
-            
-            if pallet_no not in pallets:
-                pallets[pallet_no] = {'barcodes': [], 'binnings': set()}
-            
-            pallets[pallet_no]['barcodes'].append({'barcode': barcode, 'binning': binning})
-            pallets[pallet_no]['binnings'].add(binning)
-        
-        # Find mix binning pallets
-        for pallet_no, pallet_data in pallets.items():
-            # Filter out 'Unknown' and 'Not in Master FTR' for mix check
-            valid_binnings = {b for b in pallet_data['binnings'] if b not in ['Unknown', 'Not in Master FTR', None, '']}
-            
-            if len(valid_binnings) > 1:
-                print(f"   ❌ MIX BINNING found in Pallet {pallet_no}: {valid_binnings}")
-                issues['mix_binning'].append({
-                    'pallet_no': pallet_no,
-                    'binnings': list(valid_binnings),
-                    'total_modules': len(pallet_data['barcodes']),
-                    'sample_barcodes': [b['barcode'] for b in pallet_data['barcodes'][:5]]
-                })
-        
         print(f"   Found {len(issues['mix_binning'])} pallets with mix binning")
         
         # Calculate total issues
@@ -4939,48 +4564,57 @@ def _do_validate_packing(company, send_alerts=True):
         # ============================================
         # SEND WHATSAPP ALERTS
         # ============================================
-        if send_alerts and issues['total_issues'] > 0:
-            print(f"\n📱 Sending WhatsApp alerts...")
+        # Only issues that were not open after the last run; queued, so the
+        # run does not wait on WhatsApp (one digest per type per number)
+        new_issue_count = sum(len(entries) for entries in fresh.values())
+        alerts_queued = 0
+        if send_alerts and new_issue_count > 0:
+            print(f"\n📱 Queuing WhatsApp alerts for {new_issue_count} new issue(s)...")
             
             # Alert for rejected modules
-            for rej in issues['rejected_packed'][:3]:  # Limit to 3 alerts each type
-                send_packing_alert_whatsapp(
+            for rej in fresh['rejected_packed'][:PACKING_ALERTS_PER_TYPE]:
+                alerts_queued += len(send_packing_alert_whatsapp(
                     caution="🚨 REJECTED MODULE PACKED",
                     party_name=company,
                     module_no=rej['barcode'],
                     pallet_no=rej['pallet_no'],
-                    reason=rej['rejection_reason']
-                )
+                    reason=rej['rejection_reason'],
+                    alert_type='rejection'
+                ))
             
             # Alert for wrong party
-            for wp in issues['wrong_party'][:3]:
-                send_packing_alert_whatsapp(
+            for wp in fresh['wrong_party'][:PACKING_ALERTS_PER_TYPE]:
+                alerts_queued += len(send_packing_alert_whatsapp(
                     caution="⛔ WRONG DISPATCH - PDI MISMATCH",
                     party_name=wp.get('dispatched_to', company),
                     module_no=wp['barcode'],
                     pallet_no=wp['pallet_no'],
-                    reason=f"PDI: {wp['pdi_company']} → Dispatched: {wp.get('dispatched_to', 'Unknown')}"
-                )
+                    reason=f"PDI: {wp['pdi_company']} → Dispatched: {wp.get('dispatched_to', 'Unknown')}",
+                    alert_type='wrong_party'
+                ))
             
             # Alert for duplicates
-            for dup in issues['duplicates'][:3]:
-                send_packing_alert_whatsapp(
+            for dup in fresh['duplicates'][:PACKING_ALERTS_PER_TYPE]:
+                alerts_queued += len(send_packing_alert_whatsapp(
                     caution="🔄 DUPLICATE BARCODE",
                     party_name=company,
                     module_no=dup['barcode'],
                     pallet_no=', '.join(str(p) for p in dup['pallets'][:3]),
-                    reason=f"Found {dup['count']} times in same party"
-                )
+                    reason=f"Found {dup['count']} times in same party",
+                    alert_type='duplicate'
+                ))
             
             # Alert for mix binning
-            for mix in issues['mix_binning'][:3]:
-                send_packing_alert_whatsapp(
+            for mix in fresh['mix_binning'][:PACKING_ALERTS_PER_TYPE]:
+                alerts_queued += len(send_packing_alert_whatsapp(
                     caution="⚠️ MIX BINNING DETECTED",
                     party_name=company,
                     module_no=f"{mix['total_modules']} modules",
                     pallet_no=mix['pallet_no'],
-                    reason=f"Mixed: {' + '.join(mix['binnings'])}"
-                )
+                    reason=f"Mixed: {' + '.join(mix['binnings'])}",
+                    alert_type='mix_binning',
+                    serial=f"PALLET {mix['pallet_no']}"
+                ))
         
         # Build response
         response_data = {
@@ -4989,8 +4623,13 @@ def _do_validate_packing(company, send_alerts=True):
             'binning_cutoff_date': BINNING_CUTOFF_DATE,
             'validation_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'total_packed_modules': len(all_barcodes),
-            'modules_for_binning_check': len(barcodes_for_binning),
-            'total_pallets': len(pallets),
+            'modules_for_binning_check': stats['modules_for_binning_check'],
+            'total_pallets': stats['total_pallets'],
+            'validation_mode': info['mode'],
+            'rows_checked': info['changed_rows'],
+            'pallets_rechecked': info['rechecked_pallets'],
+            'new_issues': new_issue_count,
+            'alerts_queued': alerts_queued,
             'issues': issues,
             'is_valid': issues['total_issues'] == 0,
             'message': '✅ Packing VALID - No issues!' if issues['total_issues'] == 0 else f"❌ Found {issues['total_issues']} issue(s)"
@@ -5077,7 +4716,7 @@ def run_validation_now():
                 'message': result.get('message', '')
             })
             total_issues += len(issues_list)
-            whatsapp_alerts_sent += result.get('alerts_sent', 0)
+            whatsapp_alerts_sent += result.get('alerts_queued', 0)  # queued for the notification worker
         
         return jsonify({
             'success': True,
@@ -5184,30 +4823,41 @@ def scheduler_control():
         return jsonify({'success': True}), 200
         
     try:
-        import app as app_module
+        from app.services import scheduler
         
         data = request.json or {}
         action = data.get('action', 'status')
+        job = 'packing-validation'
+        
+        if not scheduler.has_job(job):
+            return jsonify({
+                'success': True,
+                'status': 'disabled',
+                'message': 'Packing validation scheduler is disabled (set ENABLE_PACKING_SCHEDULER=true)',
+                'scheduler': scheduler.status()
+            })
         
         if action == 'stop':
-            app_module._scheduler_enabled = False
+            scheduler.pause(job)
             return jsonify({
                 'success': True,
                 'status': 'stopped',
                 'message': '⏸️ Scheduler paused - No automatic validations will run'
             })
         elif action == 'start':
-            app_module._scheduler_enabled = True
+            scheduler.resume(job)
             return jsonify({
                 'success': True,
                 'status': 'running',
                 'message': '▶️ Scheduler resumed - Automatic validations will run every 10 minutes'
             })
         else:
+            jobs = scheduler.status()
             return jsonify({
                 'success': True,
-                'status': 'running' if app_module._scheduler_enabled else 'stopped',
-                'message': 'Scheduler status retrieved'
+                'status': 'stopped' if jobs['jobs'][job]['paused'] else 'running',
+                'message': 'Scheduler status retrieved',
+                'scheduler': jobs
             })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -5324,61 +4974,27 @@ def get_pallet_modules_excel():
         excel_base64 = None
         if EXCEL_AVAILABLE:
             try:
-                wb = openpyxl.Workbook()
-                ws = wb.active
-                ws.title = f"Pallet {pallet_number}"
-                
-                # Styles
-                header_font = Font(bold=True, color='FFFFFF', size=11)
-                header_fill = PatternFill(start_color='9b59b6', end_color='9b59b6', fill_type='solid')
-                border = Border(
-                    left=Side(style='thin'),
-                    right=Side(style='thin'),
-                    top=Side(style='thin'),
-                    bottom=Side(style='thin')
-                )
-                center_align = Alignment(horizontal='center', vertical='center')
-                
-                # Title Row
-                ws.merge_cells('A1:I1')
-                title_cell = ws['A1']
-                title_cell.value = f"📦 Pallet {pallet_number} - {company} (Total: {len(modules)} modules)"
-                title_cell.font = Font(bold=True, size=14, color='FFFFFF')
-                title_cell.fill = PatternFill(start_color='8e44ad', end_color='8e44ad', fill_type='solid')
-                title_cell.alignment = center_align
-                
-                # Headers
+                wb = new_workbook()
                 headers = ['Sr. No', 'Barcode/Serial', 'Binning', 'Pmax', 'Class Status', 'Status', 'R-O', 'Dispatch Party', 'Pack Date']
-                for col, header in enumerate(headers, 1):
-                    cell = ws.cell(row=2, column=col, value=header)
-                    cell.font = header_font
-                    cell.fill = header_fill
-                    cell.border = border
-                    cell.alignment = center_align
-                
-                # Data Rows
-                for idx, module in enumerate(modules, 1):
-                    row_num = idx + 2
-                    ws.cell(row=row_num, column=1, value=idx).border = border
-                    ws.cell(row=row_num, column=2, value=module['barcode']).border = border
-                    ws.cell(row=row_num, column=3, value=module['binning']).border = border
-                    ws.cell(row=row_num, column=4, value=module.get('pmax', '')).border = border
-                    ws.cell(row=row_num, column=5, value=module.get('class_status', '')).border = border
-                    ws.cell(row=row_num, column=6, value=module['status']).border = border
-                    ws.cell(row=row_num, column=7, value=module['running_order']).border = border
-                    ws.cell(row=row_num, column=8, value=module.get('dispatch_party', '')).border = border
-                    ws.cell(row=row_num, column=9, value=module.get('pack_date', '')).border = border
-                
-                # Adjust column widths
-                column_widths = [8, 25, 10, 10, 12, 12, 20, 20, 12]
-                for i, width in enumerate(column_widths, 1):
-                    ws.column_dimensions[openpyxl.utils.get_column_letter(i)].width = width
-                
-                # Save to BytesIO
-                excel_buffer = io.BytesIO()
-                wb.save(excel_buffer)
-                excel_buffer.seek(0)
-                excel_base64 = base64.b64encode(excel_buffer.read()).decode('utf-8')
+                center_align = Alignment(horizontal='center', vertical='center')
+                write_sheet(
+                    wb, f"Pallet {pallet_number}", headers,
+                    (
+                        [idx, module['barcode'], module['binning'], module.get('pmax', ''),
+                         module.get('class_status', ''), module['status'], module['running_order'],
+                         module.get('dispatch_party', ''), module.get('pack_date', '')]
+                        for idx, module in enumerate(modules, 1)
+                    ),
+                    widths=[8, 25, 10, 10, 12, 12, 20, 20, 12],
+                    header_font=Font(bold=True, color='FFFFFF', size=11),
+                    header_fill=PatternFill(start_color='9b59b6', end_color='9b59b6', fill_type='solid'),
+                    header_alignment=center_align,
+                    border=THIN_BORDER,
+                    title_row=f"📦 Pallet {pallet_number} - {company} (Total: {len(modules)} modules)",
+                    title_font=Font(bold=True, size=14, color='FFFFFF'),
+                    title_fill=PatternFill(start_color='8e44ad', end_color='8e44ad', fill_type='solid'),
+                )
+                excel_base64 = base64.b64encode(workbook_bytes(wb)).decode('utf-8')
                 
             except Exception as excel_error:
                 print(f"Excel generation error: {excel_error}")
@@ -5714,15 +5330,19 @@ def scheduler_status():
         return jsonify({'success': True}), 200
         
     try:
-        import app as app_module
-        enabled = getattr(app_module, '_scheduler_enabled', True)
+        from app.services import scheduler
+        state = scheduler.status()
+        job = state['jobs'].get('packing-validation')
+        enabled = bool(job) and job['enabled'] and not job['paused']
         
         return jsonify({
             'success': True,
             'enabled': enabled,
             'status': 'running' if enabled else 'stopped',
             'interval': 10,  # minutes
-            'companies': ['Rays Power', 'Larsen & Toubro', 'Sterlin and Wilson']
+            'companies': ['Rays Power', 'Larsen & Toubro', 'Sterlin and Wilson'],
+            'job': job,
+            'jobs': state['jobs']
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -5851,8 +5471,12 @@ def send_bulk_whatsapp():
         "party_name": "ABC Solar",
         "module_no": "MOD-001",
         "pallet_no": "PLT-409",
-        "rejection_reason": "N/A"
+        "rejection_reason": "N/A",
+        "wait": false                 (optional: true = wait for delivery results)
     }
+    Messages go through the notification queue (rate-limited, retried);
+    without wait the response lists the queued jobs and a batch_id for
+    /ai/notification-status.
     """
     try:
         data = request.json
@@ -5861,30 +5485,34 @@ def send_bulk_whatsapp():
         if not recipients:
             return jsonify({'success': False, 'error': 'No recipients provided'}), 400
         
-        results = []
-        success_count = 0
-        fail_count = 0
-        
+        batch_id = notification_queue.new_batch()
         for recipient in recipients:
-            result = send_pack_dispatch_whatsapp(
-                recipient=recipient,
+            notification_queue.whatsapp(
+                recipient,
                 caution=data.get('caution', 'Notification'),
                 party_name=data.get('party_name', '-'),
                 module_no=data.get('module_no', '-'),
                 pallet_no=data.get('pallet_no', '-'),
-                rejection_reason=data.get('rejection_reason', '-')
+                reason=data.get('rejection_reason', '-'),
+                batch_id=batch_id
             )
-            results.append({'recipient': recipient, **result})
-            if result.get('success'):
-                success_count += 1
-            else:
-                fail_count += 1
+        
+        if data.get('wait'):
+            batch = notification_queue.wait(batch_id, timeout=120)
+        else:
+            batch = notification_queue.batch_status(batch_id)
+        results = [
+            {'recipient': recipient, 'success': job['state'] == 'sent', 'state': job['state'], 'error': job['error']}
+            for recipient, job in zip(recipients, batch['jobs'])
+        ]
         
         return jsonify({
             'success': True,
+            'batch_id': batch_id,
             'total': len(recipients),
-            'sent': success_count,
-            'failed': fail_count,
+            'sent': batch['states'].get('sent', 0),
+            'failed': batch['states'].get('failed', 0),
+            'queued': batch['states'].get('queued', 0),
             'results': results
         })
         
@@ -5892,6 +5520,18 @@ def send_bulk_whatsapp():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@ai_assistant_bp.route('/ai/notification-status', methods=['GET'])
+def notification_status():
+    """Notification queue state, or one batch with ?batch_id="""
+    batch_id = request.args.get('batch_id')
+    if batch_id:
+        batch = notification_queue.batch_status(batch_id)
+        if batch is None:
+            return jsonify({'success': False, 'error': 'Unknown batch'}), 404
+        return jsonify({'success': True, **batch})
+    return jsonify({'success': True, **notification_queue.queue_status()})
+
+
 @ai_assistant_bp.route('/ai/check-binning', methods=['POST'])
 def check_serial_binning():
     """
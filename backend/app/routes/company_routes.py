@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify
 from datetime import datetime
 from app.models.database import db, Company, ProductionRecord, RejectedModule, BomMaterial
 from app.models.coc_tracking import COCUsageTracking
+from app.services import ai_snapshot
+from app.services import packing_validation
 
 company_bp = Blueprint('company', __name__)
 
@@ -241,6 +243,8 @@ def create_company():
         
         db.session.add(company)
         db.session.commit()
+        ai_snapshot.invalidate('company')
+        packing_validation.invalidate_state()
         
         return jsonify(company.to_dict()), 201
     except Exception as e:
@@ -267,6 +271,8 @@ def update_company(company_id):
             company.cell_efficiency_received = json.dumps(data.get('cellEfficiencyReceived', {}))
         
         db.session.commit()
+        ai_snapshot.invalidate('company')
+        packing_validation.invalidate_state()
         
         return jsonify(company.to_dict()), 200
     except Exception as e:
@@ -280,6 +286,8 @@ def delete_company(company_id):
         company = Company.query.get_or_404(company_id)
         db.session.delete(company)
         db.session.commit()
+        ai_snapshot.invalidate('company')
+        packing_validation.invalidate_state()
         
         return jsonify({'message': 'Company deleted successfully'}), 200
     except Exception as e:
@@ -407,12 +415,18 @@ def add_production_record(company_id):
             db.session.add(bom_material_night)
         
         db.session.commit()
+        _production_changed(company.company_name)
         
         return jsonify({'record': record.to_dict()}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def _production_changed(company_name):
+    """Consolidated reports memoise production days; drop this company's"""
+    from app.services.consolidated_report_generator import clear_day_cache
+    clear_day_cache(company_name)
+
 # Update production record
 @company_bp.route('/api/companies/<int:company_id>/production/<int:record_id>', methods=['PUT'])
 def update_production_record(company_id, record_id):
@@ -482,6 +496,7 @@ def update_production_record(company_id, record_id):
                             bom_material.shift = bom_item['shift']
         
         db.session.commit()
+        _production_changed(record.company.company_name)
         
         return jsonify(record.to_dict()), 200
     except Exception as e:
@@ -493,8 +508,10 @@ def update_production_record(company_id, record_id):
 def delete_production_record(company_id, record_id):
     try:
         record = ProductionRecord.query.filter_by(id=record_id, company_id=company_id).first_or_404()
+        company_name = record.company.company_name
         db.session.delete(record)
         db.session.commit()
+        _production_changed(company_name)
         
         return jsonify({'message': 'Production record deleted successfully'}), 200
     except Exception as e:
@@ -779,6 +796,7 @@ def upload_ipqc_pdf(company_id, record_id):
             record.ipqc_pdf = relative_path
         
         db.session.commit()
+        _production_changed(record.company.company_name)
         
         return jsonify({
             'message': f'IPQC PDF uploaded successfully for {shift} shift',
@@ -4,6 +4,9 @@ from sqlalchemy import text
 from datetime import datetime
 import pymysql
 from config import Config
+from app.services import ai_snapshot
+from app.services import packing_validation
+from app.models import schema_registry
 
 ftr_management_bp = Blueprint('ftr_management', __name__)
 
@@ -11,58 +14,9 @@ ftr_management_bp = Blueprint('ftr_management', __name__)
 def get_company_ftr(company_id):
     """Get FTR data for a specific company"""
     try:
-        # Check and create tables if they don't exist
-        with db.engine.connect() as conn:
-            # Create ftr_master_serials table with binning and rejection
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS ftr_master_serials (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    company_id INT NOT NULL,
-                    serial_number VARCHAR(100) NOT NULL,
-                    pmax DECIMAL(10,3) DEFAULT NULL,
-                    binning VARCHAR(20) DEFAULT NULL,
-                    class_status VARCHAR(20) DEFAULT 'OK',
-                    status ENUM('available', 'assigned', 'used') DEFAULT 'available',
-                    pdi_number VARCHAR(50) DEFAULT NULL,
-                    upload_date DATETIME NOT NULL,
-                    assigned_date DATETIME DEFAULT NULL,
-                    file_name VARCHAR(255) DEFAULT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE KEY unique_serial (company_id, serial_number),
-                    INDEX idx_company_status (company_id, status),
-                    INDEX idx_pdi (pdi_number),
-                    INDEX idx_binning (binning),
-                    INDEX idx_class (class_status)
-                )
-            """))
-            
-            # Add new columns if they don't exist
-            try:
-                conn.execute(text("ALTER TABLE ftr_master_serials ADD COLUMN pmax DECIMAL(10,3) DEFAULT NULL"))
-            except:
-                pass
-            try:
-                conn.execute(text("ALTER TABLE ftr_master_serials ADD COLUMN binning VARCHAR(20) DEFAULT NULL"))
-            except:
-                pass
-            try:
-                conn.execute(text("ALTER TABLE ftr_master_serials ADD COLUMN class_status VARCHAR(20) DEFAULT 'OK'"))
-            except:
-                pass
-            
-            # Create ftr_packed_modules table
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS ftr_packed_modules (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    company_id INT NOT NULL,
-                    serial_number VARCHAR(100) NOT NULL,
-                    packed_date DATETIME NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE KEY unique_packed (company_id, serial_number),
-                    INDEX idx_company (company_id)
-                )
-            """))
-            conn.commit()
+        schema_registry.ensure('ftr_master_serials')
+        schema_registry.ensure('ftr_packed_modules')
+        schema_registry.ensure('pdi_serial_numbers')
         
         # Get TOTAL master FTR count (ALL records including rejected)
         result = db.session.execute(text("""
@@ -232,6 +186,8 @@ def upload_master_ftr():
                 new_inserted += 1
         
         db.session.commit()
+        ai_snapshot.invalidate('ftr-master')
+        packing_validation.invalidate_state()
         
         # Get actual total in database now
         db_total_result = db.session.execute(text("""
@@ -323,6 +279,7 @@ def upload_rejection_data():
                 updated_count += 1
         
         db.session.commit()
+        ai_snapshot.invalidate('ftr-rejection')
         
         return jsonify({
             'success': True,
@@ -378,6 +335,8 @@ def assign_serials_to_pdi():
             """), {'pdi_number': pdi_number, 'assigned_date': assigned_date, 'id': row[0]})
         
         db.session.commit()
+        ai_snapshot.invalidate('pdi-assign')
+        packing_validation.invalidate_state()
         
         return jsonify({
             'success': True,
@@ -449,6 +408,8 @@ def assign_serials_excel():
                 continue
         
         conn.commit()
+        ai_snapshot.invalidate('pdi-assign')
+        packing_validation.invalidate_state()
         cursor.close()
         conn.close()
         conn = None
@@ -499,6 +460,7 @@ def upload_packed_modules():
             })
         
         db.session.commit()
+        ai_snapshot.invalidate('ftr-packed')
         
         return jsonify({
             'success': True,
@@ -686,6 +648,8 @@ def delete_pdi_assignment(company_id, pdi_number):
         """), {'company_id': company_id, 'pdi_number': pdi_number})
         
         db.session.commit()
+        ai_snapshot.invalidate('pdi-unassign')
+        packing_validation.invalidate_state()
         
         return jsonify({
             'success': True,
@@ -726,6 +690,8 @@ def delete_single_serial(company_id, serial_number):
         """), {'company_id': company_id, 'serial_number': serial_number})
         
         db.session.commit()
+        ai_snapshot.invalidate('pdi-unassign')
+        packing_validation.invalidate_state()
         
         return jsonify({
             'success': True,
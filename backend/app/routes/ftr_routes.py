@@ -3,16 +3,17 @@ FTR (Field Test Report) Routes
 """
 
 from flask import Blueprint, request, jsonify, send_file
-from app.services.ftr_pdf_generator import create_ftr_report
 from app.utils.db_pool import get_db_connection      # pooled MySQL
 from app.utils import http_client                    # shared keep-alive session
-from app.utils import disk_cache                     # JSON disk cache (survives pm2 restart)
-from config import Config
+from app.utils import disk_cache                     # disk caches (survive pm2 restart, shared by processes)
+from app.utils import shared_cache                   # cross-process cache store
+from app.services import ai_snapshot                 # AI assistant data snapshot
+from app.services import scheduler                   # background jobs (refresh / pre-warm)
+from app.models import schema_registry               # raw-SQL tables, verified at start-up
 import os
 import pymysql
 import re
 import json
-import pandas as pd
 from datetime import datetime
 import time
 
@@ -86,8 +87,24 @@ def generate_ftr_report():
                 print(f"Graph image not found: {graph_image_path}")
                 graph_image_path = None
         
+        # PDF / IV-curve libraries (PyPDF2, reportlab, PIL, numpy) load on first use
+        from app.services.ftr_pdf_generator import create_ftr_report
+        from app.services.iv_curve_engine import IVCurveBatch
+        from app.services.iv_curve_renderer import render_curve_png, curve_vector_paths
+
+        # Per-serial curve synthesised from the measured results; the static
+        # wattage image stays as fallback when the values don't fit the model
+        graph_image = None
+        iv_curve_mode = data.get('ivCurve', 'per_serial')
+        if iv_curve_mode != 'static':
+            results = data.get('results') or {}
+            batch = IVCurveBatch.from_rows([dict(results, serial=data.get('serialNumber') or 'module')])
+            if len(batch):
+                curve = batch.curve(batch.serials[0])
+                graph_image = curve_vector_paths(curve) if iv_curve_mode == 'vector' else render_curve_png(curve)
+        
         # Generate PDF
-        pdf_output = create_ftr_report(template_path, data, graph_image_path)
+        pdf_output = create_ftr_report(template_path, data, graph_image_path, graph_image)
         
         # Generate filename
         serial_number = data.get('serialNumber', 'unknown')
@@ -372,57 +389,8 @@ def get_pdi_dashboard(company_id):
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Check if table exists FIRST
-        cursor.execute("""
-            SELECT COUNT(*) as count 
-            FROM information_schema.tables 
-            WHERE table_schema = %s AND table_name = 'pdi_serial_numbers'
-        """, (Config.MYSQL_DB,))
-        
-        table_check = cursor.fetchone()
-        if not table_check or table_check['count'] == 0:
-            # Table doesn't exist, create it
-            print("Creating pdi_serial_numbers table...")
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS pdi_serial_numbers (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    pdi_number VARCHAR(50) NOT NULL,
-                    serial_number VARCHAR(100) NOT NULL,
-                    company_id INT,
-                    production_record_id INT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    INDEX idx_pdi (pdi_number),
-                    INDEX idx_serial (serial_number),
-                    INDEX idx_company (company_id)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
-            """)
-            conn.commit()
-            print("âœ… pdi_serial_numbers table created successfully")
-            
-            # Return empty data since table was just created
-            cursor.close()
-            conn.close()
-            return jsonify({
-                "success": True,
-                "summary": {
-                    "total_assigned": 0,
-                    "total_tracked": 0,
-                    "packed": 0,
-                    "dispatched": 0,
-                    "pending": 0,
-                    "unknown": 0,
-                    "packed_percent": 0,
-                    "dispatched_percent": 0,
-                    "pending_percent": 0
-                },
-                "details": {
-                    "packed": [],
-                    "dispatched": [],
-                    "pending": []
-                },
-                "message": "PDI tracking initialized. No serial numbers assigned yet."
-            }), 200
-        
+        schema_registry.ensure('pdi_serial_numbers')
+
         # Get all PDI numbers and their serial counts for this company
         cursor.execute("""
             SELECT 
@@ -2079,10 +2047,8 @@ def export_not_packed_serials(company_id):
     Returns Excel file with serial numbers grouped by PDI.
     """
     try:
-        import io
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-        from flask import send_file
+        from openpyxl.styles import Font, Alignment
+        from app.utils.excel_export import new_workbook, write_sheet, styled, send_workbook, THIN_BORDER
         
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
@@ -2166,81 +2132,40 @@ def export_not_packed_serials(company_id):
         
         conn.close()
         
-        # Create Excel workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Not Packed Serials"
-        
-        # Styles
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
+        # Write-only workbook: rows are streamed, widths are fixed up front
+        wb = new_workbook()
+        def not_packed_rows():
+            serial_no = 0
+            for pdi in sorted(not_packed_by_pdi.keys()):
+                for serial in not_packed_by_pdi[pdi]:
+                    serial_no += 1
+                    yield [serial_no, pdi, serial, "Not Packed"]
+
+        _, total_not_packed = write_sheet(
+            wb, "Not Packed Serials", ["S.No", "PDI Number", "Serial Number", "Status"],
+            not_packed_rows(),
+            widths=[8, 15, 30, 12],
+            header_alignment=Alignment(horizontal='center'),
+            border=THIN_BORDER
         )
         
-        # Headers
-        headers = ["S.No", "PDI Number", "Serial Number", "Status"]
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal='center')
-            cell.border = thin_border
-        
-        # Data
-        row_num = 2
-        serial_no = 1
-        for pdi in sorted(not_packed_by_pdi.keys()):
-            for serial in not_packed_by_pdi[pdi]:
-                ws.cell(row=row_num, column=1, value=serial_no).border = thin_border
-                ws.cell(row=row_num, column=2, value=pdi).border = thin_border
-                ws.cell(row=row_num, column=3, value=serial).border = thin_border
-                ws.cell(row=row_num, column=4, value="Not Packed").border = thin_border
-                row_num += 1
-                serial_no += 1
-        
-        # Adjust column widths
-        ws.column_dimensions['A'].width = 8
-        ws.column_dimensions['B'].width = 15
-        ws.column_dimensions['C'].width = 30
-        ws.column_dimensions['D'].width = 12
-        
         # Summary sheet
+        bold = Font(bold=True)
         ws2 = wb.create_sheet("Summary")
-        ws2.cell(row=1, column=1, value="Company").font = Font(bold=True)
-        ws2.cell(row=1, column=2, value=company_name)
-        ws2.cell(row=2, column=1, value="Total PDIs").font = Font(bold=True)
-        ws2.cell(row=2, column=2, value=len(not_packed_by_pdi))
-        ws2.cell(row=3, column=1, value="Total Not Packed").font = Font(bold=True)
-        ws2.cell(row=3, column=2, value=serial_no - 1)
-        ws2.cell(row=4, column=1, value="Export Date").font = Font(bold=True)
-        ws2.cell(row=4, column=2, value=datetime.now().strftime('%Y-%m-%d %H:%M'))
+        ws2.append([styled(ws2, "Company", font=bold), company_name])
+        ws2.append([styled(ws2, "Total PDIs", font=bold), len(not_packed_by_pdi)])
+        ws2.append([styled(ws2, "Total Not Packed", font=bold), total_not_packed])
+        ws2.append([styled(ws2, "Export Date", font=bold), datetime.now().strftime('%Y-%m-%d %H:%M')])
+        ws2.append([])
         
         # PDI-wise summary
-        ws2.cell(row=6, column=1, value="PDI Number").font = Font(bold=True)
-        ws2.cell(row=6, column=2, value="Not Packed Count").font = Font(bold=True)
-        row = 7
+        ws2.append([styled(ws2, "PDI Number", font=bold), styled(ws2, "Not Packed Count", font=bold)])
         for pdi in sorted(not_packed_by_pdi.keys()):
-            ws2.cell(row=row, column=1, value=pdi)
-            ws2.cell(row=row, column=2, value=len(not_packed_by_pdi[pdi]))
-            row += 1
-        
-        # Save to buffer
-        buffer = io.BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
+            ws2.append([pdi, len(not_packed_by_pdi[pdi])])
         
         filename = f"not_packed_serials_{company_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
         
-        return send_file(
-            buffer,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
-        )
+        return send_workbook(wb, filename)
         
     except Exception as e:
         print(f"[Export] Error: {e}")
@@ -2405,6 +2330,9 @@ def sync_mrp_dispatch():
                         updated += 1
                 
                 conn.commit()
+                ai_snapshot.invalidate('mrp-sync')
+                from app.services import mrp_facts      # AI chat MRP fact tables (pandas)
+                mrp_facts.invalidate()
                 
                 # Get total count
                 cursor.execute("SELECT COUNT(*) as total FROM mrp_dispatch_cache WHERE company = %s", (matched_company,))
@@ -2522,8 +2450,9 @@ def mrp_cache_search():
 SALES_PARTY_API = 'https://logistics.umanerp.com/api/party/getSalesParty'
 SALES_PERSON_ID = os.getenv('SALES_PERSON_ID', 'c8166f4a-0897-4239-a26d-ee42e9cee22a')
 
-# Cache: {'data': [...parties...], 'timestamp': float}
-SALES_PARTY_CACHE = {'data': None, 'timestamp': 0}
+# Cache: {'data': [...parties...], 'timestamp': float}, shared by all server
+# processes (utils/shared_cache) — flush() after updating it
+SALES_PARTY_CACHE = shared_cache.open('sales_party', defaults={'data': None, 'timestamp': 0})
 SALES_PARTY_CACHE_TTL = 600  # 10 minutes
 
 
@@ -2559,6 +2488,7 @@ def _get_party_name_for_id(party_id):
                 parties.append({"id": pid, "companyName": name})
         SALES_PARTY_CACHE['data'] = parties
         SALES_PARTY_CACHE['timestamp'] = time.time()
+        SALES_PARTY_CACHE.flush()
         for p in parties:
             if p['id'] == party_id:
                 return p['companyName']
@@ -2627,6 +2557,7 @@ def get_sales_parties():
 
         SALES_PARTY_CACHE['data'] = parties
         SALES_PARTY_CACHE['timestamp'] = now
+        SALES_PARTY_CACHE.flush()
 
         return jsonify({
             "success": True,
@@ -3217,20 +3148,6 @@ def pdi_status(pdi_id):
 # new upload replaces previous.
 # ---------------------------------------------------------------------------
 
-def _ensure_actual_pdi_barcodes_table(cursor):
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS actual_pdi_barcodes (
-            pdi_id          VARCHAR(64) PRIMARY KEY,
-            party_name      VARCHAR(255) DEFAULT NULL,
-            filename        VARCHAR(255) DEFAULT NULL,
-            barcode_count   INT DEFAULT 0,
-            barcodes_json   LONGTEXT,
-            uploaded_at     DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updated_at      DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
-    """)
-
-
 @ftr_bp.route('/actual-pdi-barcodes/save', methods=['POST'])
 def save_actual_pdi_barcodes():
     """Save / replace actual PDI barcodes for a pdi_id (independent storage)."""
@@ -3250,7 +3167,7 @@ def save_actual_pdi_barcodes():
 
         conn = get_db_connection()
         cursor = conn.cursor()
-        _ensure_actual_pdi_barcodes_table(cursor)
+        schema_registry.ensure('actual_pdi_barcodes')
         cursor.execute("""
             INSERT INTO actual_pdi_barcodes (pdi_id, party_name, filename, barcode_count, barcodes_json)
             VALUES (%s, %s, %s, %s, %s)
@@ -3278,7 +3195,7 @@ def get_actual_pdi_barcodes(pdi_id):
             return jsonify({"success": False, "error": "pdi_id required"}), 400
         conn = get_db_connection()
         cursor = conn.cursor(pymysql.cursors.DictCursor)
-        _ensure_actual_pdi_barcodes_table(cursor)
+        schema_registry.ensure('actual_pdi_barcodes')
         cursor.execute("""
             SELECT pdi_id, party_name, filename, barcode_count, barcodes_json,
                    uploaded_at, updated_at
@@ -3318,7 +3235,7 @@ def delete_actual_pdi_barcodes(pdi_id):
             return jsonify({"success": False, "error": "pdi_id required"}), 400
         conn = get_db_connection()
         cursor = conn.cursor()
-        _ensure_actual_pdi_barcodes_table(cursor)
+        schema_registry.ensure('actual_pdi_barcodes')
         cursor.execute("DELETE FROM actual_pdi_barcodes WHERE pdi_id = %s", (pdi_id,))
         conn.commit()
         cursor.close()
@@ -3335,28 +3252,6 @@ def delete_actual_pdi_barcodes(pdi_id):
 # the planned PDI cards — used only for compare reports.
 # ---------------------------------------------------------------------------
 
-def _ensure_actual_pdi_batches_table(cursor):
-    try:
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS actual_pdi_batches (
-                id              INT AUTO_INCREMENT PRIMARY KEY,
-                party_id        VARCHAR(64) NOT NULL,
-                party_name      VARCHAR(255) DEFAULT NULL,
-                batch_no        INT NOT NULL,
-                batch_name      VARCHAR(255) DEFAULT NULL,
-                filename        VARCHAR(255) DEFAULT NULL,
-                barcode_count   INT DEFAULT 0,
-                barcodes_json   LONGTEXT,
-                created_at      DATETIME DEFAULT CURRENT_TIMESTAMP,
-                updated_at      DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                UNIQUE KEY uniq_party_batch (party_id, batch_no)
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
-        """)
-    except Exception as ce:
-        print(f"[_ensure_actual_pdi_batches_table] CREATE failed: {ce}")
-        raise
-
-
 @ftr_bp.route('/actual-pdi-batches/<party_id>', methods=['GET'])
 def list_actual_pdi_batches(party_id):
     """List all actual PDI batches for a party (without barcodes for speed)."""
@@ -3366,7 +3261,7 @@ def list_actual_pdi_batches(party_id):
             return jsonify({"success": False, "error": "party_id required"}), 400
         conn = get_db_connection()
         cursor = conn.cursor(pymysql.cursors.DictCursor)
-        _ensure_actual_pdi_batches_table(cursor)
+        schema_registry.ensure('actual_pdi_batches')
         cursor.execute("""
             SELECT id, party_id, party_name, batch_no, batch_name, filename,
                    barcode_count, created_at, updated_at
@@ -3418,7 +3313,7 @@ def create_actual_pdi_batch(party_id):
 
         conn = get_db_connection()
         cursor = conn.cursor()
-        _ensure_actual_pdi_batches_table(cursor)
+        schema_registry.ensure('actual_pdi_batches')
         cursor.execute("SELECT COALESCE(MAX(batch_no),0)+1 AS next_no FROM actual_pdi_batches WHERE party_id=%s", (party_id,))
         row = cursor.fetchone()
         next_no = (row['next_no'] if row else None) or 1
@@ -3447,7 +3342,7 @@ def get_actual_pdi_batch(party_id, batch_id):
         party_id = str(party_id).strip()
         conn = get_db_connection()
         cursor = conn.cursor(pymysql.cursors.DictCursor)
-        _ensure_actual_pdi_batches_table(cursor)
+        schema_registry.ensure('actual_pdi_batches')
         cursor.execute("""
             SELECT * FROM actual_pdi_batches WHERE party_id=%s AND id=%s
         """, (party_id, batch_id))
@@ -3500,7 +3395,7 @@ def update_actual_pdi_batch(party_id, batch_id):
         params.extend([str(party_id).strip(), batch_id])
         conn = get_db_connection()
         cursor = conn.cursor()
-        _ensure_actual_pdi_batches_table(cursor)
+        schema_registry.ensure('actual_pdi_batches')
         cursor.execute(f"UPDATE actual_pdi_batches SET {', '.join(sets)} WHERE party_id=%s AND id=%s", params)
         conn.commit()
         cursor.close()
@@ -3516,7 +3411,7 @@ def delete_actual_pdi_batch(party_id, batch_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        _ensure_actual_pdi_batches_table(cursor)
+        schema_registry.ensure('actual_pdi_batches')
         cursor.execute("DELETE FROM actual_pdi_batches WHERE party_id=%s AND id=%s", (str(party_id).strip(), batch_id))
         conn.commit()
         cursor.close()
@@ -3662,7 +3557,10 @@ def actual_pdi_batch_compare():
         # Reuse pdi_status._pack_cache (30 min TTL) so card views and batch share cache.
         packed_lookup = {}
         try:
-            pack_cache = pdi_status.__dict__.setdefault('_pack_cache', {})
+            pack_cache = pdi_status.__dict__.get('_pack_cache')
+            if pack_cache is None:
+                pack_cache = disk_cache.load_pack_cache()
+                pdi_status.__dict__['_pack_cache'] = pack_cache
             PACK_TTL = 1800
             not_disp = [s for s in actual_set if s not in dispatch_lookup]
             to_check = []
@@ -3707,6 +3605,7 @@ def actual_pdi_batch_compare():
                             pack_cache[serial] = {'t': now, 'status': 'packed', 'info': info}
                         elif status == 'pending':
                             pack_cache[serial] = {'t': now, 'status': 'pending'}
+                disk_cache.save_pack_cache(pack_cache)
         except Exception as e:
             print(f"[batch_compare] pack check error: {e}")
 
@@ -4119,11 +4018,9 @@ _PARTIES_PDI_CACHE_FILE = os.path.join(
 )
 _PARTIES_PDI_CACHE_TTL = 900          # 15 min fresh window
 _PARTIES_PDI_CACHE_MAX_AGE = 86400    # serve stale up to 24h
-_PARTIES_PDI_REFRESH_LOCK = False     # simple in-process guard
 
-# Pre-warm guards
-_PACK_WARM_LOCK = False
-_DISP_WARM_LOCK = False
+# Refresh + pre-warm run as scheduler jobs (services/scheduler), which
+# keeps each from overlapping itself - see the registration at the end
 _PACK_WARM_TTL = 1500   # 25 min — re-warm a party slightly before 30-min cache expires
 _DISP_WARM_TTL = 1500
 
@@ -4132,11 +4029,10 @@ def _warm_party_packing_caches_bg(parties):
     """Pre-fetch bulk packing data for every party so request handlers
     NEVER need to do the slow first call (which used to hang 28+ sec and
     cause nginx 502 cascades). Runs on a small thread pool.
+    Scheduler job 'party-packing-warm'.
     """
-    global _PACK_WARM_LOCK
-    if _PACK_WARM_LOCK or not parties:
+    if not parties:
         return
-    _PACK_WARM_LOCK = True
     try:
         from concurrent.futures import ThreadPoolExecutor, as_completed
         from app.utils import disk_cache as _dc
@@ -4203,19 +4099,15 @@ def _warm_party_packing_caches_bg(parties):
             print(f"[warm-pack] DONE: warmed {warmed}/{len(parties)} parties")
     except Exception as e:
         print(f"[warm-pack] failed: {e}")
-    finally:
-        _PACK_WARM_LOCK = False
 
 
 def _warm_party_dispatch_caches_bg(parties, days=180):
     """Pre-fetch paginated dispatch history for every party. This is the
     other heavy call (50 pages × 10k limit) that caused first-request
-    hangs.
+    hangs. Scheduler job 'party-dispatch-warm'.
     """
-    global _DISP_WARM_LOCK
-    if _DISP_WARM_LOCK or not parties:
+    if not parties:
         return
-    _DISP_WARM_LOCK = True
     try:
         from concurrent.futures import ThreadPoolExecutor, as_completed
         from app.utils import disk_cache as _dc
@@ -4308,8 +4200,6 @@ def _warm_party_dispatch_caches_bg(parties, days=180):
             print(f"[warm-disp] DONE: warmed {warmed}/{len(parties)} parties")
     except Exception as e:
         print(f"[warm-disp] failed: {e}")
-    finally:
-        _DISP_WARM_LOCK = False
 
 
 def _load_parties_pdi_disk_cache():
@@ -4325,19 +4215,18 @@ def _load_parties_pdi_disk_cache():
 
 
 def _save_parties_pdi_disk_cache(data, ts):
+    tmp = f'{_PARTIES_PDI_CACHE_FILE}.{os.getpid()}.tmp'
     try:
-        with open(_PARTIES_PDI_CACHE_FILE, 'w', encoding='utf-8') as f:
+        # Atomic: the other process (web / worker.py) may be reading it
+        with open(tmp, 'w', encoding='utf-8') as f:
             json.dump({'data': data, 'timestamp': ts}, f)
+        os.replace(tmp, _PARTIES_PDI_CACHE_FILE)
     except Exception as e:
         print(f"[parties-with-pdis] disk cache write failed: {e}")
 
 
 def _refresh_parties_with_pdis_bg():
-    """Background refresh: fetch full list + probe each party's PDI count."""
-    global _PARTIES_PDI_REFRESH_LOCK
-    if _PARTIES_PDI_REFRESH_LOCK:
-        return
-    _PARTIES_PDI_REFRESH_LOCK = True
+    """Background refresh: fetch full list + probe each party's PDI count (scheduler job 'parties-with-pdis')."""
     try:
         from concurrent.futures import ThreadPoolExecutor, as_completed
         now = time.time()
@@ -4362,6 +4251,7 @@ def _refresh_parties_with_pdis_bg():
                         all_parties.append({"id": pid, "companyName": name})
                 SALES_PARTY_CACHE['data'] = all_parties
                 SALES_PARTY_CACHE['timestamp'] = now
+                SALES_PARTY_CACHE.flush()
             except Exception as e:
                 print(f"[parties-with-pdis] sales-parties fetch failed: {e}")
                 return
@@ -4410,22 +4300,13 @@ def _refresh_parties_with_pdis_bg():
         # nginx 502 cascades). Only warm parties that actually have PDIs
         # (~33 parties) — NOT the full 600+ sales-party list.
         try:
-            import threading as _th
             warm_targets = results  # only PDI-having parties
-            _th.Thread(
-                target=_warm_party_packing_caches_bg,
-                args=(warm_targets,), daemon=True
-            ).start()
-            _th.Thread(
-                target=_warm_party_dispatch_caches_bg,
-                args=(warm_targets,), daemon=True
-            ).start()
+            scheduler.run_now('party-packing-warm', warm_targets)
+            scheduler.run_now('party-dispatch-warm', warm_targets)
         except Exception as e:
             print(f"[parties-with-pdis] warm kick-off failed: {e}")
     except Exception as e:
         print(f"[parties-with-pdis] bg refresh failed: {e}")
-    finally:
-        _PARTIES_PDI_REFRESH_LOCK = False
 
 
 @ftr_bp.route('/parties-with-pdis', methods=['GET'])
@@ -4443,7 +4324,6 @@ def parties_with_pdis():
     Response: { success, count, parties, cached, stale, age_seconds }
     """
     try:
-        import threading
         force = request.args.get('force_refresh', '').lower() == 'true'
         now = time.time()
 
@@ -4451,10 +4331,16 @@ def parties_with_pdis():
             '_cache', {'data': None, 'timestamp': 0}
         )
 
-        # Hydrate memory cache from disk once per process
-        if cache['data'] is None:
+        # Hydrate memory cache from disk on first use, and again whenever the
+        # file changes (worker.py refreshes it when SCHEDULER_MODE=web)
+        try:
+            mtime = os.path.getmtime(_PARTIES_PDI_CACHE_FILE)
+        except OSError:
+            mtime = None
+        if mtime is not None and mtime != cache.get('mtime'):
             disk = _load_parties_pdi_disk_cache()
-            if disk:
+            cache['mtime'] = mtime
+            if disk and float(disk.get('timestamp') or 0) >= (cache['timestamp'] or 0):
                 cache['data'] = disk.get('data') or []
                 cache['timestamp'] = float(disk.get('timestamp') or 0)
 
@@ -4473,7 +4359,7 @@ def parties_with_pdis():
 
         # 2. Stale-but-usable cache -> serve immediately + refresh in bg
         if not force and cache['data'] and age < _PARTIES_PDI_CACHE_MAX_AGE:
-            threading.Thread(target=_refresh_parties_with_pdis_bg, daemon=True).start()
+            scheduler.run_now('parties-with-pdis')  # no-op if already refreshing
             return jsonify({
                 "success": True,
                 "cached": True,
@@ -4483,8 +4369,8 @@ def parties_with_pdis():
                 "parties": cache['data']
             })
 
-        # 3. Cold start / forced refresh -> sync refresh (blocking)
-        _refresh_parties_with_pdis_bg()
+        # 3. Cold start / forced refresh -> sync refresh (blocking; joins a running one)
+        scheduler.run_now('parties-with-pdis', wait=True, timeout=300)
         data = cache.get('data') or []
         return jsonify({
             "success": True,
@@ -4762,6 +4648,7 @@ def get_packing_count_by_party(party_id):
             parties.sort(key=lambda x: x['companyName'].lower())
             SALES_PARTY_CACHE['data'] = parties
             SALES_PARTY_CACHE['timestamp'] = time.time()
+            SALES_PARTY_CACHE.flush()
 
         selected = None
         for party in parties:
@@ -4801,52 +4688,6 @@ def _count_serial_tokens(value):
     return len(normalized)
 
 
-def _ensure_party_workspace_table(cursor):
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS party_reallocation_workspace (
-            id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
-            party_id VARCHAR(64) NOT NULL,
-            party_name VARCHAR(255) NOT NULL,
-            pdi_serials LONGTEXT NULL,
-            running_order_serials LONGTEXT NULL,
-            barcode_serials LONGTEXT NULL,
-            rejection_serials LONGTEXT NULL,
-            smt_module_serials LONGTEXT NULL,
-            pdi_number VARCHAR(120) NULL,
-            running_order_number VARCHAR(120) NULL,
-            rfid_data_json LONGTEXT NULL,
-            rfid_row_count INT NOT NULL DEFAULT 0,
-            rfid_uploaded_at DATETIME NULL,
-            pdi_count INT NOT NULL DEFAULT 0,
-            running_order_count INT NOT NULL DEFAULT 0,
-            barcode_count INT NOT NULL DEFAULT 0,
-            rejection_count INT NOT NULL DEFAULT 0,
-            smt_module_count INT NOT NULL DEFAULT 0,
-            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-            PRIMARY KEY (id),
-            UNIQUE KEY uq_party_reallocation_workspace_party_id (party_id),
-            KEY idx_party_reallocation_workspace_updated_at (updated_at)
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-        """
-    )
-
-    # Backward-compatible column adds for already-created tables.
-    cursor.execute("SHOW COLUMNS FROM party_reallocation_workspace")
-    existing = {row['Field'] for row in (cursor.fetchall() or [])}
-    column_adds = {
-        'pdi_number': "ALTER TABLE party_reallocation_workspace ADD COLUMN pdi_number VARCHAR(120) NULL",
-        'running_order_number': "ALTER TABLE party_reallocation_workspace ADD COLUMN running_order_number VARCHAR(120) NULL",
-        'rfid_data_json': "ALTER TABLE party_reallocation_workspace ADD COLUMN rfid_data_json LONGTEXT NULL",
-        'rfid_row_count': "ALTER TABLE party_reallocation_workspace ADD COLUMN rfid_row_count INT NOT NULL DEFAULT 0",
-        'rfid_uploaded_at': "ALTER TABLE party_reallocation_workspace ADD COLUMN rfid_uploaded_at DATETIME NULL"
-    }
-    for col, ddl in column_adds.items():
-        if col not in existing:
-            cursor.execute(ddl)
-
-
 def _normalize_rfid_col(name):
     return re.sub(r'[^a-z0-9]', '', str(name or '').strip().lower())
 
@@ -4859,6 +4700,7 @@ def _parse_rfid_excel(file_storage):
     ]
     canonical_map = {_normalize_rfid_col(c): c for c in required_cols}
 
+    import pandas as pd
     df = pd.read_excel(file_storage)
     df.columns = [str(c).strip() for c in df.columns]
     input_map = {_normalize_rfid_col(c): c for c in df.columns}
@@ -4901,39 +4743,6 @@ def _normalize_pdi_key(value):
     return (value or '').strip()
 
 
-def _ensure_party_workspace_pdi_table(cursor):
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS party_reallocation_workspace_pdi (
-            id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
-            party_id VARCHAR(64) NOT NULL,
-            party_name VARCHAR(255) NOT NULL,
-            pdi_key VARCHAR(120) NOT NULL,
-            pdi_number VARCHAR(120) NULL,
-            running_order_number VARCHAR(120) NULL,
-            pdi_serials LONGTEXT NULL,
-            running_order_serials LONGTEXT NULL,
-            barcode_serials LONGTEXT NULL,
-            rejection_serials LONGTEXT NULL,
-            smt_module_serials LONGTEXT NULL,
-            rfid_data_json LONGTEXT NULL,
-            rfid_row_count INT NOT NULL DEFAULT 0,
-            rfid_uploaded_at DATETIME NULL,
-            pdi_count INT NOT NULL DEFAULT 0,
-            running_order_count INT NOT NULL DEFAULT 0,
-            barcode_count INT NOT NULL DEFAULT 0,
-            rejection_count INT NOT NULL DEFAULT 0,
-            smt_module_count INT NOT NULL DEFAULT 0,
-            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-            PRIMARY KEY (id),
-            UNIQUE KEY uq_party_reallocation_workspace_pdi (party_id, pdi_key),
-            KEY idx_party_reallocation_workspace_pdi_updated_at (updated_at)
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-        """
-    )
-
-
 def _workspace_pdi_row_to_payload(row):
     if not row:
         return None
@@ -4967,7 +4776,7 @@ def list_party_workspace_pdi_cards(party_id):
         conn = get_db_connection()
         not_found = False
         with conn.cursor() as cursor:
-            _ensure_party_workspace_pdi_table(cursor)
+            schema_registry.ensure('party_reallocation_workspace_pdi')
             cursor.execute(
                 """
                 SELECT
@@ -5031,7 +4840,7 @@ def get_party_workspace_pdi_card(party_id, pdi_key):
 
         conn = get_db_connection()
         with conn.cursor() as cursor:
-            _ensure_party_workspace_pdi_table(cursor)
+            schema_registry.ensure('party_reallocation_workspace_pdi')
             cursor.execute(
                 """
                 SELECT
@@ -5130,7 +4939,7 @@ def save_party_workspace_pdi_card(party_id, pdi_key):
 
         conn = get_db_connection()
         with conn.cursor() as cursor:
-            _ensure_party_workspace_pdi_table(cursor)
+            schema_registry.ensure('party_reallocation_workspace_pdi')
             cursor.execute(
                 """
                 INSERT INTO party_reallocation_workspace_pdi (
@@ -5240,7 +5049,7 @@ def upload_party_workspace_pdi_rfid_excel(party_id, pdi_key):
 
         conn = get_db_connection()
         with conn.cursor() as cursor:
-            _ensure_party_workspace_pdi_table(cursor)
+            schema_registry.ensure('party_reallocation_workspace_pdi')
             cursor.execute(
                 """
                 UPDATE party_reallocation_workspace_pdi
@@ -5293,7 +5102,7 @@ def get_party_workspace(party_id):
     try:
         conn = get_db_connection()
         with conn.cursor() as cursor:
-            _ensure_party_workspace_table(cursor)
+            schema_registry.ensure('party_reallocation_workspace')
             cursor.execute(
                 """
                 SELECT
@@ -5405,7 +5214,7 @@ def save_party_workspace(party_id):
 
         conn = get_db_connection()
         with conn.cursor() as cursor:
-            _ensure_party_workspace_table(cursor)
+            schema_registry.ensure('party_reallocation_workspace')
             cursor.execute(
                 """
                 INSERT INTO party_reallocation_workspace (
@@ -5508,7 +5317,7 @@ def upload_party_workspace_rfid_excel(party_id):
 
         conn = get_db_connection()
         with conn.cursor() as cursor:
-            _ensure_party_workspace_table(cursor)
+            schema_registry.ensure('party_reallocation_workspace')
             cursor.execute(
                 """
                 UPDATE party_reallocation_workspace
@@ -5548,7 +5357,7 @@ def get_party_workspace_summaries():
     try:
         conn = get_db_connection()
         with conn.cursor() as cursor:
-            _ensure_party_workspace_table(cursor)
+            schema_registry.ensure('party_reallocation_workspace')
             cursor.execute(
                 """
                 SELECT
@@ -5615,6 +5424,9 @@ def bulk_generate_from_excel():
       - wattage: Module wattage (e.g. '630')
       - module_area: Module area in m² (default 2.7)
       - download_type: 'zip' (default) or 'merged'
+      - iv_curve: 'per_serial' (default) draws each module's own curve from
+        its Voc/Isc/Vpm/Ipm/Rs/Rsh; 'vector' does the same but embeds the
+        lines as PDF paths; 'static' reuses <wattage>.png for all
     """
     import zipfile
     import io as _io
@@ -5636,6 +5448,7 @@ def bulk_generate_from_excel():
         wattage = str(request.form.get('wattage', '')).strip()
         module_area = float(request.form.get('module_area', 2.7))
         download_type = request.form.get('download_type', 'zip')
+        iv_curve_mode = request.form.get('iv_curve', 'per_serial')
 
         # Paths
         backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
@@ -5650,6 +5463,9 @@ def bulk_generate_from_excel():
                 graph_image_path = img
 
         # ----- Read Excel (all columns as text to preserve formatting) -----
+        from app.services.ftr_pdf_generator import create_ftr_report
+        from app.services.iv_curve_engine import IVCurveBatch
+        from app.services.iv_curve_renderer import render_curve_png, curve_vector_paths
         df = pd.read_excel(file, dtype=str).fillna('')
 
         # Build normalised column name lookup
@@ -5855,7 +5671,11 @@ def bulk_generate_from_excel():
             }
 
             try:
-                pdf_bytes = create_ftr_report(template_path, test_data, graph_image_path)
+                curve = curve_batch.curve(serial) if curve_batch is not None else None
+                graph_image = None
+                if curve is not None:
+                    graph_image = curve_vector_paths(curve) if iv_curve_mode == 'vector' else render_curve_png(curve)
+                pdf_bytes = create_ftr_report(template_path, test_data, graph_image_path, graph_image)
                 # Set PDF metadata to Excel date/time
                 pdf_bytes = set_pdf_meta(pdf_bytes, dt_obj)
                 safe_name = serial.replace('/', '_').replace('\\', '_').replace(':', '_')
@@ -5864,9 +5684,27 @@ def bulk_generate_from_excel():
                 print(f'  ERROR [{serial}]: {e}')
                 return None
 
+        # ----- Synthesise every module's IV curve in one vectorised pass -----
+        curve_batch = None
+        if iv_curve_mode != 'static':
+            curve_batch = IVCurveBatch.from_rows(
+                {
+                    'serial': col_val(row, 'serialnumber', 'id', 'serial_number', 'barcode', 'sr_no', 'module_id'),
+                    'voc': to_float(col_val(row, 'voc')),
+                    'isc': to_float(col_val(row, 'isc')),
+                    'vpm': to_float(col_val(row, 'vpm', 'v_pm')),
+                    'ipm': to_float(col_val(row, 'ipm', 'i_pm')),
+                    'rs': to_float(col_val(row, 'rs')),
+                    'rsh': to_float(col_val(row, 'rsh')),
+                    'pmax': to_float(col_val(row, 'pmax', 'p_max')),
+                }
+                for _, row in df.iterrows()
+            )
+
         # ----- Process all rows with thread pool -----
         total = len(df)
-        print(f'[bulk-generate] {total} modules, wattage={wattage}, graph={graph_image_path is not None}')
+        print(f'[bulk-generate] {total} modules, wattage={wattage}, graph={graph_image_path is not None}, '
+              f'per-serial curves={len(curve_batch) if curve_batch is not None else 0}')
 
         results = []
         BATCH_PRINT = max(1, min(total // 20, 5000))
@@ -5923,28 +5761,14 @@ def bulk_generate_from_excel():
 
 
 # ------------------------------------------------------------
-# Startup pre-warm: kick off the cache warmer ~5 sec after import so
-# the server is fully up first. Eliminates cold-start 502 cascades.
+# parties-with-pdis refresh + party packing/dispatch pre-warm as
+# scheduler jobs. The periodic refresh (which then re-warms the party
+# caches) starts only after the server is ready, so it no longer races
+# start-up - the old import-time warm thread crash-looped (504 restarts,
+# uptime 8s). Still opt-in: ENABLE_STARTUP_WARM=1.
 # ------------------------------------------------------------
-def _startup_warm_caches():
-    import threading as _th, time as _t
-    _t.sleep(5)
-    try:
-        _refresh_parties_with_pdis_bg()
-    except Exception as e:
-        print(f"[startup-warm] failed: {e}")
-
-
-# Startup warmer DISABLED — was causing crash-loop (504 restarts, uptime 8s).
-# Re-enable by setting env var ENABLE_STARTUP_WARM=1
-import os as _os_warm
-if _os_warm.environ.get('ENABLE_STARTUP_WARM', '').lower() in ('1', 'true', 'yes'):
-    try:
-        import threading as _th
-        _th.Thread(target=_startup_warm_caches, daemon=True).start()
-        print("[startup-warm] scheduled (T+5s)")
-    except Exception as _e:
-        print(f"[startup-warm] could not schedule: {_e}")
-else:
-    print("[startup-warm] DISABLED (set ENABLE_STARTUP_WARM=1 to enable)")
-
+scheduler.add_job('parties-with-pdis', _refresh_parties_with_pdis_bg,
+                  every=_PARTIES_PDI_CACHE_TTL, jitter=60, start_delay=30,
+                  enabled=os.environ.get('ENABLE_STARTUP_WARM', '').lower() in ('1', 'true', 'yes'))
+scheduler.add_job('party-packing-warm', _warm_party_packing_caches_bg)
+scheduler.add_job('party-dispatch-warm', _warm_party_dispatch_caches_bg)
@@ -6,12 +6,12 @@ from werkzeug.utils import secure_filename
 import os
 import json
 import zipfile
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from app.services.form_generator import IPQCFormGenerator
 from app.services.pdf_generator import IPQCPDFGenerator, SerialNumberGenerator
 from app.services.excel_generator import generate_ipqc_excel
-from app.services.ipqc_checksheet_generator import generate_ipqc_checksheet
+from app.services.ipqc_checksheet_generator import generate_ipqc_checksheet, generate_ipqc_checksheet_batch
 from app.models.ipqc_data import BOMData
 
 ipqc_bp = Blueprint('ipqc', __name__)
@@ -581,6 +581,80 @@ def auto_checksheet():
         }), 500
 
 
+@ipqc_bp.route('/auto-checksheet-batch', methods=['POST', 'GET'])
+def auto_checksheet_batch():
+    """
+    Generate IPQC Check Sheets for a range of days in one file.
+
+    GET:  /api/ipqc/auto-checksheet-batch?month=2026-03&output=zip
+    POST: /api/ipqc/auto-checksheet-batch  (JSON body)
+
+    Parameters:
+      - month             : str  (YYYY-MM, whole month)   -- or --
+      - start_date/end_date : str (YYYY-MM-DD, inclusive, max 62 days)
+      - shifts            : str/list (default: Day,Night)
+      - output            : str  (workbook = one sheet per date/shift, zip = one file each;
+                                  default: workbook)
+      - plus the same optional fields as /auto-checksheet
+
+    Returns: .xlsx or .zip file download
+    """
+    try:
+        if request.method == 'GET':
+            data = request.args.to_dict()
+        else:
+            data = request.get_json(silent=True) or {}
+
+        if data.get('month'):
+            first = datetime.strptime(data['month'], '%Y-%m')
+            last = (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        else:
+            first = datetime.strptime(data.get('start_date') or datetime.now().strftime('%Y-%m-%d'), '%Y-%m-%d')
+            last = datetime.strptime(data.get('end_date') or first.strftime('%Y-%m-%d'), '%Y-%m-%d')
+        days = (last - first).days + 1
+        if days < 1 or days > 62:
+            return jsonify({"error": "Date range must be 1-62 days"}), 400
+        dates = [(first + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
+
+        shifts = data.get('shifts') or 'Day,Night'
+        if isinstance(shifts, str):
+            shifts = [s.strip() for s in shifts.split(',') if s.strip()]
+        output = 'zip' if data.get('output') == 'zip' else 'workbook'
+
+        file_path = generate_ipqc_checksheet_batch(
+            dates,
+            shifts=shifts,
+            output=output,
+            po_number=data.get('po_number', ''),
+            cell_manufacturer=data.get('cell_manufacturer', 'Solar Space'),
+            cell_efficiency=float(data.get('cell_efficiency', 25.7)),
+            jb_cable_length=int(data.get('jb_cable_length', 1200)),
+            golden_module_number=data.get('golden_module_number', 'GM-2024-001'),
+            serial_prefix=data.get('serial_prefix', 'GS04875KG302250'),
+            serial_start=int(data.get('serial_start', 1)),
+            checked_by=data.get('checked_by', ''),
+            reviewed_by=data.get('reviewed_by', ''),
+        )
+
+        response = send_file(
+            file_path,
+            mimetype='application/zip' if output == 'zip' else
+                     'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name=os.path.basename(file_path)
+        )
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        return response
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({
+            "error": str(e),
+            "message": "Failed to generate IPQC checksheets"
+        }), 500
+
+
 @ipqc_bp.route('/template-info', methods=['GET'])
 def template_info():
     """Get information about IPQC template"""
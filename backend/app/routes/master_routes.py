@@ -84,12 +84,6 @@ def upload_excel_data():
     Column C-U: Pmax, Isc, Voc, Ipm, Vpm, FF, Rs, Rsh, Eff, T_Object, T_Target, Irr_Target, Class, Sweep_Time, Irr_Monitor, Isc_Monitor, T_Monitor, Cell_Temp, T_Ambient, Binning
     """
     try:
-        # Create tables if they don't exist
-        try:
-            db.create_all()
-        except Exception as create_err:
-            print(f"Warning: Could not create tables: {create_err}")
-        
         print(f"📤 Upload Request - Files: {list(request.files.keys())}")
         print(f"📤 Upload Request - Form Data: {dict(request.form)}")
         
@@ -752,6 +746,20 @@ def upload_delivered_ftr():
         import traceback
         return jsonify({'error': str(e), 'traceback': traceback.format_exc()}), 500
 
+FTR_EXPORT_HEADERS = ['SN', 'ID', 'Pmax', 'Isc', 'Voc', 'Ipm', 'Vpm', 'FF', 'Rs', 'Eff', 'Binning']
+
+
+def _ftr_export_rows(query):
+    """Yield FTR export rows, fetching modules from MySQL in batches."""
+    columns = query.with_entities(
+        MasterModule.serial_number, MasterModule.pmax, MasterModule.isc, MasterModule.voc,
+        MasterModule.ipm, MasterModule.vpm, MasterModule.ff, MasterModule.rs,
+        MasterModule.eff, MasterModule.binning
+    ).yield_per(5000)
+    for sn, row in enumerate(columns, 1):
+        yield [sn, *row]
+
+
 @master_bp.route('/download-ftr-by-quantity', methods=['POST'])
 def download_ftr_by_quantity():
     """
@@ -765,10 +773,8 @@ def download_ftr_by_quantity():
     }
     """
     try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, Alignment, PatternFill
-        import tempfile
-        from flask import send_file
+        from openpyxl.styles import Font, Alignment
+        from app.utils.excel_export import new_workbook, write_sheet, send_workbook
         
         data = request.json
         order_id = data.get('order_id')
@@ -784,81 +790,37 @@ def download_ftr_by_quantity():
             return jsonify({'error': 'Order not found'}), 404
         
         # Get modules starting from start_serial, only non-rejected and non-delivered, limit by quantity
-        modules = MasterModule.query.filter(
+        query = MasterModule.query.filter(
             MasterModule.order_id == order_id,
             MasterModule.is_rejected == False,
             MasterModule.is_delivered == False,
             MasterModule.serial_number >= start_serial
-        ).order_by(MasterModule.serial_number).limit(quantity).all()
+        )
+        available = min(query.count(), quantity)
         
-        if not modules:
+        if not available:
             return jsonify({'error': 'No modules found starting from given serial'}), 404
         
-        if len(modules) < quantity:
+        if available < quantity:
             return jsonify({
-                'error': f'Only {len(modules)} available modules (non-rejected & non-delivered) starting from {start_serial}. Requested: {quantity}'
+                'error': f'Only {available} available modules (non-rejected & non-delivered) starting from {start_serial}. Requested: {quantity}'
             }), 400
         
-        # Create Excel workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = 'FTR Data'
-        
-        # Header style
-        header_font = Font(bold=True, size=11)
-        header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-        header_alignment = Alignment(horizontal='center', vertical='center')
-        
-        # Headers - Only required columns
-        headers = ['SN', 'ID', 'Pmax', 'Isc', 'Voc', 'Ipm', 'Vpm', 'FF', 'Rs', 'Eff', 'Binning']
-        
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-        
-        # Data rows
-        for row_num, module in enumerate(modules, 2):
-            ws.cell(row=row_num, column=1).value = row_num - 1  # SN
-            ws.cell(row=row_num, column=2).value = module.serial_number  # ID
-            ws.cell(row=row_num, column=3).value = module.pmax
-            ws.cell(row=row_num, column=4).value = module.isc
-            ws.cell(row=row_num, column=5).value = module.voc
-            ws.cell(row=row_num, column=6).value = module.ipm
-            ws.cell(row=row_num, column=7).value = module.vpm
-            ws.cell(row=row_num, column=8).value = module.ff
-            ws.cell(row=row_num, column=9).value = module.rs
-            ws.cell(row=row_num, column=10).value = module.eff
-            ws.cell(row=row_num, column=11).value = module.binning
-        
-        # Auto-adjust column widths
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 20)
-            ws.column_dimensions[column].width = adjusted_width
-        
-        # Save to temp file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
-        wb.save(temp_file.name)
-        temp_file.close()
+        modules = query.order_by(MasterModule.serial_number).limit(quantity)
+        
+        # Stream rows straight from the DB into a write-only sheet
+        wb = new_workbook()
+        write_sheet(
+            wb, 'FTR Data', FTR_EXPORT_HEADERS,
+            _ftr_export_rows(modules),
+            max_width=20,
+            header_font=Font(bold=True, size=11),
+            header_alignment=Alignment(horizontal='center', vertical='center'),
+        )
         
         filename = f'FTR_Data_{order.order_number}_{quantity}_modules.xlsx'
         
-        return send_file(
-            temp_file.name,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
-        )
+        return send_workbook(wb, filename)
         
     except Exception as e:
         import traceback
@@ -881,10 +843,8 @@ def download_ftr_by_serials():
     }
     """
     try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, Alignment, PatternFill
-        import tempfile
-        from flask import send_file
+        from openpyxl.styles import Font, Alignment
+        from app.utils.excel_export import new_workbook, write_sheet, send_workbook
         
         data = request.json
         order_id = data.get('order_id')
@@ -905,88 +865,44 @@ def download_ftr_by_serials():
             start_serial = serial_range.get('start')
             end_serial = serial_range.get('end')
             
-            modules = MasterModule.query.filter(
+            query = MasterModule.query.filter(
                 MasterModule.order_id == order_id,
                 MasterModule.is_rejected == False,
                 MasterModule.is_delivered == False,
                 MasterModule.serial_number >= start_serial,
                 MasterModule.serial_number <= end_serial
-            ).order_by(MasterModule.serial_number).all()
+            )
         elif serial_numbers:
             # Specific serials - ONLY NON-REJECTED
-            modules = MasterModule.query.filter(
+            query = MasterModule.query.filter(
                 MasterModule.order_id == order_id,
                 MasterModule.is_rejected == False,
                 MasterModule.is_delivered == False,
                 MasterModule.serial_number.in_(serial_numbers)
-            ).order_by(MasterModule.serial_number).all()
+            )
         else:
             return jsonify({'error': 'serial_numbers or serial_range required'}), 400
         
-        if not modules:
+        module_count = query.count()
+        if not module_count:
             return jsonify({'error': 'No modules found for given serials'}), 404
         
-        # Create Excel workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = 'FTR Data'
-        
-        # Header style
-        header_font = Font(bold=True, size=11)
-        header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-        header_alignment = Alignment(horizontal='center', vertical='center')
-        
-        # Headers - Only required columns
-        headers = ['SN', 'ID', 'Pmax', 'Isc', 'Voc', 'Ipm', 'Vpm', 'FF', 'Rs', 'Eff', 'Binning']
-        
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-        
-        # Data rows - Only required columns
-        for row_num, module in enumerate(modules, 2):
-            ws.cell(row=row_num, column=1).value = row_num - 1  # SN (serial count starting from 1)
-            ws.cell(row=row_num, column=2).value = module.serial_number  # ID
-            ws.cell(row=row_num, column=3).value = module.pmax
-            ws.cell(row=row_num, column=4).value = module.isc
-            ws.cell(row=row_num, column=5).value = module.voc
-            ws.cell(row=row_num, column=6).value = module.ipm
-            ws.cell(row=row_num, column=7).value = module.vpm
-            ws.cell(row=row_num, column=8).value = module.ff
-            ws.cell(row=row_num, column=9).value = module.rs
-            ws.cell(row=row_num, column=10).value = module.eff
-            ws.cell(row=row_num, column=11).value = module.binning
-        
-        # Auto-adjust column widths
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 20)
-            ws.column_dimensions[column].width = adjusted_width
-        
-        # Save to temp file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
-        wb.save(temp_file.name)
-        temp_file.close()
-        
-        filename = f'FTR_Data_{order.order_number}_{len(modules)}_modules.xlsx'
-        
-        return send_file(
-            temp_file.name,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
+        modules = query.order_by(MasterModule.serial_number)
+        
+        # Stream rows straight from the DB into a write-only sheet
+        wb = new_workbook()
+        write_sheet(
+            wb, 'FTR Data', FTR_EXPORT_HEADERS,
+            _ftr_export_rows(modules),
+            max_width=20,
+            header_font=Font(bold=True, size=11),
+            header_alignment=Alignment(horizontal='center', vertical='center'),
         )
         
+        filename = f'FTR_Data_{order.order_number}_{module_count}_modules.xlsx'
+        
+        return send_workbook(wb, filename)
+        
     except Exception as e:
         import traceback
         return jsonify({'error': str(e), 'traceback': traceback.format_exc()}), 500
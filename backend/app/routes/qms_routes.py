@@ -1,10 +1,12 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, current_app
 from app.models.database import db
 from app.models.qms_models import QMSDocument, QMSPartnerAudit, QMSActionPlan, QMSAuditLog, QMSDocumentVersion
 from datetime import datetime
 from werkzeug.utils import secure_filename
+from sqlalchemy.orm import defer
 import os
 import uuid
+import base64
 import logging
 import json
 
@@ -260,6 +262,98 @@ def generate_doc_number(category):
     return f'GSPL/QMS/{prefix}/{next_num:03d}'
 
 
+def _update_search_index(doc=None, removed_id=None):
+    """
+    Re-post one document in the QMS search index (or drop it after a
+    delete). Runs after the route's own commit and never fails the request;
+    the index's periodic sync picks up anything missed here.
+    """
+    try:
+        from app.services.qms_search_index import index_document, remove_document
+        if doc is not None:
+            index_document(doc)
+        else:
+            remove_document(removed_id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f'Search index update failed: {e}')
+
+
+def _extract_text(doc, filepath):
+    """
+    Text for a document's newly attached file, after the route's commit.
+    Content extracted before (re-upload, revert) is taken from the
+    content-hash cache right away; anything else is queued on the
+    background extraction pool, which saves the text and re-indexes the
+    document when it finishes. Never fails the request.
+    """
+    try:
+        from app.services import extraction_queue
+        text = extraction_queue.cached_text(filepath)
+        if text is not None:
+            doc.extracted_text = text or None
+            doc.text_extracted_at = datetime.utcnow() if text else None
+            db.session.commit()
+            return {'state': 'cached', 'job_id': None}
+        job_id = extraction_queue.submit(current_app._get_current_object(), doc.id,
+                                         doc.file_path, filepath, title=doc.title)
+        return {'state': 'queued', 'job_id': job_id}
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f'Text extraction could not be started: {e}')
+        return {'state': 'failed', 'job_id': None}
+
+
+_LIST_PAGE_SIZE = int(os.environ.get('QMS_LIST_PAGE_SIZE', '100'))
+_LIST_PAGE_MAX = 500
+
+
+def _encode_cursor(doc):
+    raw = f"{doc.updated_at.isoformat()}|{doc.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor):
+    """(updated_at, id) of the last row of the previous page; ValueError if malformed"""
+    try:
+        ts, doc_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+        return datetime.fromisoformat(ts), int(doc_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def _document_stats():
+    """
+    Status totals, per-category counts and departments, rolled up from one
+    GROUP BY (category, status, department) instead of a count() each.
+    """
+    rows = db.session.query(
+        QMSDocument.category, QMSDocument.status, QMSDocument.department, db.func.count(QMSDocument.id)
+    ).group_by(QMSDocument.category, QMSDocument.status, QMSDocument.department).all()
+    
+    total = 0
+    by_status = {}
+    by_category = {}
+    departments = set()
+    for category, status, department, count in rows:
+        total += count
+        by_status[status] = by_status.get(status, 0) + count
+        by_category[category] = by_category.get(category, 0) + count
+        if department:
+            departments.add(department)
+    
+    stats = {
+        'total': total,
+        'approved': by_status.get('Approved', 0),
+        'draft': by_status.get('Draft', 0),
+        'under_review': by_status.get('Under Review', 0),
+        'obsolete': by_status.get('Obsolete', 0)
+    }
+    category_counts = {cat: by_category.get(cat, 0) for cat in QMS_CATEGORIES}
+    return stats, category_counts, sorted(departments)
+
+
 # ═══════════════════════════════════════════════
 # API Routes
 # ═══════════════════════════════════════════════
@@ -280,59 +374,73 @@ def get_doc_number():
 
 @qms_bp.route('/documents', methods=['GET'])
 def get_documents():
-    """Get all documents with filters"""
+    """
+    Documents with filters, newest first, one page at a time.
+    ?limit= sets the page size; pass the returned next_cursor as ?cursor=
+    for the following page.
+    """
     try:
         category = request.args.get('category', 'all')
         status = request.args.get('status', 'all')
         search = request.args.get('search', '')
         department = request.args.get('department', 'all')
+        cursor = request.args.get('cursor')
+        try:
+            limit = min(max(int(request.args.get('limit', _LIST_PAGE_SIZE)), 1), _LIST_PAGE_MAX)
+        except ValueError:
+            return jsonify({'error': 'limit must be a number'}), 400
         
-        query = QMSDocument.query
+        # Text length comes from SQL; the extracted text itself is never loaded
+        text_length = db.func.coalesce(db.func.length(QMSDocument.extracted_text), 0)
+        query = db.session.query(QMSDocument, text_length).options(defer(QMSDocument.extracted_text))
         
         if category != 'all':
-            query = query.filter_by(category=category)
+            query = query.filter(QMSDocument.category == category)
         if status != 'all':
-            query = query.filter_by(status=status)
+            query = query.filter(QMSDocument.status == status)
         if department != 'all':
-            query = query.filter_by(department=department)
+            query = query.filter(QMSDocument.department == department)
         if search:
-            search_term = f'%{search}%'
-            query = query.filter(
-                db.or_(
-                    QMSDocument.title.ilike(search_term),
-                    QMSDocument.doc_number.ilike(search_term),
-                    QMSDocument.description.ilike(search_term),
-                    QMSDocument.tags.ilike(search_term),
-                    QMSDocument.prepared_by.ilike(search_term)
-                )
-            )
-        
-        documents = query.order_by(QMSDocument.updated_at.desc()).all()
-        
-        # Stats
-        total = QMSDocument.query.count()
-        approved = QMSDocument.query.filter_by(status='Approved').count()
-        draft = QMSDocument.query.filter_by(status='Draft').count()
-        under_review = QMSDocument.query.filter_by(status='Under Review').count()
-        obsolete = QMSDocument.query.filter_by(status='Obsolete').count()
-        
-        # Category counts
-        category_counts = {}
-        for cat in QMS_CATEGORIES:
-            category_counts[cat] = QMSDocument.query.filter_by(category=cat).count()
+            # Document content (or title + description) through the search
+            # index, plus a doc_number prefix on its unique index; no
+            # leading-wildcard LIKE scans
+            conditions = [QMSDocument.doc_number.startswith(search.strip(), autoescape=True)]
+            try:
+                from app.services.qms_search_index import sync_index, matching_document_ids
+                sync_index()
+                ids = matching_document_ids(search)
+                if ids:
+                    conditions.append(QMSDocument.id.in_(ids))
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f'Search index unavailable for list filter: {e}')
+            query = query.filter(db.or_(*conditions))
+        
+        if cursor:
+            try:
+                last_updated, last_id = _decode_cursor(cursor)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            query = query.filter(db.or_(
+                QMSDocument.updated_at < last_updated,
+                db.and_(QMSDocument.updated_at == last_updated, QMSDocument.id < last_id)
+            ))
+        
+        rows = query.order_by(QMSDocument.updated_at.desc(), QMSDocument.id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        stats, category_counts, _ = _document_stats()
         
         return jsonify({
-            'documents': [d.to_dict() for d in documents],
-            'stats': {
-                'total': total,
-                'approved': approved,
-                'draft': draft,
-                'under_review': under_review,
-                'obsolete': obsolete
-            },
-            'category_counts': category_counts
+            'documents': [doc.to_dict(text_length=length) for doc, length in rows],
+            'stats': stats,
+            'category_counts': category_counts,
+            'next_cursor': _encode_cursor(rows[-1][0]) if has_more else None,
+            'has_more': has_more
         })
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
@@ -374,6 +482,7 @@ def create_document():
         )
         
         # Handle file upload
+        filepath = None
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
             unique_name = f"{uuid.uuid4().hex}_{filename}"
@@ -385,16 +494,6 @@ def create_document():
             doc.file_name = filename
             doc.file_size = os.path.getsize(filepath)
             doc.file_type = filename.rsplit('.', 1)[1].lower()
-            
-            # Auto-extract text for AI search
-            try:
-                from app.services.document_search import extract_text_from_file
-                extracted = extract_text_from_file(filepath)
-                if extracted:
-                    doc.extracted_text = extracted
-                    doc.text_extracted_at = datetime.utcnow()
-            except Exception as ex:
-                logger.warning(f'Text extraction failed: {ex}')
         
         db.session.add(doc)
         db.session.commit()
@@ -409,7 +508,12 @@ def create_document():
         db.session.add(log)
         db.session.commit()
         
-        return jsonify({'message': 'Document created successfully', 'document': doc.to_dict()}), 201
+        # Text extraction runs in the background; the index is updated again when it lands
+        extraction = _extract_text(doc, filepath) if filepath else None
+        _update_search_index(doc)
+        
+        return jsonify({'message': 'Document created successfully', 'document': doc.to_dict(),
+                        'text_extraction': extraction}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -440,6 +544,7 @@ def update_document(doc_id):
             doc.is_controlled = data['is_controlled'] in ['true', 'True', True, '1']
         
         # Handle new file
+        filepath = None
         if file and allowed_file(file.filename):
             # Keep old file for version history (don't delete)
             
@@ -453,16 +558,6 @@ def update_document(doc_id):
             doc.file_name = filename
             doc.file_size = os.path.getsize(filepath)
             doc.file_type = filename.rsplit('.', 1)[1].lower()
-            
-            # Auto-extract text for AI search
-            try:
-                from app.services.document_search import extract_text_from_file
-                extracted = extract_text_from_file(filepath)
-                if extracted:
-                    doc.extracted_text = extracted
-                    doc.text_extracted_at = datetime.utcnow()
-            except Exception as ex:
-                logger.warning(f'Text extraction failed on update: {ex}')
         
         doc.updated_at = datetime.utcnow()
         db.session.commit()
@@ -477,7 +572,11 @@ def update_document(doc_id):
         db.session.add(log)
         db.session.commit()
         
-        return jsonify({'message': 'Document updated', 'document': doc.to_dict()})
+        extraction = _extract_text(doc, filepath) if filepath else None
+        _update_search_index(doc)
+        
+        return jsonify({'message': 'Document updated', 'document': doc.to_dict(),
+                        'text_extraction': extraction})
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -501,6 +600,8 @@ def delete_document(doc_id):
         db.session.delete(doc)
         db.session.commit()
         
+        _update_search_index(removed_id=doc_id)
+        
         return jsonify({'message': 'Document deleted'})
     except Exception as e:
         db.session.rollback()
@@ -563,6 +664,8 @@ def update_status(doc_id):
         db.session.add(log)
         db.session.commit()
         
+        _update_search_index(doc)
+        
         return jsonify({'message': 'Status updated', 'document': doc.to_dict()})
     except Exception as e:
         db.session.rollback()
@@ -583,32 +686,13 @@ def get_audit_log(doc_id):
 def dashboard_stats():
     """Get QMS dashboard statistics"""
     try:
-        total = QMSDocument.query.count()
-        approved = QMSDocument.query.filter_by(status='Approved').count()
-        draft = QMSDocument.query.filter_by(status='Draft').count()
-        under_review = QMSDocument.query.filter_by(status='Under Review').count()
-        obsolete = QMSDocument.query.filter_by(status='Obsolete').count()
-        
-        # Category counts
-        category_counts = {}
-        for cat in QMS_CATEGORIES:
-            category_counts[cat] = QMSDocument.query.filter_by(category=cat).count()
+        stats, category_counts, departments = _document_stats()
         
         # Recent activity
         recent_logs = QMSAuditLog.query.order_by(QMSAuditLog.timestamp.desc()).limit(10).all()
         
-        # Departments
-        departments = db.session.query(QMSDocument.department).distinct().all()
-        departments = [d[0] for d in departments if d[0]]
-        
         return jsonify({
-            'stats': {
-                'total': total,
-                'approved': approved,
-                'draft': draft,
-                'under_review': under_review,
-                'obsolete': obsolete
-            },
+            'stats': stats,
             'category_counts': category_counts,
             'recent_activity': [l.to_dict() for l in recent_logs],
             'departments': departments
@@ -706,6 +790,7 @@ def checkin_document(doc_id):
             db.session.add(version_snapshot)
         
         # Handle new file upload
+        filepath = None
         if file and allowed_file(file.filename):
             # Keep old file (don't delete - it's our version history)
             filename = secure_filename(file.filename)
@@ -718,16 +803,6 @@ def checkin_document(doc_id):
             doc.file_name = filename
             doc.file_size = os.path.getsize(filepath)
             doc.file_type = filename.rsplit('.', 1)[1].lower()
-            
-            # Auto-extract text
-            try:
-                from app.services.document_search import extract_text_from_file
-                extracted = extract_text_from_file(filepath)
-                if extracted:
-                    doc.extracted_text = extracted
-                    doc.text_extracted_at = datetime.utcnow()
-            except Exception as ex:
-                logger.warning(f'Text extraction failed on checkin: {ex}')
         
         # Auto-increment version if not provided
         if new_version:
@@ -775,10 +850,14 @@ def checkin_document(doc_id):
         db.session.add(log)
         db.session.commit()
         
+        extraction = _extract_text(doc, filepath) if filepath else None
+        _update_search_index(doc)
+        
         return jsonify({
             'message': f'Document checked in as v{doc.version}',
             'document': doc.to_dict(),
-            'version': new_version_record.to_dict()
+            'version': new_version_record.to_dict(),
+            'text_extraction': extraction
         })
     except Exception as e:
         db.session.rollback()
@@ -926,9 +1005,18 @@ def revert_to_version(doc_id, version_id):
         db.session.add(log)
         db.session.commit()
         
+        # Text of the reverted file (usually a content-hash cache hit), so
+        # search reflects what is now current
+        extraction = None
+        if doc.file_path:
+            filepath = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads', doc.file_path)
+            extraction = _extract_text(doc, filepath)
+        _update_search_index(doc)
+        
         return jsonify({
             'message': f'Document reverted to v{version.version_number} (new version: v{doc.version})',
-            'document': doc.to_dict()
+            'document': doc.to_dict(),
+            'text_extraction': extraction
         })
     except Exception as e:
         db.session.rollback()
@@ -1103,7 +1191,6 @@ def delete_action_plan(action_id):
 def generate_action_plans(audit_id):
     """Auto-generate action plans for all items scoring below threshold"""
     try:
-        import json
         audit = QMSPartnerAudit.query.get_or_404(audit_id)
         data = request.json
         threshold = data.get('threshold', 3)  # Generate actions for scores < threshold
@@ -1250,9 +1337,11 @@ use that information as the PRIMARY source for your answer. Cite the document ti
 def assistant_query():
     """
     AI Document Assistant - RAG-powered Query endpoint
-    Step 1: Search documents with TF-IDF
+    Step 1: Search documents (BM25 over the search index)
     Step 2: Send relevant context to Groq LLM for intelligent answer
-    Fallback: TF-IDF answer if LLM unavailable
+    Fallback: search-based answer if LLM unavailable
+    Repeated questions are served from the query cache (send
+    "fresh": true to bypass it).
     """
     try:
         from app.services.document_search import search_documents, answer_question
@@ -1264,32 +1353,53 @@ def assistant_query():
         if not query:
             return jsonify({'error': 'Query is required'}), 400
 
-        # Get all documents with extracted text
-        all_docs = QMSDocument.query.all()
-        all_docs_count = len(all_docs)
-
-        # Prepare documents for search
-        doc_list = []
-        indexed_count = 0
-        for doc in all_docs:
-            doc_dict = {
-                'id': doc.id,
-                'doc_number': doc.doc_number,
-                'title': doc.title,
-                'category': doc.category,
-                'department': doc.department,
-                'status': doc.status,
-                'file_name': doc.file_name,
-                'description': doc.description or '',
-                'tags': doc.tags or '',
-                'extracted_text': doc.extracted_text or ''
-            }
-            if doc.extracted_text:
-                indexed_count += 1
-            doc_list.append(doc_dict)
-
-        # Step 1: TF-IDF Search for relevant documents
-        search_results = search_documents(query, doc_list, top_k=8)
+        # Step 1: search over the persistent index, reusing cached results
+        # (or the whole response) for a repeated question; in-memory scan
+        # as a fallback
+        cache_key = None
+        try:
+            from app.services import qms_query_cache
+            from app.services.qms_search_index import sync_index, search_index, index_counts, index_stamp
+            sync_index()
+            cache_key = qms_query_cache.make_key(query, mode, index_stamp())
+            cached = None if data.get('fresh') else qms_query_cache.get(cache_key)
+            if cached and cached['response'] is not None:
+                cached['response']['cached'] = True
+                return jsonify(cached['response'])
+            if cached:
+                search_results = cached['results']
+                all_docs_count, indexed_count = cached['counts']
+            else:
+                search_results = search_index(query, top_k=8)
+                all_docs_count, indexed_count = index_counts()
+        except Exception as e:
+            logger.error(f"QMS search index unavailable, scanning documents: {e}")
+            db.session.rollback()
+            cache_key = None
+            all_docs = QMSDocument.query.all()
+            all_docs_count = len(all_docs)
+
+            # Prepare documents for search
+            doc_list = []
+            indexed_count = 0
+            for doc in all_docs:
+                doc_dict = {
+                    'id': doc.id,
+                    'doc_number': doc.doc_number,
+                    'title': doc.title,
+                    'category': doc.category,
+                    'department': doc.department,
+                    'status': doc.status,
+                    'file_name': doc.file_name,
+                    'description': doc.description or '',
+                    'tags': doc.tags or '',
+                    'extracted_text': doc.extracted_text or ''
+                }
+                if doc.extracted_text:
+                    indexed_count += 1
+                doc_list.append(doc_dict)
+
+            search_results = search_documents(query, doc_list, top_k=8)
 
         # Step 2: Try RAG with Groq LLM
         ai_answer = None
@@ -1331,12 +1441,8 @@ Mention that no specific documents were found but provide expert guidance."""
             # Determine confidence from search results
             confidence = 'low'
             if search_results:
-                top_score = search_results[0].get('score', 0)
-                top_coverage = search_results[0].get('coverage', 0)
-                if top_score > 1.0 and top_coverage > 60:
-                    confidence = 'high'
-                elif top_score > 0.3:
-                    confidence = 'medium'
+                from app.services.bm25 import confidence as _confidence
+                confidence = _confidence(search_results[0])
 
             sources = []
             for result in search_results[:5]:
@@ -1365,6 +1471,12 @@ Mention that no specific documents were found but provide expert guidance."""
             response = answer_question(query, search_results, all_docs_count, indexed_count)
             response['ai_powered'] = False
 
+        if cache_key is not None:
+            # A failed LLM call keeps only the search half, so it is retried
+            reusable = ai_used or mode == 'search'
+            qms_query_cache.put(cache_key, search_results, (all_docs_count, indexed_count),
+                                response=response if reusable else None, ai_powered=ai_used)
+
         return jsonify(response)
     except Exception as e:
         logger.error(f"Assistant query error: {e}")
@@ -1438,7 +1550,7 @@ def ai_status():
 def extract_document_text(doc_id):
     """Extract text from a single document and save it"""
     try:
-        from app.services.document_search import extract_text_from_file
+        from app.services import extraction_queue
         
         doc = QMSDocument.query.get_or_404(doc_id)
         
@@ -1450,12 +1562,20 @@ def extract_document_text(doc_id):
         if not os.path.exists(filepath):
             return jsonify({'error': 'File not found on disk'}), 404
         
-        extracted = extract_text_from_file(filepath)
+        # Runs on the extraction pool (cache first, per-file timeout) and waits
+        state, extracted = extraction_queue.extract_now(filepath)
+        if state == 'timeout':
+            return jsonify({
+                'message': 'Text extraction timed out for this file',
+                'doc_id': doc.id,
+                'text_length': 0
+            }), 504
         
         if extracted:
             doc.extracted_text = extracted
             doc.text_extracted_at = datetime.utcnow()
             db.session.commit()
+            _update_search_index(doc)
             
             return jsonify({
                 'message': f'Text extracted successfully ({len(extracted)} characters)',
@@ -1463,7 +1583,8 @@ def extract_document_text(doc_id):
                 'title': doc.title,
                 'text_length': len(extracted),
                 'preview': extracted[:500] + ('...' if len(extracted) > 500 else ''),
-                'extracted_at': doc.text_extracted_at.isoformat()
+                'extracted_at': doc.text_extracted_at.isoformat(),
+                'cached': state == 'cached'
             })
         else:
             return jsonify({
@@ -1479,73 +1600,68 @@ def extract_document_text(doc_id):
 
 @qms_bp.route('/assistant/extract-all', methods=['POST'])
 def extract_all_documents():
-    """Extract text from ALL uploaded documents that haven't been processed yet"""
+    """
+    Queue text extraction for ALL uploaded documents that haven't been
+    processed yet (or every document with force). Files are spread over
+    the extraction pool; poll /assistant/extract-status?batch_id=... for
+    progress and the per-document results.
+    """
     try:
-        from app.services.document_search import extract_text_from_file
+        from app.services import extraction_queue
         
         force = request.json.get('force', False) if request.json else False
         
-        if force:
-            docs = QMSDocument.query.filter(QMSDocument.file_path.isnot(None)).all()
-        else:
-            docs = QMSDocument.query.filter(
-                QMSDocument.file_path.isnot(None),
-                QMSDocument.extracted_text.is_(None)
-            ).all()
-        
-        results = {
-            'total': len(docs),
-            'success': 0,
-            'failed': 0,
-            'skipped': 0,
-            'details': []
-        }
-        
-        for doc in docs:
-            filepath = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads', doc.file_path)
-            
-            if not os.path.exists(filepath):
-                results['skipped'] += 1
-                results['details'].append({
-                    'id': doc.id, 'title': doc.title, 'status': 'skipped', 'reason': 'File not found'
-                })
-                continue
-            
-            try:
-                extracted = extract_text_from_file(filepath)
-                if extracted:
-                    doc.extracted_text = extracted
-                    doc.text_extracted_at = datetime.utcnow()
-                    results['success'] += 1
-                    results['details'].append({
-                        'id': doc.id, 'title': doc.title, 'status': 'success',
-                        'text_length': len(extracted)
-                    })
-                else:
-                    results['failed'] += 1
-                    results['details'].append({
-                        'id': doc.id, 'title': doc.title, 'status': 'failed',
-                        'reason': 'No text extracted'
-                    })
-            except Exception as ex:
-                results['failed'] += 1
-                results['details'].append({
-                    'id': doc.id, 'title': doc.title, 'status': 'failed',
-                    'reason': str(ex)
-                })
+        query = QMSDocument.query.with_entities(
+            QMSDocument.id, QMSDocument.title, QMSDocument.file_path
+        ).filter(QMSDocument.file_path.isnot(None))
+        if not force:
+            query = query.filter(QMSDocument.extracted_text.is_(None))
+        docs = query.all()
+        
+        upload_root = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads')
+        queued, skipped = [], []
+        for doc_id, title, file_path in docs:
+            filepath = os.path.join(upload_root, file_path)
+            if os.path.exists(filepath):
+                queued.append((doc_id, title, file_path, filepath))
+            else:
+                skipped.append({'id': doc_id, 'title': title, 'reason': 'File not found'})
         
-        db.session.commit()
+        app = current_app._get_current_object()
+        batch_id = extraction_queue.new_batch(skipped=skipped)
+        for doc_id, title, file_path, filepath in queued:
+            extraction_queue.submit(app, doc_id, file_path, filepath, title=title, batch_id=batch_id)
         
-        return jsonify({
-            'message': f"Extraction complete: {results['success']}/{results['total']} successful",
-            'results': results
-        })
+        status = extraction_queue.batch_status(batch_id)
+        status['message'] = f"Extraction queued: {len(queued)} documents ({len(skipped)} skipped)"
+        return jsonify(status), 202
     except Exception as e:
-        db.session.rollback()
         logger.error(f"Bulk extraction error: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+@qms_bp.route('/assistant/extract-status', methods=['GET'])
+def extract_status():
+    """Progress of a bulk extraction (?batch_id=), one job (?job_id=), or the whole queue"""
+    try:
+        from app.services import extraction_queue
+        
+        batch_id = request.args.get('batch_id')
+        job_id = request.args.get('job_id')
+        if batch_id:
+            status = extraction_queue.batch_status(batch_id)
+        elif job_id:
+            status = extraction_queue.job_status(job_id)
+        else:
+            return jsonify(extraction_queue.queue_status())
+        
+        if status is None:
+            return jsonify({'error': 'Unknown or expired extraction id'}), 404
+        return jsonify(status)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @qms_bp.route('/assistant/index-stats', methods=['GET'])
 def assistant_index_stats():
     """Get statistics about indexed documents for AI assistant"""
@@ -1571,13 +1687,24 @@ def assistant_index_stats():
             db.func.sum(db.func.length(QMSDocument.extracted_text))
         ).filter(QMSDocument.extracted_text.isnot(None)).scalar()
         
+        try:
+            from app.services.qms_search_index import index_generation
+            generation = index_generation()
+        except Exception:
+            db.session.rollback()
+            generation = None
+        
+        from app.services import qms_query_cache
+        
         return jsonify({
             'total_documents': total_docs,
+            'index_generation': generation,
             'with_files': with_files,
             'indexed': indexed,
             'pending': pending,
             'total_text_size': text_sizes or 0,
-            'category_stats': category_stats
+            'category_stats': category_stats,
+            'query_cache': qms_query_cache.stats()
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -9,9 +9,8 @@ import os
 import json
 import requests
 import pymysql
-import time
-import threading
 from datetime import datetime, timedelta
+from app.services import notification_queue
 
 telegram_bp = Blueprint('telegram', __name__, url_prefix='/api/telegram')
 
@@ -370,14 +369,11 @@ def send_hourly_report():
             
             if data:
                 msg = _format_dispatch_message(data)
-                result = _send_telegram_message(bot_token, chat_id, msg)
-                
-                if result.get('ok'):
-                    results.append({'company': company_name, 'status': 'sent'})
-                    print(f"[Telegram] ✅ Report sent for {company_name}")
-                else:
-                    results.append({'company': company_name, 'status': 'failed', 'error': result.get('description', 'Unknown error')})
-                    print(f"[Telegram] ❌ Failed for {company_name}: {result.get('description')}")
+                # Queued: the notification worker rate-limits, retries and
+                # joins the companies' reports into as few messages as fit
+                job_id = notification_queue.telegram(bot_token, chat_id, msg, digest=True)
+                results.append({'company': company_name, 'status': 'queued', 'job_id': job_id})
+                print(f"[Telegram] 📤 Report queued for {company_name}")
             else:
                 results.append({'company': company_name, 'status': 'no_data'})
                 print(f"[Telegram] ⚠️ No data for {company_name}")
@@ -535,38 +531,22 @@ def toggle_bot():
 # ============================================================
 # BACKGROUND SCHEDULER (called from __init__.py)
 # ============================================================
-_telegram_scheduler_started = False
+def _report_interval():
+    """Seconds until the next report: the configured interval, or a 5-min re-check while inactive."""
+    config = _load_config()
+    if config.get('is_active') and config.get('bot_token') and config.get('chat_id'):
+        return config.get('interval_minutes', 60) * 60
+    return 300
 
-def start_telegram_scheduler(app):
-    """Start background thread for hourly Telegram reports."""
-    global _telegram_scheduler_started
-    if _telegram_scheduler_started:
-        return
-    _telegram_scheduler_started = True
-    
-    def scheduler_loop():
-        print("\n📱 TELEGRAM DISPATCH BOT SCHEDULER STARTED")
-        time.sleep(60)  # Wait for server to start
-        
-        while True:
-            try:
-                config = _load_config()
-                interval = config.get('interval_minutes', 60) * 60  # Convert to seconds
-                
-                if config.get('is_active') and config.get('bot_token') and config.get('chat_id'):
-                    print(f"\n📱 [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Sending Telegram dispatch reports...")
-                    with app.app_context():
-                        result = send_hourly_report()
-                        print(f"📱 Telegram report result: {result}")
-                else:
-                    interval = 300  # Check every 5 min if not active
-                
-                time.sleep(interval)
-                
-            except Exception as e:
-                print(f"📱 Telegram scheduler error: {e}")
-                time.sleep(300)
-    
-    thread = threading.Thread(target=scheduler_loop, daemon=True)
-    thread.start()
-    print("📱 Telegram scheduler thread started")
+def _scheduled_report():
+    config = _load_config()
+    if config.get('is_active') and config.get('bot_token') and config.get('chat_id'):
+        print(f"\n📱 [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Sending Telegram dispatch reports...")
+        result = send_hourly_report()
+        print(f"📱 Telegram report result: {result}")
+
+def start_telegram_scheduler():
+    """Register the Telegram dispatch report as a scheduler job (services/scheduler)."""
+    from app.services import scheduler
+    scheduler.add_job('telegram-report', _scheduled_report, every=_report_interval, start_delay=60)
+    print("📱 Telegram report job registered")
@@ -0,0 +1,267 @@
+"""
+Precomputed data snapshot for the AI assistant chat.
+
+/api/ai/chat used to call get_all_ftr_data() and create_system_prompt()
+every time a question fell through to Groq. That meant about ten queries per
+company plus a barcode-tracking call to MRP per company, all inside the
+request. Now a background builder thread assembles the same facts once,
+renders the system prompt from them, and publishes both as an immutable
+Snapshot. Chat requests only read the current snapshot: no DB or HTTP work.
+
+Rebuilds are change-driven. Whatever writes the underlying data calls
+invalidate(): FTR master/rejection uploads, PDI assignments, packed-module
+uploads, the MRP dispatch sync and company edits. Bursts of invalidations
+coalesce into one rebuild. Packed/dispatch counts also come from MRP, which
+has no change hook, so the snapshot is rebuilt every AI_SNAPSHOT_REFRESH_SEC
+as well (the same 5 minutes the MRP tracking data was cached before).
+
+Every published snapshot gets the next generation number. Groq answers are
+cached per (generation, question), so a new snapshot never serves an
+answer computed from older data.
+
+Each web process (WEB_PROCESSES > 1) keeps its own snapshot and answer
+cache. invalidate() also writes a token to the shared cache store
+(utils/shared_cache); the other processes' builders check it every
+AI_SNAPSHOT_POLL_SEC while waiting and rebuild when it changes.
+
+Usage:
+    from app.services import ai_snapshot
+    ai_snapshot.start(app)                  # once, from create_app()
+    snap = ai_snapshot.current()            # Snapshot(generation, built_at, data, prompt) or None
+    ai_snapshot.invalidate('ftr-master')    # after committing a data change
+    answer = ai_snapshot.cached_answer(snap.generation, message)
+    ai_snapshot.store_answer(snap.generation, message, answer)
+    ai_snapshot.status()
+
+Tunables via environment:
+    AI_SNAPSHOT_REFRESH_SEC    periodic rebuild for MRP-side changes  (default 300)
+    AI_SNAPSHOT_DEBOUNCE_SEC   wait after an invalidation so bursts
+                               coalesce into one rebuild               (default 2)
+    AI_SNAPSHOT_WAIT_SEC       how long a request waits for the very
+                               first snapshot after startup            (default 60)
+    AI_SNAPSHOT_POLL_SEC       how often to look for invalidations
+                               from other processes                    (default 2)
+    AI_ANSWER_CACHE_SIZE       cached Groq answers per generation      (default 256)
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from app.utils import shared_cache
+
+logger = logging.getLogger(__name__)
+
+_REFRESH_SEC = int(os.environ.get('AI_SNAPSHOT_REFRESH_SEC', '300'))
+_DEBOUNCE_SEC = float(os.environ.get('AI_SNAPSHOT_DEBOUNCE_SEC', '2'))
+_WAIT_SEC = int(os.environ.get('AI_SNAPSHOT_WAIT_SEC', '60'))
+_POLL_SEC = float(os.environ.get('AI_SNAPSHOT_POLL_SEC', '2'))
+_ANSWER_CACHE_SIZE = int(os.environ.get('AI_ANSWER_CACHE_SIZE', '256'))
+
+Snapshot = namedtuple('Snapshot', 'generation built_at data prompt')
+
+_lock = threading.Lock()
+_wake = threading.Event()           # set by invalidate()
+_published = threading.Condition(_lock)
+_snapshot = None
+_generation = 0
+_dirty_since = None                 # time of the first unhandled invalidation
+_last_reasons = []
+_last_error = None
+_last_build_sec = None
+_builder = None
+_app = None
+_seen_token = None                  # last shared invalidation token acted on
+
+_answers: OrderedDict = OrderedDict()   # (generation, question) -> answer
+_answers_lock = threading.Lock()
+
+
+def start(app):
+    """Start the builder thread; the first snapshot is built right away."""
+    global _builder, _app, _seen_token
+    with _lock:
+        if _builder is not None:
+            return
+        _app = app
+        _seen_token = _shared_token()          # the first build covers anything before it
+        _builder = threading.Thread(target=_build_loop, name='ai-snapshot', daemon=True)
+        _builder.start()
+
+
+def current(wait=True):
+    """
+    The latest Snapshot. Until the first build finishes (just after startup)
+    this waits up to AI_SNAPSHOT_WAIT_SEC, or returns None if wait is False.
+    """
+    with _lock:
+        if _snapshot is None and wait and _builder is not None:
+            _published.wait_for(lambda: _snapshot is not None, timeout=_WAIT_SEC)
+        return _snapshot
+
+
+def _shared():
+    return shared_cache.open('ai_snapshot')
+
+
+def _shared_token():
+    try:
+        entry = _shared().get('invalidated')
+    except Exception:
+        return None
+    return entry['token'] if entry else None
+
+
+def _mark(reason):
+    global _dirty_since
+    with _lock:
+        if _dirty_since is None:
+            _dirty_since = time.time()
+        if reason and reason not in _last_reasons:
+            _last_reasons.append(reason)
+    _wake.set()
+
+
+def invalidate(reason=''):
+    """Schedule a rebuild in every process; call after committing a change to FTR/packing data."""
+    global _seen_token
+    token = uuid.uuid4().hex
+    with _lock:
+        _seen_token = token                     # our own rebuild is scheduled below
+    try:
+        shared = _shared()
+        shared['invalidated'] = {'token': token, 'reason': reason, 'at': time.time()}
+        shared.flush()
+    except Exception as e:
+        logger.warning(f"Publishing AI snapshot invalidation failed: {e}")
+    _mark(reason)
+
+
+def _poll_shared():
+    """Schedule a rebuild if another process called invalidate() since the last check."""
+    global _seen_token
+    try:
+        entry = _shared().get('invalidated')
+    except Exception:
+        return
+    if not entry:
+        return
+    with _lock:
+        if entry['token'] == _seen_token:
+            return
+        _seen_token = entry['token']
+    _mark(entry.get('reason') or 'other process')
+
+
+def _wait_for_change():
+    """Block until invalidated (here or in another process) or AI_SNAPSHOT_REFRESH_SEC passes."""
+    deadline = time.time() + _REFRESH_SEC
+    while not _wake.is_set():
+        left = deadline - time.time()
+        if left <= 0:
+            return
+        if not _wake.wait(timeout=min(_POLL_SEC, left)):
+            _poll_shared()
+
+
+def _build_once():
+    from app.models.database import db
+    from app.routes.ai_assistant_routes import get_all_ftr_data, create_system_prompt
+
+    with _app.app_context():
+        try:
+            data = get_all_ftr_data()
+            if not data:
+                raise RuntimeError('get_all_ftr_data() returned no data')
+            return data, create_system_prompt(data)
+        finally:
+            db.session.remove()
+
+
+def _build_loop():
+    global _snapshot, _generation, _dirty_since, _last_error, _last_build_sec
+    first = True
+    while True:
+        if not first:
+            _wait_for_change()
+            if _wake.is_set():
+                # Let a burst of writes (e.g. a multi-sheet upload) settle
+                time.sleep(_DEBOUNCE_SEC)
+        first = False
+        _wake.clear()
+        with _lock:
+            reasons = list(_last_reasons) or ['refresh']
+            _last_reasons.clear()
+            _dirty_since = None
+
+        started = time.time()
+        try:
+            data, prompt = _build_once()
+        except Exception as e:
+            _last_error = f'{type(e).__name__}: {e}'
+            logger.warning(f"AI snapshot rebuild failed, keeping generation {_generation}: {e}")
+            if _snapshot is None:
+                time.sleep(min(_REFRESH_SEC, 30))
+                _wake.set()
+            continue
+
+        with _lock:
+            _generation += 1
+            _snapshot = Snapshot(_generation, started, data, prompt)
+            _last_error = None
+            _last_build_sec = round(time.time() - started, 2)
+            _published.notify_all()
+        logger.info(f"AI snapshot generation {_generation} built in {_last_build_sec}s ({', '.join(reasons)})")
+        _prune_answers(_generation)
+
+
+# ─── Answer cache ──────────────────────────────
+
+def _answer_key(generation, message):
+    return generation, ' '.join((message or '').lower().split())
+
+
+def cached_answer(generation, message):
+    with _answers_lock:
+        key = _answer_key(generation, message)
+        answer = _answers.get(key)
+        if answer is not None:
+            _answers.move_to_end(key)
+        return answer
+
+
+def store_answer(generation, message, answer):
+    with _answers_lock:
+        key = _answer_key(generation, message)
+        _answers[key] = answer
+        _answers.move_to_end(key)
+        while len(_answers) > _ANSWER_CACHE_SIZE:
+            _answers.popitem(last=False)
+
+
+def _prune_answers(generation):
+    with _answers_lock:
+        for key in [k for k in _answers if k[0] < generation]:
+            del _answers[key]
+
+
+def status():
+    with _lock:
+        snap = _snapshot
+        out = {
+            'generation': _generation,
+            'built_at': snap.built_at if snap else None,
+            'age_sec': round(time.time() - snap.built_at, 1) if snap else None,
+            'last_build_sec': _last_build_sec,
+            'rebuild_pending': _dirty_since is not None,
+            'last_error': _last_error,
+            'refresh_sec': _REFRESH_SEC,
+        }
+    with _answers_lock:
+        out['cached_answers'] = len(_answers)
+    return out
@@ -0,0 +1,259 @@
+"""
+BM25 ranking over a precomputed term x chunk matrix.
+
+Both QMS search engines, document_search.search_documents() (in-memory)
+and qms_search_index.search_index() (persisted postings), rank through
+this module. Each builds a BM25Matrix once per corpus version. Scoring a
+query is then a row slice of the query's terms and a weighted sum per
+chunk (np.bincount), not a Python loop over every chunk.
+
+The matrix is CSR laid out by term: indptr/indices/data as in
+scipy.sparse.csr_matrix, kept as plain NumPy arrays so no SciPy is needed.
+data holds the full BM25 weight of each (term, chunk) posting:
+
+    idf(t) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len / avglen))
+    idf(t) = ln(1 + (N - df + 0.5) / (df + 0.5))
+
+rank() then applies the existing boosts on top: exact phrase (x2.5),
+title (x1.5) and query-term coverage (x(1 + coverage)). It groups results
+to the best passage per document plus up to three more. The phrase boost
+needs chunk text, so it is checked only for documents that can still
+reach the top-k, and passages are built only for the returned results.
+
+Raw BM25 grows with corpus size (idf), so answer confidence is judged on
+each result's relevance instead: the chunk's BM25 divided by the summed
+idf of the query's own terms. It is about 1.0 when every term occurs once
+in an average-length chunk; confidence() applies the thresholds.
+
+Usage:
+    from app.services.bm25 import BM25Matrix, rank
+    matrix = BM25Matrix(vocab, term_rows, cols, tfs, chunk_lens, chunk_docs)
+    results = rank(matrix, query, expand_query(query), top_k, doc_info, chunk_text)
+    confidence(results[0])            # 'high' / 'medium' / 'low'
+
+Tunables via environment:
+    QMS_BM25_K1    term-frequency saturation      (default 1.2)
+    QMS_BM25_B     chunk-length normalisation     (default 0.75)
+"""
+
+from __future__ import annotations
+
+import os
+from collections import Counter
+
+import numpy as np
+
+K1 = float(os.environ.get('QMS_BM25_K1', '1.2'))
+B = float(os.environ.get('QMS_BM25_B', '0.75'))
+
+PHRASE_BOOST = 2.5
+TITLE_BOOST = 1.5
+EXTRA_PASSAGES = 3
+
+# confidence() thresholds, on the relevance scale (see module docstring).
+# Set so the high / medium / low split matches the pre-BM25 TF-IDF scorer's.
+HIGH_RELEVANCE = 1.6
+HIGH_COVERAGE = 60                  # percent of query tokens in the chunk
+MEDIUM_RELEVANCE = 0.7
+
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+class BM25Matrix:
+    """BM25-weighted term x chunk matrix (CSR by term)."""
+
+    __slots__ = ('vocab', 'indptr', 'indices', 'data', 'idf', 'chunk_docs', 'n_chunks')
+
+    def __init__(self, vocab, term_rows, cols, tfs, chunk_lens, chunk_docs):
+        """
+        vocab        {term: row}
+        term_rows, cols, tfs
+                     one entry per (term, chunk) posting
+        chunk_lens   token count of every chunk (defines n_chunks)
+        chunk_docs   caller's document index of every chunk
+        """
+        self.vocab = vocab
+        self.chunk_docs = np.asarray(chunk_docs, dtype=np.int64)
+        chunk_lens = np.asarray(chunk_lens, dtype=np.float64)
+        self.n_chunks = len(chunk_lens)
+
+        term_rows = np.asarray(term_rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        tfs = np.asarray(tfs, dtype=np.float64)
+        order = np.lexsort((cols, term_rows))
+        term_rows, cols, tfs = term_rows[order], cols[order], tfs[order]
+
+        df = np.bincount(term_rows, minlength=len(vocab))
+        self.indptr = np.zeros(len(df) + 1, dtype=np.int64)
+        np.cumsum(df, out=self.indptr[1:])
+        self.indices = cols
+
+        avg_len = chunk_lens.mean() if self.n_chunks else 0.0
+        self.idf = np.log1p((self.n_chunks - df + 0.5) / (df + 0.5))
+        norm = K1 * (1.0 - B + B * chunk_lens[cols] / (avg_len or 1.0))
+        self.data = self.idf[term_rows] * tfs * (K1 + 1.0) / (tfs + norm)
+
+    def _rows(self, query_tokens):
+        counts = Counter(t for t in query_tokens if t in self.vocab)
+        rows = np.fromiter((self.vocab[t] for t in counts), dtype=np.int64, count=len(counts))
+        return rows, np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+
+    def score(self, query_tokens):
+        """
+        (cols, bm25, matched) for every chunk containing a query term;
+        matched counts query tokens present in the chunk.
+        """
+        rows, weights = self._rows(query_tokens)
+        if not len(rows):
+            return _EMPTY, np.empty(0), np.empty(0)
+        starts, ends = self.indptr[rows], self.indptr[rows + 1]
+        lengths = ends - starts
+        if not lengths.sum():
+            return _EMPTY, np.empty(0), np.empty(0)
+        idx = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+        cols = self.indices[idx]
+        w = np.repeat(weights, lengths)
+        scores = np.bincount(cols, weights=self.data[idx] * w, minlength=self.n_chunks)
+        matched = np.bincount(cols, weights=w, minlength=self.n_chunks)
+        hit = np.flatnonzero(matched)
+        return hit, scores[hit], matched[hit]
+
+    def idf_sum(self, tokens):
+        """Summed idf of the distinct tokens that are in the vocabulary."""
+        rows = [self.vocab[t] for t in set(tokens) if t in self.vocab]
+        return float(self.idf[rows].sum()) if rows else 0.0
+
+    def docs_with_term(self, term):
+        """Document indexes with at least one chunk containing term."""
+        row = self.vocab.get(term)
+        if row is None:
+            return _EMPTY
+        return np.unique(self.chunk_docs[self.indices[self.indptr[row]:self.indptr[row + 1]]])
+
+    def matched_terms(self, col, query_tokens):
+        """Query tokens that occur in one chunk (binary search per term row)."""
+        out = []
+        for t in set(query_tokens):
+            row = self.vocab.get(t)
+            if row is None:
+                continue
+            lo, hi = self.indptr[row], self.indptr[row + 1]
+            i = lo + np.searchsorted(self.indices[lo:hi], col)
+            if i < hi and self.indices[i] == col:
+                out.append(t)
+        return out
+
+
+def rank(matrix, query, query_tokens, top_k, doc_info, chunk_text, title_tokens=None):
+    """
+    Ranked search results in the search_documents() result format.
+
+    doc_info(doc_indices)   -> {doc_index: dict with doc_id, doc_number, title,
+                               category, department, status, file_name};
+                               documents left out are skipped
+    chunk_text(cols)        -> {col: (chunk_index, text)}
+    title_tokens(doc_index) -> set of title tokens (default: tokenize the
+                               title from doc_info)
+    """
+    from app.services.document_search import tokenize, _extract_passage
+
+    cols, bm25, matched = matrix.score(query_tokens)
+    if not len(cols):
+        return []
+
+    uniq_docs, pos = np.unique(matrix.chunk_docs[cols], return_inverse=True)
+    doc_list = uniq_docs.tolist()
+    info = doc_info(doc_list)
+    if title_tokens is None:
+        def title_tokens(d):
+            return set(tokenize((info[d].get('title') or '').lower()))
+    wanted = set(query_tokens)
+    present = np.fromiter((d in info for d in doc_list), dtype=bool, count=len(doc_list))
+    title_hit = np.fromiter(
+        (d in info and not wanted.isdisjoint(title_tokens(d)) for d in doc_list),
+        dtype=bool, count=len(doc_list))
+
+    coverage = matched / max(len(query_tokens), 1)
+    title_mult = np.where(title_hit, TITLE_BOOST, 1.0)[pos]
+    keep = present[pos]
+    # Everything but the phrase boost: a lower bound on the final score,
+    # and pre * PHRASE_BOOST an upper one
+    pre = np.where(keep, bm25 * title_mult * (1.0 + coverage), 0.0)
+
+    best = np.zeros(len(uniq_docs))
+    np.maximum.at(best, pos, pre)
+    if len(best) > top_k:
+        cutoff = best[np.argpartition(best, len(best) - top_k)[len(best) - top_k]]
+    else:
+        cutoff = 0.0
+
+    # Exact scores only for chunks of documents that can still make the
+    # top-k; the phrase boost is the one factor that needs chunk text
+    cand = np.flatnonzero(keep & (best[pos] * PHRASE_BOOST >= cutoff))
+    cand_cols = cols[cand].tolist()
+    texts = chunk_text(cand_cols)
+    query_lower = query.lower()
+    has_text = np.fromiter((c in texts for c in cand_cols), dtype=bool, count=len(cand))
+    phrase = np.fromiter((c in texts and query_lower in texts[c][1].lower() for c in cand_cols),
+                         dtype=bool, count=len(cand))
+    final = (bm25[cand] * np.where(phrase, PHRASE_BOOST, 1.0)
+             * title_mult[cand] * (1.0 + coverage[cand]))
+    final = np.round(final, 4)
+    cand, final = cand[has_text], final[has_text]
+    # relevance: the query's own terms, not its synonym expansion
+    ideal = matrix.idf_sum(tokenize(query_lower)) or matrix.idf_sum(query_tokens)
+
+    # Best passage per document plus up to three additional ones, for the
+    # first top_k documents by score (ties keep corpus order)
+    chosen = {}
+    for j in np.lexsort((cols[cand], -final)).tolist():
+        d = doc_list[pos[cand[j]]]
+        entries = chosen.get(d)
+        if entries is None:
+            if len(chosen) >= top_k:
+                continue
+            chosen[d] = entries = []
+        if len(entries) <= EXTRA_PASSAGES:
+            entries.append(j)
+
+    final_results = []
+    for d, entries in chosen.items():
+        passages = []
+        for j in entries:
+            i = cand[j]
+            col = int(cols[i])
+            chunk_index, chunk = texts[col]
+            passages.append({
+                'score': float(final[j]),
+                'passage': _extract_passage(chunk, query_tokens, max_length=350),
+                'chunk_index': chunk_index,
+                'col': col,
+                'coverage': float(coverage[i]),
+                'relevance': float(bm25[i]) / ideal if ideal else 0.0,
+            })
+        top = passages[0]
+        result = dict(info[d])
+        result.update({
+            'score': top['score'],
+            'passage': top['passage'],
+            'chunk_index': top['chunk_index'],
+            'matched_terms': matrix.matched_terms(top['col'], query_tokens),
+            'coverage': round(top['coverage'] * 100, 1),
+            'relevance': round(top['relevance'], 3),
+            'additional_passages': [
+                {'passage': p['passage'], 'score': p['score'], 'chunk_index': p['chunk_index']}
+                for p in passages[1:]
+            ],
+        })
+        final_results.append(result)
+    return final_results
+
+
+def confidence(result):
+    """'high', 'medium' or 'low' for a rank() result (one without relevance is low)."""
+    relevance = result.get('relevance', 0)
+    if relevance >= HIGH_RELEVANCE and result.get('coverage', 0) > HIGH_COVERAGE:
+        return 'high'
+    if relevance >= MEDIUM_RELEVANCE:
+        return 'medium'
+    return 'low'
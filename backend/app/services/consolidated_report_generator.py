@@ -1,18 +1,73 @@
 """
 Consolidated Production Report Generator
 Combines: Production Data + COC Documents + IQC Reports + IPQC PDFs
+
+Data gathering: the production summary, IPQC list and daily table all
+come from one range-scoped production_records query, run concurrently
+with the two COC queries. Per-day production rows are memoised, so
+overlapping ranges (month -> quarter, re-runs) only query the days not
+already cached. Production record routes call clear_day_cache() after a
+write; the drop is published through utils/shared_cache, so every web
+process refetches that company's days.
+
+Tunables via environment:
+    CONSOLIDATED_DAY_CACHE_SEC   lifetime of a cached day        (default 900)
+    CONSOLIDATED_OPEN_DAYS       most recent days never cached,
+                                 still being entered/edited      (default 2)
 """
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.units import mm
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from io import BytesIO
-from datetime import datetime
+from datetime import datetime, date, timedelta
+from flask import current_app, has_app_context
 from sqlalchemy import text
 from app.models.database import db
+from app.utils import shared_cache
 import requests
 
+
+_DAY_CACHE_SEC = int(os.environ.get('CONSOLIDATED_DAY_CACHE_SEC', '900'))
+_OPEN_DAYS = int(os.environ.get('CONSOLIDATED_OPEN_DAYS', '2'))
+
+_day_cache = {}   # (company_name, 'YYYY-MM-DD') -> (stored_at, [row dicts])
+_day_cache_lock = threading.Lock()
+
+
+def _dropped():
+    return shared_cache.open('consolidated_days_dropped')   # company name or '*' -> time of clear_day_cache()
+
+
+def clear_day_cache(company_name=None):
+    """Drop memoised production days (all, or one company's), in every process."""
+    with _day_cache_lock:
+        if company_name is None:
+            _day_cache.clear()
+        else:
+            for key in [k for k in _day_cache if k[0] == company_name]:
+                del _day_cache[key]
+    try:
+        dropped = _dropped()
+        dropped['*' if company_name is None else company_name] = time.time()
+        dropped.flush()
+    except Exception as e:
+        print(f"[consolidated] publishing clear_day_cache failed: {e}")
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
 class ConsolidatedReportGenerator:
     def __init__(self):
         self.styles = getSampleStyleSheet()
@@ -24,6 +79,9 @@ class ConsolidatedReportGenerator:
             doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=15*mm, leftMargin=15*mm,
                                    topMargin=15*mm, bottomMargin=15*mm)
             
+            production_days, coc_data, consumption_data = self._fetch_sections(
+                company_name, from_date, to_date)
+            
             story = []
             
             # Title Page
@@ -51,7 +109,7 @@ class ConsolidatedReportGenerator:
             story.append(Paragraph("<b>📊 PRODUCTION SUMMARY</b>", self.styles['Heading2']))
             story.append(Spacer(1, 5*mm))
             
-            production_summary = self._get_production_summary(company_name, from_date, to_date)
+            production_summary = self._get_production_summary(production_days)
             if production_summary:
                 summary_data = [
                     ['Metric', 'Value'],
@@ -79,7 +137,6 @@ class ConsolidatedReportGenerator:
             story.append(Paragraph("<b>📑 COC DOCUMENTS (RAW MATERIALS USED)</b>", self.styles['Heading2']))
             story.append(Spacer(1, 5*mm))
             
-            coc_data = self._get_coc_documents(company_name, from_date, to_date)
             if coc_data:
                 coc_table_data = [['Material', 'Brand', 'Lot/Batch', 'Invoice', 'Qty', 'COC Link']]
                 
@@ -115,7 +172,6 @@ class ConsolidatedReportGenerator:
             story.append(Paragraph("<b>📦 MATERIAL CONSUMPTION</b>", self.styles['Heading2']))
             story.append(Spacer(1, 5*mm))
             
-            consumption_data = self._get_material_consumption(company_name, from_date, to_date)
             if consumption_data:
                 cons_table_data = [['Material', 'Total Received', 'Consumed', 'Available']]
                 
@@ -156,7 +212,7 @@ class ConsolidatedReportGenerator:
             story.append(Spacer(1, 5*mm))
             
             # IPQC Reports from production records
-            ipqc_data = self._get_ipqc_reports(company_name, from_date, to_date)
+            ipqc_data = self._get_ipqc_reports(production_days)
             if ipqc_data:
                 story.append(Paragraph("<b>IPQC Reports (from Production):</b>", self.styles['Normal']))
                 for i, ipqc in enumerate(ipqc_data, 1):
@@ -171,7 +227,7 @@ class ConsolidatedReportGenerator:
             story.append(Paragraph("<b>📅 DAILY PRODUCTION DETAILS</b>", self.styles['Heading2']))
             story.append(Spacer(1, 5*mm))
             
-            daily_data = self._get_daily_production(company_name, from_date, to_date)
+            daily_data = self._get_daily_production(production_days)
             if daily_data:
                 daily_table_data = [['Date', 'Lot#', 'Day Prod', 'Night Prod', 'Total', 'Cell Rej%', 'Module Rej%']]
                 
@@ -210,41 +266,107 @@ class ConsolidatedReportGenerator:
             traceback.print_exc()
             raise
     
-    def _get_production_summary(self, company_name, from_date, to_date):
-        """Get production summary statistics"""
+    def _fetch_sections(self, company_name, from_date, to_date):
+        """Production days, COC documents and material consumption, fetched concurrently"""
+        jobs = (
+            (self._get_production_days, (company_name, from_date, to_date)),
+            (self._get_coc_documents, (company_name, from_date, to_date)),
+            (self._get_material_consumption, (company_name, from_date, to_date)),
+        )
+        if not has_app_context():
+            return tuple(fn(*args) for fn, args in jobs)
+        
+        app = current_app._get_current_object()
+        
+        def run(fn, args):
+            # Each worker gets its own app context, hence its own session
+            with app.app_context():
+                return fn(*args)
+        
+        with ThreadPoolExecutor(max_workers=len(jobs)) as ex:
+            futures = [ex.submit(run, fn, args) for fn, args in jobs]
+            return tuple(f.result() for f in futures)
+    
+    def _get_production_days(self, company_name, from_date, to_date):
+        """
+        Production records in range, ordered by date. Closed days come from
+        the per-day memo; only the span of missing days is queried.
+        """
         try:
-            query = text("""
-                SELECT 
-                    COUNT(*) as days,
-                    SUM(day_production + night_production) as total_modules
-                FROM production_records
-                WHERE company_name = :company
-                AND date BETWEEN :from_date AND :to_date
-            """)
-            
-            result = db.session.execute(query, {
-                'company': company_name,
-                'from_date': from_date,
-                'to_date': to_date
-            }).fetchone()
-            
-            if result and result[1]:
-                total_modules = result[1]
-                days = result[0]
-                # Assuming 625W modules, 1000 modules = 0.625 MW
-                total_mw = (total_modules * 625) / 1000000
-                avg_daily = total_modules / days if days > 0 else 0
-                
-                return {
-                    'days': days,
-                    'total_modules': total_modules,
-                    'total_mw': total_mw,
-                    'avg_daily': avg_daily
-                }
-            return None
+            start, end = _as_date(from_date), _as_date(to_date)
+            if end < start:
+                return []
+            open_from = date.today() - timedelta(days=_OPEN_DAYS - 1)
+            now = time.time()
+            dropped = _dropped()
+            since = max(dropped.get(company_name, 0), dropped.get('*', 0))
+            
+            days = {}
+            missing = []
+            with _day_cache_lock:
+                d = start
+                while d <= end:
+                    hit = _day_cache.get((company_name, d.isoformat()))
+                    if hit and now - hit[0] < _DAY_CACHE_SEC and hit[0] >= since:
+                        days[d] = hit[1]
+                    else:
+                        missing.append(d)
+                    d += timedelta(days=1)
+            
+            if missing:
+                fetched = {d: [] for d in missing}
+                query = text("""
+                    SELECT pr.date, pr.lot_number, pr.day_production, pr.night_production,
+                           pr.cell_rejection_percent, pr.module_rejection_percent, pr.ipqc_pdf
+                    FROM production_records pr
+                    JOIN companies c ON c.id = pr.company_id
+                    WHERE c.company_name = :company
+                    AND pr.date BETWEEN :from_date AND :to_date
+                    ORDER BY pr.date, pr.id
+                """)
+                result = db.session.execute(query, {
+                    'company': company_name,
+                    'from_date': missing[0].isoformat(),
+                    'to_date': missing[-1].isoformat()
+                }).fetchall()
+                for row in result:
+                    d = _as_date(row[0])
+                    fetched.setdefault(d, []).append({
+                        'date': d.isoformat(),
+                        'lot': row[1],
+                        'day': row[2] or 0,
+                        'night': row[3] or 0,
+                        'cell_rej': float(row[4]) if row[4] else 0,
+                        'mod_rej': float(row[5]) if row[5] else 0,
+                        'ipqc_pdf': row[6]
+                    })
+                with _day_cache_lock:
+                    for d, rows in fetched.items():
+                        if d < open_from:
+                            _day_cache[(company_name, d.isoformat())] = (now, rows)
+                days.update(fetched)
+            
+            return [r for d in sorted(days) if start <= d <= end for r in days[d]]
         except Exception as e:
-            print(f"Error getting production summary: {e}")
+            print(f"Error getting production records: {e}")
+            return []
+    
+    def _get_production_summary(self, production_days):
+        """Get production summary statistics"""
+        total_modules = sum(r['day'] + r['night'] for r in production_days)
+        if not total_modules:
             return None
+        days = len(production_days)
+        # Assuming 625W modules, 1000 modules = 0.625 MW
+        total_mw = (total_modules * 625) / 1000000
+        avg_daily = total_modules / days if days > 0 else 0
+        
+        return {
+            'days': days,
+            'total_modules': total_modules,
+            'total_mw': total_mw,
+            'avg_daily': avg_daily
+        }
     
     def _get_coc_documents(self, company_name, from_date, to_date):
         """Get COC documents for period"""
@@ -307,61 +429,14 @@ class ConsolidatedReportGenerator:
             print(f"Error getting material consumption: {e}")
             return []
     
-    def _get_ipqc_reports(self, company_name, from_date, to_date):
+    def _get_ipqc_reports(self, production_days):
         """Get IPQC reports from production records"""
-        try:
-            query = text("""
-                SELECT lot_number, date, ipqc_pdf
-                FROM production_records
-                WHERE company_name = :company
-                AND date BETWEEN :from_date AND :to_date
-                AND ipqc_pdf IS NOT NULL
-                ORDER BY date
-            """)
-            
-            result = db.session.execute(query, {
-                'company': company_name,
-                'from_date': from_date,
-                'to_date': to_date
-            }).fetchall()
-            
-            return [{
-                'lot': row[0],
-                'date': str(row[1]),
-                'ipqc_pdf': row[2]
-            } for row in result]
-        except Exception as e:
-            print(f"Error getting IPQC reports: {e}")
-            return []
+        return [{
+            'lot': r['lot'],
+            'date': r['date'],
+            'ipqc_pdf': r['ipqc_pdf']
+        } for r in production_days if r['ipqc_pdf'] is not None]
     
-    def _get_daily_production(self, company_name, from_date, to_date):
+    def _get_daily_production(self, production_days):
         """Get daily production records"""
-        try:
-            query = text("""
-                SELECT 
-                    date, lot_number, day_production, night_production,
-                    cell_rejection_percent, module_rejection_percent
-                FROM production_records
-                WHERE company_name = :company
-                AND date BETWEEN :from_date AND :to_date
-                ORDER BY date
-            """)
-            
-            result = db.session.execute(query, {
-                'company': company_name,
-                'from_date': from_date,
-                'to_date': to_date
-            }).fetchall()
-            
-            return [{
-                'date': str(row[0]),
-                'lot': row[1],
-                'day': row[2],
-                'night': row[3],
-                'total': row[2] + row[3],
-                'cell_rej': float(row[4]) if row[4] else 0,
-                'mod_rej': float(row[5]) if row[5] else 0
-            } for row in result]
-        except Exception as e:
-            print(f"Error getting daily production: {e}")
-            return []
+        return [dict(r, total=r['day'] + r['night']) for r in production_days]
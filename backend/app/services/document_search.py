@@ -8,9 +8,9 @@ Solar Panel Manufacturing QMS | ISO 9001:2015
 
 import os
 import re
-import math
 import json
 import logging
+import threading
 from collections import Counter, defaultdict
 
 logger = logging.getLogger(__name__)
@@ -52,16 +52,28 @@ def extract_text_from_file(file_path):
 
 
 def _extract_pdf(file_path):
-    """Extract text from PDF using PyPDF2"""
+    """Extract text from PDF using PyPDF2, with OCR for pages that have no text layer"""
     try:
         from PyPDF2 import PdfReader
+        from app.services.pdf_ocr import needs_ocr, ocr_available, ocr_pages, page_hash
         reader = PdfReader(file_path)
-        text_parts = []
+        page_texts = {}
+        scanned = {}
         for page_num, page in enumerate(reader.pages, 1):
             page_text = page.extract_text()
             if page_text:
-                text_parts.append(f"[Page {page_num}]\n{page_text}")
-        return '\n\n'.join(text_parts)
+                page_texts[page_num] = page_text
+            if needs_ocr(page_text):
+                scanned[page_num] = page
+
+        # Scanned pages only; PDFs with a full text layer never pay for OCR
+        if scanned and ocr_available():
+            hashes = {num: page_hash(page) for num, page in scanned.items()}
+            for page_num, ocr_text in ocr_pages(file_path, hashes).items():
+                if len(ocr_text.strip()) > len((page_texts.get(page_num) or '').strip()):
+                    page_texts[page_num] = ocr_text
+
+        return '\n\n'.join(f"[Page {num}]\n{page_texts[num]}" for num in sorted(page_texts))
     except Exception as e:
         logger.error(f"PDF extraction error: {e}")
         return ''
@@ -313,9 +325,51 @@ def compute_tf(tokens):
     return {t: c / total for t, c in counter.items()}
 
 
+def _corpus_key(documents):
+    """Identity of a corpus: document ids plus the text each one is searched by"""
+    return hash(tuple((doc.get('id'), _search_text(doc)) for doc in documents))
+
+
+def _search_text(doc):
+    text = doc.get('extracted_text', '') or ''
+    if not text:
+        # Fall back to description + title
+        text = f"{doc.get('title', '')} {doc.get('description', '')}"
+    return text
+
+
+def _build_corpus(documents):
+    """Chunk + tokenize every document once into a BM25Matrix (column = chunk)"""
+    from app.services.bm25 import BM25Matrix
+
+    vocab = {}
+    term_rows, cols, tfs = [], [], []
+    chunk_lens, chunk_docs, chunks = [], [], []
+    for doc_idx, doc in enumerate(documents):
+        text = _search_text(doc)
+        pieces = chunk_text(text) if len(text) > 500 else [text]
+        for idx, chunk in enumerate(pieces):
+            col = len(chunks)
+            tokens = tokenize(chunk)
+            for term, count in Counter(tokens).items():
+                term_rows.append(vocab.setdefault(term, len(vocab)))
+                cols.append(col)
+                tfs.append(count)
+            chunk_lens.append(len(tokens))
+            chunk_docs.append(doc_idx)
+            chunks.append((idx, chunk))
+    return BM25Matrix(vocab, term_rows, cols, tfs, chunk_lens, chunk_docs), chunks
+
+
+# Last corpus searched: (key, matrix, chunks). The assistant searches the
+# same document list over and over, so tokenizing happens once per change.
+_corpus_cache = (None, None, None)
+_corpus_lock = threading.Lock()
+
+
 def search_documents(query, documents, top_k=10):
     """
-    Advanced document search with TF-IDF scoring.
+    Advanced document search with BM25 scoring.
     
     Args:
         query: Search query string
@@ -325,6 +379,9 @@ def search_documents(query, documents, top_k=10):
     Returns:
         List of result dicts with score, passages, document info
     """
+    global _corpus_cache
+    from app.services.bm25 import rank
+
     if not query or not documents:
         return []
     
@@ -332,109 +389,32 @@ def search_documents(query, documents, top_k=10):
     if not query_tokens:
         return []
     
-    # Build document corpus
-    doc_chunks = []  # (doc_info, chunk_text, chunk_idx)
-    for doc in documents:
-        text = doc.get('extracted_text', '') or ''
-        if not text:
-            # Fall back to description + title
-            text = f"{doc.get('title', '')} {doc.get('description', '')}"
-        
-        chunks = chunk_text(text) if len(text) > 500 else [text]
-        for idx, chunk in enumerate(chunks):
-            doc_chunks.append((doc, chunk, idx))
-    
-    if not doc_chunks:
+    key = _corpus_key(documents)
+    with _corpus_lock:
+        cached_key, matrix, chunks = _corpus_cache
+        if cached_key != key:
+            matrix, chunks = _build_corpus(documents)
+            _corpus_cache = (key, matrix, chunks)
+    if not matrix.n_chunks:
         return []
     
-    # Compute IDF across all chunks
-    N = len(doc_chunks)
-    df = Counter()
-    chunk_tokens_list = []
-    for _, chunk, _ in doc_chunks:
-        tokens = set(tokenize(chunk))
-        chunk_tokens_list.append(tokens)
-        for t in tokens:
-            df[t] += 1
-    
-    idf = {}
-    for t in df:
-        idf[t] = math.log(1 + N / (1 + df[t]))
-    
-    # Score each chunk
-    results = []
-    for i, (doc, chunk, chunk_idx) in enumerate(doc_chunks):
-        chunk_token_list = tokenize(chunk)
-        tf = compute_tf(chunk_token_list)
-        chunk_token_set = chunk_tokens_list[i]
-        
-        # TF-IDF score
-        score = 0
-        matched_terms = []
-        for qt in query_tokens:
-            if qt in chunk_token_set:
-                tfidf = tf.get(qt, 0) * idf.get(qt, 1)
-                score += tfidf
-                matched_terms.append(qt)
-        
-        if score <= 0:
-            continue
-        
-        # Boost for exact phrase match
-        query_lower = query.lower()
-        chunk_lower = chunk.lower()
-        if query_lower in chunk_lower:
-            score *= 2.5
-        
-        # Boost for title match
-        title_lower = (doc.get('title', '') or '').lower()
-        if any(qt in tokenize(title_lower) for qt in query_tokens):
-            score *= 1.5
-        
-        # Boost for more matched terms (coverage)
-        coverage = len(matched_terms) / max(len(query_tokens), 1)
-        score *= (1 + coverage)
-        
-        # Extract the most relevant passage (highlighted)
-        passage = _extract_passage(chunk, query_tokens, max_length=350)
-        
-        results.append({
-            'doc_id': doc.get('id'),
-            'doc_number': doc.get('doc_number', ''),
-            'title': doc.get('title', ''),
-            'category': doc.get('category', ''),
-            'department': doc.get('department', ''),
-            'status': doc.get('status', ''),
-            'file_name': doc.get('file_name', ''),
-            'score': round(score, 4),
-            'passage': passage,
-            'chunk_index': chunk_idx,
-            'matched_terms': list(set(matched_terms)),
-            'coverage': round(coverage * 100, 1),
-        })
-    
-    # Sort by score descending, deduplicate by doc_id (keep top passage per doc)
-    results.sort(key=lambda x: x['score'], reverse=True)
-    
-    # Keep top passages but also group by document
-    seen_docs = {}
-    final_results = []
-    for r in results:
-        doc_id = r['doc_id']
-        if doc_id not in seen_docs:
-            seen_docs[doc_id] = r
-            r['additional_passages'] = []
-            final_results.append(r)
-        else:
-            # Add as additional passage
-            if len(seen_docs[doc_id]['additional_passages']) < 3:
-                seen_docs[doc_id]['additional_passages'].append({
-                    'passage': r['passage'],
-                    'score': r['score'],
-                    'chunk_index': r['chunk_index']
-                })
-    
-    return final_results[:top_k]
+    def doc_info(doc_indices):
+        out = {}
+        for i in doc_indices:
+            doc = documents[i]
+            out[i] = {
+                'doc_id': doc.get('id'),
+                'doc_number': doc.get('doc_number', ''),
+                'title': doc.get('title', ''),
+                'category': doc.get('category', ''),
+                'department': doc.get('department', ''),
+                'status': doc.get('status', ''),
+                'file_name': doc.get('file_name', ''),
+            }
+        return out
+    
+    return rank(matrix, query, query_tokens, top_k, doc_info,
+                lambda cols: {c: chunks[c] for c in cols})
 
 
 def _extract_passage(text, query_tokens, max_length=350):
@@ -506,12 +486,8 @@ def answer_question(query, search_results, all_docs_count=0, indexed_count=0):
     top_result = search_results[0]
     
     # Determine confidence
-    if top_result['score'] > 1.0 and top_result['coverage'] > 60:
-        response['confidence'] = 'high'
-    elif top_result['score'] > 0.3:
-        response['confidence'] = 'medium'
-    else:
-        response['confidence'] = 'low'
+    from app.services.bm25 import confidence
+    response['confidence'] = confidence(top_result)
     
     # Build answer text
     answer_parts = []
@@ -514,27 +514,6 @@ def create_rejection_details_sheet(wb, rejections):
     
     ws.row_dimensions[3].height = 25
     
-    # Data
-    light_fill = PatternFill(start_color="FFEBEE", end_color="FFEBEE", fill_type="solid")
-    
-    for idx, rej in enumerate(rejections, 4):
-        defect_type = rej.get('defect_type', 'Minor')
-        type_fill = PatternFill(start_color="FFCDD2", end_color="FFCDD2", fill_type="solid") if defect_type == 'Major' else PatternFill(start_color="FFF9C4", end_color="FFF9C4", fill_type="solid")
-        
-        ws.cell(row=idx, column=1, value=idx-3).alignment = Alignment(horizontal='center')
-        ws.cell(row=idx, column=2, value=rej.get('date', '')).alignment = Alignment(horizontal='center')
-        ws.cell(row=idx, column=3, value=rej.get('serial', '')).alignment = Alignment(horizontal='left')
-        ws.cell(row=idx, column=4, value=rej.get('reason', '')).alignment = Alignment(horizontal='left')
-        ws.cell(row=idx, column=5, value=rej.get('stage', '')).alignment = Alignment(horizontal='center')
-        ws.cell(row=idx, column=6, value=defect_type).fill = type_fill
-        ws.cell(row=idx, column=6).alignment = Alignment(horizontal='center')
-        ws.cell(row=idx, column=6).font = Font(name='Calibri', size=10, bold=True)
-        ws.cell(row=idx, column=7, value=rej.get('remarks', '')).alignment = Alignment(horizontal='left')
-        
-        if idx % 2 == 0:
-            for col in [1, 2, 3, 4, 5, 7]:
-                ws.cell(row=idx, column=col).fill = light_fill
-    
     # Set column widths
     ws.column_dimensions['A'].width = 8
     ws.column_dimensions['B'].width = 12
@@ -544,17 +523,40 @@ def create_rejection_details_sheet(wb, rejections):
     ws.column_dimensions['F'].width = 15
     ws.column_dimensions['G'].width = 25
     
-    # Add borders
     thin_border = Border(
         left=Side(style='thin'),
         right=Side(style='thin'),
         top=Side(style='thin'),
         bottom=Side(style='thin')
     )
+    for col in range(1, 8):
+        ws.cell(row=3, column=col).border = thin_border
     
-    for row in ws.iter_rows(min_row=3, max_row=len(rejections)+3, min_col=1, max_col=7):
-        for cell in row:
+    # Data - one pass, style objects built once and shared by every row
+    # (rejection lists can run to tens of thousands of rows)
+    light_fill = PatternFill(start_color="FFEBEE", end_color="FFEBEE", fill_type="solid")
+    major_fill = PatternFill(start_color="FFCDD2", end_color="FFCDD2", fill_type="solid")
+    minor_fill = PatternFill(start_color="FFF9C4", end_color="FFF9C4", fill_type="solid")
+    type_font = Font(name='Calibri', size=10, bold=True)
+    align_center = Alignment(horizontal='center')
+    align_left = Alignment(horizontal='left')
+    column_align = [align_center, align_center, align_left, align_left, align_center, align_center, align_left]
+    
+    for idx, rej in enumerate(rejections, 4):
+        defect_type = rej.get('defect_type', 'Minor')
+        values = [idx - 3, rej.get('date', ''), rej.get('serial', ''), rej.get('reason', ''),
+                  rej.get('stage', ''), defect_type, rej.get('remarks', '')]
+        zebra = idx % 2 == 0
+        
+        for col, value in enumerate(values, 1):
+            cell = ws.cell(row=idx, column=col, value=value)
+            cell.alignment = column_align[col - 1]
             cell.border = thin_border
+            if col == 6:
+                cell.fill = major_fill if defect_type == 'Major' else minor_fill
+                cell.font = type_font
+            elif zebra:
+                cell.fill = light_fill
 
 def create_bom_materials_sheet(wb, production_data):
     """Sheet 7: BOM Materials & Documents"""
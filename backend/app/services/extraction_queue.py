@@ -0,0 +1,437 @@
+"""
+Background text extraction for QMS documents.
+
+extract_text_from_file() (PyPDF2 / python-docx / openpyxl / pptx) used to
+run inside the upload request, and /assistant/extract-all ran it serially
+for the whole library in one request. Here files are handed to a process
+pool instead: uploads return as soon as the file is saved, a bulk
+re-extract is spread over all cores, and every file gets a hard timeout
+so one pathological PDF cannot hold a worker forever.
+
+Results are cached on disk by SHA-256 of the file content and its
+extension (plus an extractor version and the OCR setup, see pdf_ocr), so
+a re-uploaded file or a revert to an older version is never extracted
+twice. Empty results are not cached: extract_text_from_file() returns ''
+for a failure (missing library, locked file, failed OCR) as well as for a
+file without text, and a failure must be retried next time. When a job
+finishes, its text is written to the document (only if the document
+still points at the same file) and the document is re-posted in the QMS
+search index.
+
+Job state (queued -> done / empty / failed / timeout / stale) lives in
+the process that runs the job and is published to the shared cache store
+(utils/shared_cache) on every change, so /api/qms/assistant/extract-status
+answers from whichever web process receives the poll (WEB_PROCESSES > 1).
+queue_status() covers this process's jobs only.
+
+Usage:
+    from app.services import extraction_queue
+    text = extraction_queue.cached_text(abs_path)           # None if never extracted
+    job_id = extraction_queue.submit(app, doc.id, doc.file_path, abs_path)
+    batch_id = extraction_queue.new_batch()                 # group jobs for progress
+    extraction_queue.batch_status(batch_id)
+    state, text = extraction_queue.extract_now(abs_path)    # waits, for one-off calls
+
+Tunables via environment:
+    QMS_EXTRACT_WORKERS       extraction processes             (default cpu_count)
+    QMS_EXTRACT_TIMEOUT_SEC   max seconds per file             (default 120)
+    QMS_EXTRACT_JOB_HISTORY   finished jobs kept for status    (default 2000)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import signal
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from app.services.document_search import extract_text_from_file
+from app.services.pdf_ocr import ocr_tag
+from app.utils import shared_cache
+
+logger = logging.getLogger(__name__)
+
+_WORKERS = max(1, int(os.environ.get('QMS_EXTRACT_WORKERS', str(os.cpu_count() or 2))))
+_TIMEOUT = int(os.environ.get('QMS_EXTRACT_TIMEOUT_SEC', '120'))
+_JOB_HISTORY = int(os.environ.get('QMS_EXTRACT_JOB_HISTORY', '2000'))
+_BATCH_HISTORY = 50
+
+# Bump when extract_text_from_file() changes output, so cached text is redone
+EXTRACTOR_VERSION = 2
+
+_TEXT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'cache', 'qms_text',
+)
+
+_FINISHED = ('done', 'empty', 'failed', 'timeout', 'stale')
+
+_lock = threading.Lock()
+_pool = None
+_applier = None          # single thread that writes results to the DB, in order
+_jobs: OrderedDict = OrderedDict()
+_batches: OrderedDict = OrderedDict()
+
+
+# ─── Content-hash text cache ───────────────────
+
+def file_hash(path, block=1024 * 1024):
+    """SHA-256 hex digest of a file, read in blocks."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(block)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cache_path(content_hash, ext):
+    # The extension picks the extractor, so the same bytes under another
+    # one are extracted again. The OCR setup is part of the key: scanned
+    # PDFs cached while tesseract was missing (or at another DPI/language)
+    # are extracted again
+    return os.path.join(_TEXT_CACHE_DIR, content_hash[:2],
+                        f'{content_hash}{ext}.v{EXTRACTOR_VERSION}.{ocr_tag()}.txt')
+
+
+def _ext(path):
+    return os.path.splitext(path)[1].lower()
+
+
+def _cache_get(content_hash, ext):
+    try:
+        with open(_cache_path(content_hash, ext), 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _cache_put(content_hash, ext, text):
+    path = _cache_path(content_hash, ext)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def cached_text(path):
+    """Previously extracted text for this file's content, or None."""
+    try:
+        return _cache_get(file_hash(path), _ext(path))
+    except OSError:
+        return None
+
+
+# ─── Worker side (runs in the process pool) ────
+
+class ExtractionTimeout(BaseException):
+    """
+    Raised by SIGALRM inside a worker. A BaseException so the extractors'
+    own `except Exception` handlers do not swallow it.
+    """
+
+
+def _on_alarm(signum, frame):
+    raise ExtractionTimeout()
+
+
+def _extract_job(path, timeout):
+    """Returns (state, text) with state in cached / done / timeout."""
+    content_hash, ext = file_hash(path), _ext(path)
+    text = _cache_get(content_hash, ext)
+    if text is not None:
+        return 'cached', text
+
+    use_alarm = timeout > 0 and hasattr(signal, 'SIGALRM')
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.alarm(timeout)
+    try:
+        text = extract_text_from_file(path)
+    except ExtractionTimeout:
+        return 'timeout', ''
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+    if text:
+        _cache_put(content_hash, ext, text)    # '' may be a failure: never cached
+    return 'done', text or ''
+
+
+# ─── Pool management ───────────────────────────
+
+def _get_pool():
+    global _pool, _applier
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=_WORKERS)
+        if _applier is None:
+            _applier = ThreadPoolExecutor(max_workers=1, thread_name_prefix='qms-extract-apply')
+        return _pool
+
+
+def _reset_pool(broken):
+    """Drop a pool whose worker died (segfault, OOM kill); the next submit starts a fresh one."""
+    global _pool
+    with _lock:
+        if _pool is broken:
+            _pool = None
+    try:
+        broken.shutdown(wait=False)
+    except Exception:
+        pass
+
+
+def _pool_submit(path):
+    pool = _get_pool()
+    try:
+        return pool.submit(_extract_job, path, _TIMEOUT)
+    except BrokenProcessPool:
+        _reset_pool(pool)
+        return _get_pool().submit(_extract_job, path, _TIMEOUT)
+
+
+# ─── Job registry ──────────────────────────────
+
+def _shared_jobs():
+    return shared_cache.open('qms_extract_jobs')
+
+
+def _shared_batches():
+    return shared_cache.open('qms_extract_batches')
+
+
+def _publish(job=None, batch=None, dropped_jobs=(), dropped_batches=()):
+    """Mirror job / batch changes to the shared store for the other processes."""
+    try:
+        if job is not None or dropped_jobs:
+            jobs = _shared_jobs()
+            if job is not None:
+                with _lock:
+                    jobs[job['id']] = {**_public(job), 'batch_id': job['batch_id']}
+            for job_id in dropped_jobs:
+                jobs.pop(job_id, None)
+            jobs.flush()
+        if batch is not None or dropped_batches:
+            batches = _shared_batches()
+            if batch is not None:
+                batches[batch['id']] = {'id': batch['id'], 'created_at': batch['created_at'],
+                                        'skipped': batch['skipped']}
+            for batch_id in dropped_batches:
+                batches.pop(batch_id, None)
+            batches.flush()
+    except Exception as e:
+        logger.warning(f"Publishing extraction status failed: {e}")
+
+
+def _register(job):
+    dropped = []
+    with _lock:
+        _jobs[job['id']] = job
+        if job['batch_id'] in _batches:
+            _batches[job['batch_id']]['jobs'].append(job)
+        while len(_jobs) > _JOB_HISTORY:
+            oldest_id, oldest = next(iter(_jobs.items()))
+            if oldest['state'] not in _FINISHED:
+                break
+            del _jobs[oldest_id]
+            dropped.append(oldest_id)
+    _publish(job=job, dropped_jobs=dropped)
+
+
+def _finish(job, state, **fields):
+    with _lock:
+        job.update(fields)
+        job['state'] = state
+        job['finished_at'] = datetime.utcnow().isoformat()
+    _publish(job=job)
+
+
+def new_batch(skipped=None):
+    """
+    Start a batch for grouping jobs (extract-all). `skipped` is a list of
+    {'id', 'title', 'reason'} for documents that were never queued.
+    """
+    batch_id = uuid.uuid4().hex[:12]
+    dropped = []
+    with _lock:
+        batch = _batches[batch_id] = {
+            'id': batch_id,
+            'created_at': datetime.utcnow().isoformat(),
+            'jobs': [],
+            'skipped': list(skipped or []),
+        }
+        while len(_batches) > _BATCH_HISTORY:
+            dropped.append(_batches.popitem(last=False)[0])
+    _publish(batch=batch, dropped_batches=dropped)
+    return batch_id
+
+
+def submit(app, doc_id, file_path, abs_path, title=None, batch_id=None):
+    """
+    Queue extraction of one document's file; returns the job id.
+
+    file_path is the document's stored (relative) path. The result is only
+    written if the document still points at that file when the job ends.
+    """
+    job = {
+        'id': uuid.uuid4().hex[:12],
+        'batch_id': batch_id,
+        'doc_id': doc_id,
+        'title': title,
+        'file_path': file_path,
+        'state': 'queued',
+        'cached': False,
+        'text_length': None,
+        'error': None,
+        'submitted_at': datetime.utcnow().isoformat(),
+        'finished_at': None,
+    }
+    _register(job)
+    try:
+        fut = _pool_submit(abs_path)
+    except Exception as e:
+        _finish(job, 'failed', error=str(e))
+        return job['id']
+    fut.add_done_callback(lambda f: _applier.submit(_apply, app, job, f))
+    return job['id']
+
+
+def _apply(app, job, fut):
+    try:
+        state, text = fut.result()
+    except BrokenProcessPool as e:
+        if _pool is not None:
+            _reset_pool(_pool)
+        _finish(job, 'failed', error=f'Extraction worker died: {e}')
+        return
+    except Exception as e:
+        _finish(job, 'failed', error=str(e))
+        return
+    if state == 'timeout':
+        _finish(job, 'timeout', error=f'No result after {_TIMEOUT}s')
+        return
+
+    from app.models.database import db
+    from app.models.qms_models import QMSDocument
+    with app.app_context():
+        try:
+            doc = db.session.get(QMSDocument, job['doc_id'])
+            if doc is None or doc.file_path != job['file_path']:
+                _finish(job, 'stale', cached=state == 'cached')
+                return
+            doc.extracted_text = text or None
+            doc.text_extracted_at = datetime.utcnow() if text else None
+            db.session.commit()
+
+            from app.services.qms_search_index import index_document
+            index_document(doc)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Saving extracted text for doc {job['doc_id']} failed: {e}")
+            _finish(job, 'failed', error=str(e))
+            return
+    _finish(job, 'done' if text else 'empty', cached=state == 'cached', text_length=len(text))
+
+
+def extract_now(abs_path, wait=None):
+    """
+    Extract one file through the cache and the pool, waiting for the
+    result. Returns (state, text), state in cached / done / timeout.
+    """
+    fut = _pool_submit(abs_path)
+    return fut.result(timeout=wait or _TIMEOUT + 30)
+
+
+# ─── Status ────────────────────────────────────
+
+def _public(job):
+    return {k: job[k] for k in ('id', 'doc_id', 'title', 'state', 'cached',
+                                'text_length', 'error', 'submitted_at', 'finished_at')}
+
+
+def job_status(job_id):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job:
+            return _public(job)
+    shared_jobs = _shared_jobs()                # run by another process
+    shared_jobs.refresh()
+    job = shared_jobs.get(job_id)
+    return {k: v for k, v in job.items() if k != 'batch_id'} if job else None
+
+
+def batch_status(batch_id):
+    """
+    Progress of a batch. `results` keeps the shape extract-all always
+    returned (total / success / failed / skipped / details).
+    """
+    with _lock:
+        batch = _batches.get(batch_id)
+        if batch is not None:
+            jobs = [_public(j) for j in batch['jobs']]
+            skipped = list(batch['skipped'])
+    if batch is None:
+        # Started by another process: read what it published, up to date
+        batches, shared_jobs = _shared_batches(), _shared_jobs()
+        batches.refresh()
+        shared_jobs.refresh()
+        batch = batches.get(batch_id)
+        if batch is None:
+            return None
+        jobs = [j for j in shared_jobs.values() if j.get('batch_id') == batch_id]
+        skipped = list(batch['skipped'])
+
+    pending = sum(1 for j in jobs if j['state'] not in _FINISHED)
+    success = sum(1 for j in jobs if j['state'] == 'done')
+    details = [{'id': s.get('id'), 'title': s.get('title'), 'status': 'skipped',
+                'reason': s.get('reason')} for s in skipped]
+    for j in jobs:
+        if j['state'] == 'done':
+            details.append({'id': j['doc_id'], 'title': j['title'], 'status': 'success',
+                            'text_length': j['text_length'], 'cached': j['cached']})
+        elif j['state'] in _FINISHED:
+            reason = j['error'] or {'empty': 'No text extracted',
+                                    'stale': 'File replaced before extraction finished'}[j['state']]
+            details.append({'id': j['doc_id'], 'title': j['title'], 'status': 'failed',
+                            'reason': reason})
+    return {
+        'batch_id': batch_id,
+        'created_at': batch['created_at'],
+        'finished': pending == 0,
+        'pending': pending,
+        'cached': sum(1 for j in jobs if j['cached']),
+        'results': {
+            'total': len(jobs) + len(skipped),
+            'success': success,
+            'failed': len(jobs) - pending - success,
+            'skipped': len(skipped),
+            'details': details,
+        },
+    }
+
+
+def queue_status(recent=20):
+    """Worker count, queued jobs and the most recent jobs."""
+    with _lock:
+        jobs = list(_jobs.values())
+    counts = {}
+    for j in jobs:
+        counts[j['state']] = counts.get(j['state'], 0) + 1
+    return {
+        'workers': _WORKERS,
+        'timeout_sec': _TIMEOUT,
+        'queued': counts.get('queued', 0),
+        'states': counts,
+        'recent': [_public(j) for j in jobs[-recent:]][::-1],
+    }
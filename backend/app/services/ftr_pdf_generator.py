@@ -74,20 +74,42 @@ class FTRPDFGenerator:
         # Module Area
         place_text(115, 165, f"{data.get('moduleArea', 0)} m²")
         
-        # Add graph image if provided
+        # Graph area: position matches .ftr-graph-container with production
+        # adjustments (X_diff / Y_diff)
+        graph_x = mm_to_point(115 - 7.24)
+        graph_y = height - mm_to_point(45 - 10.16) - mm_to_point(50)
+        graph_w, graph_h = mm_to_point(80), mm_to_point(50)
+
+        # Per-serial curve as vector paths over the cached chart background
+        graph_vector = data.get('graphVector')
+        if graph_vector is not None:
+            c.drawImage(ImageReader(BytesIO(graph_vector['background'])),
+                        graph_x, graph_y, width=graph_w, height=graph_h)
+            px_w, px_h = graph_vector['size']
+            for key, color_key, line_w in (('pv', 'pv_color', 0.5), ('iv', 'iv_color', 0.6)):
+                pts = graph_vector[key]
+                path = c.beginPath()
+                for i, (px, py) in enumerate(pts):
+                    x = graph_x + px * graph_w / px_w
+                    y = graph_y + (px_h - py) * graph_h / px_h
+                    if i == 0:
+                        path.moveTo(x, y)
+                    else:
+                        path.lineTo(x, y)
+                c.setStrokeColorRGB(*(v / 255.0 for v in graph_vector[color_key]))
+                c.setLineWidth(line_w)
+                c.drawPath(path, stroke=1, fill=0)
+
+        # Add graph image if provided: per-serial PNG bytes win over the
+        # static per-wattage image path
+        graph_image = data.get('graphImage')
         graph_image_path = data.get('graphImagePath')
-        if graph_image_path and os.path.exists(graph_image_path):
-            # Position matches .ftr-graph-container with production adjustments
-            img_x_mm = 115 - 7.24  # Adjust for X_diff
-            img_y_mm = 45 - 10.16  # Adjust for Y_diff
-            
-            c.drawImage(
-                graph_image_path,
-                mm_to_point(img_x_mm),
-                height - mm_to_point(img_y_mm) - mm_to_point(50),  # Adjust for image height
-                width=mm_to_point(80),
-                height=mm_to_point(50)
-            )
+        if graph_image is None and graph_image_path and os.path.exists(graph_image_path):
+            graph_image = graph_image_path
+        elif isinstance(graph_image, (bytes, bytearray)):
+            graph_image = ImageReader(BytesIO(graph_image))
+        if graph_vector is None and graph_image is not None:
+            c.drawImage(graph_image, graph_x, graph_y, width=graph_w, height=graph_h)
         
         c.save()
         packet.seek(0)
@@ -130,7 +152,7 @@ class FTRPDFGenerator:
         return output
 
 
-def create_ftr_report(template_path, test_data, graph_image_path=None):
+def create_ftr_report(template_path, test_data, graph_image_path=None, graph_image=None):
     """
     Convenience function to create FTR report
     
@@ -138,6 +160,9 @@ def create_ftr_report(template_path, test_data, graph_image_path=None):
         template_path: Path to template PDF
         test_data: Dictionary with test data
         graph_image_path: Optional path to graph image
+        graph_image: Optional per-serial graph as PNG bytes (takes priority),
+            or the dict from iv_curve_renderer.curve_vector_paths() to draw
+            the curve as vector paths
         
     Returns:
         BytesIO object containing generated PDF
@@ -145,6 +170,10 @@ def create_ftr_report(template_path, test_data, graph_image_path=None):
     # Add graph path to data if provided
     if graph_image_path:
         test_data['graphImagePath'] = graph_image_path
+    if isinstance(graph_image, dict):
+        test_data['graphVector'] = graph_image
+    elif graph_image is not None:
+        test_data['graphImage'] = graph_image
     
     generator = FTRPDFGenerator(template_path)
     return generator.generate_pdf(test_data)
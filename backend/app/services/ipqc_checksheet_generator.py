@@ -2,16 +2,27 @@
 IPQC Check Sheet Generator — Exact replica of "IPQC Check Sheet.xlsx"
 Generates a filled IPQC checksheet in the original Gautam Solar format.
 140 rows × 15 columns (A-O), single sheet named "IPQC".
+
+The static layout is built once per process and cloned for every sheet;
+generate_ipqc_checksheet_batch() puts a whole month of day/night sheets
+into one workbook or ZIP.
 """
 
 import os
 import random
+import threading
+import zipfile
+from copy import copy
 from datetime import datetime
+from io import BytesIO
 from openpyxl import Workbook
+from openpyxl.cell.cell import Cell
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 from openpyxl.drawing.image import Image as XlImage
 from openpyxl.worksheet.page import PageMargins
+from openpyxl.worksheet.cell_range import CellRange, MultiCellRange
+from openpyxl.utils.indexed_list import IndexedList
 
 
 # ──────────────────────────────────────────────
@@ -99,6 +110,138 @@ def _gen_serials(prefix, start, count=5):
     return [f"{prefix}{str(n).zfill(5)}" for n in picks]
 
 
+# ──────────────────────────────────────────────
+# Cached layout template
+#
+# Widths, heights, ~400 merged ranges, fonts, fills, borders and page
+# setup never change between checksheets; only the values do. The full
+# sheet is built once per process, and each checksheet is a clone of it
+# (cells + style ids copied directly, no merge/style re-resolution) with
+# the values filled in.
+# ──────────────────────────────────────────────
+_LOGO_PATH = os.path.join(os.path.dirname(__file__), 'ipqc_logo.png')
+_STYLE_TABLES = ('_fonts', '_fills', '_borders', '_alignments',
+                 '_protections', '_number_formats', '_cell_styles')
+
+_template = None
+_template_lock = threading.Lock()
+
+
+class _Discard:
+    """Stand-in cell that ignores style assignments."""
+
+    def __setattr__(self, name, value):
+        pass
+
+
+class _ValueRecorder:
+    """
+    Worksheet stand-in for the fill pass: runs the same writer code as the
+    template but only keeps {(row, col): value}. Merges and styles are
+    already in the template.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self._sink = _Discard()
+
+    def merge_cells(self, *args, **kwargs):
+        pass
+
+    def cell(self, row, column, value=None):
+        self.values[(row, column)] = value
+        return self._sink
+
+
+def _get_template():
+    global _template
+    if _template is None:
+        with _template_lock:
+            if _template is None:
+                wb = Workbook()
+                ws = wb.active
+                ws.title = 'IPQC'
+                for col_letter, width in COL_WIDTHS.items():
+                    ws.column_dimensions[col_letter].width = width
+                for r, h in ROW_HEIGHTS.items():
+                    ws.row_dimensions[r].height = h
+                _write_sheet(ws, datetime.now().strftime('%Y-%m-%d'), 'Day', '', 'Solar Space',
+                             25.7, 1200, 'GM-2024-001', 'GS04875KG302250', 1, '', '')
+                for row in ws.iter_rows(min_row=1, max_row=140, min_col=1, max_col=15):
+                    for cell in row:
+                        cell.border = THIN_BORDER
+                _setup_page(ws)
+                _template = ws
+    return _template
+
+
+def _setup_page(ws):
+    ws.page_setup.orientation = 'landscape'
+    ws.page_setup.paperSize = 9  # A4
+    ws.page_setup.fitToWidth = 1
+    ws.page_setup.fitToHeight = 0
+    ws.page_setup.scale = 100   # let fitToWidth handle scaling
+    ws.page_margins = PageMargins(left=0.2, right=0.2, top=0.35, bottom=0.2, header=0.0, footer=0.0)
+    ws.print_options.horizontalCentered = True
+    ws.print_area = 'A1:O140'
+    ws.print_title_rows = '1:6'
+    ws.sheet_properties.pageSetUpPr.fitToPage = True
+
+
+def _new_workbook():
+    """Empty workbook sharing the template's style tables, so style ids copy as-is."""
+    tpl_wb = _get_template().parent
+    wb = Workbook()
+    wb.remove(wb.active)
+    for attr in _STYLE_TABLES:
+        setattr(wb, attr, IndexedList(getattr(tpl_wb, attr)))
+    return wb
+
+
+def _clone_template(wb, title):
+    tpl = _get_template()
+    ws = wb.create_sheet(title=title)
+    cells = ws._cells
+    for (row, col), src in tpl._cells.items():
+        cell = Cell(ws, row=row, column=col)
+        cell._style = copy(src._style)
+        cells[(row, col)] = cell
+    for attr in ('row_dimensions', 'column_dimensions'):
+        target = getattr(ws, attr)
+        for key, dim in getattr(tpl, attr).items():
+            target[key] = copy(dim)
+            target[key].worksheet = ws
+    ws.merged_cells = MultiCellRange({CellRange(r.coord) for r in tpl.merged_cells.ranges})
+    ws.sheet_format = copy(tpl.sheet_format)
+    _setup_page(ws)
+    if os.path.exists(_LOGO_PATH):
+        logo_img = XlImage(_LOGO_PATH)
+        logo_img.width = 180
+        logo_img.height = 38
+        ws.add_image(logo_img, 'A1')
+    return ws
+
+
+def _add_checksheet(wb, title, date, shift, po_number, cell_manufacturer, cell_efficiency,
+                    jb_cable_length, golden_module_number, serial_prefix, serial_start,
+                    checked_by, reviewed_by):
+    """Clone the template into wb as sheet `title` and fill in this shift's values."""
+    recorder = _ValueRecorder()
+    _write_sheet(recorder, date, shift, po_number, cell_manufacturer, cell_efficiency,
+                 jb_cable_length, golden_module_number, serial_prefix, serial_start,
+                 checked_by, reviewed_by)
+    ws = _clone_template(wb, title)
+    for (row, col), value in recorder.values.items():
+        ws.cell(row=row, column=col).value = value
+    return ws
+
+
+def _output_path(filename):
+    output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'generated_pdfs')
+    os.makedirs(output_dir, exist_ok=True)
+    return os.path.join(output_dir, filename)
+
+
 # ──────────────────────────────────────────────
 # Main generator
 # ──────────────────────────────────────────────
@@ -120,30 +263,76 @@ def generate_ipqc_checksheet(
     if date is None:
         date = datetime.now().strftime('%Y-%m-%d')
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'IPQC'
+    wb = _new_workbook()
+    _add_checksheet(wb, 'IPQC', date, shift, po_number, cell_manufacturer, cell_efficiency,
+                    jb_cable_length, golden_module_number, serial_prefix, serial_start,
+                    checked_by, reviewed_by)
 
-    for col_letter, width in COL_WIDTHS.items():
-        ws.column_dimensions[col_letter].width = width
+    safe_date = date.replace('-', '') if date else datetime.now().strftime('%Y%m%d')
+    filepath = _output_path(f"IPQC_CheckSheet_{safe_date}_Shift{shift}_{datetime.now().strftime('%H%M%S')}.xlsx")
+    wb.save(filepath)
+    return filepath
 
-    for r, h in ROW_HEIGHTS.items():
-        ws.row_dimensions[r].height = h
 
+def generate_ipqc_checksheet_batch(
+    dates,
+    shifts=('Day', 'Night'),
+    output='workbook',
+    po_number='',
+    cell_manufacturer='Solar Space',
+    cell_efficiency=25.7,
+    jb_cable_length=1200,
+    golden_module_number='GM-2024-001',
+    serial_prefix='GS04875KG302250',
+    serial_start=1,
+    checked_by='',
+    reviewed_by='',
+):
+    """
+    Checksheets for every (date, shift) pair.
+
+    output='workbook' -> one .xlsx with a sheet per date/shift ("2026-03-01 Day")
+    output='zip'      -> a .zip with one .xlsx per date/shift
+    Returns the file path.
+    """
+    dates = list(dates)
+    if not dates:
+        raise ValueError('No dates given')
+    common = (po_number, cell_manufacturer, cell_efficiency, jb_cable_length,
+              golden_module_number, serial_prefix, serial_start, checked_by, reviewed_by)
+    stamp = datetime.now().strftime('%H%M%S')
+    span = f"{dates[0].replace('-', '')}_{dates[-1].replace('-', '')}"
+
+    if output == 'zip':
+        filepath = _output_path(f'IPQC_CheckSheets_{span}_{stamp}.zip')
+        with zipfile.ZipFile(filepath, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for date in dates:
+                for shift in shifts:
+                    wb = _new_workbook()
+                    _add_checksheet(wb, 'IPQC', date, shift, *common)
+                    buf = BytesIO()
+                    wb.save(buf)
+                    zf.writestr(f"IPQC_CheckSheet_{date.replace('-', '')}_Shift{shift}.xlsx", buf.getvalue())
+        return filepath
+
+    wb = _new_workbook()
+    for date in dates:
+        for shift in shifts:
+            _add_checksheet(wb, f'{date} {shift}'[:31], date, shift, *common)
+    filepath = _output_path(f'IPQC_CheckSheets_{span}_{stamp}.xlsx')
+    wb.save(filepath)
+    return filepath
+
+
+def _write_sheet(ws, date, shift, po_number, cell_mfr, cell_eff, cable_len, golden,
+                 prefix, start, checked_by, reviewed_by):
+    """Every merge and cell write of the sheet (rows 1-140), header to sign-off."""
     # ══════════════════════════════════════════
     # ROWS 1-6: Header block
     # ══════════════════════════════════════════
     ws.merge_cells('A1:C3')
     _cell(ws, 1, 1, '', FONT_BOLD, alignment=Alignment(horizontal='center'))
 
-    # Logo — smaller size
-    logo_path = os.path.join(os.path.dirname(__file__), 'ipqc_logo.png')
-    if os.path.exists(logo_path):
-        logo_img = XlImage(logo_path)
-        logo_img.width = 180
-        logo_img.height = 38
-        ws.add_image(logo_img, 'A1')
-
     ws.merge_cells('D1:K2')
     _cell(ws, 1, 4, 'Gautam Solar Private Limited', FONT_TITLE, alignment=ALIGN_CENTER_NW)
 
@@ -181,8 +370,7 @@ def generate_ipqc_checksheet(
     # ══════════════════════════════════════════
     # ROWS 7-139: All 33 checkpoints
     # ══════════════════════════════════════════
-    _write_all_stages(ws, serial_prefix, serial_start, cell_manufacturer, cell_efficiency,
-                      jb_cable_length, golden_module_number, shift, date)
+    _write_all_stages(ws, prefix, start, cell_mfr, cell_eff, cable_len, golden, shift, date)
 
     # Row 140
     ws.merge_cells('A140:B140'); _cell(ws, 140, 1, 'Checked By', FONT_BOLD, alignment=Alignment(horizontal='left', vertical='center', wrap_text=True))
@@ -191,29 +379,6 @@ def generate_ipqc_checksheet(
     ws.merge_cells('L140:M140'); _cell(ws, 140, 12, 'Reviewed By', FONT_BOLD, alignment=ALIGN_CENTER)
     ws.merge_cells('N140:O140'); _cell(ws, 140, 14, reviewed_by, FONT_NORMAL, alignment=ALIGN_CENTER)
 
-    for row in ws.iter_rows(min_row=1, max_row=140, min_col=1, max_col=15):
-        for cell in row:
-            cell.border = THIN_BORDER
-
-    ws.page_setup.orientation = 'landscape'
-    ws.page_setup.paperSize = 9  # A4
-    ws.page_setup.fitToWidth = 1
-    ws.page_setup.fitToHeight = 0
-    ws.page_setup.scale = 100   # let fitToWidth handle scaling
-    ws.page_margins = PageMargins(left=0.2, right=0.2, top=0.35, bottom=0.2, header=0.0, footer=0.0)
-    ws.print_options.horizontalCentered = True
-    ws.print_area = 'A1:O140'
-    ws.print_title_rows = '1:6'
-    ws.sheet_properties.pageSetUpPr.fitToPage = True
-
-    output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'generated_pdfs')
-    os.makedirs(output_dir, exist_ok=True)
-    safe_date = date.replace('-', '') if date else datetime.now().strftime('%Y%m%d')
-    filename = f"IPQC_CheckSheet_{safe_date}_Shift{shift}_{datetime.now().strftime('%H%M%S')}.xlsx"
-    filepath = os.path.join(output_dir, filename)
-    wb.save(filepath)
-    return filepath
-
 
 def _shift_time(shift):
     mapping = {'Day': '08:00 AM - 08:00 PM', 'Night': '08:00 PM - 08:00 AM',
@@ -0,0 +1,156 @@
+"""
+Batched I-V / P-V curve synthesis.
+
+Vectorised port of the model in `generate_iv_curves.py`. The old script
+ran a 100-step Python bisection for the knee parameter `k` and a
+500-iteration Python loop per module. Here the bisection runs once for
+the whole batch (one NumPy op per step, all modules at once) and the
+curves come out as (modules x points) 2-D arrays.
+
+Usage:
+    from app.services.iv_curve_engine import IVCurveBatch
+    batch = IVCurveBatch.from_rows(rows)       # rows: [{serial, voc, isc, vpm, ipm, rs, rsh, pmax}]
+    curve = batch.curve('GS04890KG...')        # -> IVCurve(V, I, P, voc, isc, pmax) or None
+
+Drawing the curves is done by iv_curve_renderer.
+
+Tunables via environment:
+    IV_CURVE_POINTS      points per curve                 (default 500)
+    IV_CURVE_CHUNK       modules solved per NumPy block   (default 4096)
+"""
+
+from __future__ import annotations
+
+import os
+from collections import namedtuple
+
+import numpy as np
+
+
+NUM_POINTS = int(os.environ.get('IV_CURVE_POINTS', '500'))
+_CHUNK = int(os.environ.get('IV_CURVE_CHUNK', '4096'))
+
+# Bisection bracket for k, same as generate_iv_curves.py. 64 halvings of
+# a 48-wide bracket is already below float64 resolution, so the extra
+# 36 iterations of the old loop never changed the result.
+_K_LOW, _K_HIGH = 2.0, 50.0
+_K_ITERATIONS = 64
+
+IVCurve = namedtuple('IVCurve', 'V I P voc isc pmax')
+
+
+def solve_knee(v_ratio, target_ratio, iterations=_K_ITERATIONS):
+    """
+    Solve (exp(v_ratio*k) - 1) / (exp(k) - 1) == target_ratio for k,
+    element-wise, by bisection over the whole array at once.
+    """
+    v_ratio = np.asarray(v_ratio, dtype=np.float64)
+    target_ratio = np.asarray(target_ratio, dtype=np.float64)
+    k_low = np.full(v_ratio.shape, _K_LOW)
+    k_high = np.full(v_ratio.shape, _K_HIGH)
+    for _ in range(iterations):
+        k_mid = (k_low + k_high) * 0.5
+        ratio = np.expm1(v_ratio * k_mid) / np.expm1(k_mid)
+        below = ratio < target_ratio
+        k_low = np.where(below, k_mid, k_low)
+        k_high = np.where(below, k_high, k_mid)
+    return (k_low + k_high) * 0.5
+
+
+def _synthesize_block(voc, isc, vpm, ipm, rs, rsh, num_points):
+    frac = np.linspace(0.0, 1.0, num_points)            # V / Voc, shared by every row
+    V = voc[:, None] * frac[None, :]
+
+    k = solve_knee(vpm / voc, (isc - ipm) / isc)
+    diode_fraction = np.expm1(frac[None, :] * k[:, None]) / np.expm1(k)[:, None]
+
+    with np.errstate(divide='ignore'):
+        shunt_slope = np.where(rsh > 0, 1.0 / rsh, 0.0)
+    shunt_loss = V * shunt_slope[:, None]
+
+    # Series resistance droop, only past half of Vpm (as in the script)
+    rs_factor = np.where(rs > 0, rs * isc / voc, 0.0)
+    rs_effect = rs_factor[:, None] * (frac[None, :] - 0.5) * 0.3
+    rs_effect = np.where(V > (vpm * 0.5)[:, None], rs_effect, 0.0)
+
+    I = isc[:, None] * (1.0 - diode_fraction) - shunt_loss - rs_effect * isc[:, None]
+    np.maximum(I, 0.0, out=I)
+    I[:, 0] = isc
+    I[:, -1] = 0.0
+    return V, I, V * I
+
+
+def synthesize_iv_curves(voc, isc, vpm, ipm, rs, rsh, num_points=NUM_POINTS):
+    """
+    Build I-V / P-V curves for N modules in one pass.
+
+    All parameters are length-N array-likes. Returns (V, I, P), each a
+    float64 array of shape (N, num_points).
+    """
+    params = [np.atleast_1d(np.asarray(a, dtype=np.float64)) for a in (voc, isc, vpm, ipm, rs, rsh)]
+    n = len(params[0])
+    V = np.empty((n, num_points))
+    I = np.empty((n, num_points))
+    P = np.empty((n, num_points))
+    for start in range(0, n, _CHUNK):
+        sl = slice(start, start + _CHUNK)
+        V[sl], I[sl], P[sl] = _synthesize_block(*(p[sl] for p in params), num_points)
+    return V, I, P
+
+
+def _valid(voc, isc, vpm, ipm):
+    """The model needs 0 < Vpm < Voc and 0 < Ipm < Isc."""
+    return 0 < vpm < voc and 0 < ipm < isc
+
+
+class IVCurveBatch:
+    """Curves for a set of modules, addressable by serial number."""
+
+    def __init__(self, serials, voc, isc, vpm, ipm, rs, rsh, pmax, num_points=NUM_POINTS):
+        self.serials = list(serials)
+        self._index = {s: i for i, s in enumerate(self.serials)}
+        self.voc = np.asarray(voc, dtype=np.float64)
+        self.isc = np.asarray(isc, dtype=np.float64)
+        self.pmax = np.asarray(pmax, dtype=np.float64)
+        if self.serials:
+            self.V, self.I, self.P = synthesize_iv_curves(voc, isc, vpm, ipm, rs, rsh, num_points)
+        else:
+            self.V = self.I = self.P = np.empty((0, num_points))
+
+    @classmethod
+    def from_rows(cls, rows, num_points=NUM_POINTS):
+        """
+        Build from dicts with keys serial, voc, isc, vpm, ipm, rs, rsh and
+        optional pmax. Rows with missing or physically impossible values
+        are skipped (callers fall back to the static wattage graph).
+        """
+        cols = {k: [] for k in ('serial', 'voc', 'isc', 'vpm', 'ipm', 'rs', 'rsh', 'pmax')}
+        for r in rows:
+            try:
+                serial = str(r.get('serial') or '').strip()
+                voc, isc = float(r['voc']), float(r['isc'])
+                vpm, ipm = float(r['vpm']), float(r['ipm'])
+                rs, rsh = float(r.get('rs') or 0), float(r.get('rsh') or 0)
+                pmax = float(r.get('pmax') or vpm * ipm)
+            except (KeyError, TypeError, ValueError):
+                continue
+            if not serial or not _valid(voc, isc, vpm, ipm):
+                continue
+            for k, v in zip(cols, (serial, voc, isc, vpm, ipm, rs, rsh, pmax)):
+                cols[k].append(v)
+        return cls(cols.pop('serial'), num_points=num_points, **cols)
+
+    def __len__(self):
+        return len(self.serials)
+
+    def __contains__(self, serial):
+        return serial in self._index
+
+    def curve(self, serial):
+        """Return IVCurve for one serial, or None if it was not in the batch."""
+        i = self._index.get(serial)
+        if i is None:
+            return None
+        return IVCurve(self.V[i], self.I[i], self.P[i],
+                       float(self.voc[i]), float(self.isc[i]), float(self.pmax[i]))
+
@@ -0,0 +1,188 @@
+"""
+Fast IV-curve graph renderer with cached chart templates.
+
+A fresh Matplotlib figure per module spends almost all of its time on
+things that are identical for every module of a wattage class: axes,
+ticks, grid, labels. Here that static part is drawn once with
+Matplotlib, cached as a palette background together with the data->pixel
+mapping of both axes, and each module only gets its two polylines drawn
+on a copy with Pillow.
+
+Axis limits are quantised (Voltage up to the next 5 V, Power up to the
+next 50 W) so all modules of one wattage class share a template.
+
+Two outputs:
+    render_curve_png(curve)            -> PNG bytes (drawImage in the FTR overlay)
+    curve_vector_paths(curve, ...)     -> background PNG + polyline points, for
+                                          drawing the lines as PDF vector paths
+
+Templates live in a per-process dict, so the functions are safe to call
+from threads and from ProcessPoolExecutor workers (each worker builds
+its own templates on first use). Nothing here touches pyplot state.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import threading
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+GRAPH_DPI = int(os.environ.get('IV_CURVE_DPI', '150'))
+_PNG_COMPRESS = int(os.environ.get('IV_CURVE_PNG_COMPRESS', '1'))   # zlib level, speed over size
+
+_BG = '#f0f0f0'
+_IV_COLOR = (0x44, 0x44, 0xbb)
+_PV_COLOR = (0xcc, 0x44, 0x44)
+_IV_INDEX, _PV_INDEX = 254, 255          # palette slots in the template image
+
+_templates: dict = {}
+_templates_lock = threading.Lock()
+
+
+def template_key(voc, isc, pmax):
+    """Quantised axis limits: (max_v, max_i, max_p)."""
+    max_v = int(math.ceil(max(voc * 1.08, 55) / 5.0) * 5)
+    max_i = int(math.ceil(isc * 1.05))
+    max_p = int(math.ceil(max(pmax * 1.15, 600) / 50.0) * 50)
+    return max_v, max_i, max_p
+
+
+class _ChartTemplate:
+    """Rendered background plus affine data->pixel maps for both y axes."""
+
+    __slots__ = ('image', 'png', 'x0', 'sx', 'y_iv0', 'sy_iv', 'y_pv0', 'sy_pv', 'clip')
+
+    def __init__(self, key, dpi):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        max_v, max_i, max_p = key
+        fig = Figure(figsize=(5.8, 6.5), dpi=dpi)
+        canvas = FigureCanvasAgg(fig)
+        fig.patch.set_facecolor(_BG)
+        ax1 = fig.add_subplot(111)
+        ax1.set_facecolor(_BG)
+        ax1.set_xlabel('Voltage(V)', fontsize=11, fontweight='bold', labelpad=8)
+        ax1.set_ylabel('Current(A)', fontsize=11, fontweight='bold', labelpad=8)
+        ax1.set_xlim(0, max_v)
+        ax1.set_ylim(0, max_i)
+        ax1.set_yticks(np.arange(0, max_i + 1, 1))
+        ax1.set_xticks(np.arange(0, max_v + 1, 5))
+        ax1.grid(True, which='major', linestyle=':', linewidth=0.4, color='#bbbbbb', alpha=0.8)
+        ax1.tick_params(axis='both', labelsize=9)
+
+        ax2 = ax1.twinx()
+        ax2.set_ylabel('Power(W) [red]', fontsize=11, fontweight='bold',
+                       color='#cc4444', labelpad=8, rotation=270)
+        ax2.yaxis.set_label_coords(1.12, 0.5)
+        ax2.set_ylim(0, max_p)
+        ax2.set_yticks(np.arange(0, max_p + 1, 50))
+        ax2.tick_params(axis='y', labelsize=9, colors='#cc4444')
+
+        fig.tight_layout()
+        fig.subplots_adjust(right=0.85)
+        canvas.draw()
+
+        # Crop to the tight bbox (same framing as savefig(bbox_inches='tight'))
+        full_h = int(round(fig.bbox.height))
+        tight = fig.get_tightbbox(canvas.get_renderer()).padded(0.1)
+        left = max(0, int(math.floor(tight.x0 * dpi)))
+        right = min(int(round(fig.bbox.width)), int(math.ceil(tight.x1 * dpi)))
+        top = max(0, full_h - int(math.ceil(tight.y1 * dpi)))
+        bottom = min(full_h, full_h - int(math.floor(tight.y0 * dpi)))
+        rgba = np.asarray(canvas.buffer_rgba())
+        rgb = Image.fromarray(rgba[top:bottom, left:right, :3].copy(), 'RGB')
+
+        # Palette image: the chart has only a few hundred distinct colours,
+        # and 1 byte/pixel PNGs encode ~10x faster than RGB. The last two
+        # palette slots are reserved for the curve colours.
+        pal_img = rgb.quantize(colors=254)
+        palette = (pal_img.getpalette() or [])[:254 * 3]
+        palette += [0] * (254 * 3 - len(palette))
+        pal_img.putpalette(palette + list(_IV_COLOR) + list(_PV_COLOR))
+        self.image = pal_img
+
+        # Display coords are bottom-up; Pillow is top-down, shifted by the crop
+        (ox, oy), (ex, ey) = ax1.transData.transform([(0, 0), (max_v, max_i)])
+        self.x0 = ox - left
+        self.sx = (ex - ox) / max_v
+        self.y_iv0 = (full_h - oy) - top
+        self.sy_iv = (ey - oy) / max_i
+        (_, py0), (_, py1) = ax2.transData.transform([(0, 0), (0, max_p)])
+        self.y_pv0 = (full_h - py0) - top
+        self.sy_pv = (py1 - py0) / max_p
+        self.clip = (self.x0, self.y_iv0 - (ey - oy), self.x0 + (ex - ox), self.y_iv0)
+
+        buf = BytesIO()
+        self.image.save(buf, format='PNG', compress_level=_PNG_COMPRESS)
+        self.png = buf.getvalue()
+
+    def iv_points(self, V, I):
+        return self._points(V, I, self.y_iv0, self.sy_iv)
+
+    def pv_points(self, V, P):
+        return self._points(V, P, self.y_pv0, self.sy_pv)
+
+    def _points(self, x, y, y0, sy):
+        x_lo, y_hi, x_hi, y_lo = self.clip
+        px = np.clip(self.x0 + np.asarray(x) * self.sx, x_lo, x_hi)
+        py = np.clip(y0 - np.asarray(y) * sy, y_hi, y_lo)
+        return np.column_stack((px, py))
+
+
+def get_template(voc, isc, pmax, dpi=GRAPH_DPI):
+    """Return the cached template for these limits, building it on first use."""
+    key = template_key(voc, isc, pmax) + (dpi,)
+    tpl = _templates.get(key)
+    if tpl is None:
+        with _templates_lock:
+            tpl = _templates.get(key)
+            if tpl is None:
+                tpl = _ChartTemplate(key[:3], dpi)
+                _templates[key] = tpl
+    return tpl
+
+
+def render_curve_png(curve, dpi=GRAPH_DPI):
+    """
+    Render one IVCurve (see iv_curve_engine) to PNG bytes: copy the cached
+    background and draw the red P-V line, then the blue I-V line on top.
+    """
+    tpl = get_template(curve.voc, curve.isc, curve.pmax, dpi)
+    img = tpl.image.copy()
+    draw = ImageDraw.Draw(img)
+    lw = max(1, int(round(dpi / 72.0)))
+    draw.line(tpl.pv_points(curve.V, curve.P).ravel().tolist(), fill=_PV_INDEX, width=lw)
+    draw.line(tpl.iv_points(curve.V, curve.I).ravel().tolist(), fill=_IV_INDEX, width=lw + 1)
+    buf = BytesIO()
+    img.save(buf, format='PNG', compress_level=_PNG_COMPRESS)
+    return buf.getvalue()
+
+
+def curve_vector_paths(curve, dpi=GRAPH_DPI, max_points=200):
+    """
+    Pieces for drawing the curve as PDF vector paths over the template.
+
+    Returns dict with:
+        background : PNG bytes of the static chart
+        size       : (width_px, height_px) of the background
+        iv, pv     : (N, 2) arrays of pixel coords (top-left origin),
+                     thinned to at most max_points
+        iv_color, pv_color : RGB tuples 0-255
+    """
+    tpl = get_template(curve.voc, curve.isc, curve.pmax, dpi)
+    step = max(1, int(math.ceil(len(curve.V) / float(max_points))))
+    idx = np.r_[np.arange(0, len(curve.V) - 1, step), len(curve.V) - 1]
+    return {
+        'background': tpl.png,
+        'size': tpl.image.size,
+        'iv': tpl.iv_points(curve.V[idx], curve.I[idx]),
+        'pv': tpl.pv_points(curve.V[idx], curve.P[idx]),
+        'iv_color': _IV_COLOR,
+        'pv_color': _PV_COLOR,
+    }
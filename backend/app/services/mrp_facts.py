@@ -0,0 +1,363 @@
+"""
+Per-company MRP fact table for the AI chat queries.
+
+The Julian / running-order / binning / pallet chat handlers used to call
+get_all_mrp_data(company) on every question (3-4 parallel party fetches)
+and then scan every row, re-running the R-O and binning regexes and the
+barcode Julian slice per row. Here each company's MRP rows are parsed once
+into typed columns (NumPy arrays) with hash indexes on Julian day, R-O,
+binning, pallet, sub-party and raw running_order. A question then becomes an index lookup
+plus a few array reductions over a cached table.
+
+A table is rebuilt when it is older than MRP_FACTS_TTL_SEC (the same 5
+minutes MRP tracking data was cached elsewhere) or after invalidate(),
+which the MRP dispatch sync calls. A table built while one of the
+company's party fetches failed is returned but not cached, and lists the
+party in failed_parties. Concurrent requests for a stale company
+wait for one rebuild instead of each fetching from MRP. Tables are per
+process; invalidate() also records the drop in the shared cache store
+(utils/shared_cache), so every process refetches tables older than it.
+
+find_barcode() serves single-barcode status across companies from the
+same cached tables (a barcode -> row hash index per table, built on first
+use) instead of downloading every party's dump per lookup.
+
+Columns (one entry per MRP row, in MRP order):
+    barcode, running_order, status, date, sub_party   object
+    pallet        pallet_no as sent by MRP (str/int)
+    julian, year  from the barcode (0 / -1 = not parseable)
+    ro, binning   'R-3' / 'I2' from running_order, or None
+    dispatched    bool(dispatch_party)
+
+Usage:
+    from app.services import mrp_facts
+    facts = mrp_facts.get('Rays Power')       # MRPFacts, or None if MRP failed
+    tables = mrp_facts.get_many(['Rays Power', 'L&T'])   # {company: MRPFacts or None}
+    pos = facts.select(julian=302, binning='I2')
+    facts.dispatched[pos].sum()
+    facts.counts('ro', pos)                   # {'R-1': 120, 'R-3': 40}
+    facts.index('julian')                     # {302: positions, ...}
+    facts.rows_at(pos)                        # the original MRP dicts
+    'S&W' in facts.parties                    # fetched OK (facts.failed_parties: not)
+    mrp_facts.find_barcode('GS04875KG3022500075', ['Rays Power', 'L&T'])
+                                              # (company, row) from cached tables, or None
+    mrp_facts.invalidate()                    # after an MRP sync
+
+Tunables via environment:
+    MRP_FACTS_TTL_SEC   rebuild a company's table after this long  (default 300)
+    MRP_FACTS_PARALLEL  companies fetched at once by get_many(); each
+                        fetch runs its 3-4 party calls in parallel  (default 3)
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from app.utils import shared_cache
+
+_TTL_SEC = int(os.environ.get('MRP_FACTS_TTL_SEC', '300'))
+_PARALLEL = int(os.environ.get('MRP_FACTS_PARALLEL', '3'))
+
+_EMPTY = np.empty(0, dtype=np.int64)
+
+_tables = {}                # company key -> MRPFacts
+_build_locks = {}           # company key -> Lock (one rebuild at a time)
+_lock = threading.Lock()
+_epoch = 0                  # bumped by invalidate(); a build started before it isn't kept
+_warming = set()            # company keys being built by warm()
+_warm_tried = {}            # company key -> last warm() attempt (retry at most once a minute)
+_WARM_RETRY_SEC = 60
+
+
+def _objects(values):
+    out = np.empty(len(values), dtype=object)
+    out[:] = values
+    return out
+
+
+def _group_index(values, missing=None):
+    """{value: ascending row positions}, leaving out `missing` and None."""
+    codes, uniques = pd.factorize(values, sort=False)
+    keep = np.flatnonzero(codes >= 0)
+    if not len(keep):
+        return {}
+    order = keep[np.argsort(codes[keep], kind='stable')]
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    index = {}
+    for key, rows in zip(uniques.tolist(), np.split(order, bounds)):
+        if key != missing:
+            index[key] = rows
+    return index
+
+
+class MRPFacts:
+    """One company's MRP rows as typed columns plus hash indexes."""
+
+    __slots__ = ('rows', 'built_at', 'parties', 'failed_parties', 'barcode', 'running_order', 'status', 'date', 'sub_party',
+                 'pallet', 'has_pallet', 'julian', 'year', 'ro', 'binning', 'dispatched',
+                 '_indexes', '_all', '_barcodes')
+
+    def __init__(self, rows, parties=(), failed_parties=()):
+        from app.routes.ai_assistant_routes import (
+            extract_binning_from_ro, extract_ro_from_ro, get_julian_from_barcode,
+        )
+
+        self.rows = rows
+        self.built_at = time.time()
+        self.parties = frozenset(parties)               # MRP parties fetched
+        self.failed_parties = frozenset(failed_parties)  # MRP parties whose fetch failed
+        n = len(rows)
+
+        def column(key, default=''):
+            return _objects([r.get(key, default) for r in rows])
+
+        self.barcode = column('barcode')
+        self.running_order = column('running_order')
+        self.status = column('status', None)
+        self.date = column('date')
+        self.sub_party = column('sub_party', None)
+        self.pallet = column('pallet_no')
+        self.has_pallet = self.pallet.astype(bool)
+        self.dispatched = _objects([r.get('dispatch_party') for r in rows]).astype(bool)
+
+        # Barcode fields (GS04875KG3022500075 -> Julian 302, year 2025)
+        julian = np.zeros(n, dtype=np.int64)
+        year = np.full(n, -1, dtype=np.int64)
+        for i, bc in enumerate(self.barcode.tolist()):
+            if not bc:
+                continue
+            julian[i] = get_julian_from_barcode(bc) or 0
+            try:
+                year[i] = int('20' + bc[12:14])
+            except (TypeError, ValueError):
+                pass
+        self.julian, self.year = julian, year
+
+        # R-O and binning: parsed once per distinct running_order string
+        ro_codes, ro_values = pd.factorize(self.running_order, sort=False)
+        parsed_ro = _objects([extract_ro_from_ro(v) for v in ro_values.tolist()] + [None])
+        parsed_bin = _objects([extract_binning_from_ro(v) for v in ro_values.tolist()] + [None])
+        self.ro = parsed_ro[ro_codes]                  # code -1 (None) -> trailing None
+        self.binning = parsed_bin[ro_codes]
+
+        self._all = np.arange(n, dtype=np.int64)
+        self._barcodes = None
+        self._indexes = {
+            'julian': _group_index(julian, missing=0),
+            'ro': _group_index(self.ro),
+            'binning': _group_index(self.binning),
+            'pallet': _group_index(_objects([str(p) if p else None for p in self.pallet.tolist()])),
+            'sub_party': _group_index(self.sub_party),
+            'running_order': _group_index(self.running_order),
+        }
+
+    def __len__(self):
+        return len(self.rows)
+
+    def index(self, name):
+        """{key: ascending row positions} for one indexed column (read-only)."""
+        return self._indexes[name]
+
+    def select(self, **filters):
+        """
+        Row positions matching every given filter (None = no filter). A
+        list/tuple value matches any of its keys; pallet keys are str().
+        """
+        pos = None
+        for name, value in filters.items():
+            if value is None:
+                continue
+            index = self._indexes[name]
+            if isinstance(value, (list, tuple, set)):
+                parts = [index[v] for v in value if v in index]
+                hit = np.unique(np.concatenate(parts)) if parts else _EMPTY
+            else:
+                hit = index.get(value, _EMPTY)
+            pos = hit if pos is None else np.intersect1d(pos, hit, assume_unique=True)
+        return self._all if pos is None else pos
+
+    def match(self, name, predicate):
+        """Row positions whose `name` index key satisfies predicate(key)."""
+        parts = [rows for key, rows in self._indexes[name].items() if predicate(key)]
+        return np.unique(np.concatenate(parts)) if parts else _EMPTY
+
+    def counts(self, column, pos=None):
+        """{value: rows} of a column over pos, skipping empty values."""
+        values = getattr(self, column)
+        values = values if pos is None else values[pos]
+        return {k: v for k, v in Counter(values.tolist()).items() if k and k != -1}
+
+    def find_barcode(self, barcode):
+        """Position of the first row with this barcode (case-insensitive), or -1."""
+        index = self._barcodes
+        if index is None:
+            # Built on first use; a concurrent duplicate build is harmless
+            index = {}
+            for i, bc in enumerate(self.barcode.tolist()):
+                index.setdefault((bc or '').upper(), i)
+            self._barcodes = index
+        return index.get(barcode.upper(), -1)
+
+    def rows_at(self, pos):
+        rows = self.rows
+        return [rows[i] for i in pos.tolist()]
+
+
+def _key(company):
+    return (company or '').strip().lower()
+
+
+def _dropped():
+    return shared_cache.open('mrp_facts_dropped')     # company key or '*' -> time of invalidate()
+
+
+def _fresh(key, facts):
+    if facts is None or time.time() - facts.built_at >= _TTL_SEC:
+        return False
+    dropped = _dropped()
+    return facts.built_at >= max(dropped.get(key, 0), dropped.get('*', 0))
+
+
+def peek(company):
+    """The company's table if a fresh one is cached, without fetching."""
+    key = _key(company)
+    facts = _tables.get(key)
+    return facts if _fresh(key, facts) else None
+
+
+def get(company):
+    """The company's fact table, rebuilt from MRP when stale; None if the MRP fetch failed."""
+    key = _key(company)
+    facts = _tables.get(key)
+    if _fresh(key, facts):
+        return facts
+
+    with _lock:
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+    with build_lock:
+        facts = _tables.get(key)
+        if _fresh(key, facts):
+            return facts
+        from app.routes.ai_assistant_routes import get_all_mrp_data
+        epoch = _epoch
+        fetched_at = time.time()
+        result = get_all_mrp_data(company)
+        if not result.get('success'):
+            return None
+        started = time.time()
+        facts = MRPFacts(result.get('data', []), result.get('parties', ()), result.get('failed_parties', ()))
+        facts.built_at = fetched_at             # the data is as of the fetch
+        if facts.failed_parties:
+            # Partial: serve this request, refetch on the next
+            print(f"[mrp_facts] {company}: not cached, fetch failed for {', '.join(sorted(facts.failed_parties))}")
+        else:
+            with _lock:
+                if epoch == _epoch:
+                    _tables[key] = facts
+        print(f"[mrp_facts] {company}: {len(facts):,} rows indexed in {time.time() - started:.2f}s")
+        return facts
+
+
+def get_many(companies):
+    """
+    {company: MRPFacts or None} for several companies. Fresh tables are
+    used as-is and the rest are fetched concurrently, so a cross-company
+    view costs the slowest company's fetch rather than the sum.
+    """
+    tables = {company: peek(company) for company in companies}
+    todo = [company for company, facts in tables.items() if facts is None]
+    if len(todo) == 1:
+        tables[todo[0]] = _get_or_none(todo[0])
+    elif todo:
+        with ThreadPoolExecutor(max_workers=max(1, min(_PARALLEL, len(todo)))) as executor:
+            for company, facts in zip(todo, executor.map(_get_or_none, todo)):
+                tables[company] = facts
+    return tables
+
+
+def _get_or_none(company):
+    try:
+        return get(company)
+    except Exception as e:
+        print(f"[mrp_facts] {company} failed: {e}")
+        return None
+
+
+def find_barcode(barcode, companies):
+    """
+    (company, MRP row) from the first of `companies` whose cached table holds
+    barcode, or None. Never fetches: companies without a fresh table are
+    rebuilt in the background for the next lookup, and a miss is the
+    caller's cue to ask MRP about the single barcode.
+    """
+    missing = []
+    for company in companies:
+        facts = peek(company)
+        if facts is None:
+            missing.append(company)
+            continue
+        i = facts.find_barcode(barcode)
+        if i >= 0:
+            return company, facts.rows[i]
+    if missing:
+        warm(missing)
+    return None
+
+
+def warm(companies):
+    """Build the tables of `companies` in a background thread (skips ones already warming or tried in the last minute)."""
+    now = time.time()
+    with _lock:
+        todo = [c for c in companies
+                if _key(c) not in _warming and now - _warm_tried.get(_key(c), 0) >= _WARM_RETRY_SEC]
+        for c in todo:
+            _warming.add(_key(c))
+            _warm_tried[_key(c)] = now
+    if not todo:
+        return
+
+    def run():
+        for company in todo:
+            try:
+                facts = get(company)
+                if facts is not None:
+                    facts.find_barcode('')      # build the barcode index off the request path
+            except Exception as e:
+                print(f"[mrp_facts] warm {company} failed: {e}")
+            finally:
+                with _lock:
+                    _warming.discard(_key(company))
+
+    threading.Thread(target=run, name='mrp-facts-warm', daemon=True).start()
+
+
+def invalidate(company=None):
+    """Drop one company's table (or all), in every process; the next get() refetches."""
+    global _epoch
+    with _lock:
+        _epoch += 1
+        if company is None:
+            _tables.clear()
+        else:
+            _tables.pop(_key(company), None)
+    try:
+        dropped = _dropped()
+        dropped['*' if company is None else _key(company)] = time.time()
+        dropped.flush()
+    except Exception as e:
+        print(f"[mrp_facts] publishing invalidate failed: {e}")
+
+
+def status():
+    now = time.time()
+    return {
+        company: {'rows': len(facts), 'age_sec': round(now - facts.built_at, 1)}
+        for company, facts in list(_tables.items())
+    }
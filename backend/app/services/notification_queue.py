@@ -0,0 +1,516 @@
+"""
+Outbound notification queue (WhatsApp pack_dispatch template, Telegram).
+
+Packing alerts, bulk WhatsApp sends and the Telegram dispatch reports used
+to make one blocking HTTP call per recipient per message, inline in the
+validation run or request. Here they are queued and a single background
+worker sends them:
+
+- dedupe: messages with a (serial, alert_type) key are skipped when that
+  key is already queued or in whatsapp_alert_log (one bulk lookup per pass)
+- digests: digest messages queued within NOTIFY_BATCH_WINDOW_SEC for the
+  same recipient / caution / party go out as one WhatsApp message (module
+  and pallet lists joined); Telegram digests to one chat are joined up to
+  the 4096-character limit
+- rate limits per provider, retry with exponential backoff on timeouts,
+  429 and 5xx (other 4xx fail at once). Each process (web processes and
+  worker.py) sends the jobs it queued, so the send slots are reserved in
+  the shared cache store: the limit holds for all processes together
+- whatsapp_alert_log rows for delivered keys are inserted in bulk
+
+Job state (queued -> sent / failed / skipped) lives in the process that
+queued the job and is mirrored to the shared cache store (utils/shared_cache),
+so /api/ai/notification-status?batch_id= answers from any web process and
+for jobs queued by worker.py. queue_status() covers this process only.
+
+Usage:
+    from app.services import notification_queue
+    notification_queue.start(app)                                  # once, from create_app()
+    notification_queue.whatsapp('9876543210', caution, party, module_no, pallet_no, reason,
+                                dedupe=('GS0487...', 'rejection'), digest=True)
+    notification_queue.telegram(bot_token, chat_id, html_text, digest=True)
+    batch_id = notification_queue.new_batch()                      # pass batch_id= to group
+    notification_queue.wait(batch_id, timeout=60)                  # batch_status() when done
+    notification_queue.queue_status()
+
+Tunables via environment:
+    NOTIFY_BATCH_WINDOW_SEC   collect messages this long before a pass   (default 3)
+    NOTIFY_WHATSAPP_PER_MIN   WhatsApp messages per minute              (default 60)
+    NOTIFY_TELEGRAM_PER_MIN   Telegram messages per minute              (default 20)
+    NOTIFY_MAX_ATTEMPTS       tries per message                         (default 4)
+    NOTIFY_RETRY_BASE_SEC     first retry delay, doubled per attempt    (default 5)
+    NOTIFY_JOB_HISTORY        finished jobs kept for status             (default 2000)
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from app.utils import shared_cache
+from app.utils.http_client import http
+
+_BATCH_WINDOW = float(os.environ.get('NOTIFY_BATCH_WINDOW_SEC', '3'))
+_PER_MIN = {
+    'whatsapp': max(1, int(os.environ.get('NOTIFY_WHATSAPP_PER_MIN', '60'))),
+    'telegram': max(1, int(os.environ.get('NOTIFY_TELEGRAM_PER_MIN', '20'))),
+}
+_MAX_ATTEMPTS = max(1, int(os.environ.get('NOTIFY_MAX_ATTEMPTS', '4')))
+_RETRY_BASE = float(os.environ.get('NOTIFY_RETRY_BASE_SEC', '5'))
+_JOB_HISTORY = int(os.environ.get('NOTIFY_JOB_HISTORY', '2000'))
+_BATCH_HISTORY = 50
+
+_PARAM_MAX = 900            # WhatsApp template parameters: 1024 chars, no newlines
+_TELEGRAM_MAX = 4096
+
+_FINISHED = ('sent', 'failed', 'skipped')
+
+_cond = threading.Condition()
+_app = None
+_worker = None
+_pending = []               # queued jobs, in submit order
+_pending_keys = set()       # dedupe keys of queued jobs
+_jobs: OrderedDict = OrderedDict()
+_batches: OrderedDict = OrderedDict()
+_unpublished = {}           # job id -> job (None once dropped) not yet in the shared store
+_next_slot = {'whatsapp': 0.0, 'telegram': 0.0}   # used only while the shared store is down
+
+
+# ─── Submitting ────────────────────────────────
+
+def start(app):
+    """Start the worker thread (idempotent)."""
+    global _app, _worker
+    with _cond:
+        _app = app
+        if _worker is None:
+            _worker = threading.Thread(target=_run, name='notification-queue', daemon=True)
+            _worker.start()
+
+
+def _submit(provider, to, fields, dedupe=None, digest=False, batch_id=None):
+    job = {
+        'id': uuid.uuid4().hex[:12],
+        'batch_id': batch_id,
+        'provider': provider,
+        'to': to,
+        'fields': fields,
+        'dedupe': tuple(dedupe) if dedupe else None,
+        'digest': digest,
+        'state': 'queued',
+        'attempts': 0,
+        'error': None,
+        'next_at': 0.0,
+        'submitted_at': datetime.utcnow().isoformat(),
+        'finished_at': None,
+    }
+    if _worker is None:
+        from flask import current_app
+        try:
+            start(current_app._get_current_object())
+        except RuntimeError:            # no app context: stays queued until start()
+            pass
+    with _cond:
+        _jobs[job['id']] = job
+        _unpublished[job['id']] = job
+        if batch_id in _batches:
+            _batches[batch_id]['jobs'].append(job)
+        while len(_jobs) > _JOB_HISTORY:
+            oldest_id, oldest = next(iter(_jobs.items()))
+            if oldest['state'] not in _FINISHED:
+                break
+            del _jobs[oldest_id]
+            _unpublished[oldest_id] = None
+
+        key = job['dedupe'] and (job['dedupe'], to)
+        if key and key in _pending_keys:
+            _finish(job, 'skipped', error='Already queued')
+        else:
+            if key:
+                _pending_keys.add(key)
+            _pending.append(job)
+            _cond.notify_all()
+    _publish()
+    return job['id']
+
+
+def whatsapp(recipient, caution, party_name, module_no, pallet_no, reason,
+             dedupe=None, digest=False, batch_id=None):
+    """
+    Queue one pack_dispatch template message; returns the job id.
+    dedupe=(serial, alert_type) skips it if that alert was already sent.
+    """
+    recipient = str(recipient).replace('+', '').replace(' ', '').replace('-', '')
+    if len(recipient) == 10:            # local number -> with country code
+        recipient = '91' + recipient
+    fields = {
+        'caution': str(caution), 'party_name': str(party_name), 'module_no': str(module_no),
+        'pallet_no': str(pallet_no), 'reason': str(reason),
+    }
+    return _submit('whatsapp', recipient, fields, dedupe, digest, batch_id)
+
+
+def telegram(bot_token, chat_id, text, digest=False, batch_id=None):
+    """Queue one Telegram (HTML) message; returns the job id."""
+    return _submit('telegram', str(chat_id), {'bot_token': bot_token, 'text': text},
+                   None, digest, batch_id)
+
+
+def _finish(job, state, **fields):
+    """Caller holds _cond."""
+    job.update(fields)
+    job['state'] = state
+    job['finished_at'] = datetime.utcnow().isoformat()
+    _unpublished[job['id']] = job
+    _cond.notify_all()
+
+
+def _shared_jobs():
+    return shared_cache.open('notify_jobs')
+
+
+def _shared_batches():
+    return shared_cache.open('notify_batches')
+
+
+def _publish():
+    """Mirror changed jobs to the shared store for the other processes. Call without _cond."""
+    with _cond:
+        if not _unpublished:
+            return
+        changed = {job_id: job and {**_public(job), 'batch_id': job['batch_id']}
+                   for job_id, job in _unpublished.items()}
+        _unpublished.clear()
+    try:
+        jobs = _shared_jobs()
+        for job_id, public in changed.items():
+            if public is None:
+                jobs.pop(job_id, None)
+            else:
+                jobs[job_id] = public
+        jobs.flush()
+    except Exception as e:
+        print(f"[notify] publishing job status failed: {e}")
+
+
+# ─── Worker ────────────────────────────────────
+
+def _run():
+    while True:
+        try:
+            ready = _next_pass()
+            _process(ready)
+        except Exception as e:
+            print(f"[notify] worker error: {e}")
+            time.sleep(5)
+
+
+def _next_pass():
+    """Wait for due jobs, give a burst NOTIFY_BATCH_WINDOW_SEC to arrive, take every due job."""
+    with _cond:
+        while True:
+            now = time.time()
+            due = [j for j in _pending if j['next_at'] <= now]
+            if due:
+                break
+            wake = min((j['next_at'] for j in _pending), default=None)
+            _cond.wait(None if wake is None else max(0.05, wake - now))
+    time.sleep(_BATCH_WINDOW)
+    with _cond:
+        now = time.time()
+        ready = [j for j in _pending if j['next_at'] <= now]
+        _pending[:] = [j for j in _pending if j['next_at'] > now]
+        return ready
+
+
+def _process(ready):
+    from app.models.database import db
+    from app.models.whatsapp_alert_log import WhatsAppAlertLog
+
+    with _app.app_context():
+        already = _logged_keys(db, {j['dedupe'] for j in ready if j['dedupe']})
+        db.session.remove()
+    todo = []
+    with _cond:
+        for job in ready:
+            if job['dedupe'] in already:
+                _release(job)
+                _finish(job, 'skipped', error='Already sent')
+            else:
+                todo.append(job)
+    _publish()
+
+    delivered = set()
+    for provider, to, fields, jobs in _messages(todo):
+        for job in jobs:
+            job['attempts'] += 1
+        ok, retry, error = _deliver(provider, to, fields)
+        with _cond:
+            for job in jobs:
+                if ok:
+                    _release(job)
+                    _finish(job, 'sent', error=None)
+                    if job['dedupe']:
+                        delivered.add(job['dedupe'])
+                elif retry and job['attempts'] < _MAX_ATTEMPTS:
+                    job['error'] = error
+                    job['next_at'] = time.time() + _RETRY_BASE * 2 ** (job['attempts'] - 1)
+                    _pending.append(job)
+                    _unpublished[job['id']] = job
+                else:
+                    _release(job)
+                    _finish(job, 'failed', error=error)
+        _publish()
+        if not ok:
+            print(f"[notify] {provider} to {to} failed ({'retrying' if retry else 'giving up'}): {error}")
+
+    if delivered:
+        with _app.app_context():
+            try:
+                new = delivered - _logged_keys(db, delivered)
+                if new:
+                    now = datetime.utcnow()
+                    db.session.execute(WhatsAppAlertLog.__table__.insert(), [
+                        {'serial_number': serial, 'alert_type': alert_type, 'sent_at': now}
+                        for serial, alert_type in sorted(new)
+                    ])
+                    db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"[notify] alert log write failed: {e}")
+            finally:
+                db.session.remove()
+
+
+def _release(job):
+    if job['dedupe']:
+        _pending_keys.discard((job['dedupe'], job['to']))
+
+
+def _logged_keys(db, keys):
+    """The (serial, alert_type) keys already in whatsapp_alert_log."""
+    from sqlalchemy import bindparam, text
+    by_type = {}
+    for serial, alert_type in keys:
+        by_type.setdefault(alert_type, []).append(serial)
+    query = text(
+        "SELECT serial_number FROM whatsapp_alert_log WHERE alert_type = :t AND serial_number IN :serials"
+    ).bindparams(bindparam('serials', expanding=True))
+    found = set()
+    for alert_type, serials in by_type.items():
+        for i in range(0, len(serials), 1000):
+            rows = db.session.execute(query, {'t': alert_type, 'serials': serials[i:i + 1000]})
+            found.update((row[0], alert_type) for row in rows)
+    return found
+
+
+def _clip(values, limit=_PARAM_MAX):
+    """'a, b, c (+N more)' within limit, on one line"""
+    values = [' '.join(str(v).split()) for v in values]
+    out = []
+    size = 0
+    for i, value in enumerate(values):
+        if out and size + len(value) + 2 > limit - 12:
+            return ', '.join(out) + f' (+{len(values) - i} more)'
+        out.append(value)
+        size += len(value) + 2
+    return ', '.join(out)[:limit]
+
+
+def _unique(values):
+    return list(dict.fromkeys(values))
+
+
+def _messages(jobs):
+    """(provider, to, fields, jobs) per outgoing message, digests merged, in submit order."""
+    groups = OrderedDict()
+    for job in jobs:
+        f = job['fields']
+        if not job['digest']:
+            key = job['id']
+        elif job['provider'] == 'whatsapp':
+            key = ('whatsapp', job['to'], f['caution'], f['party_name'])
+        else:
+            key = ('telegram', job['to'], f['bot_token'])
+        groups.setdefault(key, []).append(job)
+
+    for group in groups.values():
+        first = group[0]
+        if len(group) == 1:
+            yield first['provider'], first['to'], first['fields'], group
+        elif first['provider'] == 'whatsapp':
+            fields = dict(first['fields'])
+            fields['module_no'] = f"{len(group)} alerts: " + _clip(_unique(j['fields']['module_no'] for j in group))
+            fields['pallet_no'] = _clip(_unique(j['fields']['pallet_no'] for j in group))
+            fields['reason'] = _clip(_unique(j['fields']['reason'] for j in group))
+            yield 'whatsapp', first['to'], fields, group
+        else:
+            part, text = [], ''
+            for job in group:
+                piece = job['fields']['text'][:_TELEGRAM_MAX]
+                if part and len(text) + 2 + len(piece) > _TELEGRAM_MAX:
+                    yield 'telegram', first['to'], {'bot_token': first['fields']['bot_token'], 'text': text}, part
+                    part, text = [], ''
+                part.append(job)
+                text = f"{text}\n\n{piece}" if text else piece
+            yield 'telegram', first['to'], {'bot_token': first['fields']['bot_token'], 'text': text}, part
+
+
+def _throttle(provider):
+    """Sleep until the provider's next send slot (shared by all processes)."""
+    interval = 60.0 / _PER_MIN[provider]
+    slot = shared_cache.take_slot(f'notify_{provider}', interval)
+    if slot is None:
+        slot = max(time.time(), _next_slot[provider])
+        _next_slot[provider] = slot + interval
+    wait = slot - time.time()
+    if wait > 0:
+        time.sleep(wait)
+
+
+def _deliver(provider, to, fields):
+    """(ok, retry, error) for one message."""
+    _throttle(provider)
+    try:
+        if provider == 'whatsapp':
+            from app.routes.ai_assistant_routes import WHATSAPP_API_URL, WHATSAPP_AUTH_TOKEN
+            response = http.post(WHATSAPP_API_URL, json=_template_payload(to, fields), headers={
+                "Authorization": WHATSAPP_AUTH_TOKEN,
+                "Content-Type": "application/json",
+            }, timeout=30)
+            if response.status_code == 200:
+                return True, False, None
+            return False, response.status_code == 429 or response.status_code >= 500, response.text[:300]
+
+        response = http.post(f"https://api.telegram.org/bot{fields['bot_token']}/sendMessage", json={
+            'chat_id': to, 'text': fields['text'], 'parse_mode': 'HTML',
+        }, timeout=30)
+        result = response.json()
+        if result.get('ok'):
+            return True, False, None
+        code = result.get('error_code') or response.status_code
+        if code == 429:
+            # Telegram says how long to back off; hold the whole provider, in every process
+            until = time.time() + (result.get('parameters') or {}).get('retry_after', 5)
+            _next_slot[provider] = until
+            shared_cache.hold_slots(f'notify_{provider}', until)
+        return False, code == 429 or code >= 500, result.get('description', 'Unknown error')
+    except Exception as e:
+        return False, True, str(e)
+
+
+def _template_payload(recipient, fields):
+    return {
+        "to": recipient,
+        "type": "template",
+        "source": "external",
+        "template": {
+            "name": "pack_dispatch",
+            "language": {"code": "en"},
+            "components": [
+                {
+                    "type": "header",
+                    "parameters": [
+                        {"type": "text", "text": fields['caution']}
+                    ]
+                },
+                {
+                    "type": "body",
+                    "parameters": [
+                        {"type": "text", "text": fields['party_name']},
+                        {"type": "text", "text": fields['module_no']},
+                        {"type": "text", "text": fields['pallet_no']},
+                        {"type": "text", "text": fields['reason']}
+                    ]
+                }
+            ]
+        }
+    }
+
+
+# ─── Status ────────────────────────────────────
+
+def new_batch():
+    """Start a batch for grouping jobs (e.g. one bulk send)."""
+    batch_id = uuid.uuid4().hex[:12]
+    dropped = []
+    with _cond:
+        batch = _batches[batch_id] = {'id': batch_id, 'created_at': datetime.utcnow().isoformat(), 'jobs': []}
+        while len(_batches) > _BATCH_HISTORY:
+            dropped.append(_batches.popitem(last=False)[0])
+    try:
+        batches = _shared_batches()
+        batches[batch_id] = {'id': batch_id, 'created_at': batch['created_at']}
+        for old in dropped:
+            batches.pop(old, None)
+        batches.flush()
+    except Exception as e:
+        print(f"[notify] publishing batch failed: {e}")
+    return batch_id
+
+
+def _public(job):
+    return {k: job[k] for k in ('id', 'provider', 'to', 'state', 'attempts', 'error',
+                                'submitted_at', 'finished_at')}
+
+
+def batch_status(batch_id):
+    with _cond:
+        batch = _batches.get(batch_id)
+        if batch is not None:
+            jobs = [_public(j) for j in batch['jobs']]
+    if batch is None:
+        # Queued by another process: read what it published, up to date
+        batches, shared_jobs = _shared_batches(), _shared_jobs()
+        batches.refresh()
+        shared_jobs.refresh()
+        batch = batches.get(batch_id)
+        if batch is None:
+            return None
+        jobs = [{k: v for k, v in j.items() if k != 'batch_id'}
+                for j in shared_jobs.values() if j.get('batch_id') == batch_id]
+    counts = {}
+    for j in jobs:
+        counts[j['state']] = counts.get(j['state'], 0) + 1
+    return {
+        'batch_id': batch_id,
+        'created_at': batch['created_at'],
+        'finished': all(j['state'] in _FINISHED for j in jobs),
+        'total': len(jobs),
+        'states': counts,
+        'jobs': jobs,
+    }
+
+
+def wait(batch_id, timeout=60):
+    """Block until every job of the batch is finished (or timeout); returns batch_status()."""
+    deadline = time.time() + timeout
+    with _cond:
+        batch = _batches.get(batch_id)
+        while batch and any(j['state'] not in _FINISHED for j in batch['jobs']):
+            left = deadline - time.time()
+            if left <= 0:
+                break
+            _cond.wait(left)
+    return batch_status(batch_id)
+
+
+def queue_status(recent=20):
+    """Queued jobs, per-state counts and the most recent jobs."""
+    with _cond:
+        jobs = list(_jobs.values())
+        queued = len(_pending)
+    counts = {}
+    for j in jobs:
+        counts[j['state']] = counts.get(j['state'], 0) + 1
+    return {
+        'running': _worker is not None,
+        'queued': queued,
+        'per_min': dict(_PER_MIN),
+        'states': counts,
+        'recent': [_public(j) for j in jobs[-recent:]][::-1],
+    }
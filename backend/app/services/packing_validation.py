@@ -0,0 +1,507 @@
+"""
+Columnar packing validation engine.
+
+_do_validate_packing() used to walk every MRP row in Python and issue two
+queries per row: a rejection lookup and a PDI/company lookup. Here the MRP
+rows, the company's FTR binning, and the PDI serial table are each loaded
+once into pandas/NumPy columns. The four checks then run as index lookups,
+duplicated() and groupby:
+
+1. REJECTED modules packed (all time): a rejection_reason on the PDI serial,
+   or FTR class_status REJECTED/REJECT/REJ.
+2. WRONG PARTY: a dispatched module whose PDI company's first word is not in
+   the dispatch party.
+3. DUPLICATE barcodes: the same barcode on more than one MRP row.
+4. MIX BINNING: pallets packed on or after the cutoff date that hold more
+   than one known FTR binning.
+
+Results match the row-by-row version, including entry order: rows in MRP
+order, duplicates and pallets in order of first appearance, and a
+rejection_reason entry per row but only the first row of an FTR-only
+rejection. Pack dates are compared as strings against the cutoff, as
+before. Mix binnings are listed sorted.
+
+Usage:
+    from app.services.packing_validation import validate_packing_rows
+    issues, stats = validate_packing_rows(mrp_rows, ftr_rows, pdi_rows, '2026-01-17')
+
+    mrp_rows  MRP barcode-tracking dicts (barcode, pallet_no, date, dispatch_party)
+    ftr_rows  (serial_number, binning, class_status) for the company
+    pdi_rows  (serial_number, pdi_number, company_name, rejection_reason, qc_status)
+
+Incremental runs (what the scheduler uses): each company's last run is
+kept as a PackingState (row fingerprints over barcode / pallet / pack
+date / dispatch party, a signature per pallet, the wrong-party and
+mix-binning findings), in memory and in backend/cache/packing_state/.
+The next run only looks up new or changed rows and the pallets they
+touch; rejected/duplicate checks still cover every row but only load
+the rejected serials. A full run happens when there is no state, the
+cutoff changed, PACKING_FULL_CHECK_SEC passed, or invalidate_state()
+was called (FTR binning, PDI assignment or company changes). State and
+invalidations go through the disk files, so a separate worker process
+(worker.py) and the web process see each other's runs.
+
+    with run_lock(company):
+        previous = load_state(company)
+        issues, stats, state, info = validate_packing_incremental(
+            mrp_rows, previous, load_rejected, load_ftr, load_pdi, '2026-01-17',
+            full=needs_full(company, previous))
+        save_state(company, state)
+    new_issues(issues, previous)    # entries not open last time (for alerts)
+
+Tunables via environment:
+    PACKING_FULL_CHECK_SEC  re-check everything at least this often  (default 21600)
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.utils import disk_cache
+
+REJECTED_CLASS_STATUSES = ('REJECTED', 'REJECT', 'REJ')
+UNKNOWN_BINNINGS = frozenset(('Unknown', 'Not in Master FTR'))
+
+
+def _lookup(rows, keys):
+    """
+    Columns of `rows` (tuples keyed by their first field) plus, for every
+    key, the position of its row (-1 = missing or empty key). A repeated
+    first field resolves to its last row, like building a dict.
+    """
+    columns = [np.array(col, dtype=object) for col in zip(*rows)] if rows else []
+    if not columns:
+        return columns, np.full(len(keys), -1, dtype=np.int64)
+    index = pd.Index(columns[0], dtype=object)
+    if index.is_unique:
+        pos = index.get_indexer(keys)
+    else:
+        codes, uniques = pd.factorize(np.concatenate([columns[0], keys]), sort=False)
+        n = len(columns[0])
+        row_of = np.full(len(uniques), -1, dtype=np.int64)
+        row_of[codes[:n]] = np.arange(n)
+        pos = row_of[codes[n:]]
+    pos[keys == ''] = -1
+    return columns, pos
+
+
+def _take(columns, index, pos):
+    out = np.full(len(pos), None, dtype=object)
+    if columns:
+        hit = pos >= 0
+        out[hit] = columns[index][pos[hit]]
+    return out
+
+
+def _groups(keys):
+    """(unique keys, row positions of each) in order of first appearance"""
+    codes, uniques = pd.factorize(keys, sort=False)
+    if not len(codes):
+        return [], []
+    order = np.argsort(codes, kind='stable')
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    return uniques.tolist(), np.split(order, bounds)
+
+
+def _in_window(date, binning_cutoff):
+    """Rows with a pack date on/after the cutoff (string comparison, empty = outside)"""
+    in_window = date.astype(bool)
+    dated = np.flatnonzero(in_window)
+    in_window[dated] = (date[dated] >= binning_cutoff).astype(bool)
+    return in_window
+
+
+def validate_packing_rows(mrp_rows, ftr_rows, pdi_rows, binning_cutoff):
+    """
+    Run the four packing checks. Returns (issues, stats), where issues has
+    rejected_packed / wrong_party / duplicates / mix_binning lists and
+    stats has modules_for_binning_check and total_pallets.
+    """
+    barcode = np.array([r.get('barcode') or '' for r in mrp_rows], dtype=object)
+    pallet = np.array([r.get('pallet_no', '') for r in mrp_rows], dtype=object)
+    date = np.array([r.get('date', '') for r in mrp_rows], dtype=object)
+    party = np.array([r.get('dispatch_party') or '' for r in mrp_rows], dtype=object)
+
+    ftr, ftr_pos = _lookup(ftr_rows, barcode)
+    pdi, pdi_pos = _lookup(pdi_rows, barcode)
+    ftr_binning = _take(ftr, 1, ftr_pos)
+    ftr_class = _take(ftr, 2, ftr_pos)
+    pdi_number = _take(pdi, 1, pdi_pos)
+    pdi_company = _take(pdi, 2, pdi_pos)
+    reason = _take(pdi, 3, pdi_pos)
+    qc_status = _take(pdi, 4, pdi_pos)
+
+    # Barcode occurrences (object arrays: astype(bool) is Python truthiness)
+    has_barcode = barcode.astype(bool)
+    bc_codes, _ = pd.factorize(barcode, sort=False)
+    bc_counts = np.bincount(bc_codes) if len(bc_codes) else np.zeros(0, dtype=np.int64)
+    first_seen = np.zeros(len(barcode), dtype=bool)
+    first_seen[np.unique(bc_codes, return_index=True)[1]] = True
+
+    # ── Check 1: rejected modules packed (all time) ──
+    pdi_rejected = reason.astype(bool)
+    class_codes, class_values = pd.factorize(ftr_class, sort=False)
+    rejected_class = np.array([str(v).upper() in REJECTED_CLASS_STATUSES for v in class_values] + [False])
+    ftr_rejected = rejected_class[class_codes]          # code -1 (None) -> trailing False
+    ftr_only = ftr_rejected & ~pdi_rejected & first_seen
+    rejected_packed = []
+    for i in np.flatnonzero(pdi_rejected | ftr_only).tolist():
+        if pdi_rejected[i]:
+            rejected_packed.append({
+                'barcode': barcode[i], 'pallet_no': pallet[i], 'pack_date': date[i],
+                'rejection_reason': reason[i], 'qc_status': qc_status[i],
+                'pdi_number': pdi_number[i],
+            })
+        else:
+            rejected_packed.append({
+                'barcode': barcode[i], 'pallet_no': pallet[i], 'pack_date': date[i],
+                'rejection_reason': f"FTR Status: {ftr_class[i]}", 'qc_status': 'rejected',
+                'pdi_number': '-',
+            })
+
+    # ── Check 2: dispatched to a party other than the PDI's company ──
+    wrong_party = []
+    dispatched = np.flatnonzero(party.astype(bool) & pdi_company.astype(bool))
+    if len(dispatched):
+        tokens = {c: (c.lower().split() or [''])[0] for c in set(pdi_company[dispatched].tolist())}
+        mismatch = {}
+        for i in dispatched.tolist():
+            key = (tokens[pdi_company[i]], party[i])
+            hit = mismatch.get(key)
+            if hit is None:
+                hit = mismatch[key] = key[0] not in key[1].lower()
+            if hit:
+                wrong_party.append({
+                    'barcode': barcode[i], 'pallet_no': pallet[i], 'pack_date': date[i],
+                    'pdi_company': pdi_company[i], 'dispatched_to': party[i],
+                    'pdi_number': pdi_number[i],
+                })
+
+    # ── Check 3: duplicate barcodes ──
+    duplicates = []
+    dup_rows = np.flatnonzero(has_barcode & (bc_counts[bc_codes] > 1))
+    codes, groups = _groups(barcode[dup_rows])
+    for code, rows in zip(codes, groups):
+        rows = dup_rows[rows]
+        duplicates.append({
+            'barcode': code,
+            'count': len(rows),
+            'pallets': pallet[rows].tolist(),
+            'dates': date[rows].tolist(),
+        })
+
+    # ── Check 4: mix binning per pallet (packed on/after the cutoff) ──
+    in_window = _in_window(date, binning_cutoff)
+    rows = np.flatnonzero(in_window & pallet.astype(bool) & has_barcode)
+    binning = ftr_binning[rows]
+    binning[~binning.astype(bool)] = 'Unknown'
+    pallet_codes, pallet_keys = pd.factorize(pallet[rows], sort=False)
+
+    valid = np.array([b not in UNKNOWN_BINNINGS for b in binning], dtype=bool)
+    bin_codes, _ = pd.factorize(binning[valid], sort=False)
+    pairs = np.unique(pallet_codes[valid].astype(np.int64) * (bin_codes.max(initial=0) + 1) + bin_codes)
+    kinds = np.bincount(pairs // (bin_codes.max(initial=0) + 1), minlength=len(pallet_keys))
+    mix_binning = []
+    mixed = np.flatnonzero(kinds > 1)
+    if len(mixed):
+        _, groups = _groups(pallet_codes)
+        for g in mixed.tolist():
+            members = groups[g]
+            member_bins = binning[members]
+            mix_binning.append({
+                'pallet_no': pallet_keys[g],
+                'binnings': sorted(set(member_bins[valid[members]].tolist())),
+                'total_modules': len(members),
+                'sample_barcodes': barcode[rows[members[:5]]].tolist(),
+            })
+
+    issues = {
+        'rejected_packed': rejected_packed,
+        'wrong_party': wrong_party,
+        'duplicates': duplicates,
+        'mix_binning': mix_binning,
+    }
+    stats = {
+        'modules_for_binning_check': int(in_window.sum()),
+        'total_pallets': len(pallet_keys),
+    }
+    return issues, stats
+
+
+# ============================================
+# INCREMENTAL VALIDATION
+# ============================================
+
+_FULL_CHECK_SEC = int(os.environ.get('PACKING_FULL_CHECK_SEC', '21600'))
+_STATE_VERSION = 1
+_FP_MULT = np.uint64(0x100000001B3)
+
+_states = {}                # company key -> PackingState (mirrors backend/cache/packing_state)
+_state_mtimes = {}          # company key -> mtime of the state file _states holds
+_run_locks = {}             # company key -> Lock (one validation per company at a time)
+_invalidated = {}           # company key -> time of invalidate_state(company)
+_invalidated_all = 0.0
+_lock = threading.Lock()
+
+
+def _objects(values):
+    out = np.empty(len(values), dtype=object)
+    out[:] = values
+    return out
+
+
+def _fingerprint(*columns):
+    """uint64 hash per row over the given object columns"""
+    fp = np.zeros(len(columns[0]), dtype=np.uint64)
+    for column in columns:
+        fp = fp * _FP_MULT ^ pd.util.hash_array(column, categorize=False)
+    return fp
+
+
+def _blank(column):
+    """column with every falsy value as '' (so None / missing / '' fingerprint alike)"""
+    out = column.copy()
+    out[~column.astype(bool)] = ''
+    return out
+
+
+def _entry_fingerprints(entries):
+    """Fingerprints of the rows behind wrong_party entries (the row fields under their issue names)"""
+    return _fingerprint(*(_objects([e.get(k) or '' for e in entries])
+                          for k in ('barcode', 'pallet_no', 'pack_date', 'dispatched_to')))
+
+
+class PackingState:
+    """
+    What the last validation of one company saw: the fingerprint of every
+    MRP row, a signature per pallet (sum of its rows' fingerprints), and
+    the wrong-party / mix-binning issues to carry forward.
+    """
+
+    __slots__ = ('cutoff', 'full_at', 'checked_at', 'last_pack_date', 'fingerprints',
+                 'pallet_keys', 'pallet_sigs', 'wrong_party', 'mix_binning', 'issue_keys')
+
+    def __init__(self, cutoff, full_at, fingerprints, pallet_keys, pallet_sigs,
+                 wrong_party, mix_binning, issue_keys, last_pack_date='', checked_at=None):
+        self.cutoff = cutoff
+        self.full_at = full_at
+        self.checked_at = checked_at or time.time()
+        self.last_pack_date = last_pack_date
+        self.fingerprints = fingerprints        # sorted unique uint64
+        self.pallet_keys = pallet_keys          # str(pallet_no)
+        self.pallet_sigs = pallet_sigs          # uint64, aligned with pallet_keys
+        self.wrong_party = wrong_party
+        self.mix_binning = mix_binning
+        self.issue_keys = issue_keys            # {issue type: [barcode / pallet keys]}
+
+    def to_disk(self):
+        arrays = {'fingerprints': self.fingerprints, 'pallet_sigs': self.pallet_sigs}
+        meta = {
+            'version': _STATE_VERSION, 'cutoff': self.cutoff, 'full_at': self.full_at,
+            'checked_at': self.checked_at, 'last_pack_date': self.last_pack_date,
+            'pallet_keys': self.pallet_keys, 'wrong_party': self.wrong_party,
+            'mix_binning': self.mix_binning, 'issue_keys': self.issue_keys,
+        }
+        return arrays, meta
+
+    @classmethod
+    def from_disk(cls, arrays, meta):
+        if meta.get('version') != _STATE_VERSION:
+            return None
+        return cls(meta['cutoff'], meta['full_at'], arrays['fingerprints'], meta['pallet_keys'],
+                   arrays['pallet_sigs'], meta['wrong_party'], meta['mix_binning'],
+                   meta['issue_keys'], meta.get('last_pack_date', ''), meta.get('checked_at'))
+
+
+def _issue_key(kind, entry):
+    return str(entry['pallet_no']) if kind == 'mix_binning' else entry['barcode']
+
+
+def _issue_keys(issues):
+    return {kind: [_issue_key(kind, e) for e in entries] for kind, entries in issues.items()}
+
+
+def new_issues(issues, previous):
+    """The entries of `issues` that were not open in the previous state (all of them without one)."""
+    if previous is None:
+        return issues
+    fresh = {}
+    for kind, entries in issues.items():
+        seen = set(previous.issue_keys.get(kind, ()))
+        fresh[kind] = [e for e in entries if _issue_key(kind, e) not in seen]
+    return fresh
+
+
+def _pallet_signatures(pallet, fp):
+    """(str pallet keys, uint64 signature per pallet, pallet code per row or -1)"""
+    keys = _objects([str(p) if p else None for p in pallet.tolist()])
+    codes, uniques = pd.factorize(keys, sort=False)
+    sigs = np.zeros(len(uniques), dtype=np.uint64)
+    has = codes >= 0
+    np.add.at(sigs, codes[has], fp[has])
+    return uniques.tolist(), sigs, codes
+
+
+def _ordered(entries, positions):
+    order = np.argsort(np.asarray(positions, dtype=np.int64), kind='stable')
+    return [entries[i] for i in order.tolist()]
+
+
+def validate_packing_incremental(mrp_rows, previous, load_rejected, load_ftr, load_pdi,
+                                 binning_cutoff, full=False):
+    """
+    Run the four packing checks, re-checking only what changed since
+    `previous` (a PackingState, or None):
+
+    - rejected packed + duplicates: every row, but against the rejected
+      serials only (load_rejected() -> (ftr_rows, pdi_rows)), so the
+      "ALL TIME" rule still holds without loading every serial
+    - wrong party: rows that are new or changed, looked up with
+      load_pdi(serials); earlier findings are kept while their row is
+    - mix binning: pallets whose set of rows changed, looked up with
+      load_ftr(serials); other pallets keep their earlier result
+
+    load_ftr(None) / load_pdi(None) load everything, used for a full run
+    (no previous state, a different cutoff, or full=True).
+
+    Returns (issues, stats, state, info); info has mode ('full' or
+    'incremental'), changed_rows and rechecked_pallets.
+    """
+    barcode = _objects([r.get('barcode') or '' for r in mrp_rows])
+    pallet = _objects([r.get('pallet_no', '') for r in mrp_rows])
+    date = _objects([r.get('date', '') for r in mrp_rows])
+    party = _objects([r.get('dispatch_party') or '' for r in mrp_rows])
+
+    # What the checks read from a row: barcode, pallet, pack date, dispatch party
+    fp = _fingerprint(barcode, _blank(pallet), _blank(date), party)
+    unique_fp, first_row = np.unique(fp, return_index=True)
+    pallet_keys, pallet_sigs, pallet_codes = _pallet_signatures(pallet, fp)
+    last_pack_date = max(date[date.astype(bool)].tolist(), default='')
+    now = time.time()
+
+    if full or previous is None or previous.cutoff != binning_cutoff:
+        issues, stats = validate_packing_rows(mrp_rows, load_ftr(None), load_pdi(None), binning_cutoff)
+        state = PackingState(binning_cutoff, now, unique_fp, pallet_keys, pallet_sigs,
+                             issues['wrong_party'], issues['mix_binning'], _issue_keys(issues),
+                             last_pack_date, now)
+        info = {'mode': 'full', 'changed_rows': len(mrp_rows), 'rechecked_pallets': len(pallet_keys)}
+        return issues, stats, state, info
+
+    def row_of(fps):
+        return first_row[np.searchsorted(unique_fp, fps)]
+
+    # Checks 1 + 3 (and the stats): all rows, rejected serials only
+    ftr_rejected, pdi_rejected = load_rejected()
+    issues, stats = validate_packing_rows(mrp_rows, ftr_rejected, pdi_rejected, binning_cutoff)
+
+    # Check 2: new/changed dispatched rows; keep earlier findings whose row is unchanged
+    changed = ~np.isin(fp, previous.fingerprints)
+    recheck = np.flatnonzero(changed & party.astype(bool) & barcode.astype(bool))
+    found = []
+    if len(recheck):
+        subset = [mrp_rows[i] for i in recheck.tolist()]
+        serials = pd.unique(barcode[recheck]).tolist()
+        found = validate_packing_rows(subset, [], load_pdi(serials), binning_cutoff)[0]['wrong_party']
+    kept = previous.wrong_party
+    if kept:
+        kept_fp = _entry_fingerprints(kept)
+        alive = np.isin(kept_fp, unique_fp)
+        kept = [e for e, ok in zip(kept, alive.tolist()) if ok]
+    wrong_party = kept + found
+    if wrong_party:
+        wrong_party = _ordered(wrong_party, row_of(_entry_fingerprints(wrong_party)))
+    issues['wrong_party'] = wrong_party
+
+    # Check 4: pallets that are new or whose rows changed; keep the rest
+    prev_pos = pd.Index(previous.pallet_keys, dtype=object).get_indexer(pallet_keys)
+    prev_sigs = np.asarray(previous.pallet_sigs, dtype=np.uint64)
+    touched = prev_pos < 0
+    known = np.flatnonzero(~touched)
+    touched[known] = pallet_sigs[known] != prev_sigs[prev_pos[known]]
+    touched_rows = np.flatnonzero(pallet_codes >= 0)
+    touched_rows = touched_rows[touched[pallet_codes[touched_rows]]]
+    found = []
+    if len(touched_rows):
+        subset = [mrp_rows[i] for i in touched_rows.tolist()]
+        serials = [s for s in pd.unique(barcode[touched_rows]).tolist() if s]
+        found = validate_packing_rows(subset, load_ftr(serials), [], binning_cutoff)[0]['mix_binning']
+    untouched = {key for key, t in zip(pallet_keys, touched.tolist()) if not t}
+    mix_binning = [e for e in previous.mix_binning if str(e['pallet_no']) in untouched] + found
+    if mix_binning:
+        # Order of first appearance among the rows check 4 looks at
+        window = np.flatnonzero(_in_window(date, binning_cutoff) & (pallet_codes >= 0) & barcode.astype(bool))
+        first = pd.Series(window).groupby(pallet_codes[window]).first()
+        code_of = {key: i for i, key in enumerate(pallet_keys)}
+        mix_binning = _ordered(mix_binning, [first.get(code_of[str(e['pallet_no'])], 0) for e in mix_binning])
+    issues['mix_binning'] = mix_binning
+
+    state = PackingState(binning_cutoff, previous.full_at, unique_fp, pallet_keys, pallet_sigs,
+                         wrong_party, mix_binning, _issue_keys(issues), last_pack_date, now)
+    info = {'mode': 'incremental', 'changed_rows': int(changed.sum()),
+            'rechecked_pallets': int(touched.sum())}
+    return issues, stats, state, info
+
+
+def _key(company):
+    return (company or '').strip().lower()
+
+
+def run_lock(company):
+    """Lock serialising validations of one company (load state -> validate -> save state)."""
+    with _lock:
+        return _run_locks.setdefault(_key(company), threading.Lock())
+
+
+def load_state(company):
+    """The company's last PackingState (from memory, else backend/cache), or None."""
+    key = _key(company)
+    state = _states.get(key)
+    mtime = disk_cache.packing_state_mtime(key)
+    if state is None or mtime != _state_mtimes.get(key):
+        # First use, or another process (worker.py) saved a newer run
+        saved = disk_cache.load_packing_state(key)
+        if saved is not None:
+            loaded = PackingState.from_disk(*saved)
+            if loaded is not None:
+                state = _states[key] = loaded
+                _state_mtimes[key] = mtime
+    return state
+
+
+def save_state(company, state):
+    key = _key(company)
+    _states[key] = state
+    disk_cache.save_packing_state(key, *state.to_disk())
+    _state_mtimes[key] = disk_cache.packing_state_mtime(key)
+
+
+def needs_full(company, state):
+    """
+    True when the next run should re-check everything: no state yet, the
+    last full run is older than PACKING_FULL_CHECK_SEC, or invalidate_state()
+    was called since (FTR binning / PDI assignment / company changes).
+    """
+    if state is None:
+        return True
+    shared = disk_cache.load_packing_invalidations()      # from other processes
+    invalidated = max(_invalidated_all, _invalidated.get(_key(company), 0.0),
+                      shared.get('*', 0.0), shared.get(_key(company), 0.0))
+    return time.time() - state.full_at >= _FULL_CHECK_SEC or state.full_at < invalidated
+
+
+def invalidate_state(company=None):
+    """Make the next validation of one company (or all) a full run."""
+    global _invalidated_all
+    now = time.time()
+    with _lock:
+        if company is None:
+            _invalidated_all = now
+        else:
+            _invalidated[_key(company)] = now
+        shared = disk_cache.load_packing_invalidations()
+        shared['*' if company is None else _key(company)] = now
+        disk_cache.save_packing_invalidations(shared)
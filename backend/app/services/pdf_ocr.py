@@ -0,0 +1,225 @@
+"""
+OCR fallback for scanned PDF pages.
+
+PyPDF2 only reads a PDF's text layer, so scanned certificates and
+signed-and-scanned SOPs come out empty. document_search._extract_pdf()
+hands just the pages without a text layer to ocr_pages(): each page is
+rasterized with pdf2image (pdftoppm) at QMS_OCR_DPI and read with
+pytesseract. PDFs that already have text never reach this module.
+
+Pages are OCR'd in parallel. Each worker thread drives its own pdftoppm
+and tesseract processes, so pages run on separate cores without pickling
+page images between Python processes. Tesseract's own OpenMP threading is
+capped at one thread per process so the two levels of parallelism don't
+oversubscribe the CPU.
+
+Every page's OCR text is cached on disk under backend/cache/qms_ocr, keyed
+by a hash of the page's content stream and images plus DPI and language.
+A page that shows up again (re-upload, revert, the same scanned annexure
+in several documents) is read from the cache instead of being OCR'd again.
+
+If the tesseract or pdftoppm binaries are missing, ocr_available() is
+False and extraction falls back to text-layer-only, as before.
+
+Usage:
+    from app.services.pdf_ocr import ocr_available, ocr_pages, page_hash
+    if ocr_available():
+        texts = ocr_pages(file_path, {3: page_hash(reader.pages[2]), 7: None})  # {page_no: text}
+
+Tunables via environment:
+    QMS_OCR_ENABLED        0 disables OCR entirely                (default 1)
+    QMS_OCR_DPI            rasterization DPI                      (default 300)
+    QMS_OCR_LANG           tesseract language(s), e.g. eng+hin    (default eng)
+    QMS_OCR_WORKERS        pages OCR'd in parallel per file       (default cpu_count)
+    QMS_OCR_PAGE_TIMEOUT   max seconds tesseract spends per page  (default 60)
+    QMS_OCR_MIN_CHARS      text-layer chars below which a page
+                           counts as scanned                      (default 10)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import importlib.util
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+OCR_ENABLED = os.environ.get('QMS_OCR_ENABLED', '1') not in ('0', 'false', 'False')
+OCR_DPI = int(os.environ.get('QMS_OCR_DPI', '300'))
+OCR_LANG = os.environ.get('QMS_OCR_LANG', 'eng')
+OCR_MIN_CHARS = int(os.environ.get('QMS_OCR_MIN_CHARS', '10'))
+_WORKERS = max(1, int(os.environ.get('QMS_OCR_WORKERS', str(os.cpu_count() or 2))))
+_PAGE_TIMEOUT = int(os.environ.get('QMS_OCR_PAGE_TIMEOUT', '60'))
+
+# One OpenMP thread per tesseract process; parallelism comes from running pages side by side
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+_OCR_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'cache', 'qms_ocr',
+)
+
+_available = None
+_available_lock = threading.Lock()
+
+
+def ocr_available():
+    """True when OCR is enabled and pytesseract, pdf2image and their binaries are usable."""
+    global _available
+    if _available is None:
+        with _available_lock:
+            if _available is None:
+                _available = _probe()
+    return _available
+
+
+def _probe():
+    if not OCR_ENABLED:
+        return False
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        if importlib.util.find_spec('pdf2image') is None or shutil.which('pdftoppm') is None:
+            raise RuntimeError('pdf2image or poppler (pdftoppm) not installed')
+    except Exception as e:
+        logger.warning(f"PDF OCR unavailable, scanned pages will not be indexed: {e}")
+        return False
+    return True
+
+
+def ocr_tag():
+    """Short id of the OCR setup, for caches of whole-file extraction results."""
+    return f'ocr{OCR_DPI}-{OCR_LANG}' if ocr_available() else 'noocr'
+
+
+def needs_ocr(page_text):
+    return len((page_text or '').strip()) < OCR_MIN_CHARS
+
+
+# ─── Page hashing & cache ──────────────────────
+
+def _stream_bytes(obj):
+    data = getattr(obj, '_data', None)      # raw (still encoded) stream, cheapest to hash
+    if data is None:
+        data = obj.get_data()
+    return data if isinstance(data, bytes) else str(data).encode('utf-8', 'replace')
+
+
+def _hash_xobjects(resources, h, seen, depth=0):
+    if resources is None or depth > 4:
+        return
+    xobjects = resources.get_object().get('/XObject')
+    if xobjects is None:
+        return
+    xobjects = xobjects.get_object()
+    for name in sorted(xobjects):
+        ref = xobjects.raw_get(name)
+        key = getattr(ref, 'idnum', None)
+        if key is not None:
+            if key in seen:
+                h.update(f'ref:{key}'.encode())
+                continue
+            seen.add(key)
+        obj = xobjects[name].get_object()
+        h.update(name.encode('utf-8', 'replace'))
+        h.update(_stream_bytes(obj))
+        if obj.get('/Subtype') == '/Form':
+            _hash_xobjects(obj.get('/Resources'), h, seen, depth + 1)
+
+
+def page_hash(page):
+    """
+    SHA-256 of what a PyPDF2 page renders from (content stream, images and
+    form XObjects, page box and rotation), or None if it can't be read.
+    """
+    try:
+        h = hashlib.sha256()
+        h.update(repr((list(page.mediabox), page.get('/Rotate', 0))).encode())
+        contents = page.get_contents()
+        if contents is not None:
+            h.update(contents.get_data())
+        _hash_xobjects(page.get('/Resources'), h, set())
+        return h.hexdigest()
+    except Exception as e:
+        logger.debug(f"Page hash failed: {e}")
+        return None
+
+
+def _cache_path(digest):
+    return os.path.join(_OCR_CACHE_DIR, digest[:2], f'{digest}.{OCR_DPI}.{OCR_LANG}.txt')
+
+
+def _cache_get(digest):
+    try:
+        with open(_cache_path(digest), 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _cache_put(digest, text):
+    path = _cache_path(digest)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.debug(f"OCR cache write failed: {e}")
+
+
+# ─── OCR ───────────────────────────────────────
+
+def _ocr_page(file_path, page_num):
+    import pytesseract
+    from pdf2image import convert_from_path
+
+    images = convert_from_path(file_path, dpi=OCR_DPI, first_page=page_num,
+                               last_page=page_num, grayscale=True)
+    if not images:
+        return ''
+    try:
+        return pytesseract.image_to_string(images[0], lang=OCR_LANG, timeout=_PAGE_TIMEOUT)
+    finally:
+        images[0].close()
+
+
+def ocr_pages(file_path, pages):
+    """
+    OCR the given pages of one PDF. `pages` maps 1-based page number to
+    its page_hash() (None = don't cache). Returns {page_num: text}; pages
+    that fail or time out are left out.
+    """
+    out, todo = {}, []
+    for page_num, digest in sorted(pages.items()):
+        cached = _cache_get(digest) if digest else None
+        if cached is not None:
+            out[page_num] = cached
+        else:
+            todo.append((page_num, digest))
+    if not todo:
+        return out
+
+    # Not a `with` block: a per-file timeout in the extraction worker must
+    # not wait here for pages still in tesseract (they end on _PAGE_TIMEOUT)
+    pool = ThreadPoolExecutor(max_workers=min(_WORKERS, len(todo)), thread_name_prefix='pdf-ocr')
+    try:
+        futures = [(page_num, digest, pool.submit(_ocr_page, file_path, page_num))
+                   for page_num, digest in todo]
+        for page_num, digest, fut in futures:
+            try:
+                text = (fut.result() or '').strip()
+            except Exception as e:
+                logger.warning(f"OCR failed for page {page_num} of {file_path}: {e}")
+                continue
+            if digest:
+                _cache_put(digest, text)
+            out[page_num] = text
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return out
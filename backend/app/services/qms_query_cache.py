@@ -0,0 +1,113 @@
+"""
+LRU cache for QMS assistant queries.
+
+Operators ask the same handful of questions all day ("calibration
+procedure", "NCR format"). Each of them used to run a full search and
+then a Groq round trip. Here the ranked results, with their extracted
+passages, and the finished response (including the LLM answer) are
+cached per process.
+
+Key: (index stamp, mode, sorted expanded query tokens, normalized query).
+The stamp is qms_search_index.index_stamp(): the posting generation plus
+the documents' latest updated_at and count. Any re-index, upload, delete
+or metadata edit therefore starts a fresh key space, and stale entries
+age out of the LRU. The normalized query (lowercase, single spaces) is part
+of the key because the exact-phrase boost looks at it.
+
+An entry holds the search results and counts, plus the full response if
+one may be reused. The response is stored when no LLM was involved
+(mode=search) or the LLM answered. A failed LLM call caches only the
+search half, so the next ask retries Groq without searching again.
+
+Usage:
+    from app.services import qms_query_cache
+    key = qms_query_cache.make_key(query, mode, index_stamp())
+    entry = qms_query_cache.get(key)     # {'results', 'counts', 'response'} or None
+    qms_query_cache.put(key, results, counts, response=resp, ai_powered=True)
+    qms_query_cache.stats()
+
+Tunables via environment:
+    QMS_QUERY_CACHE_SIZE   entries kept                        (default 512)
+    QMS_QUERY_CACHE_TTL    seconds an entry stays usable       (default 21600)
+    QMS_QUERY_CACHE_LLM    0 = never reuse LLM answers         (default 1)
+"""
+
+from __future__ import annotations
+
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.services.document_search import expand_query
+
+_SIZE = int(os.environ.get('QMS_QUERY_CACHE_SIZE', '512'))
+_TTL = int(os.environ.get('QMS_QUERY_CACHE_TTL', str(6 * 3600)))
+_CACHE_LLM = os.environ.get('QMS_QUERY_CACHE_LLM', '1') not in ('0', 'false', 'False')
+
+_lock = threading.Lock()
+_entries: OrderedDict = OrderedDict()     # key -> (stored_at, entry)
+_counters = {'hits': 0, 'response_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+
+def make_key(query, mode, stamp):
+    tokens = tuple(sorted(set(expand_query(query))))
+    return (stamp, mode or 'auto', tokens, ' '.join(query.lower().split()))
+
+
+def get(key):
+    """Cached entry (a private copy) or None; counts the hit/miss."""
+    now = time.time()
+    with _lock:
+        item = _entries.get(key)
+        if item is not None and now - item[0] > _TTL:
+            del _entries[key]
+            item = None
+        if item is None:
+            _counters['misses'] += 1
+            return None
+        _entries.move_to_end(key)
+        _counters['hits'] += 1
+        if item[1]['response'] is not None:
+            _counters['response_hits'] += 1
+        entry = item[1]
+    return copy.deepcopy(entry)
+
+
+def put(key, results, counts, response=None, ai_powered=False):
+    """
+    Store search results (and the response, when it may be reused) for a key.
+    counts is (total documents, indexed documents).
+    """
+    if ai_powered and not _CACHE_LLM:
+        response = None
+    entry = {
+        'results': copy.deepcopy(results),
+        'counts': tuple(counts),
+        'response': copy.deepcopy(response),
+    }
+    with _lock:
+        _entries[key] = (time.time(), entry)
+        _entries.move_to_end(key)
+        _counters['stores'] += 1
+        while len(_entries) > _SIZE:
+            _entries.popitem(last=False)
+            _counters['evictions'] += 1
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+def stats():
+    with _lock:
+        out = dict(_counters)
+        out['entries'] = len(_entries)
+    lookups = out['hits'] + out['misses']
+    out['hit_rate'] = round(out['hits'] * 100.0 / lookups, 1) if lookups else 0.0
+    out['max_entries'] = _SIZE
+    out['ttl_sec'] = _TTL
+    out['caches_llm_answers'] = _CACHE_LLM
+    return out
@@ -0,0 +1,373 @@
+"""
+Persistent inverted index for QMS document search.
+
+Chunks, per-chunk term frequencies and chunk lengths are stored once in
+side tables (qms_search_chunks, qms_search_postings, qms_search_doc_state)
+instead of re-chunking and re-tokenizing the library per query. The
+postings and chunk texts are loaded into an in-memory BM25 matrix (see
+bm25.py), which is kept per index generation. When the generation moves,
+only documents whose text hash changed are read again.
+
+Ranking is bm25.rank(), the same as search_documents(), so results match
+the in-memory engine.
+
+The index is maintained incrementally: the QMS routes call
+index_document()/remove_document() for the one document they changed.
+A document whose indexed text is unchanged (metadata-only edits) is not
+re-posted. Every posting change bumps the generation number in
+qms_search_index_meta, which cached results/statistics are keyed on.
+sync_index() is a periodic safety net for changes made outside the
+routes (SQL edits, older code paths).
+
+Usage:
+    from app.services.qms_search_index import index_document, remove_document, search_index
+    index_document(doc); db.session.commit()   # after create/update/checkin/revert
+    remove_document(doc_id); db.session.commit()
+    results = search_index(query, top_k=8)     # same result dicts as search_documents
+    stamp = index_stamp()                      # key for cached query results
+    ids = matching_document_ids('lamination sop')   # document list free-text filter
+    total_docs, indexed_docs = index_counts()
+
+Tunables via environment:
+    QMS_INDEX_TERM_MAX     longest term stored in postings; capped at
+                           the postings term column length          (default 64)
+    QMS_INDEX_SYNC_SEC     min seconds between safety-net syncs     (default 300)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import case, func
+
+from app.models import schema_registry
+from app.models.database import db
+from app.models.qms_models import (
+    QMSDocument, QMSSearchChunk, QMSSearchPosting, QMSSearchDocState, QMSSearchIndexMeta,
+)
+from app.services.bm25 import BM25Matrix, rank
+from app.services.document_search import chunk_text, tokenize, expand_query
+
+logger = logging.getLogger(__name__)
+
+_TERM_COLUMN = QMSSearchPosting.__table__.c.term.type.length       # VARCHAR(64)
+_TERM_MAX = min(int(os.environ.get('QMS_INDEX_TERM_MAX', str(_TERM_COLUMN))), _TERM_COLUMN)
+_SYNC_SEC = int(os.environ.get('QMS_INDEX_SYNC_SEC', '300'))
+_IN_BATCH = 500
+
+_sync_lock = threading.Lock()
+_last_sync = 0.0
+_matrix_lock = threading.Lock()
+_matrix = None                     # _Snapshot of the current generation
+_doc_postings = {}                 # document_id -> (text_hash, chunk indexes, chunk texts, chunk lens,
+                                   #                 term rows, local chunk cols, tfs)
+_vocab = {}                        # term -> matrix row, grow-only
+
+_Snapshot = namedtuple('_Snapshot', 'generation matrix chunk_index texts doc_ids')
+
+
+# ═══════════════════════════════════════════════
+# GENERATION
+# ═══════════════════════════════════════════════
+
+def _bump_generation():
+    """Mark the postings as changed (in the caller's transaction)"""
+    updated = QMSSearchIndexMeta.query.filter_by(id=1).update(
+        {'generation': QMSSearchIndexMeta.generation + 1, 'updated_at': datetime.utcnow()},
+        synchronize_session=False)
+    if not updated:
+        db.session.add(QMSSearchIndexMeta(id=1, generation=1, updated_at=datetime.utcnow()))
+
+
+def index_generation():
+    """Current index generation; changes whenever any posting changes"""
+    return db.session.query(QMSSearchIndexMeta.generation).filter_by(id=1).scalar() or 0
+
+
+def index_stamp():
+    """
+    (generation, latest document updated_at, document count): changes
+    whenever search results could, including metadata-only edits that do
+    not touch the postings. Key for cached query results.
+    """
+    latest, count = db.session.query(func.max(QMSDocument.updated_at), func.count(QMSDocument.id)).one()
+    return (index_generation(), latest.isoformat() if latest else None, int(count or 0))
+
+
+# ═══════════════════════════════════════════════
+# INDEXING
+# ═══════════════════════════════════════════════
+
+def _document_text(doc):
+    """Same text selection as search_documents()"""
+    content = doc.extracted_text or ''
+    if not content:
+        # Fall back to description + title
+        content = f"{doc.title or ''} {doc.description or ''}"
+    return content
+
+
+def _delete_postings(document_id):
+    QMSSearchPosting.query.filter_by(document_id=document_id).delete(synchronize_session=False)
+    QMSSearchChunk.query.filter_by(document_id=document_id).delete(synchronize_session=False)
+
+
+def remove_document(document_id):
+    """Drop a document's chunks, postings and state (caller commits)"""
+    schema_registry.ensure('qms_search_doc_state')
+    _delete_postings(document_id)
+    if QMSSearchDocState.query.filter_by(document_id=document_id).delete(synchronize_session=False):
+        _bump_generation()
+
+
+def index_document(doc):
+    """
+    Bring one QMSDocument's index rows up to date (caller commits).
+    Re-chunks and re-posts only if the indexed text changed; returns
+    True if postings were rewritten.
+    """
+    schema_registry.ensure('qms_search_doc_state')
+    content = _document_text(doc)
+    text_hash = hashlib.sha1(content.encode('utf-8', 'replace')).hexdigest()
+    state = db.session.get(QMSSearchDocState, doc.id)
+    if state is not None and state.text_hash == text_hash:
+        state.source_updated_at = doc.updated_at
+        state.has_text = bool(doc.extracted_text)
+        return False
+
+    _delete_postings(doc.id)
+    chunks = chunk_text(content) if len(content) > 500 else [content]
+    postings = []
+    for idx, chunk in enumerate(chunks):
+        tokens = tokenize(chunk)
+        row = QMSSearchChunk(document_id=doc.id, chunk_index=idx, text=chunk, token_count=len(tokens))
+        db.session.add(row)
+        db.session.flush()
+        for term, count in Counter(tokens).items():
+            if len(term) <= _TERM_MAX:
+                postings.append({'term': term, 'chunk_id': row.id, 'document_id': doc.id,
+                                 'tf': count, 'chunk_len': len(tokens)})
+    if postings:
+        db.session.execute(QMSSearchPosting.__table__.insert(), postings)
+
+    if state is None:
+        state = QMSSearchDocState(document_id=doc.id)
+        db.session.add(state)
+    state.source_updated_at = doc.updated_at
+    state.text_hash = text_hash
+    state.has_text = bool(doc.extracted_text)
+    state.chunk_count = len(chunks)
+    state.indexed_at = datetime.utcnow()
+    _bump_generation()
+    return True
+
+
+def sync_index(force=False):
+    """
+    Safety net: (re)index documents that are new or whose updated_at no
+    longer matches the index, drop documents that are gone. Runs at most
+    every QMS_INDEX_SYNC_SEC per process unless forced; only id/updated_at
+    are read for the comparison.
+    """
+    global _last_sync
+    if not force and time.time() - _last_sync < _SYNC_SEC:
+        return 0
+    with _sync_lock:
+        if not force and time.time() - _last_sync < _SYNC_SEC:
+            return 0
+        schema_registry.ensure('qms_search_doc_state')
+        current = dict(db.session.query(QMSDocument.id, QMSDocument.updated_at).all())
+        state = dict(db.session.query(QMSSearchDocState.document_id,
+                                      QMSSearchDocState.source_updated_at).all())
+        stale = [doc_id for doc_id, ts in current.items() if doc_id not in state or state[doc_id] != ts]
+        removed = [doc_id for doc_id in state if doc_id not in current]
+
+        try:
+            for doc_id in removed:
+                remove_document(doc_id)
+            for start in range(0, len(stale), 50):
+                for doc in QMSDocument.query.filter(QMSDocument.id.in_(stale[start:start + 50])).all():
+                    index_document(doc)
+                db.session.commit()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        _last_sync = time.time()
+        if stale or removed:
+            logger.info(f"QMS search index: {len(stale)} document(s) checked/indexed, {len(removed)} removed")
+        return len(stale) + len(removed)
+
+
+def rebuild_index():
+    """Drop and rebuild every document's index rows"""
+    with _sync_lock:
+        schema_registry.ensure('qms_search_doc_state')
+        try:
+            QMSSearchPosting.query.delete(synchronize_session=False)
+            QMSSearchChunk.query.delete(synchronize_session=False)
+            QMSSearchDocState.query.delete(synchronize_session=False)
+            _bump_generation()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    return sync_index(force=True)
+
+
+def index_counts():
+    """(total documents, documents with extracted text) as seen by the index"""
+    total, with_text = db.session.query(
+        func.count(QMSSearchDocState.document_id),
+        func.coalesce(func.sum(case((QMSSearchDocState.has_text.is_(True), 1), else_=0)), 0),
+    ).one()
+    return int(total or 0), int(with_text or 0)
+
+
+# ═══════════════════════════════════════════════
+# SEARCH
+# ═══════════════════════════════════════════════
+
+def _in_batches(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), _IN_BATCH):
+        yield ids[start:start + _IN_BATCH]
+
+
+def _load_documents(document_ids):
+    """Read chunks and postings of these documents into _doc_postings"""
+    chunks = defaultdict(list)
+    postings = defaultdict(list)
+    for batch in _in_batches(document_ids):
+        for chunk_id, document_id, chunk_index, token_count, chunk in db.session.query(
+            QMSSearchChunk.id, QMSSearchChunk.document_id, QMSSearchChunk.chunk_index,
+            QMSSearchChunk.token_count, QMSSearchChunk.text,
+        ).filter(QMSSearchChunk.document_id.in_(batch)).all():
+            chunks[document_id].append((chunk_index, chunk_id, token_count or 0, chunk or ''))
+        for term, chunk_id, document_id, tf in db.session.query(
+            QMSSearchPosting.term, QMSSearchPosting.chunk_id, QMSSearchPosting.document_id,
+            QMSSearchPosting.tf,
+        ).filter(QMSSearchPosting.document_id.in_(batch)).all():
+            postings[document_id].append((term, chunk_id, tf))
+
+    loaded = {}
+    for document_id in document_ids:
+        rows = sorted(chunks.get(document_id, ()))
+        local = {r[1]: i for i, r in enumerate(rows)}
+        plist = [(t, c, tf) for t, c, tf in postings.get(document_id, ()) if c in local]
+        loaded[document_id] = (
+            np.array([r[0] for r in rows], dtype=np.int32),
+            [r[3] for r in rows],
+            np.array([r[2] for r in rows], dtype=np.int32),
+            np.array([_vocab.setdefault(t, len(_vocab)) for t, _, _ in plist], dtype=np.int64),
+            np.array([local[c] for _, c, _ in plist], dtype=np.int64),
+            np.array([tf for _, _, tf in plist], dtype=np.int32),
+        )
+    return loaded
+
+
+def _current_matrix():
+    """
+    _Snapshot for the current index generation: BM25Matrix (column =
+    chunk, document index = position in doc_ids) plus each column's chunk
+    index and text. Chunk text is kept in memory for the phrase boost.
+    """
+    global _matrix
+    generation = index_generation()
+    current = _matrix
+    if current is not None and current.generation == generation:
+        return current
+    with _matrix_lock:
+        if _matrix is not None and _matrix.generation == generation:
+            return _matrix
+        states = dict(db.session.query(QMSSearchDocState.document_id, QMSSearchDocState.text_hash).all())
+        for gone in set(_doc_postings) - set(states):
+            del _doc_postings[gone]
+        stale = [d for d, h in states.items() if d not in _doc_postings or _doc_postings[d][0] != h]
+        for document_id, arrays in _load_documents(stale).items():
+            _doc_postings[document_id] = (states[document_id],) + arrays
+
+        doc_ids = sorted(_doc_postings)
+        parts = [_doc_postings[d] for d in doc_ids]
+        sizes = [len(p[1]) for p in parts]
+        offsets = np.cumsum([0] + sizes)
+        empty = np.empty(0, dtype=np.int64)
+        matrix = BM25Matrix(
+            _vocab,
+            np.concatenate([p[4] for p in parts] or [empty]),
+            np.concatenate([p[5] + offsets[i] for i, p in enumerate(parts)] or [empty]),
+            np.concatenate([p[6] for p in parts] or [empty]),
+            np.concatenate([p[3] for p in parts] or [empty]),
+            np.repeat(np.arange(len(parts)), sizes),
+        )
+        _matrix = _Snapshot(
+            generation, matrix,
+            np.concatenate([p[1] for p in parts] or [empty]).tolist(),
+            [t for p in parts for t in p[2]],
+            doc_ids,
+        )
+        return _matrix
+
+
+def search_index(query, top_k=10):
+    """
+    Indexed equivalent of document_search.search_documents(query, all_docs, top_k).
+    """
+    if not query:
+        return []
+    query_tokens = expand_query(query)
+    if not query_tokens:
+        return []
+
+    snap = _current_matrix()
+    if not snap.matrix.n_chunks:
+        return []
+    doc_ids = snap.doc_ids
+
+    def doc_info(doc_indices):
+        wanted = {doc_ids[i]: i for i in doc_indices}
+        out = {}
+        for batch in _in_batches(wanted):
+            for row in db.session.query(
+                QMSDocument.id, QMSDocument.doc_number, QMSDocument.title, QMSDocument.category,
+                QMSDocument.department, QMSDocument.status, QMSDocument.file_name,
+            ).filter(QMSDocument.id.in_(batch)).all():
+                out[wanted[row.id]] = {
+                    'doc_id': row.id,
+                    'doc_number': row.doc_number,
+                    'title': row.title,
+                    'category': row.category,
+                    'department': row.department,
+                    'status': row.status,
+                    'file_name': row.file_name,
+                }
+        return out
+
+    return rank(snap.matrix, query, query_tokens, top_k, doc_info,
+                lambda cols: {c: (snap.chunk_index[c], snap.texts[c]) for c in cols})
+
+
+def matching_document_ids(query):
+    """
+    Ids of documents whose indexed text contains every token of `query`
+    (no synonym expansion). Filter semantics for the document list, served
+    from the in-memory matrix without scanning the documents table.
+    """
+    tokens = set(tokenize(query or ''))
+    if not tokens:
+        return []
+    snap = _current_matrix()
+    matched = None
+    for term in tokens:
+        docs = snap.matrix.docs_with_term(term)
+        matched = docs if matched is None else np.intersect1d(matched, docs, assume_unique=True)
+        if not len(matched):
+            return []
+    return [snap.doc_ids[i] for i in matched.tolist()]
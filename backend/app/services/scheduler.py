@@ -0,0 +1,430 @@
+"""
+In-process background job scheduler.
+
+Background work used to start in several unrelated ways: a validation loop
+thread in create_app(), the Telegram report loop, a startup warm thread
+spawned at import time and the packing/dispatch warmers spawned per
+request. Each had its own sleep loop and a plain boolean as re-entrancy
+guard. Here every such job is registered by name and run by one
+scheduler:
+
+- triggers: every N seconds (a number, or a callable read after each run)
+  or a 5-field cron expression ('30 2 * * *'), plus random jitter
+- a job never overlaps itself: a due or requested run while the previous
+  one is still going is counted as skipped
+- at most SCHEDULER_WORKERS jobs run at once (shared thread pool)
+- nothing starts before the server is ready (first request served, or
+  SCHEDULER_READY_TIMEOUT_SEC after start()), then each job waits its
+  start_delay, so warmers no longer compete with start-up
+- per-job metrics: runs, failures, skips, last/avg/max run time, last error
+
+Jobs run inside an app context; the DB session is removed afterwards.
+
+Worker process: with SCHEDULER_MODE=web the web process registers the
+same jobs but never runs them on a timer; worker.py (a separate pm2 app,
+SCHEDULER_MODE=worker) does, so warmers and validations no longer take
+the GIL and Waitress threads from requests. Both sides share data through
+backend/cache and the database (see utils/disk_cache). From the web
+process, run_now() queues the run for the worker (with wait it still
+runs here, since the caller blocks on it anyway), pause()/resume() are
+passed on to the worker, and status() reports the worker's jobs.
+
+Usage:
+    from app.services import scheduler
+    scheduler.add_job('parties-with-pdis', refresh, every=900, jitter=60, start_delay=30)
+    scheduler.add_job('nightly-sync', sync, cron='30 2 * * *')
+    scheduler.add_job('party-packing-warm', warm)          # no trigger: run_now() only
+    scheduler.start(app)                                   # once, from create_app()
+    scheduler.run_now('party-packing-warm', parties)       # False if already running
+    scheduler.run_now('parties-with-pdis', wait=True)      # run (or join the running one) and wait
+    scheduler.pause('packing-validation'); scheduler.resume('packing-validation')
+    scheduler.status()
+    scheduler.run_worker(app)                              # worker.py: run jobs forever
+
+Tunables via environment:
+    SCHEDULER_MODE               inline (jobs run here), web (worker.py
+                                 runs them) or worker                    (default inline)
+    SCHEDULER_POLL_SEC           worker: check for requests / publish
+                                 status this often                       (default 2)
+    SCHEDULER_WORKERS            jobs running at once                    (default 3)
+    SCHEDULER_START_DELAY_SEC    default delay after the server is ready (default 30)
+    SCHEDULER_READY_TIMEOUT_SEC  start anyway if no request came by then (default 300)
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+MODE = os.environ.get('SCHEDULER_MODE', 'inline').strip().lower()
+_POLL_SEC = float(os.environ.get('SCHEDULER_POLL_SEC', '2'))
+_WORKERS = max(1, int(os.environ.get('SCHEDULER_WORKERS', '3')))
+_START_DELAY = float(os.environ.get('SCHEDULER_START_DELAY_SEC', '30'))
+_READY_TIMEOUT = float(os.environ.get('SCHEDULER_READY_TIMEOUT_SEC', '300'))
+
+_cond = threading.Condition()
+_jobs = {}                  # name -> Job
+_app = None
+_loop = None
+_pool = None
+_started_at = None
+_ready_at = None
+
+
+# ─── Cron ──────────────────────────────────────
+
+class _Cron:
+    """minute hour day-of-month month day-of-week; '*', '*/n', 'a-b', 'a-b/n' and lists"""
+
+    _RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expr):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f'cron needs 5 fields: {expr!r}')
+        self.expr = expr
+        self.minute, self.hour, self.day, self.month, self.weekday = (
+            self._field(f, lo, hi) for f, (lo, hi) in zip(fields, self._RANGES))
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+        self.weekday = {d % 7 for d in self.weekday}      # 7 = Sunday too
+
+    @staticmethod
+    def _field(text, lo, hi):
+        values = set()
+        for part in text.split(','):
+            rng, _, step = part.partition('/')
+            if rng == '*':
+                start, end = lo, hi
+            elif '-' in rng:
+                start, end = (int(v) for v in rng.split('-'))
+            else:
+                start = end = int(rng)
+                if step:
+                    end = hi
+            if start < lo or end > hi or start > end:
+                raise ValueError(f'cron field out of range: {text!r}')
+            values.update(range(start, end + 1, int(step or 1)))
+        return values
+
+    def _day_ok(self, dt):
+        weekday = (dt.weekday() + 1) % 7       # cron: 0 = Sunday
+        if self.any_day or self.any_weekday:
+            return (self.any_day or dt.day in self.day) and (self.any_weekday or weekday in self.weekday)
+        return dt.day in self.day or weekday in self.weekday
+
+    def next_after(self, ts):
+        """Epoch seconds of the first matching minute after ts (local time)."""
+        dt = datetime.fromtimestamp(ts).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.month:
+                dt = (dt.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self._day_ok(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+            elif dt.hour not in self.hour:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+            elif dt.minute not in self.minute:
+                dt += timedelta(minutes=1)
+            else:
+                return dt.timestamp()
+        raise ValueError(f'cron never matches: {self.expr!r}')
+
+
+# ─── Jobs ──────────────────────────────────────
+
+class Job:
+    """One named job: trigger, state and run-time metrics."""
+
+    __slots__ = ('name', 'func', 'every', 'cron', 'jitter', 'start_delay', 'enabled', 'paused',
+                 'next_run', 'running', 'runs', 'failures', 'skipped', 'last_started',
+                 'last_duration', 'total_duration', 'max_duration', 'last_error')
+
+    def __init__(self, name, func, every, cron, jitter, start_delay, enabled):
+        self.name = name
+        self.func = func
+        self.every = every
+        self.cron = _Cron(cron) if cron else None
+        self.jitter = jitter
+        self.start_delay = _START_DELAY if start_delay is None else start_delay
+        self.enabled = enabled
+        self.paused = False
+        self.next_run = None
+        self.running = False
+        self.runs = self.failures = self.skipped = 0
+        self.last_started = None
+        self.last_duration = None
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_error = None
+
+    @property
+    def scheduled(self):
+        return self.every is not None or self.cron is not None
+
+    def is_enabled(self):
+        return self.enabled() if callable(self.enabled) else bool(self.enabled)
+
+    def schedule_next(self, now, first=False):
+        """Set next_run after a run (or, with first, after the start delay)."""
+        if not self.scheduled or MODE == 'web':      # timers fire in worker.py
+            self.next_run = None
+            return
+        jitter = random.uniform(0, self.jitter) if self.jitter else 0.0
+        if first:
+            base = now + self.start_delay
+            self.next_run = (self.cron.next_after(base) if self.cron else base) + jitter
+        elif self.cron:
+            self.next_run = self.cron.next_after(now) + jitter
+        else:
+            every = self.every() if callable(self.every) else self.every
+            self.next_run = now + max(1.0, float(every)) + jitter
+
+
+def add_job(name, func, every=None, cron=None, jitter=0, start_delay=None, enabled=True):
+    """
+    Register (or re-register) a job. every: seconds, or a callable
+    returning them; cron: 5-field expression; neither = run_now() only.
+    enabled: bool or callable, checked each time the job is due.
+    """
+    if every is not None and cron is not None:
+        raise ValueError('give every or cron, not both')
+    job = Job(name, func, every, cron, jitter, start_delay, enabled)
+    with _cond:
+        old = _jobs.get(name)
+        if old is not None:
+            for field in ('paused', 'running', 'runs', 'failures', 'skipped', 'last_started',
+                          'last_duration', 'total_duration', 'max_duration', 'last_error'):
+                setattr(job, field, getattr(old, field))
+        _jobs[name] = job
+        if _ready_at is not None:
+            job.schedule_next(time.time(), first=True)
+        _cond.notify_all()
+    return job
+
+
+def start(app):
+    """Start the scheduler loop (idempotent); jobs begin once the server is ready."""
+    global _app, _loop, _pool, _started_at
+    with _cond:
+        _app = app
+        if _loop is not None:
+            return
+        _started_at = time.time()
+        _pool = ThreadPoolExecutor(max_workers=_WORKERS, thread_name_prefix='scheduler')
+        _loop = threading.Thread(target=_run_loop, name='scheduler', daemon=True)
+        _loop.start()
+
+    @app.before_request
+    def _scheduler_ready():
+        if _ready_at is None:
+            mark_ready()
+
+
+def mark_ready():
+    """The server is serving: start the start_delay countdown of every job."""
+    global _ready_at
+    with _cond:
+        if _ready_at is not None:
+            return
+        _ready_at = time.time()
+        for job in _jobs.values():
+            job.schedule_next(_ready_at, first=True)
+        _cond.notify_all()
+    print(f"[scheduler] server ready, {len(_jobs)} job(s) scheduled")
+
+
+def _run_loop():
+    with _cond:
+        _cond.wait_for(lambda: _ready_at is not None, timeout=_READY_TIMEOUT)
+    if _ready_at is None:
+        mark_ready()
+
+    while True:
+        with _cond:
+            now = time.time()
+            due = [j for j in _jobs.values() if j.next_run is not None and j.next_run <= now]
+            for job in due:
+                if job.paused or not job.is_enabled():
+                    job.schedule_next(now)
+                elif job.running:
+                    job.skipped += 1
+                    job.schedule_next(now)
+                else:
+                    _dispatch(job, ())
+            wake = min((j.next_run for j in _jobs.values() if j.next_run is not None), default=None)
+            _cond.wait(None if wake is None else max(0.05, wake - time.time()))
+
+
+def _dispatch(job, args):
+    """Hand a run to the pool. Caller holds _cond and checked job.running."""
+    job.running = True
+    job.next_run = None
+    return _pool.submit(_execute, job, args)
+
+
+def _execute(job, args):
+    from app.models.database import db
+    started = time.time()
+    error = None
+    try:
+        with _app.app_context():
+            try:
+                return job.func(*args)
+            finally:
+                db.session.remove()
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+        print(f"[scheduler] {job.name} failed: {error}")
+    finally:
+        finished = time.time()
+        duration = finished - started
+        with _cond:
+            job.running = False
+            job.runs += 1
+            job.last_started = started
+            job.last_duration = duration
+            job.total_duration += duration
+            job.max_duration = max(job.max_duration, duration)
+            if error:
+                job.failures += 1
+                job.last_error = error
+            if _ready_at is not None:
+                job.schedule_next(finished)
+            _cond.notify_all()
+
+
+def run_now(name, *args, wait=False, timeout=None):
+    """
+    Run a job now with args. Returns False when it is already running (the
+    run is counted as skipped), unless wait is set: then this joins the
+    running one. With wait, blocks until the run finishes. In web mode a
+    run without wait is queued for the worker (args must be JSON-able).
+    """
+    if MODE == 'web' and not wait:
+        from app.utils import disk_cache
+        if name not in _jobs:
+            raise KeyError(name)
+        disk_cache.save_worker_request(name, args)
+        return True
+    with _cond:
+        job = _jobs[name]
+        if job.running:
+            if not wait:
+                job.skipped += 1
+                return False
+            _cond.wait_for(lambda: not job.running, timeout=timeout)
+            return True
+        if _pool is None:
+            raise RuntimeError('scheduler not started')
+        future = _dispatch(job, args)
+    if wait:
+        future.result(timeout=timeout)
+    return True
+
+
+def pause(name):
+    with _cond:
+        _jobs[name].paused = True
+    if MODE == 'web':
+        _set_worker_paused(name, True)
+
+
+def resume(name):
+    with _cond:
+        _jobs[name].paused = False
+        _cond.notify_all()
+    if MODE == 'web':
+        _set_worker_paused(name, False)
+
+
+def has_job(name):
+    return name in _jobs
+
+
+def status():
+    """Per-job state and run-time metrics (in web mode: the worker's, as last published)."""
+    if MODE == 'web':
+        from app.utils import disk_cache
+        published = disk_cache.load_worker_status()
+        seen = published.get('published_at')
+        return {
+            'mode': MODE,
+            'workers': published.get('workers'),
+            'ready': published.get('ready', False),
+            'worker_pid': published.get('pid'),
+            'worker_seen_sec_ago': None if seen is None else round(time.time() - seen, 1),
+            'jobs': published.get('jobs', {}),
+        }
+    now = time.time()
+    with _cond:
+        jobs = {}
+        for job in _jobs.values():
+            trigger = (f'cron {job.cron.expr}' if job.cron else
+                       'every (dynamic)' if callable(job.every) else
+                       f'every {job.every}s' if job.every is not None else 'on demand')
+            jobs[job.name] = {
+                'trigger': trigger,
+                'enabled': job.is_enabled(),
+                'paused': job.paused,
+                'running': job.running,
+                'next_run_in_sec': None if job.next_run is None else round(job.next_run - now, 1),
+                'runs': job.runs,
+                'failures': job.failures,
+                'skipped': job.skipped,
+                'last_started': (datetime.fromtimestamp(job.last_started).strftime('%Y-%m-%d %H:%M:%S')
+                                 if job.last_started else None),
+                'last_duration_sec': None if job.last_duration is None else round(job.last_duration, 2),
+                'avg_duration_sec': round(job.total_duration / job.runs, 2) if job.runs else None,
+                'max_duration_sec': round(job.max_duration, 2),
+                'last_error': job.last_error,
+            }
+        return {
+            'mode': MODE,
+            'workers': _WORKERS,
+            'ready': _ready_at is not None,
+            'jobs': jobs,
+        }
+
+
+# ─── Worker process ────────────────────────────
+
+def _set_worker_paused(name, paused):
+    from app.utils import disk_cache
+    names = set(disk_cache.load_worker_control().get('paused') or [])
+    if paused:
+        names.add(name)
+    else:
+        names.discard(name)
+    disk_cache.save_worker_control({'paused': sorted(names)})
+
+
+def run_worker(app):
+    """
+    Body of worker.py: run the jobs on their triggers, plus the runs the
+    web process queued, and publish status() for it. Never returns.
+    """
+    from app.utils import disk_cache
+    if MODE != 'worker':
+        raise RuntimeError('run_worker() needs SCHEDULER_MODE=worker')
+    start(app)
+    mark_ready()                    # nothing to wait for: no requests are served here
+    while True:
+        try:
+            paused = set(disk_cache.load_worker_control().get('paused') or [])
+            with _cond:
+                for job in _jobs.values():
+                    job.paused = job.name in paused
+            for name, args in disk_cache.take_worker_requests():
+                if name in _jobs:
+                    run_now(name, *args)
+                else:
+                    print(f"[scheduler] worker: unknown job requested: {name}")
+            disk_cache.save_worker_status({**status(), 'pid': os.getpid(), 'published_at': time.time()})
+        except Exception as e:
+            print(f"[scheduler] worker poll failed: {e}")
+        time.sleep(_POLL_SEC)
@@ -0,0 +1,71 @@
+"""
+Start-up time report.
+
+pm2 restarts the backend on its memory limit, so a slow boot shows up
+as 502s. create_app() wraps each start-up step in step(); report() then
+prints the steps by time, how many modules were imported and which heavy
+libraries are already loaded, and the first request logs how long after
+start it was served.
+
+Usage:
+    from app.utils import boot_profile
+    with boot_profile.step('db.create_all'):
+        db.create_all()
+    boot_profile.report(app)          # end of create_app(); also hooks the first request
+    boot_profile.status()
+
+Tunables via environment:
+    BOOT_PROFILE_TOP  steps listed in the report  (default 12)
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+_TOP = int(os.environ.get('BOOT_PROFILE_TOP', '12'))
+_HEAVY = ('pandas', 'numpy', 'openpyxl', 'reportlab', 'PyPDF2', 'PIL', 'docx', 'pptx', 'groq')
+
+_started = time.time()          # first import of this module, i.e. start of app import
+_steps = []                     # (name, seconds, modules imported)
+_ready_sec = None
+_first_request_sec = None
+
+
+@contextmanager
+def step(name):
+    started = time.perf_counter()
+    modules = len(sys.modules)
+    try:
+        yield
+    finally:
+        _steps.append((name, time.perf_counter() - started, len(sys.modules) - modules))
+
+
+def report(app):
+    """Print the start-up report and log the first served request."""
+    global _ready_sec
+    _ready_sec = time.time() - _started
+    heavy = [m for m in _HEAVY if m in sys.modules]
+    print(f"[boot] app ready in {_ready_sec:.2f}s — {len(sys.modules)} modules, "
+          f"heavy libs loaded: {', '.join(heavy) or 'none'}")
+    for name, sec, modules in sorted(_steps, key=lambda s: -s[1])[:_TOP]:
+        print(f"[boot]   {sec * 1000:7.0f} ms  {name}  (+{modules} modules)")
+
+    @app.before_request
+    def _boot_first_request():
+        global _first_request_sec
+        if _first_request_sec is None:
+            _first_request_sec = time.time() - _started
+            print(f"[boot] first request {_first_request_sec:.2f}s after start")
+
+
+def status():
+    return {
+        'ready_sec': None if _ready_sec is None else round(_ready_sec, 2),
+        'first_request_sec': None if _first_request_sec is None else round(_first_request_sec, 2),
+        'steps': [{'step': name, 'ms': round(sec * 1000), 'modules': modules} for name, sec, modules in _steps],
+        'heavy_libs_loaded': [m for m in _HEAVY if m in sys.modules],
+    }
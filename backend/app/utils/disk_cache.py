@@ -1,22 +1,34 @@
 """
 Disk-backed caches that survive pm2 restarts.
 
-Three caches:
-- pack_cache         : per-barcode pack status (terminal=24h, pending=15min)
-- pdi_status_cache   : full /pdi-status response per (pdi_id, party_id)
+Four caches:
+- pack_cache          : per-barcode pack status (terminal=24h, pending=15min)
+- pdi_status_cache    : full /pdi-status response per (pdi_id, party_id)
 - party_dispatch_cache: bulk party-dispatch-history per (party_id, days)
-
-All saved as JSON in backend/cache/. Atomic write via .tmp + rename.
-Loaded once at module import; periodically flushed by save_*().
+- party_packing_cache : bulk packed barcodes per party_name
+
+load_*() returns a SharedDict (utils/shared_cache): a process-local dict
+mirrored through backend/cache/shared_cache.sqlite, so every server
+process (WEB_PROCESSES > 1) and worker.py see each other's entries.
+save_*() publishes this process's changes. The old JSON files in
+backend/cache/ only seed the store the first time.
+
+Plus per-company packing validation state (backend/cache/packing_state/,
+one .npz per company: fingerprint arrays + JSON metadata), and the
+worker.py hand-off files (run requests, pause control, worker status)
+in backend/cache/worker/. Atomic writes via per-process .tmp + rename.
 """
 from __future__ import annotations
 
 import json
 import os
+import re
 import threading
 import time
 import copy
 
+from app.utils import shared_cache
+
 _CACHE_DIR = os.path.join(
     os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
     'cache',
@@ -27,6 +39,11 @@ _PACK_FILE = os.path.join(_CACHE_DIR, 'pack_cache.json')
 _PDI_FILE = os.path.join(_CACHE_DIR, 'pdi_status_cache.json')
 _PARTY_DISPATCH_FILE = os.path.join(_CACHE_DIR, 'party_dispatch_cache.json')
 _PARTY_PACKING_FILE = os.path.join(_CACHE_DIR, 'party_packing_cache.json')
+_PACKING_STATE_DIR = os.path.join(_CACHE_DIR, 'packing_state')
+_PACKING_INVALIDATED_FILE = os.path.join(_PACKING_STATE_DIR, 'invalidated.json')
+_WORKER_DIR = os.path.join(_CACHE_DIR, 'worker')
+_WORKER_STATUS_FILE = os.path.join(_WORKER_DIR, 'status.json')
+_WORKER_CONTROL_FILE = os.path.join(_WORKER_DIR, 'control.json')
 
 _lock = threading.Lock()
 
@@ -44,7 +61,7 @@ def _load(path: str) -> dict:
 
 
 def _save(path: str, data: dict) -> None:
-    tmp = path + '.tmp'
+    tmp = f'{path}.{os.getpid()}.tmp'     # per process: web and worker may save the same file
     # Cache dictionaries are updated by multiple request/warmer threads.
     # Take a stable snapshot first, then persist atomically.
     snapshot = None
@@ -73,31 +90,31 @@ def _save(path: str, data: dict) -> None:
 
 def load_pack_cache() -> dict:
     """{ serial: {'t': ts, 'status': 'packed'|'pending', 'info': {...}} }"""
-    d = _load(_PACK_FILE)
-    print(f"[disk_cache] loaded {len(d)} pack entries from disk")
+    d = shared_cache.open('pack', seed=lambda: _load(_PACK_FILE))
+    print(f"[disk_cache] loaded {len(d)} pack entries")
     return d
 
 
 def save_pack_cache(cache: dict) -> None:
-    _save(_PACK_FILE, cache)
+    cache.flush()
 
 
 def load_pdi_status_cache() -> dict:
     """{ 'pdi|party|days': {'timestamp': ts, 'data': {...}} }"""
-    return _load(_PDI_FILE)
+    return shared_cache.open('pdi_status', seed=lambda: _load(_PDI_FILE))
 
 
 def save_pdi_status_cache(cache: dict) -> None:
-    _save(_PDI_FILE, cache)
+    cache.flush()
 
 
 def load_party_dispatch_cache() -> dict:
     """{ 'party_id|days': {'timestamp': ts, 'data': {serial: {...}}} }"""
-    return _load(_PARTY_DISPATCH_FILE)
+    return shared_cache.open('party_dispatch', seed=lambda: _load(_PARTY_DISPATCH_FILE))
 
 
 def save_party_dispatch_cache(cache: dict) -> None:
-    _save(_PARTY_DISPATCH_FILE, cache)
+    cache.flush()
 
 
 def load_party_packing_cache() -> dict:
@@ -106,10 +123,121 @@ def load_party_packing_cache() -> dict:
     Bulk packing data fetched from get_barcode_tracking.php with party_name.
     One call returns ALL packed barcodes for that party — much faster than per-barcode lookups.
     """
-    d = _load(_PARTY_PACKING_FILE)
+    d = shared_cache.open('party_packing', seed=lambda: _load(_PARTY_PACKING_FILE))
     print(f"[disk_cache] loaded party-packing cache for {len(d)} parties")
     return d
 
 
 def save_party_packing_cache(cache: dict) -> None:
-    _save(_PARTY_PACKING_FILE, cache)
+    cache.flush()
+
+
+def _packing_state_path(company: str) -> str:
+    slug = re.sub(r'[^a-z0-9]+', '_', company.strip().lower()).strip('_') or 'default'
+    return os.path.join(_PACKING_STATE_DIR, f'{slug}.npz')
+
+
+def load_packing_state(company: str):
+    """(arrays, meta) saved by save_packing_state(), or None"""
+    import numpy as np
+    path = _packing_state_path(company)
+    try:
+        if os.path.exists(path):
+            with np.load(path) as f:
+                arrays = {k: f[k] for k in f.files if k != 'meta'}
+                meta = json.loads(f['meta'].item())
+            return arrays, meta
+    except Exception as e:
+        print(f"[disk_cache] load {path} failed: {e}")
+    return None
+
+
+def packing_state_mtime(company: str) -> float:
+    """mtime of the company's saved state file (0.0 if none), to spot saves by another process."""
+    try:
+        return os.path.getmtime(_packing_state_path(company))
+    except OSError:
+        return 0.0
+
+
+def load_packing_invalidations() -> dict:
+    """{company key or '*': time of the last invalidate_state()}"""
+    return _load(_PACKING_INVALIDATED_FILE)
+
+
+def save_packing_invalidations(data: dict) -> None:
+    os.makedirs(_PACKING_STATE_DIR, exist_ok=True)
+    _save(_PACKING_INVALIDATED_FILE, data)
+
+
+def save_packing_state(company: str, arrays: dict, meta: dict) -> None:
+    """NumPy arrays + JSON-able meta for one company's packing validation state."""
+    import numpy as np
+    path = _packing_state_path(company)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(_PACKING_STATE_DIR, exist_ok=True)
+        with _lock:
+            with open(tmp, 'wb') as f:
+                np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+            os.replace(tmp, path)
+    except Exception as e:
+        print(f"[disk_cache] save {path} failed: {e}")
+
+
+# ─── Worker process hand-off ───────────────────
+
+def _worker_request_path(job: str) -> str:
+    slug = re.sub(r'[^a-z0-9]+', '_', job.strip().lower()).strip('_')
+    return os.path.join(_WORKER_DIR, f'request-{slug}.json')
+
+
+def save_worker_request(job: str, args: list) -> None:
+    """Ask the worker to run a job; a newer request for the same job replaces an unread one."""
+    os.makedirs(_WORKER_DIR, exist_ok=True)
+    _save(_worker_request_path(job), {'job': job, 'args': list(args), 'at': time.time()})
+
+
+def take_worker_requests() -> list:
+    """[(job, args)] requested since the last call, oldest first; each is read once."""
+    try:
+        names = [n for n in os.listdir(_WORKER_DIR) if n.startswith('request-') and n.endswith('.json')]
+    except OSError:
+        return []
+    requests = []
+    for name in names:
+        path = os.path.join(_WORKER_DIR, name)
+        taking = path + '.taking'
+        try:
+            os.replace(path, taking)        # a request written after this lands in a new file
+        except OSError:
+            continue
+        data = _load(taking)
+        try:
+            os.remove(taking)
+        except OSError:
+            pass
+        if data.get('job'):
+            requests.append((data.get('at') or 0, data['job'], data.get('args') or []))
+    requests.sort(key=lambda r: r[0])
+    return [(job, args) for _, job, args in requests]
+
+
+def load_worker_status() -> dict:
+    """The worker's last published scheduler status ({} if it never ran)."""
+    return _load(_WORKER_STATUS_FILE)
+
+
+def save_worker_status(status: dict) -> None:
+    os.makedirs(_WORKER_DIR, exist_ok=True)
+    _save(_WORKER_STATUS_FILE, status)
+
+
+def load_worker_control() -> dict:
+    """{'paused': [job names]} set from the web process"""
+    return _load(_WORKER_CONTROL_FILE)
+
+
+def save_worker_control(control: dict) -> None:
+    os.makedirs(_WORKER_DIR, exist_ok=True)
+    _save(_WORKER_CONTROL_FILE, control)
@@ -0,0 +1,240 @@
+"""
+Streaming Excel / CSV export helpers.
+
+Replaces the "normal Workbook, ws.cell(...) per value, then walk every
+column again for auto-width" pattern. A normal openpyxl workbook keeps
+one Cell object per value (O(rows x cols) Python objects) and the
+auto-width pass touches every one of them a second time.
+
+Here sheets are written in openpyxl write-only mode: rows go straight
+to a temp file as they are appended. Column widths are computed up
+front from the headers plus the first EXPORT_WIDTH_SAMPLE rows (the
+rest of the rows are never buffered), and the finished file is
+streamed to the client in chunks and deleted afterwards.
+
+Usage:
+    from app.utils.excel_export import new_workbook, write_sheet, send_workbook
+    wb = new_workbook()
+    write_sheet(wb, 'FTR Data', headers, rows)        # rows: any iterable of lists
+    return send_workbook(wb, 'FTR_Data.xlsx')
+
+    # JSON endpoints that embed the file as base64:
+    excel_base64 = base64.b64encode(workbook_bytes(wb)).decode('utf-8')
+
+    # Plain CSV, streamed row by row:
+    return send_csv(headers, rows, 'Packed.csv')
+
+Tunables via environment:
+    EXPORT_WIDTH_SAMPLE   rows sampled for column widths   (default 1000)
+    EXPORT_CHUNK_BYTES    response chunk size              (default 262144)
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import itertools
+import os
+import tempfile
+import unicodedata
+from urllib.parse import quote
+
+from flask import Response
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import Cell
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+
+_WIDTH_SAMPLE = int(os.environ.get('EXPORT_WIDTH_SAMPLE', '1000'))
+_CHUNK_BYTES = int(os.environ.get('EXPORT_CHUNK_BYTES', str(256 * 1024)))
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# House style used by most exports
+HEADER_FONT = Font(bold=True, color='FFFFFF')
+HEADER_FILL = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
+THIN_BORDER = Border(
+    left=Side(style='thin'), right=Side(style='thin'),
+    top=Side(style='thin'), bottom=Side(style='thin'),
+)
+CENTER = Alignment(horizontal='center', vertical='center')
+
+
+def new_workbook() -> Workbook:
+    """Write-only workbook with no default sheet."""
+    return Workbook(write_only=True)
+
+
+def column_widths(headers, sample_rows, min_width=None, max_width=50, pad=2):
+    """Widths from the longest str() per column among headers + sample rows."""
+    lengths = [len(str(h)) for h in headers]
+    for row in sample_rows:
+        for i, v in enumerate(row):
+            if isinstance(v, Cell):
+                v = v.value
+            n = len(str(v)) if v is not None else 0
+            if i >= len(lengths):
+                lengths.append(n)
+            elif n > lengths[i]:
+                lengths[i] = n
+    widths = [n + pad for n in lengths]
+    if max_width:
+        widths = [min(w, max_width) for w in widths]
+    if min_width:
+        widths = [max(w, min_width) for w in widths]
+    return widths
+
+
+def styled(ws, value, font=None, fill=None, border=None, alignment=None, number_format=None):
+    """A single styled cell for ws.append() on a write-only sheet."""
+    cell = WriteOnlyCell(ws, value=value)
+    if font is not None:
+        cell.font = font
+    if fill is not None:
+        cell.fill = fill
+    if border is not None:
+        cell.border = border
+    if alignment is not None:
+        cell.alignment = alignment
+    if number_format is not None:
+        cell.number_format = number_format
+    return cell
+
+
+def write_sheet(wb, title, headers, rows, *, widths=None, max_width=50, min_width=None,
+                header_font=HEADER_FONT, header_fill=HEADER_FILL, header_alignment=None,
+                border=None, cell_style=None, title_row=None, title_font=None,
+                title_fill=None, title_height=None):
+    """
+    Append one sheet to a write-only workbook and stream `rows` into it.
+
+    rows        iterable of lists/tuples; consumed once, never materialised
+    widths      explicit column widths; otherwise computed from headers +
+                the first EXPORT_WIDTH_SAMPLE rows, clamped to
+                [min_width, max_width]
+    border      applied to header and every data cell (e.g. THIN_BORDER)
+    cell_style  optional fn(col_idx, value, row) -> dict of extra style
+                kwargs for that cell (fill/font/alignment), or None
+    title_row   optional text for a merged banner row above the headers
+
+    Returns (ws, data_row_count). The sheet stays open, so callers can
+    ws.append() summary rows after the data.
+    """
+    ws = wb.create_sheet(title=str(title)[:31])
+    rows = iter(rows)
+
+    if widths is None:
+        sample = list(itertools.islice(rows, _WIDTH_SAMPLE))
+        widths = column_widths(headers, sample, min_width=min_width, max_width=max_width)
+        rows = itertools.chain(sample, rows)
+    for i, w in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(i)].width = w
+
+    if title_row is not None:
+        ncols = max(len(headers), 1)
+        ws.merged_cells.add(f'A1:{get_column_letter(ncols)}1')
+        if title_height:
+            ws.row_dimensions[1].height = title_height
+        ws.append([styled(ws, title_row, font=title_font, fill=title_fill, alignment=CENTER)])
+
+    ws.append([styled(ws, h, font=header_font, fill=header_fill, border=border,
+                      alignment=header_alignment) for h in headers])
+
+    count = 0
+    plain = border is None and cell_style is None
+    for row in rows:
+        if plain:
+            ws.append(list(row))
+        else:
+            out = []
+            for col_idx, value in enumerate(row, 1):
+                if isinstance(value, Cell):
+                    out.append(value)
+                    continue
+                extra = cell_style(col_idx, value, row) if cell_style else None
+                if border is None and not extra:
+                    out.append(value)
+                else:
+                    out.append(styled(ws, value, border=border, **(extra or {})))
+            ws.append(out)
+        count += 1
+    return ws, count
+
+
+def _save_to_temp(wb) -> str:
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        wb.save(path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def _stream_and_delete(path):
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _attachment(body, mimetype, download_name, length=None):
+    resp = Response(body, mimetype=mimetype, direct_passthrough=True)
+    # Names come from company / party strings: quote them, and add the RFC 5987
+    # filename* form for non-ASCII ones (as send_file(download_name=) does)
+    try:
+        download_name.encode('ascii')
+        names = {'filename': download_name}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        names = {'filename': simple, 'filename*': "UTF-8''" + quote(download_name, safe="!#$&+-.^_`|~")}
+    resp.headers.set('Content-Disposition', 'attachment', **names)
+    if length is not None:
+        resp.headers['Content-Length'] = str(length)
+    return resp
+
+
+def send_workbook(wb, download_name):
+    """Save to a temp file and stream it as an attachment; the file is removed once sent."""
+    path = _save_to_temp(wb)
+    return _attachment(_stream_and_delete(path), XLSX_MIMETYPE, download_name,
+                       length=os.path.getsize(path))
+
+
+def workbook_bytes(wb) -> bytes:
+    """Finished .xlsx as bytes, for endpoints that return it base64-encoded."""
+    path = _save_to_temp(wb)
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+
+def send_csv(headers, rows, download_name):
+    """Stream a UTF-8 (with BOM, for Excel) CSV built row by row."""
+    def generate():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        buf.write('\ufeff')
+        writer.writerow(headers)
+        for row in rows:
+            writer.writerow(row)
+            if buf.tell() >= _CHUNK_BYTES:
+                yield buf.getvalue().encode('utf-8')
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue().encode('utf-8')
+
+    return _attachment(generate(), 'text/csv', download_name)
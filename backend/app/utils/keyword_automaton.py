@@ -0,0 +1,85 @@
+"""
+Aho-Corasick keyword automaton.
+
+Finds every occurrence of a fixed set of keywords in one left-to-right
+pass over the text, instead of one `kw in text` scan per keyword.
+Matching is plain substring matching (overlaps included), i.e. exactly
+what a chain of `if kw in text` checks would report, so it can replace
+one without changing behaviour.
+
+Build once at import time; find()/finditer() are thread-safe (read-only).
+
+Usage:
+    from app.utils.keyword_automaton import KeywordAutomaton
+    kw = KeywordAutomaton(['pack', 'packed', 'dispatch'])
+    kw.find('packed and dispatched')        # {'pack', 'packed', 'dispatch'}
+    for start, end, word in kw.finditer(text): ...
+"""
+from __future__ import annotations
+
+from collections import deque
+
+
+class KeywordAutomaton:
+    """Trie with failure transitions folded in (a DFA); outputs are the keywords ending in each state."""
+
+    __slots__ = ('_goto', '_out', 'keywords')
+
+    def __init__(self, keywords):
+        self.keywords = frozenset(k for k in keywords if k)
+        self._goto = [{}]
+        self._out = [()]
+        for word in sorted(self.keywords):
+            state = 0
+            for ch in word:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._out.append(())
+                state = nxt
+            self._out[state] = (word,)
+
+        # Breadth-first failure links; each state also reports the
+        # keywords of its failure chain (suffixes of the current match).
+        # Failure transitions are then folded into each state's table, so
+        # scanning is one dict lookup per character.
+        fail = [0] * len(self._goto)
+        order = []
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            order.append(state)
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in self._goto[f]:
+                    f = fail[f]
+                target = self._goto[f].get(ch, 0)
+                fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[fail[nxt]]
+        for state in order:
+            table = dict(self._goto[fail[state]])
+            table.update(self._goto[state])
+            self._goto[state] = table
+
+    def finditer(self, text):
+        """(start, end, keyword) for every occurrence, in order of end position."""
+        goto, out = self._goto, self._out
+        state = 0
+        for i, ch in enumerate(text):
+            state = goto[state].get(ch, 0)
+            for word in out[state]:
+                yield i + 1 - len(word), i + 1, word
+
+    def find(self, text):
+        """Set of keywords that occur anywhere in text."""
+        goto, out = self._goto, self._out
+        found = set()
+        state = 0
+        for ch in text:
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
@@ -0,0 +1,192 @@
+"""
+Blueprint registration that defers importing the route module.
+
+create_app() used to import every route module (and with them pandas,
+openpyxl, reportlab, PyPDF2 ...) before the server could take a request.
+Flask needs a blueprint's URL rules at registration, so the first boot
+imports each module as before and records its rules in a route manifest
+(backend/cache/route_manifest.json). Later boots register the recorded
+rules with a stand-in view instead; the module is imported when one of
+its routes is first requested, then the real view runs.
+
+A manifest entry is used only while the module's source file is
+unchanged (mtime + size), so after a deploy the next boot is eager once
+and refreshes it. Modules with import-time side effects (scheduler jobs,
+fallback checks) are registered with lazy=False.
+
+Usage:
+    from app.utils import lazy_blueprints
+    lazy_blueprints.register(app, 'app.routes.ipqc_routes', 'ipqc_bp', url_prefix='/api/ipqc')
+    lazy_blueprints.register(app, 'app.routes.ftr_routes', 'ftr_bp', lazy=False)   # import now
+    lazy_blueprints.status()
+
+Tunables via environment:
+    LAZY_BLUEPRINTS  0 = import every route module at boot  (default 1)
+"""
+
+from __future__ import annotations
+
+import importlib
+import importlib.util
+import json
+import os
+import threading
+import time
+
+from flask import Flask
+
+_ENABLED = os.environ.get('LAZY_BLUEPRINTS', '1').lower() not in ('0', 'false', 'no')
+
+_MANIFEST_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'cache', 'route_manifest.json',
+)
+
+_lock = threading.Lock()
+_manifest = None            # loaded on first register()
+_lazy = {}                  # module key -> _LazyModule
+_eager = {}                 # module key -> import seconds
+
+
+def _key(module, attr, url_prefix):
+    return f'{module}:{attr}:{url_prefix or ""}'
+
+
+def _stamp(module):
+    spec = importlib.util.find_spec(module)
+    st = os.stat(spec.origin)
+    return [st.st_mtime, st.st_size]
+
+
+def _load_manifest():
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(_MANIFEST_FILE, 'r', encoding='utf-8') as f:
+                _manifest = json.load(f)
+        except (OSError, ValueError):
+            _manifest = {}
+    return _manifest
+
+
+def _save_manifest():
+    tmp = f'{_MANIFEST_FILE}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(_MANIFEST_FILE), exist_ok=True)
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(_manifest, f, indent=1)
+        os.replace(tmp, _MANIFEST_FILE)
+    except Exception as e:
+        print(f"[lazy_blueprints] manifest write failed: {e}")
+
+
+class _LazyModule:
+    """One deferred route module: imported, and its views resolved, on first use."""
+
+    __slots__ = ('module', 'attr', 'url_prefix', 'rules', 'views', 'loaded_sec', '_lock')
+
+    def __init__(self, module, attr, url_prefix, rules):
+        self.module = module
+        self.attr = attr
+        self.url_prefix = url_prefix
+        self.rules = rules
+        self.views = None
+        self.loaded_sec = None
+        self._lock = threading.Lock()
+
+    def view(self, endpoint):
+        views = self.views
+        if views is None:
+            with self._lock:
+                if self.views is None:
+                    started = time.perf_counter()
+                    bp = getattr(importlib.import_module(self.module), self.attr)
+                    # Register on a throwaway app to get endpoint -> view function
+                    # exactly as the real registration would name them
+                    shadow = Flask(self.module)
+                    shadow.register_blueprint(bp, url_prefix=self.url_prefix)
+                    self.views = shadow.view_functions
+                    self.loaded_sec = time.perf_counter() - started
+                    print(f"[lazy_blueprints] {self.module} loaded on first request "
+                          f"({self.loaded_sec * 1000:.0f} ms)")
+                views = self.views
+        return views[endpoint]
+
+
+class _LazyView:
+    __slots__ = ('lazy', 'endpoint')
+
+    def __init__(self, lazy, endpoint):
+        self.lazy = lazy
+        self.endpoint = endpoint
+
+    def __call__(self, **kwargs):
+        return self.lazy.view(self.endpoint)(**kwargs)
+
+
+def _record(app, bp):
+    """The blueprint's rules as registered on app, in manifest form."""
+    rules = []
+    for rule in app.url_map.iter_rules():
+        if not rule.endpoint.startswith(bp.name + '.'):
+            continue
+        # HEAD and an automatic OPTIONS are added again by add_url_rule()
+        methods = set(rule.methods or ()) - {'HEAD'}
+        if getattr(rule, 'provide_automatic_options', False):
+            methods.discard('OPTIONS')
+        rules.append({
+            'rule': rule.rule,
+            'endpoint': rule.endpoint,
+            'methods': sorted(methods),
+            'defaults': rule.defaults,
+            'strict_slashes': rule.strict_slashes,
+        })
+    return rules
+
+
+def register(app, module, attr, url_prefix=None, lazy=True):
+    """
+    Register blueprint `attr` of `module` on app. Deferred (module not
+    imported) when lazy and the manifest matches the module's source;
+    otherwise imported now, registered, and recorded for the next boot.
+    Returns the blueprint, or None when deferred. Import errors propagate.
+    """
+    key = _key(module, attr, url_prefix)
+    with _lock:
+        manifest = _load_manifest()
+        entry = manifest.get(key)
+        stamp = _stamp(module)
+    if lazy and _ENABLED and entry and entry.get('stamp') == stamp and entry.get('rules'):
+        deferred = _LazyModule(module, attr, url_prefix, entry['rules'])
+        views = {}      # one stand-in per endpoint: Flask rejects a second function for it
+        for r in entry['rules']:
+            view = views.get(r['endpoint'])
+            if view is None:
+                view = views[r['endpoint']] = _LazyView(deferred, r['endpoint'])
+            app.add_url_rule(
+                r['rule'], endpoint=r['endpoint'], view_func=view,
+                methods=r['methods'], defaults=r['defaults'], strict_slashes=r['strict_slashes'],
+            )
+        with _lock:
+            _lazy[key] = deferred
+        return None
+
+    started = time.perf_counter()
+    bp = getattr(importlib.import_module(module), attr)
+    app.register_blueprint(bp, url_prefix=url_prefix)
+    rules = _record(app, bp)
+    with _lock:
+        _eager[key] = time.perf_counter() - started
+        if not entry or entry.get('stamp') != stamp or entry.get('rules') != rules:
+            manifest[key] = {'stamp': stamp, 'rules': rules}
+            _save_manifest()
+    return bp
+
+
+def status():
+    return {
+        'enabled': _ENABLED,
+        'eager': {k.split(':')[0]: round(sec * 1000) for k, sec in _eager.items()},
+        'deferred': {d.module: ('not loaded' if d.views is None else f'loaded ({d.loaded_sec * 1000:.0f} ms)')
+                     for d in _lazy.values()},
+    }
@@ -0,0 +1,277 @@
+"""
+Cache store shared by all server processes (SQLite, backend/cache/shared_cache.sqlite).
+
+With WEB_PROCESSES > 1 (see production_server.py) several Waitress
+processes serve the same port, so a cache held in a module-level dict
+would be warmed separately in each of them. A SharedDict keeps the
+process-local dict the handlers already read (lookups stay dict-speed)
+and mirrors it through one SQLite table:
+
+- writes go to the local dict and are published by flush(), one
+  transaction per flush (the handlers already call disk_cache.save_*()
+  after each batch of updates)
+- at most every SHARED_CACHE_CHECK_SEC a lookup checks the namespace's
+  version and pulls only the entries other processes changed since
+- when a namespace is still empty in the store, it is seeded from the
+  old JSON cache file, so the switch keeps the warm data
+
+Values must be JSON-able. The last flush of a key wins.
+
+Rate limits that must hold across processes (one outbound API shared by
+every process) reserve their send slots with take_slot(), which reads and
+advances the limit's next free slot in one SQLite transaction.
+
+Usage:
+    from app.utils import shared_cache
+    cache = shared_cache.open('party_packing', seed=lambda: {...})   # one SharedDict per name
+    cache.get(key); key in cache; cache[key] = value
+    cache.flush()                         # publish this process's changes
+    cache.refresh()                       # see other processes' changes now
+    at = shared_cache.take_slot('notify_whatsapp', 1.0)   # send at `at`; None if store down
+    shared_cache.hold_slots('notify_telegram', time.time() + 30)   # provider said back off
+    parties = shared_cache.open('sales_party', defaults={'data': None, 'timestamp': 0})
+    shared_cache.status()
+
+Tunables via environment:
+    SHARED_CACHE_CHECK_SEC  look for other processes' writes this often  (default 1)
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
+
+_CHECK_SEC = float(os.environ.get('SHARED_CACHE_CHECK_SEC', '1'))
+
+_DB_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'cache', 'shared_cache.sqlite',
+)
+
+_DELETED = object()
+_local = threading.local()      # one connection per thread
+_dicts = {}                     # name -> SharedDict
+_lock = threading.Lock()
+
+
+def _conn():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        os.makedirs(os.path.dirname(_DB_PATH), exist_ok=True)
+        conn = sqlite3.connect(_DB_PATH, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS namespaces '
+                     '(ns TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS entries '
+                     '(ns TEXT NOT NULL, key TEXT NOT NULL, version INTEGER NOT NULL, value TEXT, '
+                     'PRIMARY KEY (ns, key))')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_entries_ns_version ON entries (ns, version)')
+        conn.execute('CREATE TABLE IF NOT EXISTS slots (name TEXT PRIMARY KEY, next_at REAL NOT NULL)')
+        _local.conn = conn
+    return conn
+
+
+def _dumps(value):
+    # Entries may still be updated by other request threads; retry like disk_cache._save
+    for _ in range(5):
+        try:
+            return json.dumps(value)
+        except RuntimeError as e:
+            if 'changed size during iteration' not in str(e):
+                raise
+            time.sleep(0.02)
+    raise RuntimeError('value kept changing while being saved')
+
+
+class SharedDict(MutableMapping):
+    """Process-local dict mirrored through the shared store (see module docstring)."""
+
+    __slots__ = ('name', '_data', '_dirty', '_defaults', '_seen', '_checked_at', '_lock')
+
+    def __init__(self, name, defaults=None):
+        self.name = name
+        self._data = {}
+        self._dirty = {}            # key -> value (or _DELETED) not flushed yet
+        self._defaults = dict(defaults or {})
+        self._seen = 0              # namespace version pulled so far
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    # ─── sync ──────────────────────────────────
+
+    def _sync(self, force=False):
+        now = time.time()
+        if not force and now - self._checked_at < _CHECK_SEC:
+            return
+        self._checked_at = now
+        try:
+            conn = _conn()
+            row = conn.execute('SELECT version FROM namespaces WHERE ns = ?', (self.name,)).fetchone()
+            if row is None or row[0] == self._seen:
+                return
+            changed = conn.execute('SELECT key, value FROM entries WHERE ns = ? AND version > ?',
+                                   (self.name, self._seen)).fetchall()
+        except sqlite3.Error as e:
+            print(f"[shared_cache] {self.name}: sync failed: {e}")
+            return
+        with self._lock:
+            for key, value in changed:
+                if key in self._dirty:
+                    continue        # our unflushed write is newer
+                if value is None:
+                    self._data.pop(key, None)
+                else:
+                    self._data[key] = json.loads(value)
+            self._seen = max(self._seen, row[0])
+
+    def refresh(self):
+        """Pull other processes' changes now instead of waiting for SHARED_CACHE_CHECK_SEC."""
+        self._sync(force=True)
+
+    def flush(self):
+        """Publish this process's changes. Returns the number of keys written."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+        try:
+            rows = [(key, None if value is _DELETED else _dumps(value)) for key, value in dirty.items()]
+            conn = _conn()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT version FROM namespaces WHERE ns = ?', (self.name,)).fetchone()
+                before = row[0] if row else 0
+                version = before + 1
+                conn.executemany('INSERT OR REPLACE INTO entries (ns, key, version, value) VALUES (?, ?, ?, ?)',
+                                 [(self.name, key, version, value) for key, value in rows])
+                conn.execute('INSERT OR REPLACE INTO namespaces (ns, version) VALUES (?, ?)',
+                             (self.name, version))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        except Exception as e:
+            print(f"[shared_cache] {self.name}: flush of {len(dirty)} key(s) failed: {e}")
+            with self._lock:
+                for key, value in dirty.items():
+                    self._dirty.setdefault(key, value)      # retried by the next flush
+            return 0
+        with self._lock:
+            if self._seen == before:
+                self._seen = version                        # nothing from others in between
+        return len(dirty)
+
+    # ─── mapping ───────────────────────────────
+
+    def __getitem__(self, key):
+        self._sync()
+        try:
+            return self._data[key]
+        except KeyError:
+            if key in self._defaults:
+                return self._defaults[key]
+            raise
+
+    def get(self, key, default=None):
+        self._sync()
+        value = self._data.get(key, _DELETED)
+        if value is _DELETED:
+            return self._defaults.get(key, default)
+        return value
+
+    def __contains__(self, key):
+        self._sync()
+        return key in self._data
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._dirty[key] = value
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._data[key]
+            self._dirty[key] = _DELETED
+
+    def __iter__(self):
+        self._sync()
+        return iter(list(self._data))
+
+    def __len__(self):
+        self._sync()
+        return len(self._data)
+
+    def __repr__(self):
+        return f'<SharedDict {self.name!r}: {len(self._data)} entries>'
+
+
+def open(name, seed=None, defaults=None):
+    """
+    The process's SharedDict for name (created on first call). seed: a
+    callable returning initial entries, used only if the store has none.
+    defaults: values returned for missing keys (not stored).
+    """
+    with _lock:
+        cache = _dicts.get(name)
+        if cache is not None:
+            return cache
+        cache = _dicts[name] = SharedDict(name, defaults)
+        try:
+            empty = _conn().execute('SELECT 1 FROM namespaces WHERE ns = ?', (name,)).fetchone() is None
+        except sqlite3.Error as e:
+            print(f"[shared_cache] {name}: store unavailable ({e}), process-local only")
+            return cache
+        if empty and seed is not None:
+            initial = seed() or {}
+            for key, value in initial.items():
+                cache[key] = value
+            cache.flush()
+            print(f"[shared_cache] {name}: seeded {len(initial)} entries")
+        cache._sync(force=True)
+        return cache
+
+
+def _advance_slot(name, interval, until=0.0):
+    """The slot reserved (now or the limit's next free one); next free = slot + interval."""
+    conn = _conn()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute('SELECT next_at FROM slots WHERE name = ?', (name,)).fetchone()
+        slot = max(time.time(), until, row[0] if row else 0.0)
+        conn.execute('INSERT OR REPLACE INTO slots (name, next_at) VALUES (?, ?)', (name, slot + interval))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    return slot
+
+
+def take_slot(name, interval):
+    """
+    Reserve the next send slot of rate limit `name` (slots `interval`
+    seconds apart, shared by all processes). Returns the slot's start
+    time, or None if the store is unavailable.
+    """
+    try:
+        return _advance_slot(name, interval)
+    except sqlite3.Error as e:
+        print(f"[shared_cache] slot {name}: store unavailable ({e})")
+        return None
+
+
+def hold_slots(name, until):
+    """No slot of rate limit `name` starts before `until`, in any process."""
+    try:
+        _advance_slot(name, 0.0, until)
+    except sqlite3.Error as e:
+        print(f"[shared_cache] slot {name}: store unavailable ({e})")
+
+
+def status():
+    return {name: {'entries': len(cache._data), 'version': cache._seen, 'unflushed': len(cache._dirty)}
+            for name, cache in list(_dicts.items())}
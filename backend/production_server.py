@@ -1,17 +1,44 @@
 """
 Production Server for PDI Complete System
 Uses Waitress WSGI server for production deployment
+
+Multi-process: pm2 starts WEB_PROCESSES copies of this script (see
+ecosystem.config.js). With more than one, each binds port 5003 with
+SO_REUSEPORT and the kernel spreads connections over them, so CPU-heavy
+handlers use every core instead of sharing one GIL. Caches, job/batch
+status and invalidations are shared through utils/shared_cache, and
+background jobs run in worker.py
+(SCHEDULER_MODE=web is set here, else every process would run them).
 """
 
 import os
+import socket
 from waitress import serve
+
+PROCESSES = int(os.environ.get('WEB_PROCESSES', '1'))
+if PROCESSES > 1:
+    os.environ.setdefault('SCHEDULER_MODE', 'web')      # before the app (and scheduler) is imported
+
 from app import create_app
 
 app = create_app()
 
+
+def _reuse_port_socket(port, backlog):
+    """Listening socket that other processes can bind too (Linux SO_REUSEPORT)."""
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        raise SystemExit('WEB_PROCESSES > 1 needs SO_REUSEPORT (Linux); use WEB_PROCESSES=1 here')
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(('0.0.0.0', port))
+    sock.listen(backlog)
+    return sock
+
 if __name__ == '__main__':
     # Tunables (env override-able)
-    threads             = int(os.environ.get('WAITRESS_THREADS', '32'))
+    # Per process; the 32-thread default is split over the processes
+    threads             = int(os.environ.get('WAITRESS_THREADS', str(max(8, 32 // PROCESSES))))
     connection_limit    = int(os.environ.get('WAITRESS_CONN_LIMIT', '1000'))
     channel_timeout     = int(os.environ.get('WAITRESS_CHANNEL_TIMEOUT', '120'))
     cleanup_interval    = int(os.environ.get('WAITRESS_CLEANUP_INTERVAL', '30'))
@@ -21,6 +48,7 @@ if __name__ == '__main__':
     print("🚀 PDI Complete System - Production Server")
     print("=" * 60)
     print("Server starting on http://0.0.0.0:5003")
+    print(f"  processes        = {PROCESSES} (pid {os.getpid()})")
     print(f"  threads          = {threads}")
     print(f"  connection_limit = {connection_limit}")
     print(f"  channel_timeout  = {channel_timeout}s")
@@ -29,11 +57,17 @@ if __name__ == '__main__':
     print("Press CTRL+C to stop the server")
     print("=" * 60)
 
+    if PROCESSES > 1 and os.environ.get('SCHEDULER_MODE') != 'web':
+        print(f"⚠️  SCHEDULER_MODE={os.environ.get('SCHEDULER_MODE')}: background jobs run in every process")
+
     # Waitress production server with high concurrency
+    if PROCESSES > 1:
+        listen = {'sockets': [_reuse_port_socket(5003, backlog)]}
+    else:
+        listen = {'host': '0.0.0.0', 'port': 5003}
     serve(
         app,
-        host='0.0.0.0',
-        port=5003,
+        **listen,
         threads=threads,
         connection_limit=connection_limit,
         channel_timeout=channel_timeout,
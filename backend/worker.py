@@ -0,0 +1,31 @@
+"""
+Background Worker for PDI Complete System
+Runs the scheduler jobs (packing validation, Telegram reports, party
+cache warmers) outside the Waitress process that serves requests.
+
+Run next to production_server.py (see ecosystem.config.js, app
+'pdi-worker') and give the web process SCHEDULER_MODE=web, so it only
+reads what this worker publishes in backend/cache and the database.
+Both processes need the same ENABLE_* flags.
+"""
+
+import os
+
+os.environ['SCHEDULER_MODE'] = 'worker'      # before the app (and scheduler) is imported
+
+from app import create_app
+from app.services import scheduler
+
+app = create_app()
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("🛠️  PDI Complete System - Background Worker")
+    print("=" * 60)
+    print(f"  pid     = {os.getpid()}")
+    print(f"  jobs    = {', '.join(sorted(scheduler.status()['jobs'])) or '(none enabled)'}")
+    print(f"  workers = {scheduler.status()['workers']}")
+    print("Press CTRL+C to stop the worker")
+    print("=" * 60)
+
+    scheduler.run_worker(app)
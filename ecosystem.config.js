@@ -1,3 +1,8 @@
+// Web processes behind port 5003 (SO_REUSEPORT, Linux); caches are shared
+// through backend/cache/shared_cache.sqlite. Each process has its own
+// MySQL pools (DB_POOL_MAX, SQLALCHEMY_POOL_SIZE) — mind max_connections.
+const WEB_PROCESSES = parseInt(process.env.WEB_PROCESSES || '1', 10);
+
 module.exports = {
   apps: [
     {
@@ -5,13 +10,16 @@ module.exports = {
       script: 'backend/production_server.py',
       cwd: './',
       interpreter: '/root/pdi_complete/backend/venv/bin/python',
-      instances: 1,
+      instances: WEB_PROCESSES,
+      exec_mode: 'fork',
       autorestart: true,
       watch: false,
       max_memory_restart: '1G',
       env: {
         NODE_ENV: 'production',
-        PORT: 5003
+        PORT: 5003,
+        WEB_PROCESSES: WEB_PROCESSES,
+        SCHEDULER_MODE: 'web'   // background jobs run in pdi-worker
         // AZURE_CV_KEY, AZURE_CV_ENDPOINT, GROQ_API_KEY - Set on server via .env file
       },
       error_file: './logs/backend-error.log',
@@ -19,6 +27,26 @@ module.exports = {
       log_date_format: 'YYYY-MM-DD HH:mm:ss Z',
       merge_logs: true
     },
+    {
+      // Cache warmers, packing validation, Telegram reports (services/scheduler).
+      // ENABLE_PACKING_SCHEDULER / ENABLE_TELEGRAM_BOT / ENABLE_STARTUP_WARM
+      // must match pdi-backend's.
+      name: 'pdi-worker',
+      script: 'backend/worker.py',
+      cwd: './',
+      interpreter: '/root/pdi_complete/backend/venv/bin/python',
+      instances: 1,
+      autorestart: true,
+      watch: false,
+      max_memory_restart: '1G',
+      env: {
+        NODE_ENV: 'production'
+      },
+      error_file: './logs/worker-error.log',
+      out_file: './logs/worker-out.log',
+      log_date_format: 'YYYY-MM-DD HH:mm:ss Z',
+      merge_logs: true
+    },
     {
       name: 'pdi-frontend',
       script: 'npx',
@@ -115,7 +115,14 @@ const QMSAssistant = ({ isOpen, onClose }) => {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ force: false })
       });
-      const data = await res.json();
+      let data = await res.json();
+      // Extraction runs in the background; poll the batch until it is done
+      while (data.batch_id && !data.finished) {
+        await new Promise(resolve => setTimeout(resolve, 2000));
+        const statusRes = await fetch(`${API_BASE}/api/qms/assistant/extract-status?batch_id=${data.batch_id}`);
+        data = await statusRes.json();
+        if (!statusRes.ok) throw new Error(data.error || 'Status check failed');
+      }
       const r = data.results || data;
       addBotMessage(`✅ **Extraction Complete!**\n\n- ✅ **${r.success || 0}** documents extracted\n- ❌ **${r.failed || 0}** failed\n- ⏭️ **${r.skipped || 0}** skipped\n\nAb aap kuch bhi pooch sakte hain! 🎉`, 'system');
       loadIndexStats();
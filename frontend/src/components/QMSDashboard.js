@@ -243,6 +243,8 @@ function formatDate(dateStr) {
 // ═══════════════════════════════════════════════
 const QMSDashboard = () => {
   const [documents, setDocuments] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   // eslint-disable-next-line no-unused-vars
   const [categories, setCategories] = useState(DEFAULT_CATEGORIES);
   const [stats, setStats] = useState({ total: 0, approved: 0, draft: 0, under_review: 0, obsolete: 0 });
@@ -284,16 +286,19 @@ const QMSDashboard = () => {
   const [message, setMessage] = useState({ text: '', type: '' });
 
   // ─── Data Fetching ──────────────────────────
-  const fetchDocuments = useCallback(async () => {
+  const fetchDocuments = useCallback(async (cursor = null) => {
     try {
       const params = new URLSearchParams();
       if (selectedCategory !== 'all') params.append('category', selectedCategory);
       if (selectedStatus !== 'all') params.append('status', selectedStatus);
       if (searchQuery) params.append('search', searchQuery);
+      if (cursor) params.append('cursor', cursor);
       
       const res = await fetch(`${API_BASE}/api/qms/documents?${params}`);
       const data = await res.json();
-      setDocuments(data.documents || []);
+      const page = data.documents || [];
+      setDocuments(prev => (cursor ? [...prev, ...page] : page));
+      setNextCursor(data.next_cursor || null);
       setStats(data.stats || { total: 0, approved: 0, draft: 0, under_review: 0, obsolete: 0 });
       setCategoryCounts(data.category_counts || {});
     } catch (err) {
@@ -301,6 +306,13 @@ const QMSDashboard = () => {
     }
   }, [selectedCategory, selectedStatus, searchQuery]);
 
+  const loadMoreDocuments = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    await fetchDocuments(nextCursor);
+    setLoadingMore(false);
+  };
+
   const fetchDashboardStats = useCallback(async () => {
     try {
       const res = await fetch(`${API_BASE}/api/qms/dashboard-stats`);
@@ -822,6 +834,13 @@ const QMSDashboard = () => {
           ))}
         </div>
       )}
+      {documents.length > 0 && nextCursor && (
+        <div style={{ textAlign: 'center', margin: '16px 0' }}>
+          <button className="qms-btn-secondary" onClick={loadMoreDocuments} disabled={loadingMore}>
+            {loadingMore ? 'Loading...' : 'Load more'}
+          </button>
+        </div>
+      )}
     </div>
   );
 
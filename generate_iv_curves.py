@@ -14,8 +14,18 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import openpyxl
 import warnings
+import importlib.util
 warnings.filterwarnings('ignore')
 
+# Load the engine by file path: importing it through backend.app would run
+# the Flask app package's __init__ just to get a NumPy helper.
+_ENGINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'backend', 'app', 'services', 'iv_curve_engine.py')
+_spec = importlib.util.spec_from_file_location('iv_curve_engine', _ENGINE_PATH)
+iv_curve_engine = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(iv_curve_engine)
+synthesize_iv_curves = iv_curve_engine.synthesize_iv_curves
+
 # ============================================================
 # Configuration
 # ============================================================
@@ -32,6 +42,9 @@ def generate_iv_curve(Voc, Isc, Vpm, Ipm, Rs, Rsh, num_points=NUM_POINTS):
     Generate a realistic IV curve using a piecewise approach that ensures
     the curve passes through Isc, (Vpm, Ipm), and Voc accurately,
     matching the characteristic flat-then-sharp-drop shape of real modules.
+
+    Reference scalar implementation; process_all() uses the batched
+    backend/app/services/iv_curve_engine.py port of this same model.
     """
     # Generate voltage points
     V = np.linspace(0, Voc, num_points)
@@ -212,7 +225,10 @@ def process_all():
 
         print(f"[{sf_idx+1}/{len(subfolders)}] {sf}: {total} modules")
 
-        for r_idx, row in enumerate(rows):
+        # Collect the modules that still need a graph, then solve all of
+        # their curves in one vectorised batch
+        pending = []
+        for row in rows:
             serial = str(row[col['SerialNumber']] or '').strip()
             if not serial:
                 skipped += 1
@@ -227,25 +243,28 @@ def process_all():
                 continue
 
             try:
-                Pmax = float(row[col['Pmax']])
-                Vpm  = float(row[col['Vpm']])
-                Ipm  = float(row[col['Ipm']])
-                Voc  = float(row[col['Voc']])
-                Isc  = float(row[col['Isc']])
-                Rs   = float(row[col['Rs']])
-                Rsh  = float(row[col['Rsh']])
-
-                V, I, P = generate_iv_curve(Voc, Isc, Vpm, Ipm, Rs, Rsh)
-                plot_iv_curve(V, I, P, Voc, Isc, Pmax, out_path)
-                generated += 1
+                params = [float(row[col[h]]) for h in ('Pmax', 'Vpm', 'Ipm', 'Voc', 'Isc', 'Rs', 'Rsh')]
+                pending.append((serial, out_path, params))
+            except Exception as e:
+                errors += 1
+                if errors <= 3:
+                    print(f"  ERROR [{serial}]: {str(e)[:60]}")
+
+        if pending:
+            Pmax, Vpm, Ipm, Voc, Isc, Rs, Rsh = np.array([p for _, _, p in pending]).T
+            V, I, P = synthesize_iv_curves(Voc, Isc, Vpm, Ipm, Rs, Rsh, NUM_POINTS)
 
+        for r_idx, (serial, out_path, _) in enumerate(pending):
+            try:
+                plot_iv_curve(V[r_idx], I[r_idx], P[r_idx], Voc[r_idx], Isc[r_idx], Pmax[r_idx], out_path)
+                generated += 1
             except Exception as e:
                 errors += 1
                 if errors <= 3:
                     print(f"  ERROR [{serial}]: {str(e)[:60]}")
 
             if (r_idx + 1) % 50 == 0:
-                print(f"  {r_idx+1}/{total} done...")
+                print(f"  {r_idx+1}/{len(pending)} done...")
 
         wb.close()
         print(f"  => {generated} generated, {skipped} skipped, {errors} errors")